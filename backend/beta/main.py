@@ -1,7 +1,7 @@
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, Query, UploadFile, File, Form
+from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, Query, UploadFile, File, Form, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.concurrency import run_in_threadpool
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from google.adk.sessions import InMemorySessionService
@@ -16,7 +16,8 @@ from backend.beta.agents.nfr_agent import create_nfr_agent
 from backend.beta.agents.glossary_agent import create_glossary_agent
 from backend.beta.agents.assumptions_agent import create_assumptions_agent
 from backend.beta.schemas.srs_input_schema import SRSRequest
-from pydantic import BaseModel
+from backend.beta.schemas.ai_sections_schema import validate_ai_family
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 import os
 import requests
@@ -120,20 +121,45 @@ from backend.beta.utils.globals import (
     get_session ,
     clean_and_parse_json,
     clean_interface_diagrams,
-    render_mermaid_png)
+    render_mermaid_png,
+    render_mermaid_batch,
+    mermaid_source_key,
+    MERMAID_RENDER_CACHE,
+    PNG_OPTIMIZER,
+    RENDER_DEDUP_STATS,
+    native_renderer_stats,
+    validate_mermaid,
+    mermaid_validation_stats)
+from backend.beta.utils.mermaid_pool import MERMAID_RENDERER_POOL
+from backend.beta.utils.render_backends import RENDER_BACKENDS
+from backend.beta.utils.docx_pool import DOCX_ASSEMBLY_POOL
+from backend.beta.utils.llm_stats import LLM_LATENCY
+from backend.beta.utils.llm_cache import LLM_RESPONSE_CACHE
+from backend.beta.utils.json_stream import parse_json_stream
+from backend.beta.utils.rate_limiter import LLM_RATE_LIMITER, is_rate_limit_error
+from backend.beta.utils.model_router import MODEL_ROUTER
+from backend.beta.utils.json_repair import JSON_REPAIR_STATS, call_tokens, repair_fragment, repair_json_text
+from backend.beta.utils.section_dependencies import FAMILY_SECTIONS, changed_fields, deep_merge, plan_regeneration
+from backend.beta.utils.batch_input import parse_batch
+from backend.beta.utils.pipeline import Pipeline, overlap_saved
 from google.adk.agents import SequentialAgent , ParallelAgent
 from pathlib import Path
 import os
 import time
 from datetime import datetime
-from backend.beta.utils.srs_document_generator import generate_srs_document
 from backend.beta.utils.model import API_KEY_CONFIGURED, GROQ_API_KEY, GROQ_MODEL, GEMINI_API_KEY
 from backend.beta.utils.fallback_srs import build_minimal_sections
 from backend.beta.utils.srs_diagrams import get_all_srs_diagrams
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from litellm import completion as litellm_completion
-import threading
+from litellm import acompletion as litellm_acompletion
+import asyncio
+import contextvars
+from backend.beta.services.job_queue import JOB_QUEUE, JOB_WORKERS, QueueFull
+from backend.beta.services.artifact_store import ARTIFACT_STORE
+from backend.beta.services.progress_events import PROGRESS_EVENTS, same_state
+from backend.beta.services.progress_store import PROGRESS_STORE
+from contextlib import aclosing, nullcontext
+import zipfile
 
 today = datetime.today().strftime("%m/%d/%Y")
 
@@ -146,8 +172,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SRS_PROGRESS = {}
-SRS_PROGRESS_LOCK = threading.Lock()
+# Set while a queued job runs in a worker process so progress lands on the job row.
+_CURRENT_JOB_ID = contextvars.ContextVar("srs_job_id", default=None)
+# Set by batch generation so every row draws provider calls from one shared budget.
+_LLM_SLOTS = contextvars.ContextVar("srs_llm_slots", default=None)
 
 app.mount(
     "/static",
@@ -208,6 +236,50 @@ async def create_srs_agent():
 
 
 
+@app.on_event("startup")
+async def _start_render_pool():
+    # Spawning Node is cheap; browsers warm up in the workers without blocking startup.
+    await run_in_threadpool(MERMAID_RENDERER_POOL.start)
+
+
+@app.on_event("startup")
+async def _start_docx_pool():
+    # Workers import the app once while warming up; builds queue for them instead of delaying startup.
+    app.state.docx_pool_start = asyncio.get_running_loop().run_in_executor(None, DOCX_ASSEMBLY_POOL.start)
+
+
+@app.on_event("startup")
+async def _start_job_workers():
+    if not JOB_WORKERS.enabled:
+        return
+    await run_in_threadpool(JOB_WORKERS.start)
+
+    async def _supervise():
+        while True:
+            await asyncio.sleep(10)
+            await run_in_threadpool(JOB_WORKERS.ensure_alive)
+
+    app.state.job_supervisor = asyncio.create_task(_supervise())
+
+
+@app.on_event("shutdown")
+async def _stop_render_pool():
+    await run_in_threadpool(MERMAID_RENDERER_POOL.stop)
+
+
+@app.on_event("shutdown")
+async def _stop_docx_pool():
+    await run_in_threadpool(DOCX_ASSEMBLY_POOL.stop)
+
+
+@app.on_event("shutdown")
+async def _stop_job_workers():
+    supervisor = getattr(app.state, "job_supervisor", None)
+    if supervisor:
+        supervisor.cancel()
+    await run_in_threadpool(JOB_WORKERS.stop)
+
+
 @app.get("/health")
 async def health():
     return {"status": "UP"}
@@ -246,20 +318,93 @@ def _set_progress(project_key: str, stage: str, progress: int, message: str, sta
         "updated_at": int(time.time()),
     }
     payload.update(extra)
-    with SRS_PROGRESS_LOCK:
-        SRS_PROGRESS[project_key] = payload
+    job_id = _CURRENT_JOB_ID.get()
+    on_write = None
+    if job_id:
+        # Tags the payload so _get_progress can tell this job's progress from another build's.
+        payload["job_id"] = job_id
+
+        def on_write():
+            try:
+                JOB_QUEUE.update_progress(job_id, stage, payload["progress"], message)
+            except Exception as e:
+                print(f"⚠️ Could not record job progress for {job_id}: {e}")
+    # Both SQLite writes happen on the progress store's writer thread, off the event loop.
+    PROGRESS_STORE.set(project_key, payload, on_write=on_write)
+    PROGRESS_EVENTS.publish(project_key, payload)
+
+
+def _job_progress(job: dict) -> dict:
+    result = job.get("result") or {}
+    payload = {
+        "project_key": job["project_key"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "status": "processing" if job["status"] == "running" else job["status"],
+        "message": job["message"],
+        "updated_at": int(job["updated_at"]),
+        "job_id": job["id"],
+        "mode": job["mode"],
+    }
+    if result.get("download_url"):
+        payload["download_url"] = result["download_url"]
+    return payload
 
 
 def _get_progress(project_key: str) -> dict:
-    with SRS_PROGRESS_LOCK:
-        return SRS_PROGRESS.get(project_key, {
-            "project_key": project_key,
-            "stage": "idle",
-            "progress": 0,
-            "status": "idle",
-            "message": "No generation started for this project.",
-            "updated_at": int(time.time()),
-        })
+    stamp, local = PROGRESS_STORE.get_entry(project_key) or (0.0, None)
+    # Queued and cancelled jobs, and jobs whose worker died, only show up on the job row.
+    try:
+        job = JOB_QUEUE.latest_for_project(project_key)
+    except Exception as e:
+        print(f"⚠️ Could not read job progress for {project_key}: {e}")
+        job = None
+    if job and local and local.get("job_id") == job["id"] and job["status"] != "queued":
+        # The worker's own payload carries timings, previews and cache tiers the job row
+        # lacks; the row only adds how the job ended (failed, cancelled, worker lost).
+        payload = {**local, "mode": job["mode"]}
+        if job["status"] in ("failed", "cancelled"):
+            payload.update(status=job["status"], stage=job["stage"], message=job["message"])
+        if job.get("error"):
+            payload["error"] = job["error"]
+        download_url = (job.get("result") or {}).get("download_url")
+        if download_url:
+            payload.setdefault("download_url", download_url)
+        return payload
+    # Both sides are time.time() stamps, so the newer build wins even within the same second.
+    if job and (local is None or job["updated_at"] >= stamp):
+        return _job_progress(job)
+    return local or {
+        "project_key": project_key,
+        "stage": "idle",
+        "progress": 0,
+        "status": "idle",
+        "message": "No generation started for this project.",
+        "updated_at": int(time.time()),
+    }
+
+
+def _resolve_project_key(inputs: dict) -> str:
+    # If project_id is provided from Node.js, use it as the stable key for files & progress.
+    # This prevents creating multiple files for the same project during regeneration.
+    project_id = inputs["project_identity"].get("project_id")
+    if project_id:
+        return str(project_id)
+    return _safe_project_key(inputs["project_identity"]["project_name"])
+
+
+def _schedule_enhanced(background_tasks: BackgroundTasks, inputs: dict, project_name: str, project_key: str):
+    """Queue the enhanced follow-up build; durable when job workers are running, skipped when the queue is full."""
+    if JOB_WORKERS.enabled:
+        try:
+            JOB_QUEUE.submit("enhanced", project_key, {"inputs": inputs, "project_name": project_name})
+            return
+        except QueueFull as e:
+            print(f"⚠️ Enhanced follow-up for {project_key} skipped: {e}")
+            return
+        except Exception as e:
+            print(f"⚠️ Could not queue enhanced job for {project_key}, running in-process: {e}")
+    background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
 
 
 def _safe_project_key(project_name: str) -> str:
@@ -355,16 +500,21 @@ def _ensure_minimum_diagrams(image_paths: dict, mode: str = "quick") -> dict:
             available_before += 1
             continue
 
+        started = time.perf_counter()
         template = _find_template_diagram(key)
         if template and target:
             try:
                 target.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copy2(template, target)
                 filled_from_template += 1
+                RENDER_BACKENDS.record("template", True, time.perf_counter() - started)
                 print(f"🧩 Fallback diagram applied for '{key}' from template: {template.name}")
                 continue
             except Exception as e:
+                RENDER_BACKENDS.record("template", False, time.perf_counter() - started, e)
                 print(f"⚠️ Failed to copy template diagram for {key}: {e}")
+        elif target:
+            RENDER_BACKENDS.record("template", False, time.perf_counter() - started, RuntimeError(f"no template for {key}"))
         still_missing += 1
 
     final_available = available_before + filled_from_template
@@ -411,65 +561,185 @@ def _select_gemini_models() -> list:
     ]
 
 
-def _try_fast_litellm_json(prompt: str) -> dict:
+def _fast_litellm_models() -> list:
+    """Groq/LiteLLM model candidates, fastest first."""
+    if not GROQ_API_KEY:
+        return []
+    # Prefer configured GROQ model first if it is not gemini/*
+    model_candidates = []
+    if GROQ_MODEL and not GROQ_MODEL.startswith("gemini/"):
+        model_candidates.append(GROQ_MODEL)
+    # Fast Groq defaults
+    model_candidates.extend([
+        "groq/llama-3.1-8b-instant",
+        "groq/llama-3.3-70b-versatile",
+    ])
+    # Expand Groq model aliases so both raw and provider-qualified names are tried.
+    expanded = []
+    for m in model_candidates:
+        expanded.append(m)
+        if not m.startswith("groq/"):
+            expanded.append(f"groq/{m}")
+
+    # Deduplicate while keeping order
+    seen = set()
+    return [m for m in expanded if not (m in seen or seen.add(m))]
+
+
+def _parse_ai_json(text: str, prompt: str):
+    """
+    ``clean_and_parse_json``, then tolerant repair of malformed or truncated
+    JSON, so a nearly valid reply is kept instead of asking the next model.
+    """
+    parsed = clean_and_parse_json(text)
+    if parsed:
+        return parsed
+    repaired, fixes = repair_json_text(text)
+    if isinstance(repaired, dict) and repaired:
+        JSON_REPAIR_STATS.add(text_repaired=1, retries_avoided=1, tokens_saved=call_tokens(prompt, text))
+        print(f"🔧 Repaired model JSON locally ({', '.join(fixes)})")
+        return repaired
+    JSON_REPAIR_STATS.add(text_unrepairable=1)
+    return parsed
+
+
+def _streaming_enabled(on_member) -> bool:
+    return on_member is not None and os.getenv("LLM_STREAMING", "1") != "0"
+
+
+async def _litellm_json(model_name: str, prompt: str, on_member=None) -> dict:
     """
-    Try Groq/LiteLLM first for speed. Returns parsed JSON dict or {}.
+    One LiteLLM call through the shared provider rate limiter. Returns parsed JSON dict or {}.
+    With ``on_member``, the completion is streamed and each top-level JSON member
+    is handed to it as soon as it closes.
     """
+    print(f"⚡ Trying fast LiteLLM model: {model_name}")
+    stream = _streaming_enabled(on_member)
+
+    async def request():
+        # Some models/providers do not support strict response_format json_object.
+        # We retry without it if needed (a rate limit goes back to the limiter instead).
+        try:
+            resp = await litellm_acompletion(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                response_format={"type": "json_object"},
+                timeout=15,
+                stream=stream,
+            )
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise
+            resp = await litellm_acompletion(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                timeout=15,
+                stream=stream,
+            )
+        if stream:
+            async def chunks():
+                async for chunk in resp:
+                    if chunk.choices:
+                        yield chunk.choices[0].delta.content or ""
+            text = (await parse_json_stream(chunks(), on_member)).strip()
+        else:
+            text = (resp.choices[0].message.content or "").strip()
+        return _parse_ai_json(text, prompt)
+
+    return await LLM_RATE_LIMITER.call(model_name, request, prompt)
+
+
+async def _gemini_json(model_name: str, prompt: str, on_member=None) -> dict:
+    """One rate-limited Gemini call. Returns parsed JSON dict or {}; streams like ``_litellm_json`` with ``on_member``."""
+    import google.generativeai as genai
+
+    print(f"⚡ Trying model: {model_name}")
+    model = genai.GenerativeModel(model_name)
+
+    async def request():
+        if _streaming_enabled(on_member):
+            response = await model.generate_content_async(prompt, stream=True)
+
+            async def chunks():
+                async for chunk in response:
+                    yield chunk.text
+            return _parse_ai_json(await parse_json_stream(chunks(), on_member), prompt)
+        response = await model.generate_content_async(prompt)
+        return _parse_ai_json(response.text, prompt)
+
+    return await LLM_RATE_LIMITER.call(model_name, request, prompt)
+
+
+async def _hedged_json(candidates: list, hedging: bool = True, route_task: str = "srs_sections") -> tuple:
+    """
+    Race ``(model_name, coroutine_factory)`` candidates in order and return ``(model_name, json)``.
+
+    The first candidate starts immediately. The next one starts when the previous
+    fails, or, with hedging on, once the running model exceeds its p95 latency.
+    The first parseable JSON wins and every other in-flight call is cancelled.
+    Each finished call is reported to the model router under ``route_task``; calls
+    cancelled after outliving the task's latency target count as misses.
+    Returns ``("", {})`` when no candidate produced JSON.
+    """
+    max_inflight = max(1, int(os.getenv("LLM_HEDGE_MAX_INFLIGHT", "2"))) if hedging else 1
+    loop = asyncio.get_running_loop()
+    pending = list(candidates)
+    running = {}
+    launched = hedges = 0
+    winner, result, winner_hedged = "", {}, False
+
+    def _launch():
+        nonlocal launched, hedges
+        model_name, factory = pending.pop(0)
+        # A launch while another call is still in flight is a hedge rather than a fallback.
+        hedged = bool(running)
+        hedges += hedged
+        task = asyncio.ensure_future(factory())
+        running[task] = (model_name, loop.time(), launched, hedged)
+        launched += 1
+
     try:
-        if not GROQ_API_KEY:
-            return {}
-        # Prefer configured GROQ model first if it is not gemini/*
-        model_candidates = []
-        if GROQ_MODEL and not GROQ_MODEL.startswith("gemini/"):
-            model_candidates.append(GROQ_MODEL)
-        # Fast Groq defaults
-        model_candidates.extend([
-            "groq/llama-3.1-8b-instant",
-            "groq/llama-3.3-70b-versatile",
-        ])
-        # Expand Groq model aliases so both raw and provider-qualified names are tried.
-        expanded = []
-        for m in model_candidates:
-            expanded.append(m)
-            if not m.startswith("groq/"):
-                expanded.append(f"groq/{m}")
-
-        # Deduplicate while keeping order
-        seen = set()
-        models = [m for m in expanded if not (m in seen or seen.add(m))]
-
-        for model_name in models:
-            try:
-                print(f"⚡ Trying fast LiteLLM model: {model_name}")
-                # Some models/providers do not support strict response_format json_object.
-                # We retry without it if needed.
+        while pending or running:
+            timeout = None
+            if pending and running and hedging and len(running) < max_inflight:
+                # Hedge against the most recently launched call once it passes its p95.
+                name, started, _, _ = max(running.values(), key=lambda entry: entry[2])
+                timeout = max(0.0, started + LLM_LATENCY.hedge_delay(name) - loop.time())
+            if pending and (not running or timeout == 0.0):
+                _launch()
+                continue
+            done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model_name, started, _, hedged = running.pop(task)
+                elapsed = loop.time() - started
                 try:
-                    resp = litellm_completion(
-                        model=model_name,
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0,
-                        response_format={"type": "json_object"},
-                        timeout=15,
-                    )
-                except Exception:
-                    resp = litellm_completion(
-                        model=model_name,
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0,
-                        timeout=15,
-                    )
-                text = (resp.choices[0].message.content or "").strip()
-                cleaned = clean_and_parse_json(text)
-                if cleaned:
-                    print(f"✅ LiteLLM JSON accepted from: {model_name}")
-                    return cleaned
-                print(f"⚠️ LiteLLM returned non-parseable JSON from: {model_name}")
-            except Exception as e:
-                print(f"⚠️ LiteLLM model failed ({model_name}): {e}")
-        return {}
-    except Exception as e:
-        print(f"⚠️ LiteLLM fast path failed: {e}")
-        return {}
+                    parsed = task.result()
+                except Exception as e:
+                    LLM_LATENCY.record(model_name, elapsed, ok=False)
+                    MODEL_ROUTER.record(route_task, model_name, elapsed, ok=False)
+                    print(f"⚠️ Model failed ({model_name}): {e}")
+                    continue
+                LLM_LATENCY.record(model_name, elapsed, ok=bool(parsed))
+                MODEL_ROUTER.record(route_task, model_name, elapsed, ok=True, json_valid=bool(parsed))
+                if parsed and not result:
+                    winner, result, winner_hedged = model_name, parsed, hedged
+                    print(f"✅ AI JSON accepted from: {model_name} ({elapsed:.1f}s)")
+                elif not parsed:
+                    print(f"⚠️ Non-parseable JSON from: {model_name}")
+            if result:
+                break
+    finally:
+        target = MODEL_ROUTER.target_sec(route_task)
+        for task, (model_name, started, _, _) in running.items():
+            task.cancel()
+            if loop.time() - started > target:
+                MODEL_ROUTER.record(route_task, model_name, loop.time() - started, ok=False)
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    LLM_LATENCY.record_race(hedges, winner_hedged)
+    return winner, result
 
 
 def _map_ai_to_sections(inputs: dict, ai: dict) -> dict:
@@ -589,219 +859,681 @@ def _map_ai_to_sections(inputs: dict, ai: dict) -> dict:
     return sections
 
 
-def _render_all_diagrams(inputs: dict, image_paths: dict, interface_sections: dict):
-    """Render all major and interface Mermaid diagrams to PNG files."""
-    stats = {"core_rendered": 0, "core_failed": 0, "interface_rendered": 0, "interface_failed": 0}
-    interface_keys = [
-        "user_interfaces",
-        "hardware_interfaces",
-        "software_interfaces",
-        "communication_interfaces",
+def _render_diagram_jobs(project_key: str, render_jobs: list) -> list:
+    """
+    Render ``(key, code, output_png, kind)`` jobs, skipping PNGs the artifact store
+    shows are already current for this project. Sources are validated (and
+    repaired) first; code that cannot be repaired is not rendered. Returns
+    ``(job, error, reused, check)`` per job, ``check`` from ``validate_mermaid``.
+    """
+    checks = [validate_mermaid(code) for _, code, _, _ in render_jobs]
+    render_jobs = [(key, check["code"], output_png, kind) for (key, _, output_png, kind), check in zip(render_jobs, checks)]
+    source_keys = [mermaid_source_key(code) for _, code, _, _ in render_jobs]
+    reused = [
+        check["error"] is None and ARTIFACT_STORE.diagram_current(project_key, key, source_key, output_png)
+        for (key, _, output_png, _), source_key, check in zip(render_jobs, source_keys, checks)
     ]
-    render_jobs = []
+    todo = [job for job, skip, check in zip(render_jobs, reused, checks) if not skip and check["error"] is None]
+    # One batch: cache hits first, then the warm renderer pool, then parallel mmdc fallback.
+    errors = iter(
+        render_mermaid_batch([(code, output_png) for _, code, output_png, _ in todo], validate=False) if todo else []
+    )
+    results = []
+    for job, skip, check in zip(render_jobs, reused, checks):
+        if check["error"] is not None:
+            # Never embed an older render of a diagram that no longer parses.
+            Path(job[2]).unlink(missing_ok=True)
+            Path(job[2]).with_suffix(".svg").unlink(missing_ok=True)
+        error = check["error"] if check["error"] is not None or skip else next(errors)
+        results.append((job, error, skip, check))
+    ARTIFACT_STORE.record_diagrams(project_key, [
+        (job[0], source_key, job[2])
+        for (job, error, skip, _), source_key in zip(results, source_keys)
+        if error is None and not skip
+    ])
+    return results
+
+
+_INTERFACE_DIAGRAM_KEYS = [
+    "user_interfaces",
+    "hardware_interfaces",
+    "software_interfaces",
+    "communication_interfaces",
+]
 
-    # Core diagrams
+
+def _empty_render_stats() -> dict:
+    return {
+        "core_rendered": 0, "core_failed": 0, "interface_rendered": 0, "interface_failed": 0, "reused": 0,
+        "syntax_repaired": 0, "syntax_rejected": 0, "render_attempts_avoided": 0,
+    }
+
+
+def _diagram_syntax_report(diagram_stats: dict) -> dict:
+    """Per-SRS summary of pre-render Mermaid validation."""
+    return {
+        "repaired": diagram_stats["syntax_repaired"],
+        "rejected": diagram_stats["syntax_rejected"],
+        "render_attempts_avoided": diagram_stats["render_attempts_avoided"],
+    }
+
+
+def _core_diagram_jobs(inputs: dict, image_paths: dict, keys: list | None = None) -> list:
+    """Render jobs for the diagrams built from the request alone (no AI output needed)."""
+    jobs = []
     for key, mermaid_code in get_all_srs_diagrams(inputs).items():
         output_png = image_paths.get(key)
+        if keys is not None and key not in keys:
+            continue
         if output_png and isinstance(mermaid_code, str) and mermaid_code.strip():
-            render_jobs.append((key, mermaid_code, output_png, "core"))
+            jobs.append((key, mermaid_code, output_png, "core"))
+    return jobs
+
 
-    # Interface diagrams
-    for key in interface_keys:
+def _interface_diagram_jobs(interface_sections: dict, image_paths: dict) -> list:
+    """Render jobs for the interface diagrams the AI stage wrote."""
+    jobs = []
+    for key in _INTERFACE_DIAGRAM_KEYS:
         section = interface_sections.get(key, {})
         code = ((section.get("interface_diagram") or {}).get("code", "") if isinstance(section, dict) else "")
         output_png = image_paths.get(key)
         if output_png and isinstance(code, str) and code.strip():
-            render_jobs.append((key, code, output_png, "interface"))
-
-    # Parallel rendering for faster response time.
-    max_workers = max(2, min(6, len(render_jobs)))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_map = {
-            executor.submit(render_mermaid_png, code, output_png): (key, kind)
-            for key, code, output_png, kind in render_jobs
+            jobs.append((key, code, output_png, "interface"))
+    return jobs
+
+
+def _render_and_tally(project_key: str, render_jobs: list) -> dict:
+    stats = _empty_render_stats()
+    for (key, _, _, kind), error, reused, check in _render_diagram_jobs(project_key, render_jobs):
+        stats["reused"] += reused
+        stats["syntax_repaired"] += bool(check["repairs"])
+        stats["syntax_rejected"] += check["error"] is not None
+        stats["render_attempts_avoided"] += check["attempts_avoided"]
+        if check["repairs"]:
+            print(f"🔧 Repaired {key} {kind} diagram: {'; '.join(check['repairs'])}")
+        if error is None:
+            stats[f"{kind}_rendered"] += 1
+        else:
+            stats[f"{kind}_failed"] += 1
+            print(f"⚠️ Failed to render {key} {kind} diagram: {error}")
+    return stats
+
+
+def _merge_render_stats(*all_stats: dict) -> dict:
+    merged = _empty_render_stats()
+    for stats in all_stats:
+        for key, value in stats.items():
+            merged[key] += value
+    return merged
+
+
+def _render_core_diagrams(inputs: dict, image_paths: dict, project_key: str = "", keys: list | None = None):
+    """Render the input-only Mermaid diagrams; safe to run before the AI stage finishes."""
+    return _render_and_tally(project_key, _core_diagram_jobs(inputs, image_paths, keys))
+
+
+def _render_interface_diagrams(interface_sections: dict, image_paths: dict, project_key: str = ""):
+    """Render the four interface diagrams of the external interfaces section."""
+    return _render_and_tally(project_key, _interface_diagram_jobs(interface_sections, image_paths))
+
+
+# Quick mode renders only these 2 core diagrams.
+_QUICK_DIAGRAM_KEYS = ["system_context", "system_architecture"]
+
+
+async def _run_generation_stages(inputs: dict, project_name: str, project_key: str, image_paths: dict, mode: str):
+    """
+    Run the AI stage and diagram rendering as a DAG. Core and interface diagrams
+    depend only on the request (the AI JSON carries no interface diagrams, see
+    ``_map_ai_to_sections``) and render while the AI response streams in.
+    Returns ``(sections, diagram_stats, timings)``.
+    """
+    ai_metrics = {}
+    pipeline = Pipeline()
+    pipeline.add("ai", lambda _: _build_sections_with_ai(inputs, project_name, project_key, mode=mode, metrics=ai_metrics))
+    core_keys = _QUICK_DIAGRAM_KEYS if mode == "quick" else None
+    pipeline.add("core_diagrams", lambda _: run_in_threadpool(_render_core_diagrams, inputs, image_paths, project_key, core_keys))
+    if mode != "quick":
+        interface_sections = _map_ai_to_sections(inputs, {})["external_interfaces_section"]
+        pipeline.add(
+            "interface_diagrams",
+            lambda _: run_in_threadpool(
+                _render_interface_diagrams, clean_interface_diagrams(interface_sections), image_paths, project_key
+            ),
+        )
+    results, timings = await pipeline.run()
+    diagram_stats = _merge_render_stats(results["core_diagrams"], results.get("interface_diagrams") or {})
+    stage_timings = {
+        "stages": timings,
+        "overlap_saved_sec": overlap_saved(timings),
+        "ttfus_sec": ai_metrics.get("ttfus_sec"),
+    }
+    print(f"⏱️ {mode} stage timings for {project_key}: {stage_timings}")
+    if diagram_stats["syntax_repaired"] or diagram_stats["syntax_rejected"]:
+        print(f"🔧 {mode} diagram syntax for {project_key}: {_diagram_syntax_report(diagram_stats)}")
+    return results["ai"], diagram_stats, stage_timings
+
+
+def _ai_family_structures(mode: str = "full") -> dict:
+    """Required-JSON fragment per AI output family; full/enhanced ask for richer fields and risk analysis."""
+    families = {
+        "introduction": """
+        "introduction": {
+            "purpose": "50-75 word professional summary of the system purpose.",
+            "scope": {
+                "description": "100 word description of what the system does.",
+                "included": ["List of 5-7 in-scope features/modules"],
+                "excluded": ["List of 3 out-of-scope items"]
+            },
+            "definitions": [
+                 {"term": "Term1", "definition": "Def1"}
+            ]
+        }""",
+        "functional_requirements": """
+        "functional_requirements": [
+            {
+                "feature_name": "Feature Name",
+                "description": "2-3 feature description.",
+                "requirements": ["Req 1", "Req 2", "Req 3"]
+            }
+        ]""",
+        "overall_description": """
+        "overall_description": {
+            "product_perspective": "...",
+            "user_characteristics": [
+                {"user_class": "Admin", "characteristics": "..."} 
+            ],
+            "assumptions": [...]
+        }""",
+        "non_functional_requirements": """
+        "non_functional_requirements": {
+            "performance": ["Req 1", "Req 2"],
+            "security": ["Req 1", "Req 2"],
+            "reliability": ["Req 1"]
+        }""",
+    }
+
+    if mode in ["full", "enhanced"]:
+        families["functional_requirements"] = """
+        "functional_requirements": [
+            {
+                "feature_name": "Feature Name",
+                "description": "Detailed description of the feature.",
+                "requirements": ["Req 1", "Req 2"],
+                "structured_requirements": {
+                     "inputs": "User ID, Password...",
+                     "outputs": "Dashboard, Error Message...",
+                     "acceptance_criteria": "User must be redirected within 2s..."
+                }
+            }
+        ]"""
+        families["overall_description"] = """
+        "overall_description": {
+            "product_perspective": "Detailed 200-word perspective...",
+            "user_characteristics": [
+                {
+                    "user_class": "Admin", 
+                    "characteristics": "System administrator...",
+                    "responsibilities": "System config, User management",
+                    "skills": "High technical proficiency"
+                } 
+            ],
+            "assumptions": [...]
+        }"""
+        families["risk_analysis"] = """
+        "risk_analysis": [
+            {
+                "risk": "Data Breach",
+                "probability": "Low",
+                "impact": "High",
+                "mitigation": "Encryption at rest..."
+            }
+        ]"""
+    # Keep the prompt order stable: introduction, features, description, risks, NFRs.
+    order = ["introduction", "functional_requirements", "overall_description", "risk_analysis", "non_functional_requirements"]
+    return {family: families[family] for family in order if family in families}
+
+
+def _ai_detail_instruction(inputs: dict, mode: str = "full") -> str:
+    if mode in ["full", "enhanced"]:
+        return (
+            "PROVIDE EXTENSIVE ENTERPRISE-GRADE DETAIL. "
+            "Write comprehensive, professional paragraphs (100-150 words) for descriptions. "
+            "Use structured data for tables."
+        )
+    detail_instruction = "Ensure the content is concise but professional."
+    extra_instructions = (inputs.get("output_control") or {}).get("additional_instructions")
+    if extra_instructions:
+        detail_instruction = f"{detail_instruction}\nAdditional instructions: {extra_instructions}"
+    return detail_instruction
+
+
+def _build_ai_prompt(inputs: dict, mode: str = "full") -> str:
+    """Build the single-shot SRS expansion prompt for the given generation mode."""
+    json_structure = ",".join(_ai_family_structures(mode).values())
+    prompt = f"""
+    You are an expert Senior Technical Writer. I need you to generate a comprehensive IEEE 830 Software Requirements Specification (SRS) in JSON format.
+    
+    {_ai_detail_instruction(inputs, mode)}
+    
+    Project Input Data:
+    {json.dumps(inputs, indent=2)}
+    
+    Task:
+    Expand the short user inputs into detailed, professional technical content.
+    
+    Required JSON Structure:
+    {{{json_structure}
+    }}
+    
+    Constraints:
+    - Generate at least 5 functional requirements when possible.
+    - Return ONLY valid JSON (no markdown, no comments).
+    """
+    return prompt
+
+
+def _build_family_prompt(family: str, inputs: dict, mode: str = "full") -> str:
+    """Focused prompt that regenerates a single AI output family (see utils/section_dependencies.py)."""
+    structure = _ai_family_structures(mode)[family]
+    constraint = "- Generate at least 5 functional requirements when possible.\n    " if family == "functional_requirements" else ""
+    prompt = f"""
+    You are an expert Senior Technical Writer updating one part of an IEEE 830 Software Requirements Specification (SRS).
+    
+    {_ai_detail_instruction(inputs, mode)}
+    
+    Project Input Data:
+    {json.dumps(inputs, indent=2)}
+    
+    Task:
+    Produce ONLY the "{family}" part of the SRS for the inputs above.
+    
+    Required JSON Structure:
+    {{{structure}
+    }}
+    
+    Constraints:
+    {constraint}- Return ONLY valid JSON (no markdown, no comments).
+    """
+    return prompt
+
+
+def _build_enhancement_prompt(inputs: dict, base_ai: dict) -> str:
+    """Ask only for the enhanced-only fields missing from a quick-mode AI result."""
+    features = [
+        str(f.get("feature_name", "")).strip()
+        for f in base_ai.get("functional_requirements") or [] if isinstance(f, dict) and f.get("feature_name")
+    ]
+    overall = base_ai.get("overall_description") if isinstance(base_ai.get("overall_description"), dict) else {}
+    user_classes = [
+        str(u.get("user_class", "")).strip()
+        for u in overall.get("user_characteristics") or [] if isinstance(u, dict) and u.get("user_class")
+    ]
+    prompt = f"""
+    You are an expert Senior Technical Writer extending an existing IEEE 830 SRS draft.
+    PROVIDE EXTENSIVE ENTERPRISE-GRADE DETAIL, but return ONLY the fields requested below.
+
+    Project Input Data:
+    {json.dumps(inputs)}
+
+    Existing features: {json.dumps(features)}
+    Existing user classes: {json.dumps(user_classes)}
+
+    Required JSON Structure:
+    {{
+        "functional_requirements": [
+            {{
+                "feature_name": "One of the existing features, verbatim",
+                "structured_requirements": {{
+                    "inputs": "User ID, Password...",
+                    "outputs": "Dashboard, Error Message...",
+                    "acceptance_criteria": "User must be redirected within 2s..."
+                }}
+            }}
+        ],
+        "overall_description": {{
+            "product_perspective": "Detailed 200-word perspective...",
+            "user_characteristics": [
+                {{
+                    "user_class": "One of the existing user classes, verbatim",
+                    "responsibilities": "System config, User management",
+                    "skills": "High technical proficiency"
+                }}
+            ]
+        }},
+        "risk_analysis": [
+            {{
+                "risk": "Data Breach",
+                "probability": "Low",
+                "impact": "High",
+                "mitigation": "Encryption at rest..."
+            }}
+        ]
+    }}
+
+    Constraints:
+    - Cover every existing feature and user class.
+    - Return ONLY valid JSON (no markdown, no comments).
+    """
+    return prompt
+
+
+def _merge_enhancement(base_ai: dict, extra: dict) -> dict:
+    """Overlay enhanced-only fields from ``extra`` onto a quick-mode AI result."""
+    merged = json.loads(json.dumps(base_ai))
+    if not isinstance(extra, dict) or not extra:
+        return merged
+
+    by_feature = {
+        str(f.get("feature_name", "")).strip().lower(): f
+        for f in extra.get("functional_requirements") or [] if isinstance(f, dict)
+    }
+    for feature in merged.get("functional_requirements") or []:
+        if not isinstance(feature, dict):
+            continue
+        match = by_feature.get(str(feature.get("feature_name", "")).strip().lower())
+        if match and isinstance(match.get("structured_requirements"), dict):
+            feature["structured_requirements"] = match["structured_requirements"]
+
+    extra_overall = extra.get("overall_description") if isinstance(extra.get("overall_description"), dict) else {}
+    if extra_overall:
+        overall = merged.setdefault("overall_description", {})
+        perspective = extra_overall.get("product_perspective")
+        if isinstance(perspective, str) and len(perspective.strip()) > len(str(overall.get("product_perspective") or "")):
+            overall["product_perspective"] = perspective.strip()
+        by_class = {
+            str(u.get("user_class", "")).strip().lower(): u
+            for u in extra_overall.get("user_characteristics") or [] if isinstance(u, dict)
         }
-        for future in as_completed(future_map):
-            key, kind = future_map[future]
+        for user in overall.get("user_characteristics") or []:
+            match = by_class.get(str(user.get("user_class", "")).strip().lower()) if isinstance(user, dict) else None
+            if match:
+                for field in ("responsibilities", "skills"):
+                    if match.get(field):
+                        user[field] = match[field]
+
+    if isinstance(extra.get("risk_analysis"), list):
+        merged["risk_analysis"] = extra["risk_analysis"]
+    return merged
+
+
+async def _generate_ai_content(prompt: str, project_key: str = "", on_member=None) -> dict:
+    """
+    Serve from the response cache, else race the fast LiteLLM and Gemini models
+    in the order the model router picks for SRS sections (configured order until
+    they are measured), with p95-based hedging. Returns {} on failure.
+    ``on_member(key, value)`` receives top-level JSON members as completions
+    stream in (from any racing model), or every member of a cached response.
+    """
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+    # Fast path first (Groq/LiteLLM), then Gemini fallback
+    candidates = [(m, lambda m=m: _litellm_json(m, prompt, on_member)) for m in _fast_litellm_models()]
+    candidates += [(m, lambda m=m: _gemini_json(m, prompt, on_member)) for m in _select_gemini_models()]
+    ranked = MODEL_ROUTER.order("srs_sections", [m for m, _ in candidates], prompt)
+    candidates = sorted(candidates, key=lambda candidate: ranked.index(candidate[0]))
+
+    model_name, ai_content, tier = await run_in_threadpool(LLM_RESPONSE_CACHE.lookup, prompt, [m for m, _ in candidates])
+    if ai_content:
+        print(f"♻️ AI content reused from cache ({tier}, {model_name})")
+        if on_member is not None:
+            for key, value in ai_content.items():
+                on_member(key, value)
+        if project_key:
+            _set_progress(project_key, "ai", 40, f"AI content reused from cache ({model_name}).", llm_cache=tier)
+        return ai_content
+
+    hedging = os.getenv("LLM_HEDGE_ENABLED", "1") != "0"
+    slots = _LLM_SLOTS.get()
+    async with slots if slots is not None else nullcontext():
+        model_name, ai_content = await _hedged_json(candidates, hedging=hedging)
+    if ai_content:
+        await run_in_threadpool(LLM_RESPONSE_CACHE.store, prompt, model_name, ai_content)
+        if project_key:
+            _set_progress(project_key, "ai", 40, f"AI content generated ({model_name}).", llm_cache="miss")
+        return ai_content
+    print("⚠️ All models failed or returned invalid JSON. Falling back.")
+    return {}
+
+
+async def _generate_ai_sections_parallel(inputs: dict, project_key: str, mode: str, budget_sec: float, on_member=None) -> tuple:
+    """
+    Parallel section mode: one focused prompt per AI output family, all in flight
+    at once. Each reply is validated against its family schema
+    (schemas/ai_sections_schema.py); a family that fails or does not validate is
+    retried on its own, so one bad reply no longer discards the others. Families
+    still missing when the budget expires fall back to template content.
+    Returns ``(ai_content, report)`` with per-family status and attempts.
+    """
+    families = list(_ai_family_structures(mode))
+    attempts = max(1, int(os.getenv("AI_SECTION_ATTEMPTS", "2")))
+    report = {family: {"status": "pending", "attempts": 0, "error": ""} for family in families}
+    started = time.perf_counter()
+
+    async def generate(family: str):
+        prompt = _build_family_prompt(family, inputs, mode)
+        for attempt in range(1, attempts + 1):
+            report[family]["attempts"] = attempt
             try:
-                future.result()
-                if kind == "core":
-                    stats["core_rendered"] += 1
-                else:
-                    stats["interface_rendered"] += 1
+                result = await _generate_ai_content(prompt, on_member=on_member)
+                value = result.get(family) if isinstance(result, dict) else None
+                if value is None:
+                    raise ValueError(f"reply has no '{family}' key")
+                try:
+                    validate_ai_family(family, value)
+                except ValueError:
+                    # Fix the invalid subtrees in place; only an unfixable reply costs another call.
+                    fixed, fixes = repair_fragment(family, value)
+                    if fixed is None:
+                        raise
+                    value = fixed
+                    report[family]["repaired"] = fixes
+                    JSON_REPAIR_STATS.add(fragments_fixed_locally=1, retries_avoided=1, tokens_saved=call_tokens(prompt, value))
             except Exception as e:
-                if kind == "core":
-                    stats["core_failed"] += 1
-                    print(f"⚠️ Failed to render {key} diagram: {e}")
+                if isinstance(e, ValidationError):
+                    first = e.errors()[0]
+                    error = f"{'.'.join(str(part) for part in first['loc']) or family}: {first['msg']}"
                 else:
-                    stats["interface_failed"] += 1
-                    print(f"⚠️ Failed to render {key} interface diagram: {e}")
-    return stats
+                    error = str(e) or type(e).__name__
+                report[family]["error"] = error[:200]
+                # The cache stored the invalid reply; drop it so the retry asks a provider again.
+                await run_in_threadpool(LLM_RESPONSE_CACHE.invalidate, prompt)
+                print(f"🔁 AI section '{family}' attempt {attempt}/{attempts} failed: {report[family]['error']}")
+                if attempt < attempts:
+                    JSON_REPAIR_STATS.add(fragments_reprompted=1)
+                continue
+            report[family].update(status="ok", error="", sec=round(time.perf_counter() - started, 2))
+            if project_key:
+                ready = [f for f in families if report[f]["status"] == "ok"]
+                _set_progress(
+                    project_key, "ai", 25 + 15 * len(ready) // len(families),
+                    f"AI section ready: {family} ({len(ready)}/{len(families)}).", ai_sections=ready,
+                )
+            return value
+        report[family]["status"] = "failed"
+        JSON_REPAIR_STATS.add(fragments_failed=1)
+        return None
 
+    tasks = {asyncio.create_task(generate(family)): family for family in families}
+    done, pending = await asyncio.wait(tasks, timeout=budget_sec)
+    for task in pending:
+        task.cancel()
+        report[tasks[task]]["status"] = "timeout"
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    ai_content = {}
+    for task in done:
+        value = None if task.cancelled() or task.exception() else task.result()
+        if value is not None:
+            ai_content[tasks[task]] = value
+    return ai_content, report
 
-def _render_quick_diagrams(inputs: dict, image_paths: dict):
-    """Render only 2 core diagrams for quick mode."""
-    stats = {"core_rendered": 0, "core_failed": 0, "interface_rendered": 0, "interface_failed": 0}
-    all_diagrams = get_all_srs_diagrams(inputs)
-    for key in ["system_context", "system_architecture"]:
-        code = all_diagrams.get(key)
-        output_png = image_paths.get(key)
-        if not code or not output_png:
-            continue
+
+async def _repair_ai_output(inputs: dict, mode: str, prompt: str, ai_content: dict, budget_sec: float) -> tuple:
+    """
+    Validate every family of a combined AI reply against its schema. Invalid
+    subtrees are fixed locally; families still missing or invalid are asked
+    for again with their small family prompt instead of re-running the whole
+    prompt. A re-prompted reply goes through the same schema check, and a
+    family that still fails is dropped so it gets template content.
+    Returns ``(ai_content, broken_families)``.
+    """
+    ai_content = dict(ai_content)
+    broken = []
+    for family in _ai_family_structures(mode):
+        value = ai_content.get(family)
+        fixed, fixes = repair_fragment(family, value) if value is not None else (None, [])
+        if fixed is None:
+            broken.append(family)
+        elif fixes:
+            ai_content[family] = fixed
+            JSON_REPAIR_STATS.add(
+                fragments_fixed_locally=1, retries_avoided=1,
+                tokens_saved=call_tokens(_build_family_prompt(family, inputs, mode), fixed),
+            )
+            print(f"🔧 Repaired AI section '{family}' locally: {'; '.join(fixes)}")
+    if not broken or budget_sec <= 1:
+        for family in broken:
+            ai_content.pop(family, None)
+        return ai_content, broken
+    whole_call = call_tokens(prompt, ai_content)
+
+    async def reprompt(family: str):
+        family_prompt = _build_family_prompt(family, inputs, mode)
+        result = await _generate_ai_content(family_prompt)
+        value = result.get(family) if isinstance(result, dict) else None
+        fixed, _ = repair_fragment(family, value) if value is not None else (None, [])
+        if fixed is not None:
+            # Measured against re-running the whole prompt, which is what a shape failure used to cost.
+            JSON_REPAIR_STATS.add(tokens_saved=max(0, whole_call - call_tokens(family_prompt, fixed)))
+        return fixed
+
+    print(f"🔁 Re-prompting only for AI section(s): {', '.join(broken)}")
+    JSON_REPAIR_STATS.add(fragments_reprompted=len(broken))
+    tasks = {asyncio.create_task(reprompt(family)): family for family in broken}
+    done, pending = await asyncio.wait(tasks, timeout=budget_sec)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        value = None if task.exception() else task.result()
+        if value is not None:
+            ai_content[tasks[task]] = value
+            broken.remove(tasks[task])
+    for family in broken:
+        ai_content.pop(family, None)
+    JSON_REPAIR_STATS.add(fragments_failed=len(broken))
+    return ai_content, broken
+
+
+# AI families worth showing before the full response has arrived.
+_EARLY_FAMILIES = {
+    "functional_requirements": "Functional requirements",
+    "non_functional_requirements": "Non-functional requirements",
+}
+
+
+def _early_section_publisher(inputs: dict, project_key: str, metrics: dict):
+    """
+    ``on_member`` callback for streamed AI output: the first valid functional or
+    non-functional requirements list is mapped to its section and pushed to
+    progress right away; the first one also fixes time-to-first-useful-section.
+    """
+    started = time.perf_counter()
+    published = set()
+
+    def publish(family, value):
+        if family not in _EARLY_FAMILIES or family in published:
+            return
         try:
-            render_mermaid_png(code, output_png)
-            stats["core_rendered"] += 1
-        except Exception as e:
-            stats["core_failed"] += 1
-            print(f"⚠️ Failed quick render for {key}: {e}")
-    return stats
+            validate_ai_family(family, value)
+        except ValueError:
+            return
+        published.add(family)
+        elapsed = round(time.perf_counter() - started, 3)
+        if "ttfus_sec" not in metrics:
+            metrics["ttfus_sec"] = elapsed
+            LLM_LATENCY.record_first_section(elapsed)
+        if project_key:
+            section_key = FAMILY_SECTIONS[family][0]
+            _set_progress(
+                project_key, "ai", 30, f"{_EARLY_FAMILIES[family]} ready ({elapsed:.1f}s).",
+                section_preview={section_key: _map_ai_to_sections(inputs, {family: value})[section_key]},
+                ttfus_sec=metrics["ttfus_sec"],
+            )
 
+    return publish
 
-def _build_sections_with_ai(inputs: dict, project_name: str, project_key: str = "", mode: str = "full") -> dict:
-    """Build merged sections using AI when available; fallback to minimal."""
-    ai_content = {}
+
+async def _build_sections_with_ai(inputs: dict, project_name: str, project_key: str = "", mode: str = "full",
+                                  metrics: dict | None = None) -> dict:
+    """
+    Build merged sections using AI when available; fallback to minimal.
+    Provider calls are awaited on the event loop and cancelled once the mode's budget expires.
+    Stage outputs recorded for the same project and inputs are reused instead of regenerated.
+    Completions are streamed; ``metrics["ttfus_sec"]`` is set when the first
+    requirements section is usable.
+    """
+    metrics = {} if metrics is None else metrics
+    on_member = _early_section_publisher(inputs, project_key, metrics)
     budget_sec = float(os.getenv("QUICK_AI_BUDGET_SEC", "18")) if mode == "quick" else float(os.getenv("FULL_AI_BUDGET_SEC", "90"))
-    started = time.monotonic()
 
-    if API_KEY_CONFIGURED:
+    # Full output already covers enhanced; enhanced can also build on the quick result.
+    reuse_modes = {"enhanced": ["enhanced", "full", "quick"], "full": ["full", "enhanced"]}.get(mode, [mode])
+    base_mode, base_ai = await run_in_threadpool(ARTIFACT_STORE.load_stage, project_key, inputs, "ai", reuse_modes)
+    if base_ai and (base_mode != "quick" or mode == "quick"):
+        print(f"♻️ Reusing {base_mode} AI output for: {project_name}")
+        _, sections = await run_in_threadpool(ARTIFACT_STORE.load_stage, project_key, inputs, "sections", [base_mode])
+        if not sections:
+            sections = _map_ai_to_sections(inputs, base_ai)
+            sections["external_interfaces_section"] = clean_interface_diagrams(sections.get("external_interfaces_section", {}))
+        if project_key:
+            _set_progress(project_key, "ai", 40, f"Reusing {base_mode} AI output.", ai_reused=base_mode)
+        return sections
+
+    # An enhanced build keeps the quick-mode output as its floor if the extension fails,
+    # but that floor alone is never recorded as this mode's output.
+    ai_content = base_ai
+    complete = not base_ai
+    if API_KEY_CONFIGURED and not base_ai and os.getenv("AI_SECTION_FANOUT", "1") != "0":
+        print(f"🚀 Starting parallel AI Expansion for: {project_name}")
+        if project_key:
+            _set_progress(project_key, "ai", 25, "Generating requirement sections in parallel with AI...")
+        ai_content, report = await _generate_ai_sections_parallel(inputs, project_key, mode, budget_sec, on_member)
+        failed = [family for family, entry in report.items() if entry["status"] != "ok"]
+        complete = not failed
+        if failed:
+            print(f"⚠️ AI sections without usable output: {', '.join(failed)}; using fallback content for them.")
+        if project_key:
+            _set_progress(project_key, "ai", 40, f"AI sections generated ({len(report) - len(failed)}/{len(report)}).", ai_section_report=report)
+    elif API_KEY_CONFIGURED:
         try:
             print(f"🚀 Starting AI Expansion for: {project_name}")
-            if project_key:
+            prompt = _build_ai_prompt(inputs, mode)
+            if base_ai:
+                # Quick output is already there; only the enhanced-only fields still need generating.
+                prompt = _build_enhancement_prompt(inputs, base_ai)
+                if project_key:
+                    _set_progress(project_key, "ai", 25, "Extending quick-mode AI output...", ai_reused=base_mode)
+            elif project_key:
                 _set_progress(project_key, "ai", 25, "Generating detailed requirements with AI...")
-            import google.generativeai as genai
-            
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            
-            detail_instruction = "Ensure the content is concise but professional."
-            extra_instructions = (inputs.get("output_control") or {}).get("additional_instructions")
-            if extra_instructions:
-                detail_instruction = f"{detail_instruction}\nAdditional instructions: {extra_instructions}"
-            json_structure = """
-                "functional_requirements": [
-                    {
-                        "feature_name": "Feature Name",
-                        "description": "2-3 feature description.",
-                        "requirements": ["Req 1", "Req 2", "Req 3"]
-                    }
-                ],
-                "overall_description": {
-                    "product_perspective": "...",
-                    "user_characteristics": [
-                        {"user_class": "Admin", "characteristics": "..."} 
-                    ],
-                    "assumptions": [...]
-                }
-            """
-
-            if mode in ["full", "enhanced"]:
-                detail_instruction = (
-                    "PROVIDE EXTENSIVE ENTERPRISE-GRADE DETAIL. "
-                    "Write comprehensive, professional paragraphs (100-150 words) for descriptions. "
-                    "Use structured data for tables."
+            # An enhancement reply only carries the missing fields; it is not worth previewing.
+            stream_to = None if base_ai else on_member
+            started = time.perf_counter()
+            generated = await asyncio.wait_for(_generate_ai_content(prompt, project_key, stream_to), timeout=budget_sec)
+            if generated and not base_ai:
+                generated, broken = await _repair_ai_output(
+                    inputs, mode, prompt, generated, budget_sec - (time.perf_counter() - started)
                 )
-                json_structure = """
-                "functional_requirements": [
-                    {
-                        "feature_name": "Feature Name",
-                        "description": "Detailed description of the feature.",
-                        "requirements": ["Req 1", "Req 2"],
-                        "structured_requirements": {
-                             "inputs": "User ID, Password...",
-                             "outputs": "Dashboard, Error Message...",
-                             "acceptance_criteria": "User must be redirected within 2s..."
-                        }
-                    }
-                ],
-                "overall_description": {
-                    "product_perspective": "Detailed 200-word perspective...",
-                    "user_characteristics": [
-                        {
-                            "user_class": "Admin", 
-                            "characteristics": "System administrator...",
-                            "responsibilities": "System config, User management",
-                            "skills": "High technical proficiency"
-                        } 
-                    ],
-                    "assumptions": [...]
-                },
-                "risk_analysis": [
-                    {
-                        "risk": "Data Breach",
-                        "probability": "Low",
-                        "impact": "High",
-                        "mitigation": "Encryption at rest..."
-                    }
-                ]
-                """
-
-            prompt = f"""
-            You are an expert Senior Technical Writer. I need you to generate a comprehensive IEEE 830 Software Requirements Specification (SRS) in JSON format.
-            
-            {detail_instruction}
-            
-            Project Input Data:
-            {json.dumps(inputs, indent=2)}
-            
-            Task:
-            Expand the short user inputs into detailed, professional technical content.
-            
-            Required JSON Structure:
-            {{
-                "introduction": {{
-                    "purpose": "50-75 word professional summary of the system purpose.",
-                    "scope": {{
-                        "description": "100 word description of what the system does.",
-                        "included": ["List of 5-7 in-scope features/modules"],
-                        "excluded": ["List of 3 out-of-scope items"]
-                    }},
-                    "definitions": [
-                         {{"term": "Term1", "definition": "Def1"}}
-                    ]
-                }},
-                {json_structure},
-                "non_functional_requirements": {{
-                    "performance": ["Req 1", "Req 2"],
-                    "security": ["Req 1", "Req 2"],
-                    "reliability": ["Req 1"]
-                }}
-            }}
-            
-            Constraints:
-            - Generate at least 5 functional requirements when possible.
-            - Return ONLY valid JSON (no markdown, no comments).
-            """
-
-            # Fast path first (Groq/LiteLLM), then Gemini fallback
-            ai_content = _try_fast_litellm_json(prompt)
-            if ai_content:
-                if project_key:
-                    _set_progress(project_key, "ai", 40, "AI content generated (fast provider).")
-                sections = _map_ai_to_sections(inputs, ai_content)
-                interface_sections = clean_interface_diagrams(sections.get("external_interfaces_section", {}))
-                sections["external_interfaces_section"] = interface_sections
-                return sections
-
-            for model_name in _select_gemini_models():
-                if (time.monotonic() - started) > budget_sec:
-                    print(f"⏱️ AI budget exceeded ({budget_sec}s). Using fallback content.")
-                    break
-                try:
-                    print(f"⚡ Trying model: {model_name}")
-                    model = genai.GenerativeModel(model_name)
-                    response = model.generate_content(prompt)
-                    cleaned_json = clean_and_parse_json(response.text)
-                    if cleaned_json:
-                        ai_content = cleaned_json
-                        print(f"✅ AI Response accepted from: {model_name}")
-                        if project_key:
-                            _set_progress(project_key, "ai", 40, f"AI content generated ({model_name}).")
-                        break
-                    print(f"⚠️ Parsed empty JSON from model: {model_name}")
-                except Exception as model_err:
-                    print(f"⚠️ Model {model_name} failed: {model_err}")
-            if not ai_content:
-                print("⚠️ All models failed or returned invalid JSON. Falling back.")
-                
+                complete = not broken
+            elif base_ai:
+                complete = bool(generated)
+            ai_content = _merge_enhancement(base_ai, generated) if base_ai else generated
+        except asyncio.TimeoutError:
+            print(f"⏱️ AI budget exceeded ({budget_sec}s). Using {'quick-mode' if base_ai else 'fallback'} content.")
         except Exception as e:
             print(f"⚠️ AI Expansion failed: {e}")
             import traceback
@@ -814,11 +1546,16 @@ def _build_sections_with_ai(inputs: dict, project_name: str, project_key: str =
             _set_progress(project_key, "ai", 35, "Using fallback baseline content.")
     interface_sections = clean_interface_diagrams(sections.get("external_interfaces_section", {}))
     sections["external_interfaces_section"] = interface_sections
+    # Partial parallel output is not recorded, so the next run retries the missing families.
+    if ai_content and complete:
+        await run_in_threadpool(ARTIFACT_STORE.save_stage, project_key, inputs, "ai", mode, ai_content)
+        await run_in_threadpool(ARTIFACT_STORE.save_stage, project_key, inputs, "sections", mode, sections)
     return sections
 
 
 def _generate_document(project_name: str, project_key: str, inputs: dict, sections: dict, image_paths: dict, variant: str):
-    output_file = generate_srs_document(
+    # Assembly is CPU-bound python-docx work; it runs in a warm worker process off the GIL.
+    output_file = DOCX_ASSEMBLY_POOL.build(
         project_name=project_name,
         introduction_section=sections["introduction_section"],
         overall_description_section=sections["overall_description_section"],
@@ -863,27 +1600,28 @@ def _generate_instant_fallback(project_name: str, project_key: str, inputs: dict
     return _generate_document(project_name, project_key, inputs, sections, instant_image_paths, "instant")
 
 
-def _generate_enhanced_background(inputs: dict, project_name: str, project_key: str):
+async def _generate_enhanced_background(inputs: dict, project_name: str, project_key: str):
     """Background task to create enhanced SRS after quick file is returned."""
     try:
         print(f"🛠️ Background enhanced generation started: {project_name}")
         _set_progress(project_key, "enhanced_ai", 88, "Preparing enhanced version...", status="processing")
         image_paths = _build_image_paths(project_key)
-        sections = _build_sections_with_ai(inputs, project_name, project_key, mode="enhanced")
-        _set_progress(project_key, "enhanced_diagrams", 92, "Rendering enhanced diagrams...", status="processing")
-        diagram_stats = _render_all_diagrams(inputs, image_paths, sections["external_interfaces_section"])
-        template_stats = _ensure_minimum_diagrams(image_paths, mode="enhanced")
+        sections, diagram_stats, stage_timings = await _run_generation_stages(inputs, project_name, project_key, image_paths, "enhanced")
+        _set_progress(project_key, "enhanced_diagrams", 92, "Enhanced diagrams rendered.", status="processing", stage_timings=stage_timings)
+        template_stats = await run_in_threadpool(_ensure_minimum_diagrams, image_paths, "enhanced")
         if diagram_stats["core_rendered"] == 0:
             _set_progress(project_key, "enhanced_diagrams", 93, "Diagrams unavailable; continuing enhanced build.", status="processing")
         if template_stats["filled_from_template"] > 0:
             _set_progress(project_key, "enhanced_diagrams", 94, "Applied template diagram fallback for quality consistency.", status="processing")
         _set_progress(project_key, "enhanced_doc", 96, "Compiling enhanced DOCX...", status="processing")
-        _generate_document(project_name, project_key, inputs, sections, image_paths, "enhanced")
+        await run_in_threadpool(_generate_document, project_name, project_key, inputs, sections, image_paths, "enhanced")
         _set_progress(project_key, "completed", 100, "Enhanced document ready.", status="completed")
         print(f"✅ Background enhanced generation completed: {project_name}")
+        return _output_path(project_key, "enhanced")
     except Exception as e:
         _set_progress(project_key, "failed", 100, f"Enhanced generation failed: {e}", status="failed")
         print(f"❌ Background enhanced generation failed for {project_name}: {e}")
+        return None
 
 
 @app.get("/srs_status/{project_key}")
@@ -909,7 +1647,106 @@ async def srs_status(project_key: str):
 @app.get("/srs_progress/{project_key}")
 async def srs_progress(project_key: str):
     """Stage-wise progress for SRS generation."""
-    return _get_progress(project_key)
+    return await run_in_threadpool(_get_progress, project_key)
+
+
+async def _progress_snapshot(project_key: str) -> dict:
+    return await run_in_threadpool(_get_progress, project_key)
+
+
+async def _progress_stream(project_key: str, last_event_id: Optional[int]):
+    """Yield ``(event_id, payload)`` progress events, or None when a heartbeat is due."""
+    heartbeat_sec = float(os.getenv("SRS_EVENTS_HEARTBEAT_SEC", "15"))
+    # Subscribe before replaying so nothing published in between is lost.
+    queue = PROGRESS_EVENTS.subscribe(project_key, _progress_snapshot)
+    try:
+        backlog = PROGRESS_EVENTS.replay(project_key, last_event_id)
+        if backlog is None:
+            # Only this client needs the snapshot; publishing it would repeat it to every subscriber.
+            payload = await _progress_snapshot(project_key)
+            backlog = [PROGRESS_EVENTS.snapshot_event(project_key, payload)]
+        sent, last = 0, None
+        for event in backlog:
+            sent, last = event[0], event[1]
+            yield event
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat_sec)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            # The watcher may publish the state this client just got as a snapshot.
+            if event[0] > sent and not (last is not None and same_state(last, event[1])):
+                sent, last = event[0], event[1]
+                yield event
+    finally:
+        PROGRESS_EVENTS.unsubscribe(project_key, queue)
+
+
+def _resume_id(raw) -> Optional[int]:
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+@app.get("/srs_events/{project_key}")
+async def srs_events(project_key: str, request: Request, last_event_id: Optional[str] = None):
+    """Server-Sent Events stream of stage-wise progress; resumes after the Last-Event-ID header."""
+    resume_from = _resume_id(request.headers.get("last-event-id") or last_event_id)
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        async with aclosing(_progress_stream(project_key, resume_from)) as events:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield f"id: {event[0]}\nevent: progress\ndata: {json.dumps(event[1])}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/srs_events/{project_key}")
+async def srs_events_ws(websocket: WebSocket, project_key: str):
+    """WebSocket variant of /srs_events; pass ?last_event_id= to resume."""
+    await websocket.accept()
+    resume_from = _resume_id(websocket.query_params.get("last_event_id"))
+    try:
+        async with aclosing(_progress_stream(project_key, resume_from)) as events:
+            async for event in events:
+                if event is None:
+                    await websocket.send_json({"event": "heartbeat"})
+                else:
+                    await websocket.send_json({"id": event[0], "event": "progress", "data": event[1]})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@app.get("/srs_metrics")
+async def srs_metrics():
+    """Generation pipeline metrics: LLM latency, hedging, response cache, progress events and writes, DOCX assembly, provider rate limits and JSON repair."""
+    return {
+        "llm_latency": LLM_LATENCY.snapshot(),
+        "llm_cache": LLM_RESPONSE_CACHE.stats(),
+        "progress_events": PROGRESS_EVENTS.stats(),
+        "progress_store": PROGRESS_STORE.stats(),
+        "docx_assembly": DOCX_ASSEMBLY_POOL.status(),
+        "llm_rate_limits": LLM_RATE_LIMITER.status(),
+        "json_repair": JSON_REPAIR_STATS.snapshot(),
+    }
+
+
+@app.get("/api/admin/model_routing")
+async def model_routing():
+    """Model router state: per-task rolling latency, failure and JSON-validity rates per model, and recent routing decisions."""
+    return JSONResponse(content=MODEL_ROUTER.status())
 
 
 @app.post("/generate_srs")
@@ -918,15 +1755,15 @@ async def generate_srs(
     background_tasks: BackgroundTasks,
     mode: str = Query(default="full", regex="^(full|quick|instant)$"),
 ):
+    return await _generate_srs(srs_data, background_tasks, mode)
+
+
+async def _generate_srs(srs_data: SRSRequest, background_tasks: BackgroundTasks, mode: str = "full",
+                        schedule_enhanced: bool = True):
+    """Body of ``/generate_srs``; ``schedule_enhanced=False`` builds the document without the enhanced follow-up."""
     inputs = srs_data.dict()
     project_name = inputs["project_identity"]["project_name"]
-    # If project_id is provided from Node.js, use it as the stable key for files & progress.
-    # This prevents creating multiple files for the same project during regeneration.
-    project_id = inputs["project_identity"].get("project_id")
-    if project_id:
-        project_key = str(project_id)
-    else:
-        project_key = _safe_project_key(project_name)
+    project_key = _resolve_project_key(inputs)
     
     _ensure_output_dir()
     image_paths = _build_image_paths(project_key)
@@ -938,7 +1775,7 @@ async def generate_srs(
             _set_progress(project_key, "content", 20, "Preparing baseline content...")
             sections = build_minimal_sections(inputs)
             sections["external_interfaces_section"] = clean_interface_diagrams(sections.get("external_interfaces_section", {}))
-            _ensure_minimum_diagrams(image_paths, mode="instant")
+            await run_in_threadpool(_ensure_minimum_diagrams, image_paths, "instant")
             instant_image_paths = {}
             for k in ["system_context", "system_architecture"]:
                 p = image_paths.get(k)
@@ -960,7 +1797,8 @@ async def generate_srs(
                     download_url=f"/download_srs/{Path(generated_path).name}",
                     mode="instant",
                 )
-                background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
+                if schedule_enhanced:
+                    _schedule_enhanced(background_tasks, inputs, project_name, project_key)
                 return {
                     "status": "success",
                     "mode": "instant",
@@ -979,9 +1817,12 @@ async def generate_srs(
 
         if mode == "quick":
             # Quick mode: AI-enriched sections + only 2 core diagrams (better quality, faster than full).
-            sections = _build_sections_with_ai(inputs, project_name, project_key, mode="quick")
-            _set_progress(project_key, "diagrams", 55, "Rendering core diagrams...")
-            quick_stats = await run_in_threadpool(_render_quick_diagrams, inputs, image_paths)
+            # Core diagrams render while the AI stage runs.
+            sections, quick_stats, stage_timings = await _run_generation_stages(inputs, project_name, project_key, image_paths, "quick")
+            _set_progress(
+                project_key, "diagrams", 55, "Core diagrams rendered.",
+                stage_timings=stage_timings, diagram_syntax=_diagram_syntax_report(quick_stats),
+            )
             quick_template_stats = await run_in_threadpool(_ensure_minimum_diagrams, image_paths, "quick")
             if quick_stats["core_rendered"] == 0:
                 # Do not fail quick mode; generate document without freshly rendered diagrams.
@@ -1014,7 +1855,8 @@ async def generate_srs(
                     download_url=f"/download_srs/{Path(generated_path).name}",
                     mode="quick",
                 )
-                background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
+                if schedule_enhanced:
+                    _schedule_enhanced(background_tasks, inputs, project_name, project_key)
                 return {
                     "status": "success",
                     "mode": "quick",
@@ -1023,6 +1865,8 @@ async def generate_srs(
                     "download_url": f"/download_srs/{Path(generated_path).name}",
                     "enhanced_status_url": f"/srs_status/{project_key}",
                     "enhanced_download_url": f"/download_srs/{Path(_output_path(project_key, 'enhanced')).name}",
+                    "stage_timings": stage_timings,
+                    "diagram_syntax": _diagram_syntax_report(quick_stats),
                     "warnings": [] if quick_stats["core_rendered"] > 0 else [
                         "Core diagrams could not be freshly rendered in quick mode; document was generated with available assets."
                     ],
@@ -1043,7 +1887,8 @@ async def generate_srs(
                         download_url=f"/download_srs/{Path(generated_path).name}",
                         mode="instant",
                     )
-                    background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
+                    if schedule_enhanced:
+                        _schedule_enhanced(background_tasks, inputs, project_name, project_key)
                     return {
                         "status": "success",
                         "mode": "instant",
@@ -1058,9 +1903,12 @@ async def generate_srs(
                     _set_progress(project_key, "failed", 100, str(fallback_err), status="failed")
                     raise HTTPException(status_code=500, detail=f"Quick and instant fallback failed: {fallback_err}")
 
-        sections = _build_sections_with_ai(inputs, project_name, project_key)
-        _set_progress(project_key, "diagrams", 60, "Rendering all diagrams...")
-        diagram_stats = await run_in_threadpool(_render_all_diagrams, inputs, image_paths, sections["external_interfaces_section"])
+        # Core diagrams render while the AI stage runs; only interface diagrams wait for it.
+        sections, diagram_stats, stage_timings = await _run_generation_stages(inputs, project_name, project_key, image_paths, "full")
+        _set_progress(
+            project_key, "diagrams", 60, "Diagrams rendered.",
+            stage_timings=stage_timings, diagram_syntax=_diagram_syntax_report(diagram_stats),
+        )
         full_template_stats = await run_in_threadpool(_ensure_minimum_diagrams, image_paths, "full")
         if diagram_stats["core_rendered"] == 0:
             _set_progress(
@@ -1101,6 +1949,8 @@ async def generate_srs(
                 "mode": "full",
                 "srs_document_path": generated_path,
                 "download_url": f"/download_srs/{Path(generated_path).name}",
+                "stage_timings": stage_timings,
+                "diagram_syntax": _diagram_syntax_report(diagram_stats),
                 "warnings": [] if diagram_stats["core_rendered"] > 0 else [
                     "Some diagrams could not be rendered; document was generated with available assets."
                 ],
@@ -1122,7 +1972,8 @@ async def generate_srs(
                     download_url=f"/download_srs/{Path(generated_path).name}",
                     mode="instant",
                 )
-                background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
+                if schedule_enhanced:
+                    _schedule_enhanced(background_tasks, inputs, project_name, project_key)
                 return {
                     "status": "success",
                     "message": "Full generation failed, instant fallback generated successfully.",
@@ -1140,7 +1991,7 @@ async def generate_srs(
         # Last-resort safety: attempt instant fallback for any unexpected failure.
         try:
             _set_progress(project_key, "doc", 75, "Unexpected error, switching to instant fallback...")
-            generated_path = _generate_instant_fallback(project_name, project_key, inputs, image_paths)
+            generated_path = await run_in_threadpool(_generate_instant_fallback, project_name, project_key, inputs, image_paths)
             _set_progress(
                 project_key,
                 "completed",
@@ -1150,7 +2001,8 @@ async def generate_srs(
                 download_url=f"/download_srs/{Path(generated_path).name}",
                 mode="instant",
             )
-            background_tasks.add_task(_generate_enhanced_background, inputs, project_name, project_key)
+            if schedule_enhanced:
+                _schedule_enhanced(background_tasks, inputs, project_name, project_key)
             return {
                 "status": "success",
                 "message": "Unexpected error; instant fallback generated successfully.",
@@ -1164,6 +2016,347 @@ async def generate_srs(
             raise HTTPException(status_code=500, detail=f"Unexpected error; instant fallback failed: {fallback_err}")
 
 
+# --- Batch SRS Generation ---
+
+_BATCH_DIR = Path("./backend/beta/generated_srs/batches")
+
+
+def _latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0, "mean": 0.0}
+    ordered = sorted(latencies)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+    return {"p50": pick(50), "p95": pick(95), "max": round(ordered[-1], 3), "mean": round(sum(ordered) / len(ordered), 3)}
+
+
+def _write_batch_zip(zip_path: Path, results: list):
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    # DOCX files are already deflated; storing them keeps zipping off the critical path.
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for result in results:
+            path = result.get("srs_document_path")
+            if path and Path(path).is_file():
+                archive.write(path, arcname=f"{result['row']:04d}_{Path(path).name}")
+        archive.writestr("results.jsonl", "".join(json.dumps(r) + "\n" for r in results))
+
+
+async def _generate_batch_row(row_no: int, request: dict, mode: str, rows: asyncio.Semaphore) -> dict:
+    async with rows:
+        started = time.perf_counter()
+        result = {"row": row_no, "status": "failed"}
+        try:
+            srs_data = SRSRequest(**request)
+            result["project_key"] = _resolve_project_key(srs_data.dict())
+            # Batches never queue the enhanced follow-up: one per row would flood the job queue.
+            response = await _generate_srs(srs_data, BackgroundTasks(), mode=mode, schedule_enhanced=False)
+            result.update(
+                status="success",
+                mode=response.get("mode"),
+                srs_document_path=response.get("srs_document_path"),
+                download_url=response.get("download_url"),
+                warnings=response.get("warnings", []),
+            )
+        except ValidationError as e:
+            result["error"] = json.loads(e.json())
+        except HTTPException as e:
+            result["error"] = e.detail
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency_sec"] = round(time.perf_counter() - started, 3)
+        return result
+
+
+@app.post("/generate_srs/batch")
+async def generate_srs_batch(
+    file: UploadFile = File(...),
+    mode: str = Query(default="quick", regex="^(full|quick|instant)$"),
+    concurrency: int = Query(default=int(os.getenv("SRS_BATCH_CONCURRENCY", "4")), ge=1, le=32),
+    llm_concurrency: int = Query(default=int(os.getenv("SRS_BATCH_LLM_CONCURRENCY", "2")), ge=1, le=16),
+):
+    """
+    Generate one SRS per CSV/JSONL row and stream per-row results as NDJSON.
+    Rows share the Mermaid renderer pool and one LLM concurrency budget; the
+    final line summarizes throughput and latency and links the zip of documents.
+    """
+    rows = parse_batch(await file.read(), file.filename or "", file.content_type or "")
+    max_rows = int(os.getenv("SRS_BATCH_MAX_ROWS", "500"))
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch file has no rows.")
+    if len(rows) > max_rows:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(rows)} rows; the limit is {max_rows}.")
+
+    # Rows for the same project would overwrite each other's files.
+    seen_keys = set()
+    for row_no, request, error in rows:
+        identity = request.get("project_identity")
+        if error or not isinstance(identity, dict):
+            continue
+        key = str(identity.get("project_id") or _safe_project_key(str(identity.get("project_name", "")).strip()))
+        if key in seen_keys:
+            identity["project_id"] = key = f"{key}_{row_no}"
+        seen_keys.add(key)
+
+    batch_id = uuid.uuid4().hex[:12]
+    _ensure_output_dir()
+
+    async def stream():
+        started = time.perf_counter()
+        dedup_before = RENDER_DEDUP_STATS["deduplicated"]
+        cache_before = MERMAID_RENDER_CACHE.stats()["hits"]
+        row_slots = asyncio.Semaphore(concurrency)
+        token = _LLM_SLOTS.set(asyncio.Semaphore(llm_concurrency))
+        try:
+            tasks = [
+                asyncio.create_task(_generate_batch_row(row_no, request, mode, row_slots))
+                for row_no, request, error in rows if not error
+            ]
+        finally:
+            _LLM_SLOTS.reset(token)
+        results = [{"row": row_no, "status": "failed", "error": error, "latency_sec": 0.0} for row_no, _, error in rows if error]
+        try:
+            for result in results:
+                yield json.dumps(result) + "\n"
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        results.sort(key=lambda r: r["row"])
+        zip_path = _BATCH_DIR / f"batch_{batch_id}.zip"
+        await run_in_threadpool(_write_batch_zip, zip_path, results)
+        elapsed = time.perf_counter() - started
+        succeeded = sum(1 for r in results if r["status"] == "success")
+        yield json.dumps({
+            "summary": {
+                "batch_id": batch_id,
+                "mode": mode,
+                "rows": len(results),
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "elapsed_sec": round(elapsed, 3),
+                "rows_per_min": round(len(results) / elapsed * 60, 2) if elapsed else 0.0,
+                "latency_sec": _latency_summary([r["latency_sec"] for r in results if r["status"] == "success"]),
+                "diagrams_deduplicated": RENDER_DEDUP_STATS["deduplicated"] - dedup_before,
+                "diagram_cache_hits": MERMAID_RENDER_CACHE.stats()["hits"] - cache_before,
+                "download_url": f"/download_batch/{zip_path.name}",
+            }
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/download_batch/{filename}")
+async def download_batch(filename: str):
+    """Serve the zip of documents produced by a batch generation."""
+    if not filename.endswith(".zip") or ".." in filename or "/" in filename or "\\" in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    base = _BATCH_DIR.resolve()
+    path = (base / filename).resolve()
+    if not path.is_file() or base not in path.parents:
+        raise HTTPException(status_code=404, detail="Batch archive not found")
+    return FileResponse(path, filename=filename, media_type="application/zip")
+
+
+# --- Section-level Regeneration ---
+
+class SectionRegenerationRequest(BaseModel):
+    changes: dict
+
+
+@app.post("/generate_srs/{project_key}/sections")
+async def regenerate_srs_sections(project_key: str, request: SectionRegenerationRequest):
+    """
+    Apply a partial SRSRequest to the last generation of a project and regenerate
+    only the AI families, sections and diagrams that depend on the changed fields.
+    """
+    prev_inputs, variant, prev_ai = await run_in_threadpool(
+        ARTIFACT_STORE.load_latest, project_key, "ai", ["enhanced", "full", "quick"]
+    )
+    if not prev_ai:
+        raise HTTPException(status_code=404, detail="No previous AI generation recorded for this project; call /generate_srs first.")
+    try:
+        inputs = SRSRequest(**deep_merge(prev_inputs, request.changes)).dict()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+
+    fields = changed_fields(prev_inputs, inputs)
+    plan = plan_regeneration(fields)
+    project_name = inputs["project_identity"]["project_name"]
+    image_paths = _build_image_paths(project_key)
+    warnings = []
+    _set_progress(project_key, "init", 5, f"Regenerating {len(plan['sections'])} section(s)...", changed_fields=fields)
+
+    ai_content = json.loads(json.dumps(prev_ai))
+    families = [f for f in plan["families"] if f in _ai_family_structures(variant)]
+    if families and API_KEY_CONFIGURED:
+        _set_progress(project_key, "ai", 25, f"Regenerating {', '.join(families)}...")
+        budget_sec = float(os.getenv("QUICK_AI_BUDGET_SEC", "18")) if variant == "quick" else float(os.getenv("FULL_AI_BUDGET_SEC", "90"))
+        results = await asyncio.gather(*[
+            asyncio.wait_for(_generate_ai_content(_build_family_prompt(family, inputs, variant), project_key), timeout=budget_sec)
+            for family in families
+        ], return_exceptions=True)
+        for family, result in zip(families, results):
+            value = result.get(family) if isinstance(result, dict) else None
+            if not value:
+                warnings.append(f"Could not regenerate {family}; kept the previous content.")
+                continue
+            fixed, fixes = repair_fragment(family, value)
+            if fixed is None:
+                # The previous content was written for the old inputs; use template content instead.
+                ai_content.pop(family, None)
+                JSON_REPAIR_STATS.add(fragments_failed=1)
+                warnings.append(f"Regenerated {family} did not validate; using fallback content for it.")
+                continue
+            if fixes:
+                print(f"🔧 Repaired AI section '{family}' locally: {'; '.join(fixes)}")
+            ai_content[family] = fixed
+    elif families:
+        warnings.append("AI provider not configured; AI-written sections kept from the previous generation.")
+
+    sections = _map_ai_to_sections(inputs, ai_content)
+    sections["external_interfaces_section"] = clean_interface_diagrams(sections.get("external_interfaces_section", {}))
+    await run_in_threadpool(ARTIFACT_STORE.save_stage, project_key, inputs, "ai", variant, ai_content)
+    await run_in_threadpool(ARTIFACT_STORE.save_stage, project_key, inputs, "sections", variant, sections)
+
+    # Quick documents only carry the two core diagrams.
+    keys = [key for key in plan["diagrams"] if variant != "quick" or key in _QUICK_DIAGRAM_KEYS]
+    render_jobs = _core_diagram_jobs(inputs, image_paths, keys)
+    if render_jobs:
+        _set_progress(project_key, "diagrams", 60, f"Re-rendering {len(render_jobs)} diagram(s)...")
+        for (key, _, _, _), error, _, _ in await run_in_threadpool(_render_diagram_jobs, project_key, render_jobs):
+            if error is not None:
+                print(f"⚠️ Failed to re-render {key} diagram: {error}")
+                warnings.append(f"Diagram {key} could not be re-rendered.")
+    await run_in_threadpool(_ensure_minimum_diagrams, image_paths, variant)
+
+    try:
+        _set_progress(project_key, "doc", 85, "Rebuilding DOCX...")
+        generated_path = await run_in_threadpool(
+            _generate_document, project_name, project_key, inputs, sections, image_paths, variant
+        )
+    except Exception as e:
+        _set_progress(project_key, "failed", 100, str(e), status="failed")
+        raise HTTPException(status_code=500, detail=f"Document rebuild failed: {e}")
+    _set_progress(
+        project_key,
+        "completed",
+        100,
+        "Updated document ready.",
+        status="completed",
+        download_url=f"/download_srs/{Path(generated_path).name}",
+        mode=variant,
+    )
+    return {
+        "status": "success",
+        "mode": variant,
+        "message": "SRS sections regenerated.",
+        "changed_fields": fields,
+        "regenerated": {
+            "ai_families": families,
+            "sections": plan["sections"],
+            "diagrams": [key for key, _, _, _ in render_jobs],
+        },
+        "srs_document_path": generated_path,
+        "download_url": f"/download_srs/{Path(generated_path).name}",
+        "warnings": warnings,
+    }
+
+
+# --- SRS Job Queue ---
+
+async def run_generation_job(job: dict) -> dict:
+    """Run a claimed job inside a worker process (see services/job_queue.py)."""
+    token = _CURRENT_JOB_ID.set(job["id"])
+    try:
+        payload = job["payload"]
+        if job["mode"] == "enhanced":
+            generated_path = await _generate_enhanced_background(payload["inputs"], payload["project_name"], job["project_key"])
+            if not generated_path:
+                raise RuntimeError(_get_progress(job["project_key"]).get("message") or "Enhanced generation failed")
+            return {
+                "status": "success",
+                "mode": "enhanced",
+                "message": "Enhanced document ready.",
+                "srs_document_path": generated_path,
+                "download_url": f"/download_srs/{Path(generated_path).name}",
+            }
+        # Follow-up work is queued as its own job by _schedule_enhanced, so these tasks stay empty.
+        return await _generate_srs(SRSRequest(**payload["request"]), BackgroundTasks(), mode=job["mode"])
+    finally:
+        _CURRENT_JOB_ID.reset(token)
+
+
+def _job_response(job: dict) -> dict:
+    return {
+        **job,
+        "status_url": f"/jobs/{job['id']}",
+        "progress_url": f"/srs_progress/{job['project_key']}",
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    srs_data: SRSRequest,
+    mode: str = Query(default="full", regex="^(full|quick|instant)$"),
+    priority: Optional[int] = Query(default=None, ge=0, le=9),
+):
+    """Queue an SRS generation and return immediately; poll /jobs/{job_id} for the result."""
+    if not JOB_WORKERS.enabled:
+        raise HTTPException(status_code=503, detail="Job workers are disabled (SRS_JOB_WORKERS=0).")
+    inputs = srs_data.dict()
+    project_key = _resolve_project_key(inputs)
+    try:
+        job = await run_in_threadpool(JOB_QUEUE.submit, mode, project_key, {"request": inputs}, priority)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, try again shortly.", headers={"Retry-After": "5"})
+    return _job_response(job)
+
+
+@app.get("/jobs")
+async def list_jobs(project_key: Optional[str] = None):
+    """Queue overview, or the recent jobs of one project."""
+    if project_key:
+        return {"project_key": project_key, "jobs": await run_in_threadpool(JOB_QUEUE.list_for_project, project_key)}
+    return {"workers": JOB_WORKERS.status(), "counts": await run_in_threadpool(JOB_QUEUE.counts)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(JOB_QUEUE.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = await run_in_threadpool(JOB_QUEUE.cancel, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return _job_response(job)
+
+
+@app.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    try:
+        job = await run_in_threadpool(JOB_QUEUE.retry, job_id)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, try again shortly.", headers={"Retry-After": "5"})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "queued":
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled jobs can be retried (job is {job['status']})")
+    return _job_response(job)
+
+
 # --- AI Notebook Endpoints ---
 
 from backend.beta.services.workflow_service import WorkflowService
@@ -1277,9 +2470,16 @@ async def generate_image(request: ImageRequest):
 @app.get("/api/notebook/diagram-image/status")
 async def diagram_image_status():
     mmdc_path = shutil.which("mmdc") or shutil.which("mmdc.cmd")
+    enabled = bool(mmdc_path) or MERMAID_RENDERER_POOL.available()
     return JSONResponse(content={
-        "enabled": bool(mmdc_path),
-        "reason": "" if mmdc_path else "mmdc not found. Install @mermaid-js/mermaid-cli."
+        "enabled": enabled,
+        "reason": "" if enabled else "mmdc not found. Install @mermaid-js/mermaid-cli.",
+        "render_cache": MERMAID_RENDER_CACHE.stats(),
+        "renderer_pool": MERMAID_RENDERER_POOL.status(),
+        "native_renderer": native_renderer_stats(),
+        "syntax_validation": mermaid_validation_stats(),
+        "render_backends": RENDER_BACKENDS.status(),
+        "png_optimizer": PNG_OPTIMIZER.stats(),
     })
 
 @app.get("/api/notebook/image/status")
@@ -1306,7 +2506,7 @@ async def generate_diagram_image(request: DiagramImageRequest):
 
 @app.post("/api/project/{project_id}/append-diagram")
 async def append_diagram_to_project(project_id: str, request: AppendDiagramRequest):
-    project = ProjectStore.get_project(project_id)
+    project = await run_in_threadpool(ProjectStore.get_project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     if not request.content.strip():
@@ -1323,7 +2523,6 @@ async def append_diagram_to_project(project_id: str, request: AppendDiagramReque
         image_url = f"/static/diagrams/{filename}"
         caption = (request.caption or "Studio Diagram").strip()
         markdown_block = f"\n\n## {caption}\n\n![{caption}]({image_url})\n"
-        project.contentMarkdown = (project.contentMarkdown or "") + markdown_block
 
         updated_document_url = project.documentUrl
         doc_path = _resolve_docx_path(project.documentUrl or "")
@@ -1337,7 +2536,12 @@ async def append_diagram_to_project(project_id: str, request: AppendDiagramReque
         else:
             updated_document_url = project.documentUrl
 
-        ProjectStore.save_project(project)
+        def append_markdown(current: Project):
+            current.contentMarkdown = (current.contentMarkdown or "") + markdown_block
+
+        project = await run_in_threadpool(ProjectStore.modify, project_id, append_markdown)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
         return JSONResponse(content={
             "imageUrl": image_url,
             "documentUrl": updated_document_url,
@@ -1351,7 +2555,7 @@ async def append_diagram_to_project(project_id: str, request: AppendDiagramReque
 # --- DocuVerse Studio & Project Endpoints ---
 
 from backend.beta.models.project import Project, ReviewFeedback, WorkflowEvent
-from backend.beta.services.project_store import ProjectStore
+from backend.beta.services.project_store import ProjectStore, ReviewTokenInvalid, ReviewTokenUsed
 import uuid
 
 class CreateProjectRequest(BaseModel):
@@ -1400,12 +2604,12 @@ async def create_project(request: CreateProjectRequest):
         project.workflowEvents = request.workflowEvents
     if request.reviewFeedback:
         project.reviewFeedback = request.reviewFeedback
-    ProjectStore.save_project(project)
+    await run_in_threadpool(ProjectStore.save_project, project)
     return JSONResponse(content={"id": project_id, "message": "Project created successfully"})
 
 @app.get("/api/project/{project_id}")
 async def get_project(project_id: str):
-    project = ProjectStore.get_project(project_id)
+    project = await run_in_threadpool(ProjectStore.get_project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
@@ -1413,7 +2617,7 @@ async def get_project(project_id: str):
 @app.post("/api/workflow/start-review")
 async def start_review(request: ReviewRequest):
     print(f"DEBUG: start_review triggered for project: {request.projectId}")
-    project = ProjectStore.get_project(request.projectId)
+    project = await run_in_threadpool(ProjectStore.get_project, request.projectId)
     if not project:
         print(f"WARN: Project {request.projectId} not found in store. Creating fallback project entry.")
         fallback_name = request.projectName or "DocuVerse Project"
@@ -1425,22 +2629,27 @@ async def start_review(request: ReviewRequest):
             contentMarkdown=fallback_content,
             documentUrl=fallback_doc
         )
-        ProjectStore.save_project(fallback_project)
-        project = ProjectStore.get_project(request.projectId)
+        await run_in_threadpool(ProjectStore.save_project, fallback_project)
+        project = await run_in_threadpool(ProjectStore.get_project, request.projectId)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found in Python backend store")
 
     # Update Status
-    ProjectStore.update_status(project.id, "IN_REVIEW")
-    project.clientEmail = request.clientEmail
-    project.reviewToken = project.reviewToken or str(uuid.uuid4())
-    project.reviewTokenUsed = False
-    project.workflowEvents.append(WorkflowEvent(
-        date=datetime.now().isoformat(),
-        title="Review Started",
-        description="Email sent to client for review.",
-        status="IN_REVIEW"
-    ))
+    project = await run_in_threadpool(
+        ProjectStore.transition,
+        project.id,
+        "IN_REVIEW",
+        updates={"clientEmail": request.clientEmail},
+        issue_token=True,
+        event=WorkflowEvent(
+            date=datetime.now().isoformat(),
+            title="Review Started",
+            description="Email sent to client for review.",
+            status="IN_REVIEW"
+        ),
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
     from backend.beta.utils.email_service import send_review_email
 
@@ -1514,7 +2723,7 @@ Please use the buttons below in the HTML version of this email to Approve or Req
 @app.post("/api/workflow/resend-review")
 async def resend_review(request: ReviewRequest):
     print(f"DEBUG: resend_review triggered for project: {request.projectId}")
-    project = ProjectStore.get_project(request.projectId)
+    project = await run_in_threadpool(ProjectStore.get_project, request.projectId)
     if not project:
         print(f"WARN: Project {request.projectId} not found in store. Creating fallback project entry.")
         fallback_name = request.projectName or "DocuVerse Project"
@@ -1526,21 +2735,26 @@ async def resend_review(request: ReviewRequest):
             contentMarkdown=fallback_content,
             documentUrl=fallback_doc
         )
-        ProjectStore.save_project(fallback_project)
-        project = ProjectStore.get_project(request.projectId)
+        await run_in_threadpool(ProjectStore.save_project, fallback_project)
+        project = await run_in_threadpool(ProjectStore.get_project, request.projectId)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found in Python backend store")
 
-    ProjectStore.update_status(project.id, "IN_REVIEW")
-    project.clientEmail = request.clientEmail
-    project.reviewToken = project.reviewToken or str(uuid.uuid4())
-    project.reviewTokenUsed = False
-    project.workflowEvents.append(WorkflowEvent(
-        date=datetime.now().isoformat(),
-        title="Review Resent",
-        description="Updated review email sent to client.",
-        status="IN_REVIEW"
-    ))
+    project = await run_in_threadpool(
+        ProjectStore.transition,
+        project.id,
+        "IN_REVIEW",
+        updates={"clientEmail": request.clientEmail},
+        issue_token=True,
+        event=WorkflowEvent(
+            date=datetime.now().isoformat(),
+            title="Review Resent",
+            description="Updated review email sent to client.",
+            status="IN_REVIEW"
+        ),
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
 
     from backend.beta.utils.email_service import send_review_email
 
@@ -1605,53 +2819,59 @@ Please reply to this email with your review comments or use the Approve/Request
 
 @app.post("/api/workflow/webhook-callback")
 async def webhook_callback(request: WebhookCallbackRequest):
-    project = ProjectStore.get_project(request.projectId)
+    project = await run_in_threadpool(ProjectStore.get_project, request.projectId)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
         
     if request.action == "APPROVED":
-        ProjectStore.update_status(project.id, "APPROVED")
+        project = await run_in_threadpool(ProjectStore.transition, project.id, "APPROVED")
     elif request.action == "REJECTED":
-        ProjectStore.update_status(project.id, "CHANGES_REQUESTED")
+        feedback = None
         if request.feedbackText:
             feedback = ReviewFeedback(
                 date=datetime.now().isoformat(),
                 comment=request.feedbackText,
                 source="Client"
             )
-            ProjectStore.add_feedback(project.id, feedback)
+        project = await run_in_threadpool(ProjectStore.transition, project.id, "CHANGES_REQUESTED", feedback=feedback)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
             
     return JSONResponse(content={"message": "Callback processed", "new_status": project.status})
 
 @app.get("/api/workflow/review")
 async def review_from_email(projectId: str, action: str, token: Optional[str] = None):
-    project = ProjectStore.get_project(projectId)
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    if project.reviewToken and token != project.reviewToken:
-        raise HTTPException(status_code=403, detail="Invalid review token")
-    if project.reviewTokenUsed:
-        return HTMLResponse(content="<h2>Review already processed</h2><p>This review link has already been used.</p>")
-
     if action == "APPROVED":
-        ProjectStore.update_status(project.id, "APPROVED")
-        project.reviewTokenUsed = True
-        project.workflowEvents.append(WorkflowEvent(
+        step = dict(status="APPROVED", mark_token_used=True, event=WorkflowEvent(
             date=datetime.now().isoformat(),
             title="Approved",
             description="Client approved the document.",
             status="APPROVED"
         ))
-        return HTMLResponse(content="<h2>Review recorded: Approved</h2><p>You can close this tab.</p>")
-    if action == "REJECTED":
-        ProjectStore.update_status(project.id, "CHANGES_REQUESTED")
-        project.workflowEvents.append(WorkflowEvent(
+    elif action == "REJECTED":
+        # The link stays usable until the feedback form below is submitted.
+        step = dict(status="CHANGES_REQUESTED", require_unused_token=True, event=WorkflowEvent(
             date=datetime.now().isoformat(),
             title="Changes Requested",
             description="Client requested changes.",
             status="CHANGES_REQUESTED"
         ))
+    else:
+        raise HTTPException(status_code=400, detail="Invalid action")
+
+    # Token check, single-use check and status change happen in one transaction.
+    try:
+        project = await run_in_threadpool(ProjectStore.transition, projectId, expect_token=token or "", **step)
+    except ReviewTokenInvalid:
+        raise HTTPException(status_code=403, detail="Invalid review token")
+    except ReviewTokenUsed:
+        return HTMLResponse(content="<h2>Review already processed</h2><p>This review link has already been used.</p>")
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if action == "APPROVED":
+        return HTMLResponse(content="<h2>Review recorded: Approved</h2><p>You can close this tab.</p>")
+    if action == "REJECTED":
         return HTMLResponse(content=f"""
         <html>
           <body style="font-family: Arial, sans-serif; background:#0f141b; color:#e6edf3; padding:24px;">
@@ -1669,29 +2889,34 @@ async def review_from_email(projectId: str, action: str, token: Optional[str] =
         </html>
         """)
 
-    raise HTTPException(status_code=400, detail="Invalid action")
-
 @app.post("/api/workflow/review-feedback")
 async def review_feedback(projectId: str = Form(...), feedbackText: str = Form(...), token: str = Form("")):
-    project = ProjectStore.get_project(projectId)
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    if project.reviewToken and token != project.reviewToken:
-        raise HTTPException(status_code=403, detail="Invalid review token")
-    ProjectStore.update_status(project.id, "CHANGES_REQUESTED")
     feedback = ReviewFeedback(
         date=datetime.now().isoformat(),
         comment=feedbackText,
         source="Client"
     )
-    ProjectStore.add_feedback(project.id, feedback)
-    project.reviewTokenUsed = True
-    project.workflowEvents.append(WorkflowEvent(
-        date=datetime.now().isoformat(),
-        title="Feedback Received",
-        description="Client submitted feedback.",
-        status="CHANGES_REQUESTED"
-    ))
+    try:
+        project = await run_in_threadpool(
+            ProjectStore.transition,
+            projectId,
+            "CHANGES_REQUESTED",
+            feedback=feedback,
+            expect_token=token,
+            mark_token_used=True,
+            event=WorkflowEvent(
+                date=datetime.now().isoformat(),
+                title="Feedback Received",
+                description="Client submitted feedback.",
+                status="CHANGES_REQUESTED"
+            ),
+        )
+    except ReviewTokenInvalid:
+        raise HTTPException(status_code=403, detail="Invalid review token")
+    except ReviewTokenUsed:
+        return HTMLResponse(content="<h2>Review already processed</h2><p>This review link has already been used.</p>")
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     return HTMLResponse(content="<h2>Feedback received</h2><p>Thank you. You can close this tab.</p>")
 
 
@@ -1709,7 +2934,7 @@ async def review_feedback(projectId: str = Form(...), feedbackText: str = Form(.
 
 @app.post("/api/project/{project_id}/upload-review")
 async def upload_review(project_id: str, file: UploadFile = File(...)):
-    project = ProjectStore.get_project(project_id)
+    project = await run_in_threadpool(ProjectStore.get_project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
@@ -1720,17 +2945,21 @@ async def upload_review(project_id: str, file: UploadFile = File(...)):
         import shutil
         shutil.copyfileobj(file.file, buffer)
         
-    # Update project
-    ProjectStore.update_status(project.id, "CHANGES_REQUESTED")
-    project.reviewedDocumentUrl = f"/static/{filename}"
-    
-    # Add system feedback
+    # Update project and add system feedback in one step
     feedback = ReviewFeedback(
         date=datetime.now().isoformat(),
         comment="Client uploaded a marked-up document with changes.",
         source="Client Attachment"
     )
-    ProjectStore.add_feedback(project.id, feedback)
+    project = await run_in_threadpool(
+        ProjectStore.transition,
+        project.id,
+        "CHANGES_REQUESTED",
+        updates={"reviewedDocumentUrl": f"/static/{filename}"},
+        feedback=feedback,
+    )
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
 
     return JSONResponse(content={
         "status": "CHANGES_REQUESTED",
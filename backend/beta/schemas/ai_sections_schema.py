@@ -0,0 +1,91 @@
+from typing import Annotated, Any, Dict, List, Union
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, TypeAdapter, model_validator
+
+# Shapes of the per-family AI JSON fragments (see _ai_family_structures in main.py).
+# Models are lenient about extra keys and string-vs-list variants that
+# _map_ai_to_sections already tolerates, but reject fragments it would silently
+# replace with template content (wrong types, empty lists, missing names).
+
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+StrList = Union[List[str], str]
+
+
+class AIFragmentModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class AIDefinition(AIFragmentModel):
+    term: str
+    definition: str
+
+
+class AIScope(AIFragmentModel):
+    description: str = ""
+    included: StrList = []
+    excluded: StrList = []
+
+
+class AIPurpose(AIFragmentModel):
+    description: NonEmptyStr
+
+
+class AIIntroduction(AIFragmentModel):
+    purpose: Union[NonEmptyStr, AIPurpose]
+    scope: AIScope = AIScope()
+    definitions: List[AIDefinition] = []
+
+
+class AIFeature(AIFragmentModel):
+    feature_name: NonEmptyStr
+    description: str = ""
+    requirements: StrList = []
+    structured_requirements: Dict[str, Any] = {}
+
+
+class AIUserClass(AIFragmentModel):
+    user_class: NonEmptyStr
+    characteristics: str = ""
+    responsibilities: str = ""
+    skills: str = ""
+
+
+class AIOverallDescription(AIFragmentModel):
+    product_perspective: NonEmptyStr
+    user_characteristics: List[AIUserClass] = []
+    assumptions: StrList = []
+
+
+class AINonFunctionalRequirements(AIFragmentModel):
+    performance: StrList = []
+    security: StrList = []
+    reliability: StrList = []
+
+    @model_validator(mode="after")
+    def _has_requirements(self):
+        if not (self.performance or self.security or self.reliability):
+            raise ValueError("no performance, security or reliability requirements")
+        return self
+
+
+class AIRisk(AIFragmentModel):
+    risk: NonEmptyStr
+    probability: str = ""
+    impact: str = ""
+    mitigation: str = ""
+
+
+AI_FAMILY_SCHEMAS: Dict[str, TypeAdapter] = {
+    "introduction": TypeAdapter(AIIntroduction),
+    "functional_requirements": TypeAdapter(Annotated[List[AIFeature], Field(min_length=1)]),
+    "overall_description": TypeAdapter(AIOverallDescription),
+    "non_functional_requirements": TypeAdapter(AINonFunctionalRequirements),
+    "risk_analysis": TypeAdapter(Annotated[List[AIRisk], Field(min_length=1)]),
+}
+
+
+def validate_ai_family(family: str, value: Any) -> None:
+    """Raise ``pydantic.ValidationError`` (a ``ValueError``) if ``value`` is not a usable ``family`` fragment."""
+    adapter = AI_FAMILY_SCHEMAS.get(family)
+    if adapter is None:
+        return
+    adapter.validate_python(value)
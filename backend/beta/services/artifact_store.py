@@ -0,0 +1,163 @@
+"""
+Per-project store of completed generation stage outputs.
+
+Records the AI JSON and mapped sections produced by each mode, plus the
+source hash of every rendered diagram, under ``SRS_DATA_DIR/artifacts``.
+Later builds for the same ``project_key`` (notably the enhanced follow-up
+of a quick generation) reuse whatever is still valid instead of recomputing
+it. Stage outputs are tied to a hash of the request inputs; diagrams are
+tied to their own source hash and the PNG on disk.
+
+The API process and the job worker processes update the same manifests, so
+every read-modify-write holds an OS file lock on the project's
+``.manifest.lock`` as well as the in-process lock.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def inputs_hash(inputs: dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """File-backed manifest of stage outputs per project key, written atomically so other processes never see partial files."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _dir(self, project_key: str) -> Path:
+        safe = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in project_key)
+        return self.root / safe
+
+    @staticmethod
+    def _write_json(path: Path, data: dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read_json(path: Path) -> dict:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _manifest(self, project_key: str) -> dict:
+        manifest = self._read_json(self._dir(project_key) / "manifest.json")
+        manifest.setdefault("inputs_hash", "")
+        manifest.setdefault("stages", {})
+        manifest.setdefault("diagrams", {})
+        return manifest
+
+    def _save_manifest(self, project_key: str, manifest: dict):
+        self._write_json(self._dir(project_key) / "manifest.json", manifest)
+
+    @contextmanager
+    def _manifest_lock(self, project_key: str):
+        """Serialize manifest updates across threads and processes."""
+        directory = self._dir(project_key)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(directory / ".manifest.lock", "a+b") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def save_stage(self, project_key: str, inputs: dict, stage: str, mode: str, data: dict):
+        """Record a stage output (``ai`` or ``sections``); different inputs invalidate older stages."""
+        if not project_key or not data:
+            return
+        digest = inputs_hash(inputs)
+        with self._manifest_lock(project_key):
+            manifest = self._manifest(project_key)
+            if manifest["inputs_hash"] != digest:
+                manifest["inputs_hash"] = digest
+                manifest["stages"] = {}
+                self._write_json(self._dir(project_key) / "inputs.json", inputs)
+            name = f"{stage}_{mode}.json"
+            self._write_json(self._dir(project_key) / name, data)
+            manifest["stages"][f"{stage}:{mode}"] = name
+            self._save_manifest(project_key, manifest)
+
+    def load_stage(self, project_key: str, inputs: dict, stage: str, modes: List[str]) -> Tuple[Optional[str], dict]:
+        """Return ``(mode, data)`` for the first of ``modes`` recorded for these inputs."""
+        if not project_key:
+            return None, {}
+        manifest = self._manifest(project_key)
+        if manifest["inputs_hash"] != inputs_hash(inputs):
+            return None, {}
+        for mode in modes:
+            name = manifest["stages"].get(f"{stage}:{mode}")
+            if name:
+                data = self._read_json(self._dir(project_key) / name)
+                if data:
+                    return mode, data
+        return None, {}
+
+    def load_latest(self, project_key: str, stage: str, modes: List[str]) -> Tuple[dict, Optional[str], dict]:
+        """``(inputs, mode, data)`` for the most recently recorded inputs, whatever they were."""
+        if not project_key:
+            return {}, None, {}
+        inputs = self._read_json(self._dir(project_key) / "inputs.json")
+        if not inputs:
+            return {}, None, {}
+        mode, data = self.load_stage(project_key, inputs, stage, modes)
+        return inputs, mode, data
+
+    @staticmethod
+    def _file_signature(path: str) -> Optional[list]:
+        # Inode rather than mtime: PNGs may be hard links into the render cache, whose LRU touches mtime.
+        # Every re-render or template fill creates a new file, so the inode changes with the content.
+        try:
+            st = Path(path).stat()
+        except OSError:
+            return None
+        return [st.st_dev, st.st_ino, st.st_size]
+
+    def diagram_current(self, project_key: str, key: str, source_hash: str, png_path: str) -> bool:
+        """True when ``png_path`` is still the render of ``source_hash`` recorded earlier."""
+        if not project_key:
+            return False
+        entry = self._manifest(project_key)["diagrams"].get(key)
+        if not entry or entry.get("source_hash") != source_hash or entry.get("path") != str(png_path):
+            return False
+        return entry.get("file") == self._file_signature(png_path)
+
+    def record_diagrams(self, project_key: str, rendered: List[Tuple[str, str, str]]):
+        """Record ``(key, source_hash, png_path)`` for freshly rendered diagrams."""
+        if not project_key or not rendered:
+            return
+        with self._manifest_lock(project_key):
+            manifest = self._manifest(project_key)
+            for key, source_hash, png_path in rendered:
+                signature = self._file_signature(png_path)
+                if signature:
+                    manifest["diagrams"][key] = {"source_hash": source_hash, "path": str(png_path), "file": signature}
+            self._save_manifest(project_key, manifest)
+
+
+ARTIFACT_STORE = ArtifactStore(Path(os.getenv("SRS_DATA_DIR", "backend/beta/data")) / "artifacts")
@@ -0,0 +1,384 @@
+"""
+Durable SRS generation job queue.
+
+Jobs are stored in SQLite so they survive restarts and can be shared by every
+API process on the host. A small pool of worker processes claims jobs by
+priority (instant before quick before full before enhanced), keeps a lease
+alive while working, and records stage progress on the job row. Jobs whose
+worker died are re-queued once their lease expires.
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+JOB_PRIORITIES = {"instant": 0, "quick": 1, "full": 2, "enhanced": 3}
+TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    project_key TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    stage TEXT NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_project ON jobs (project_key, updated_at);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the running job was cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised by ``submit``/``retry`` when ``max_pending`` jobs are already queued."""
+
+
+class JobQueue:
+    """SQLite-backed priority queue of SRS generation jobs."""
+
+    def __init__(self, db_path: Path, lease_sec: float = 60.0, max_pending: int = 100):
+        self.db_path = Path(db_path)
+        self.lease_sec = lease_sec
+        self.max_pending = max_pending
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row], include_payload: bool = False) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        if include_payload:
+            job["payload"] = json.loads(job["payload"])
+        else:
+            job.pop("payload", None)
+        return job
+
+    def _check_capacity(self, conn: sqlite3.Connection):
+        """Raise ``QueueFull`` at ``max_pending``; call inside the transaction that queues the job."""
+        if self.max_pending > 0:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_pending:
+                raise QueueFull(f"{queued} jobs already queued (max {self.max_pending})")
+
+    def submit(self, mode: str, project_key: str, payload: dict, priority: Optional[int] = None,
+               max_attempts: int = 3) -> dict:
+        """Queue a job. Raises ``QueueFull`` when ``max_pending`` jobs are waiting."""
+        conn = self._conn()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._check_capacity(conn)
+            conn.execute(
+                "INSERT INTO jobs (id, project_key, mode, priority, status, payload, message, max_attempts, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, 'Waiting for a worker...', ?, ?, ?)",
+                (job_id, project_key, mode, JOB_PRIORITIES.get(mode, 2) if priority is None else priority,
+                 json.dumps(payload), max_attempts, now, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def get(self, job_id: str, include_payload: bool = False) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row, include_payload)
+
+    def latest_for_project(self, project_key: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE project_key = ? ORDER BY updated_at DESC LIMIT 1", (project_key,)
+        ).fetchone()
+        return self._to_dict(row)
+
+    def list_for_project(self, project_key: str, limit: int = 20) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE project_key = ? ORDER BY created_at DESC LIMIT ?", (project_key, limit)
+        ).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def pending_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def is_full(self) -> bool:
+        return self.max_pending > 0 and self.pending_count() >= self.max_pending
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Atomically take the highest-priority queued job and lease it to ``worker_id``."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, stage = 'starting',"
+                " message = 'Worker picked up the job.', lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_sec, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"], include_payload=True)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease. Returns True when cancellation was requested."""
+        conn = self._conn()
+        conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_sec, job_id, worker_id),
+        )
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def update_progress(self, job_id: str, stage: str, progress: int, message: str):
+        self._conn().execute(
+            "UPDATE jobs SET stage = ?, progress = ?, message = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (stage, int(progress), message, time.time(), job_id),
+        )
+
+    def _finish(self, job_id: str, status: str, stage: str, message: str, result=None, error=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, stage = ?, progress = 100, message = ?, result = ?, error = ?,"
+            " lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+            (status, stage, message, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, "completed", "completed", result.get("message", "Job completed."), result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", "failed", error, error=error)
+
+    def mark_cancelled(self, job_id: str):
+        self._finish(job_id, "cancelled", "cancelled", "Job cancelled.")
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job at once; ask the worker to stop a running one."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', stage = 'cancelled', message = 'Job cancelled.', updated_at = ?"
+            " WHERE id = ? AND status = 'queued'",
+            (now, job_id),
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, message = 'Cancellation requested...', updated_at = ?"
+            " WHERE id = ? AND status = 'running'",
+            (now, job_id),
+        )
+        return self.get(job_id)
+
+    def retry(self, job_id: str) -> Optional[dict]:
+        """Put a failed or cancelled job back in the queue with a fresh attempt budget; ``QueueFull`` when full."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row["status"] in ("failed", "cancelled"):
+                self._check_capacity(conn)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', stage = 'queued', progress = 0, message = 'Waiting for a worker...',"
+                    " error = NULL, result = NULL, attempts = 0, cancel_requested = 0, worker = NULL, updated_at = ?"
+                    " WHERE id = ?",
+                    (time.time(), job_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def requeue_expired(self) -> int:
+        """Recover jobs whose worker stopped heartbeating (crash or restart)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', stage = 'failed', error = 'Worker lost too many times.',"
+                " message = 'Worker lost too many times.', updated_at = ?"
+                " WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+                (now, now),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested = 1 THEN 'cancelled' ELSE 'queued' END,"
+                " stage = 'queued', message = 'Re-queued after worker loss.', worker = NULL, updated_at = ?"
+                " WHERE status = 'running' AND lease_expires_at < ?",
+                (now, now),
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if failed or requeued:
+            print(f"♻️ Job queue recovered {requeued} job(s); {failed} exceeded max attempts")
+        return requeued
+
+
+def _default_db_path() -> Path:
+    return Path(os.getenv("SRS_DATA_DIR", "backend/beta/data")) / "jobs.db"
+
+
+JOB_QUEUE = JobQueue(
+    db_path=_default_db_path(),
+    lease_sec=float(os.getenv("SRS_JOB_LEASE_SEC", "60")),
+    max_pending=int(os.getenv("SRS_JOB_MAX_PENDING", "100")),
+)
+
+
+def _worker_main(worker_index: int, parent_pid: int):
+    """Entry point of a job worker process."""
+    import asyncio
+
+    # Imported here so the API process does not pay for it twice and spawn works on every OS.
+    from backend.beta.main import run_generation_job
+    from backend.beta.utils.mermaid_pool import MERMAID_RENDERER_POOL
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    poll_sec = float(os.getenv("SRS_JOB_POLL_SEC", "0.5"))
+    MERMAID_RENDERER_POOL.start()
+    print(f"👷 SRS job worker {worker_id} ready")
+
+    last_recovery = 0.0
+    while os.getppid() == parent_pid:
+        if time.monotonic() - last_recovery > JOB_QUEUE.lease_sec / 2:
+            JOB_QUEUE.requeue_expired()
+            last_recovery = time.monotonic()
+        job = JOB_QUEUE.claim(worker_id)
+        if job is None:
+            time.sleep(poll_sec)
+            continue
+        _run_claimed_job(job, worker_id, run_generation_job, asyncio)
+    MERMAID_RENDERER_POOL.stop()
+
+
+def _run_claimed_job(job: dict, worker_id: str, run_generation_job, asyncio):
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(run_generation_job(job))
+    stop = threading.Event()
+
+    def _keep_lease():
+        # Heartbeats double as the cancellation check, so keep them frequent.
+        while not stop.wait(min(2.0, JOB_QUEUE.lease_sec / 4)):
+            if JOB_QUEUE.heartbeat(job["id"], worker_id):
+                loop.call_soon_threadsafe(task.cancel)
+                return
+
+    heart = threading.Thread(target=_keep_lease, daemon=True)
+    heart.start()
+    try:
+        result = loop.run_until_complete(task)
+        JOB_QUEUE.complete(job["id"], result or {})
+    except (asyncio.CancelledError, JobCancelled):
+        JOB_QUEUE.mark_cancelled(job["id"])
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        print(f"❌ Job {job['id']} failed: {detail}")
+        JOB_QUEUE.fail(job["id"], str(detail))
+    finally:
+        stop.set()
+        loop.close()
+
+
+class JobWorkerPool:
+    """Starts and supervises the worker processes that drain JOB_QUEUE."""
+
+    def __init__(self, size: int):
+        self.size = max(0, size)
+        self._procs: List[multiprocessing.Process] = []
+        self._ctx = multiprocessing.get_context("spawn")
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        if not self.enabled or self._procs:
+            return
+        JOB_QUEUE.requeue_expired()
+        for i in range(self.size):
+            self._procs.append(self._spawn(i))
+        print(f"🚀 Started {self.size} SRS job worker process(es)")
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        proc = self._ctx.Process(target=_worker_main, args=(index, os.getpid()), name=f"srs-job-worker-{index}", daemon=True)
+        proc.start()
+        return proc
+
+    def ensure_alive(self):
+        """Replace worker processes that exited unexpectedly."""
+        for i, proc in enumerate(self._procs):
+            if not proc.is_alive():
+                print(f"🔁 SRS job worker {i} exited (code {proc.exitcode}); restarting")
+                self._procs[i] = self._spawn(i)
+
+    def stop(self):
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._procs = []
+
+    def status(self) -> dict:
+        return {
+            "size": self.size,
+            "alive": sum(1 for p in self._procs if p.is_alive()),
+        }
+
+
+# Off by default: every API process starts its own workers on startup, so enable
+# it for one process only (a single-worker uvicorn serving /jobs).
+JOB_WORKERS = JobWorkerPool(size=int(os.getenv("SRS_JOB_WORKERS", "0")))
@@ -0,0 +1,140 @@
+"""
+In-process pub/sub for SRS generation progress.
+
+``_set_progress`` publishes every update here; the SSE and WebSocket
+endpoints subscribe per ``project_key``. Each event gets an increasing id
+and a short per-project history is kept so reconnecting clients can resume
+after their ``Last-Event-ID``. Progress written by other processes (job
+workers) is picked up by one shared watcher per project that polls the
+progress snapshot while anyone is subscribed.
+
+Ids are millisecond timestamps (bumped to stay unique), so they keep
+increasing when a client reconnects to another API worker. Histories are
+per process, though: a resume id this process never issued gets the current
+snapshot rather than a replay.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+Event = Tuple[int, dict]
+
+
+def same_state(a: dict, b: dict) -> bool:
+    return {k: v for k, v in a.items() if k != "updated_at"} == {k: v for k, v in b.items() if k != "updated_at"}
+
+
+class ProgressBroker:
+    """Thread-safe fan-out of progress payloads to asyncio subscribers."""
+
+    def __init__(self, history: int = 50, poll_sec: float = 1.0, max_projects: int = 1000):
+        self.history_size = history
+        self.poll_sec = poll_sec
+        self.max_projects = max_projects
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: "OrderedDict[str, deque]" = OrderedDict()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self.published = 0
+
+    def publish(self, project_key: str, payload: dict) -> int:
+        """Record and deliver ``payload``; callable from any thread."""
+        with self._lock:
+            history = self._history.get(project_key)
+            if history is None:
+                history = self._history[project_key] = deque(maxlen=self.history_size)
+                while len(self._history) > self.max_projects:
+                    self._history.popitem(last=False)
+            self._history.move_to_end(project_key)
+            # Snapshots are re-read by the watcher; only a real change is a new event.
+            if history and same_state(history[-1][1], payload):
+                return history[-1][0]
+            event_id = self._last_id = max(self._last_id + 1, int(time.time() * 1000))
+            history.append((event_id, payload))
+            subscribers = list(self._subscribers.get(project_key, []))
+            self.published += 1
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (event_id, payload))
+            except RuntimeError:
+                # Subscriber loop already closed; it unsubscribes on its own way out.
+                pass
+        return event_id
+
+    def replay(self, project_key: str, last_event_id: Optional[int]) -> Optional[List[Event]]:
+        """Events after ``last_event_id``, or None when that id is not in this process's history."""
+        with self._lock:
+            history = list(self._history.get(project_key, []))
+        # Unknown ids come from another worker or from events already trimmed away.
+        if last_event_id is None or all(event[0] != last_event_id for event in history):
+            return None
+        return [event for event in history if event[0] > last_event_id]
+
+    def snapshot_event(self, project_key: str, payload: dict) -> Event:
+        """
+        Wrap a snapshot for one reconnecting client without publishing it:
+        the latest event when it already shows this state, else a fresh id
+        that other subscribers never see.
+        """
+        with self._lock:
+            history = self._history.get(project_key)
+            if history and same_state(history[-1][1], payload):
+                return history[-1]
+            self._last_id = max(self._last_id + 1, int(time.time() * 1000))
+            return self._last_id, payload
+
+    def latest(self, project_key: str) -> Optional[Event]:
+        with self._lock:
+            history = self._history.get(project_key)
+            return history[-1] if history else None
+
+    def subscribe(self, project_key: str, snapshot: Callable[[str], Awaitable[dict]]) -> asyncio.Queue:
+        """Register the running loop for ``project_key`` events and start its watcher."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(project_key, []).append((loop, queue))
+            watcher = self._watchers.get(project_key)
+            if watcher is None or watcher.done():
+                self._watchers[project_key] = loop.create_task(self._watch(project_key, snapshot))
+        return queue
+
+    def unsubscribe(self, project_key: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(project_key, []) if s[1] is not queue]
+            if subscribers:
+                self._subscribers[project_key] = subscribers
+                return
+            self._subscribers.pop(project_key, None)
+            watcher = self._watchers.pop(project_key, None)
+        if watcher:
+            watcher.cancel()
+
+    async def _watch(self, project_key: str, snapshot: Callable[[str], Awaitable[dict]]):
+        while True:
+            try:
+                self.publish(project_key, await snapshot(project_key))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Progress watcher for {project_key} failed: {e}")
+            await asyncio.sleep(self.poll_sec)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "published": self.published,
+                "projects": len(self._history),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+PROGRESS_EVENTS = ProgressBroker(
+    history=int(os.getenv("SRS_EVENTS_HISTORY", "50")),
+    poll_sec=float(os.getenv("SRS_EVENTS_POLL_SEC", "1")),
+)
@@ -0,0 +1,184 @@
+"""
+Generation progress shared by every API process on the host.
+
+``_set_progress`` writes here and ``/srs_progress`` reads here, so a poll
+that lands on a different uvicorn worker than the one generating still sees
+the current stage. Rows live in SQLite (WAL) under ``SRS_DATA_DIR``; a hot
+in-memory mirror skips JSON decoding when the row has not changed and keeps
+progress readable if the database is briefly unavailable. Entries expire
+after a TTL so finished projects do not pile up.
+
+``set`` never touches the database: it updates the mirror and hands the row
+to a background writer, which coalesces updates per project (only the latest
+is written) and commits them in one transaction. That keeps SQLite off the
+event loop, where ``_set_progress`` is usually called.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    project_key TEXT PRIMARY KEY,
+    stamp REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_progress_stamp ON progress (stamp);
+"""
+
+
+class ProgressStore:
+    """SQLite-backed progress map with a per-process mirror and TTL expiry."""
+
+    def __init__(self, db_path: Path, ttl_sec: float = 86400.0, purge_every_sec: float = 300.0):
+        self.db_path = Path(db_path)
+        self.ttl_sec = ttl_sec
+        self.purge_every_sec = purge_every_sec
+        self._mirror: Dict[str, Tuple[float, dict]] = {}
+        self._mirror_lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._last_purge = 0.0
+        self._pending: Dict[str, Tuple[float, dict, Optional[Callable[[], None]]]] = {}
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self.writes = 0
+        self.coalesced = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    def set(self, project_key: str, payload: dict, on_write: Optional[Callable[[], None]] = None):
+        """
+        Record ``payload`` and queue it for the database without blocking.
+        ``on_write`` runs on the writer thread after the row is written; like
+        the row, it is dropped when a newer update for the project replaces it.
+        """
+        stamp = time.time()
+        with self._mirror_lock:
+            self._mirror[project_key] = (stamp, payload)
+            if project_key in self._pending:
+                self.coalesced += 1
+            self._pending[project_key] = (stamp, payload, on_write)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="progress-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        self._wake.set()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every queued update now; called by the writer thread and at exit."""
+        with self._flush_lock:
+            with self._mirror_lock:
+                pending = dict(self._pending)
+            if not pending:
+                return
+            try:
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO progress (project_key, stamp, payload) VALUES (?, ?, ?)",
+                        [(key, stamp, json.dumps(payload)) for key, (stamp, payload, _) in pending.items()],
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                self.writes += len(pending)
+                if time.time() - self._last_purge >= self.purge_every_sec:
+                    self.purge()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not share progress for {', '.join(pending)}: {e}")
+            # Entries stay readable from _pending until written; newer ones queued meanwhile stay.
+            with self._mirror_lock:
+                for key, entry in pending.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+            for key, (_, _, on_write) in pending.items():
+                if on_write is None:
+                    continue
+                try:
+                    on_write()
+                except Exception as e:
+                    print(f"⚠️ Progress write hook for {key} failed: {e}")
+
+    def get(self, project_key: str) -> Optional[dict]:
+        """Latest payload written by any process, or None when unknown or expired."""
+        entry = self.get_entry(project_key)
+        return entry[1] if entry else None
+
+    def get_entry(self, project_key: str) -> Optional[Tuple[float, dict]]:
+        """``(stamp, payload)`` for the latest update; ``stamp`` is the full-resolution write time."""
+        now = time.time()
+        with self._mirror_lock:
+            mirrored = self._mirror.get(project_key)
+            queued = self._pending.get(project_key)
+        if queued:
+            # Not written yet; the database still holds the previous update.
+            return queued[0], queued[1]
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT stamp FROM progress WHERE project_key = ?", (project_key,)).fetchone()
+            if row is None or row[0] < now - self.ttl_sec:
+                return None
+            if mirrored and mirrored[0] == row[0]:
+                return mirrored
+            row = conn.execute("SELECT stamp, payload FROM progress WHERE project_key = ?", (project_key,)).fetchone()
+            if row is None:
+                return None
+            payload = json.loads(row[1])
+            with self._mirror_lock:
+                self._mirror[project_key] = (row[0], payload)
+            return row[0], payload
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️ Could not read shared progress for {project_key}: {e}")
+            if mirrored and mirrored[0] >= now - self.ttl_sec:
+                return mirrored
+            return None
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Drop entries older than the TTL from the database and the mirror."""
+        now = now or time.time()
+        self._last_purge = now
+        cutoff = now - self.ttl_sec
+        with self._mirror_lock:
+            for key in [k for k, (stamp, _) in self._mirror.items() if stamp < cutoff]:
+                del self._mirror[key]
+        return self._conn().execute("DELETE FROM progress WHERE stamp < ?", (cutoff,)).rowcount
+
+    def stats(self) -> dict:
+        with self._mirror_lock:
+            return {"pending": len(self._pending), "writes": self.writes, "coalesced": self.coalesced}
+
+
+PROGRESS_STORE = ProgressStore(
+    Path(os.getenv("SRS_DATA_DIR", "backend/beta/data")) / "progress.db",
+    ttl_sec=float(os.getenv("SRS_PROGRESS_TTL_SEC", "86400")),
+)
@@ -1,28 +1,310 @@
-from typing import Dict, Optional
+"""
+Project storage for the DocuVerse review workflow.
+
+``ProjectStore`` keeps its classmethod interface but delegates to a
+pluggable backend chosen by ``PROJECT_STORE_BACKEND``:
+
+- ``sqlite`` (default): one WAL-mode database under ``SRS_DATA_DIR`` shared
+  by every uvicorn worker, with indexed status, client email and review
+  token, atomic status/feedback updates, and a small read-through LRU of
+  project JSON. A hit only reads the row version (kept off the large
+  ``data`` column, which holds the whole markdown) so workers never serve
+  stale data.
+- ``memory``: the original per-process dict, for tests and throwaway runs.
+
+Projects returned by the SQLite backend are copies. Workflow steps go
+through ``transition`` (or ``modify`` for other edits), which re-reads the
+project, checks the review token and applies the change in one transaction,
+so concurrent workers neither lose updates nor both consume a single-use
+review link. ``save_project`` replaces the whole project and is meant for
+creating one.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
 from backend.beta.models.project import Project
 
+
+class ReviewTokenInvalid(Exception):
+    """The review token does not match the project's."""
+
+
+class ReviewTokenUsed(Exception):
+    """The single-use review link was already used."""
+
+
+def _transition_change(status: Optional[str], event, feedback, updates: Optional[dict],
+                       expect_token: Optional[str], require_unused_token: bool,
+                       mark_token_used: bool, issue_token: bool) -> Callable[[Project], None]:
+    """Build the ``modify`` callback for ``transition``; checks run before anything changes."""
+    def change(project: Project):
+        if expect_token is not None and project.reviewToken and expect_token != project.reviewToken:
+            raise ReviewTokenInvalid(project.id)
+        if (require_unused_token or mark_token_used) and project.reviewTokenUsed:
+            raise ReviewTokenUsed(project.id)
+        if status is not None:
+            project.status = status
+        for field, value in (updates or {}).items():
+            setattr(project, field, value)
+        if issue_token:
+            project.reviewToken = project.reviewToken or str(uuid.uuid4())
+            project.reviewTokenUsed = False
+        if mark_token_used:
+            project.reviewTokenUsed = True
+        if feedback is not None:
+            project.reviewFeedback.append(feedback)
+        if event is not None:
+            project.workflowEvents.append(event)
+    return change
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    client_email TEXT,
+    review_token TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    -- Last, so reading the other columns never walks the overflow pages of a large document.
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects (status);
+CREATE INDEX IF NOT EXISTS idx_projects_client_email ON projects (client_email);
+CREATE INDEX IF NOT EXISTS idx_projects_review_token ON projects (review_token);
+"""
+
+
+class MemoryProjectBackend:
+    """Per-process dict; projects are shared objects, so in-place edits persist."""
+
+    def __init__(self):
+        self._projects: Dict[str, Project] = {}
+
+    def save(self, project: Project) -> Project:
+        self._projects[project.id] = project
+        return project
+
+    def get(self, project_id: str) -> Optional[Project]:
+        return self._projects.get(project_id)
+
+    def modify(self, project_id: str, change: Callable[[Project], None]) -> Optional[Project]:
+        project = self._projects.get(project_id)
+        if project is None:
+            return None
+        # Apply to a copy so a change that raises leaves the stored project untouched.
+        updated = project.model_copy(deep=True)
+        change(updated)
+        self._projects[project_id] = updated
+        return updated
+
+    def update_status(self, project_id: str, status: str) -> Optional[Project]:
+        project = self._projects.get(project_id)
+        if project:
+            project.status = status
+        return project
+
+    def add_feedback(self, project_id: str, feedback) -> Optional[Project]:
+        project = self._projects.get(project_id)
+        if project:
+            project.reviewFeedback.append(feedback)
+        return project
+
+    def find(self, status: Optional[str] = None, client_email: Optional[str] = None,
+             review_token: Optional[str] = None, limit: int = 100) -> List[Project]:
+        matches = [
+            p for p in self._projects.values()
+            if (status is None or p.status == status)
+            and (client_email is None or p.clientEmail == client_email)
+            and (review_token is None or p.reviewToken == review_token)
+        ]
+        return matches[:limit]
+
+
+class SQLiteProjectBackend:
+    """SQLite (WAL) project table safe to share between processes."""
+
+    def __init__(self, db_path: Path, cache_size: int = 1024):
+        self.db_path = Path(db_path)
+        self.cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    def _remember(self, project_id: str, version: int, data: str):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[project_id] = (version, data)
+            self._cache.move_to_end(project_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cached(self, project_id: str, version: int) -> Optional[str]:
+        with self._cache_lock:
+            entry = self._cache.get(project_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._cache.move_to_end(project_id)
+            return entry[1]
+
+    def _write(self, conn: sqlite3.Connection, project: Project, data: str) -> int:
+        """Upsert ``project`` serialized as ``data`` and return its new version."""
+        row = conn.execute(
+            "INSERT INTO projects (id, status, client_email, review_token, data, version, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 1, ?)"
+            " ON CONFLICT(id) DO UPDATE SET status = excluded.status, client_email = excluded.client_email,"
+            " review_token = excluded.review_token, data = excluded.data,"
+            " version = projects.version + 1, updated_at = excluded.updated_at"
+            " RETURNING version",
+            (project.id, project.status, project.clientEmail, project.reviewToken, data, time.time()),
+        ).fetchone()
+        return row[0]
+
+    def save(self, project: Project) -> Project:
+        data = project.model_dump_json()
+        self._remember(project.id, self._write(self._conn(), project, data), data)
+        return project
+
+    def get(self, project_id: str) -> Optional[Project]:
+        conn = self._conn()
+        row = conn.execute("SELECT version FROM projects WHERE id = ?", (project_id,)).fetchone()
+        if row is None:
+            return None
+        data = self._cached(project_id, row[0])
+        if data is None:
+            row = conn.execute("SELECT version, data FROM projects WHERE id = ?", (project_id,)).fetchone()
+            if row is None:
+                return None
+            data = row[1]
+            self._remember(project_id, row[0], data)
+        # Each caller gets its own object, so in-place edits never leak into the cache.
+        return Project.model_validate_json(data)
+
+    def modify(self, project_id: str, change: Callable[[Project], None]) -> Optional[Project]:
+        """Read-modify-write one project under a write lock so concurrent workers never lose updates."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM projects WHERE id = ?", (project_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            project = Project.model_validate_json(row[0])
+            change(project)
+            data = project.model_dump_json()
+            version = self._write(conn, project, data)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._remember(project_id, version, data)
+        return project
+
+    def update_status(self, project_id: str, status: str) -> Optional[Project]:
+        def change(project: Project):
+            project.status = status
+        return self.modify(project_id, change)
+
+    def add_feedback(self, project_id: str, feedback) -> Optional[Project]:
+        def change(project: Project):
+            project.reviewFeedback.append(feedback)
+        return self.modify(project_id, change)
+
+    def find(self, status: Optional[str] = None, client_email: Optional[str] = None,
+             review_token: Optional[str] = None, limit: int = 100) -> List[Project]:
+        clauses, params = [], []
+        for column, value in (("status", status), ("client_email", client_email), ("review_token", review_token)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT data FROM projects{where} ORDER BY updated_at DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [Project.model_validate_json(row[0]) for row in rows]
+
+
+def _default_backend():
+    if os.getenv("PROJECT_STORE_BACKEND", "sqlite").lower() == "memory":
+        return MemoryProjectBackend()
+    default_path = Path(os.getenv("SRS_DATA_DIR", "backend/beta/data")) / "projects.db"
+    return SQLiteProjectBackend(
+        Path(os.getenv("PROJECT_STORE_PATH", str(default_path))),
+        cache_size=int(os.getenv("PROJECT_STORE_CACHE_SIZE", "1024")),
+    )
+
+
 class ProjectStore:
-    _projects: Dict[str, Project] = {}
+    _backend = _default_backend()
+
+    @classmethod
+    def use_backend(cls, backend):
+        cls._backend = backend
 
     @classmethod
     def save_project(cls, project: Project):
-        cls._projects[project.id] = project
-        return project
+        return cls._backend.save(project)
 
     @classmethod
     def get_project(cls, project_id: str) -> Optional[Project]:
-        return cls._projects.get(project_id)
+        return cls._backend.get(project_id)
 
     @classmethod
     def update_status(cls, project_id: str, status: str):
-        if project_id in cls._projects:
-            cls._projects[project_id].status = status
-            return cls._projects[project_id]
-        return None
+        return cls._backend.update_status(project_id, status)
 
     @classmethod
     def add_feedback(cls, project_id: str, feedback):
-        if project_id in cls._projects:
-            cls._projects[project_id].reviewFeedback.append(feedback)
-            return cls._projects[project_id]
-        return None
+        return cls._backend.add_feedback(project_id, feedback)
+
+    @classmethod
+    def modify(cls, project_id: str, change: Callable[[Project], None]) -> Optional[Project]:
+        """Apply ``change(project)`` atomically; an exception from it aborts the update."""
+        return cls._backend.modify(project_id, change)
+
+    @classmethod
+    def transition(cls, project_id: str, status: Optional[str] = None, event=None, feedback=None,
+                   updates: Optional[dict] = None, expect_token: Optional[str] = None,
+                   require_unused_token: bool = False, mark_token_used: bool = False,
+                   issue_token: bool = False) -> Optional[Project]:
+        """
+        One atomic review-workflow step. With ``expect_token`` the project's
+        token (if it has one) must match, else ``ReviewTokenInvalid``;
+        ``require_unused_token``/``mark_token_used`` raise ``ReviewTokenUsed``
+        for a used link, and the latter consumes it. Then sets ``status`` and
+        ``updates``, issues a token if asked, and appends ``feedback`` and
+        ``event``. Returns None when the project does not exist.
+        """
+        change = _transition_change(status, event, feedback, updates, expect_token,
+                                    require_unused_token, mark_token_used, issue_token)
+        return cls._backend.modify(project_id, change)
+
+    @classmethod
+    def find_projects(cls, status: Optional[str] = None, client_email: Optional[str] = None,
+                      review_token: Optional[str] = None, limit: int = 100) -> List[Project]:
+        return cls._backend.find(status=status, client_email=client_email, review_token=review_token, limit=limit)
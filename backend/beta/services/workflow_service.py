@@ -1,10 +1,20 @@
 import os
 import json
+import time
 import requests
 import traceback
 from fastapi import HTTPException
 from backend.beta.utils.model import GEMINI_API_KEY, GROQ_API_KEY, GROQ_MODEL
-from litellm import completion as litellm_completion
+from litellm import acompletion as litellm_acompletion
+from backend.beta.utils.rate_limiter import LLM_RATE_LIMITER
+from backend.beta.utils.model_router import MODEL_ROUTER
+
+# Returned for empty notes, or when the models that answered replied with unusable JSON.
+_FALLBACKS = {
+    "analyze": {"services": []},
+    "chat": {"answer": ""},
+    "diagram": {"nodes": [], "edges": []},
+}
 
 class WorkflowService:
     @staticmethod
@@ -16,47 +26,85 @@ class WorkflowService:
         return await WorkflowService._execute_local(workflow_type, payload)
 
 
+    @staticmethod
+    def _candidate_models():
+        """
+        ``(model, api_key)`` pairs for every configured provider.
+        NOTEBOOK_MODELS (comma-separated, provider-qualified) replaces the defaults.
+        """
+        keys = {"groq": GROQ_API_KEY, "gemini": GEMINI_API_KEY}
+        raw = os.getenv("NOTEBOOK_MODELS", "").strip()
+        if raw:
+            names = [m.strip() for m in raw.split(",") if m.strip()]
+        else:
+            configured = GROQ_MODEL or "groq/llama-3.1-8b-instant"
+            if not configured.startswith(("groq/", "gemini/")):
+                configured = f"groq/{configured}"
+            names = [
+                configured,
+                "groq/llama-3.1-8b-instant",
+                "groq/llama-3.3-70b-versatile",
+                "gemini/gemini-1.5-flash",
+                "gemini/gemini-2.0-flash",
+            ]
+        candidates = []
+        for name in dict.fromkeys(names):
+            key = keys.get(name.split("/", 1)[0])
+            if key:
+                candidates.append((name, key))
+        return candidates
+
     @staticmethod
     async def _execute_local(workflow_type: str, payload: dict):
         """
         Local implementation using LiteLLM + Gemini (Legacy Refactored Logic).
+        Calls go through the shared provider rate limiter. The model router picks
+        the model per workflow; a failed call or unusable JSON moves on to the
+        next candidate, up to NOTEBOOK_MODEL_ATTEMPTS models.
         """
         print(f"DEBUG: Executing local workflow: {workflow_type}")
-        if GROQ_API_KEY:
-            model_name = GROQ_MODEL or "groq/llama-3.1-8b-instant"
-            if not model_name.startswith("groq/"):
-                model_name = f"groq/{model_name}"
-            api_key = GROQ_API_KEY
-        elif GEMINI_API_KEY:
-            model_name = "gemini/gemini-1.5-flash"
-            api_key = GEMINI_API_KEY
-        else:
+        handlers = {
+            "analyze": WorkflowService._local_analyze,
+            "chat": WorkflowService._local_chat,
+            "diagram": WorkflowService._local_diagram,
+        }
+        if workflow_type not in handlers:
+            raise HTTPException(status_code=500, detail=f"Workflow failed: Unknown workflow type: {workflow_type}")
+        if workflow_type in ("analyze", "diagram") and not payload.get("content", "").strip():
+            return _FALLBACKS[workflow_type]
+
+        candidates = WorkflowService._candidate_models()
+        if not candidates:
             raise HTTPException(status_code=500, detail="No LLM API key configured. Set GROQ_API_KEY or GEMINI_API_KEY.")
-
-        try:
-            if workflow_type == "analyze":
-                return await WorkflowService._local_analyze(payload, model_name, api_key)
-            
-            elif workflow_type == "chat":
-                return await WorkflowService._local_chat(payload, model_name, api_key)
-            
-            elif workflow_type == "diagram":
-                return await WorkflowService._local_diagram(payload, model_name, api_key)
-            
-            else:
-                raise ValueError(f"Unknown workflow type: {workflow_type}")
-
-        except Exception as e:
-            traceback.print_exc()
-            raise HTTPException(status_code=500, detail=f"Workflow failed: {str(e)}")
+        task = f"notebook_{workflow_type}"
+        keys = dict(candidates)
+        ranked = MODEL_ROUTER.order(task, list(keys), payload.get("content", ""))
+        attempts = max(1, int(os.getenv("NOTEBOOK_MODEL_ATTEMPTS", "2")))
+
+        answered, last_error = False, None
+        for model_name in ranked[:attempts]:
+            started = time.perf_counter()
+            try:
+                result = await handlers[workflow_type](payload, model_name, keys[model_name])
+            except Exception as e:
+                MODEL_ROUTER.record(task, model_name, time.perf_counter() - started, ok=False)
+                traceback.print_exc()
+                last_error = e
+                continue
+            MODEL_ROUTER.record(task, model_name, time.perf_counter() - started, ok=True, json_valid=result is not None)
+            if result is not None:
+                return result
+            print(f"⚠️ Unusable reply from {model_name} for {workflow_type}")
+            answered = True
+        if answered:
+            return _FALLBACKS[workflow_type]
+        raise HTTPException(status_code=500, detail=f"Workflow failed: {str(last_error)}")
 
     # --- Local Implementations ---
 
     @staticmethod
     async def _local_analyze(payload, model, key):
         content = payload.get("content", "")
-        if not content.strip():
-            return {"services": []}
 
         prompt = f"""
         You are a Senior Software Architect. Analyze the following software engineering notes/requirements.
@@ -78,14 +126,14 @@ class WorkflowService:
         {content}
         """
         
-        response = litellm_completion(
+        response = await LLM_RATE_LIMITER.call(model, lambda: litellm_acompletion(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             api_key=key,
             temperature=0.7
-        )
+        ), prompt)
         raw = response.choices[0].message.content
-        return WorkflowService._safe_json(raw, fallback={"services": []})
+        return WorkflowService._safe_json(raw, fallback=None)
 
     @staticmethod
     async def _local_chat(payload, model, key):
@@ -112,19 +160,18 @@ class WorkflowService:
             
         messages.append({"role": "user", "content": f"CONTEXT NOTES:\n{content}\n\nUSER QUESTION: {query}"})
 
-        response = litellm_completion(
+        response = await LLM_RATE_LIMITER.call(model, lambda: litellm_acompletion(
             model=model,
             messages=messages,
             api_key=key,
             temperature=0.7
-        )
-        return {"answer": response.choices[0].message.content}
+        ), " ".join(m["content"] for m in messages))
+        answer = response.choices[0].message.content
+        return {"answer": answer} if answer else None
 
     @staticmethod
     async def _local_diagram(payload, model, key):
         content = payload.get("content", "")
-        if not content.strip():
-            return {"nodes": [], "edges": []}
 
         prompt = f"""
         You are a Cloud Solution Architect. Generate a clear, detailed system architecture diagram for these requirements.
@@ -157,14 +204,14 @@ class WorkflowService:
         {content}
         """
 
-        response = litellm_completion(
+        response = await LLM_RATE_LIMITER.call(model, lambda: litellm_acompletion(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             api_key=key,
             temperature=0.2
-        )
+        ), prompt)
         raw = response.choices[0].message.content
-        return WorkflowService._safe_json(raw, fallback={"nodes": [], "edges": []})
+        return WorkflowService._safe_json(raw, fallback=None)
 
     @staticmethod
     def _safe_json(text: str, fallback: dict):
@@ -0,0 +1,82 @@
+"""
+Parsing of batch SRS generation uploads.
+
+A batch is either JSONL (one ``SRSRequest`` object per line) or CSV whose
+header uses dotted ``section.field`` column names, e.g.
+``project_identity.project_name``. In CSV, list fields take ``;``- or
+``|``-separated values and empty cells are left out so schema defaults apply.
+"""
+
+import csv
+import io
+import json
+import re
+from typing import List, Tuple
+
+# CSV columns whose cells hold several values.
+LIST_FIELDS = {
+    "project_identity.author",
+    "project_identity.target_users",
+    "functional_scope.core_features",
+    "security_and_compliance.compliance_requirements",
+}
+
+Row = Tuple[int, dict, str]
+
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in re.split(r"[;|]", value) if item.strip()]
+
+
+def _csv_rows(text: str) -> List[Row]:
+    rows = []
+    reader = csv.DictReader(io.StringIO(text))
+    for row_no, record in enumerate(reader, start=1):
+        request: dict = {}
+        error = ""
+        for column, cell in record.items():
+            column = (column or "").strip()
+            section, _, field = column.partition(".")
+            if not field:
+                error = f"Column '{column}' is not a dotted section.field name."
+                break
+            # Sections whose fields are all optional must still be present.
+            values = request.setdefault(section, {})
+            if isinstance(cell, str) and cell.strip():
+                values[field] = _split_list(cell) if column in LIST_FIELDS else cell.strip()
+        rows.append((row_no, {} if error else request, error))
+    return rows
+
+
+def _jsonl_rows(text: str) -> List[Row]:
+    rows = []
+    row_no = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            rows.append((row_no, {}, f"Invalid JSON: {e}"))
+            continue
+        if not isinstance(request, dict):
+            rows.append((row_no, {}, "Each JSONL line must be an SRSRequest object."))
+            continue
+        rows.append((row_no, request, ""))
+    return rows
+
+
+def parse_batch(data: bytes, filename: str = "", content_type: str = "") -> List[Row]:
+    """
+    Split an upload into ``(row_no, request, error)`` rows. The format comes
+    from the file extension or content type, else from the first character.
+    """
+    text = data.decode("utf-8-sig")
+    name = (filename or "").lower()
+    kind = (content_type or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or "json" in kind:
+        return _jsonl_rows(text)
+    if name.endswith(".csv") or "csv" in kind:
+        return _csv_rows(text)
+    return _jsonl_rows(text) if text.lstrip().startswith("{") else _csv_rows(text)
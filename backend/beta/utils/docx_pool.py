@@ -0,0 +1,169 @@
+"""
+Process pool for DOCX assembly.
+
+python-docx/lxml work is CPU-bound and holds the GIL, so concurrent builds in
+threads serialize and stall the event loop. ``DocxAssemblyPool`` runs
+``generate_srs_document`` in a few long-lived ``spawn`` worker processes that
+import python-docx and build the styled base template once at start-up. Jobs
+go in as a zlib-compressed JSON payload (sections plus image paths) and only
+the output path comes back. Builds run in-process when the pool is disabled
+(the default), broken, or the caller is itself a daemonic worker (SRS job
+workers), which cannot have child processes.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+
+def _encode(kwargs: dict) -> bytes:
+    return zlib.compress(json.dumps(kwargs, separators=(",", ":"), default=str).encode("utf-8"), 6)
+
+
+def _build_in_process(kwargs: dict) -> str:
+    from backend.beta.utils.srs_document_generator import generate_srs_document
+
+    return generate_srs_document(**kwargs)
+
+
+def _warm_worker():
+    """Worker initializer: import python-docx and build the cached base template."""
+    from backend.beta.utils.srs_document_generator import _base_template_bytes
+
+    if os.getenv("SRS_DOCX_TEMPLATE_CACHE", "1") != "0":
+        _base_template_bytes()
+
+
+def _build_payload(payload: bytes) -> str:
+    return _build_in_process(json.loads(zlib.decompress(payload)))
+
+
+def _ping():
+    pass
+
+
+class DocxAssemblyPool:
+    """Warm worker processes that turn section data into DOCX files."""
+
+    def __init__(self, size: int, enabled: bool = True, timeout: float = 300.0):
+        self.size = max(0, size)
+        self.enabled = enabled and self.size > 0
+        self.timeout = timeout
+        self.built = 0
+        self.in_process = 0
+        self.failed = 0
+        self.restarts = 0
+        self.total_ms = 0.0
+        self.payload_bytes = 0
+        self.reason = ""
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return self.enabled and not multiprocessing.current_process().daemon
+
+    def start(self):
+        """Spawn and warm every worker; safe to call more than once."""
+        if not self.available():
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+            executor = self._executor
+        try:
+            # Submitting one job per worker at once makes the executor spawn them all now.
+            for future in [executor.submit(_ping) for _ in range(self.size)]:
+                future.result()
+        except Exception as e:
+            print(f"⚠️ DOCX assembly pool failed to start: {e}; building documents in-process")
+            self.stop()
+            self.enabled = False
+            self.reason = str(e) or type(e).__name__
+            return
+        print(f"🚀 Started {self.size} DOCX assembly worker process(es)")
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, payload: bytes) -> Future:
+        with self._lock:
+            if self._executor is None:
+                raise BrokenProcessPool("DOCX assembly pool is not running")
+            return self._executor.submit(_build_payload, payload)
+
+    def _restart(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        print("🔁 DOCX assembly pool broke; restarting")
+        self.start()
+
+    def build(self, **kwargs) -> str:
+        """Run ``generate_srs_document(**kwargs)`` in a worker; returns the output path."""
+        started = time.perf_counter()
+        if self._executor is None:
+            self.start()
+        if self._executor is None:
+            output = _build_in_process(kwargs)
+            with self._lock:
+                self.in_process += 1
+            return output
+        payload = _encode(kwargs)
+        try:
+            output = self._submit(payload).result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); this build runs here, later ones get fresh workers.
+            self._restart()
+            output = _build_in_process(kwargs)
+            with self._lock:
+                self.in_process += 1
+            return output
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.built += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+            self.payload_bytes += len(payload)
+        return output
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self._executor is not None,
+                "size": self.size,
+                "built": self.built,
+                "in_process": self.in_process,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "avg_ms": round(self.total_ms / self.built, 1) if self.built else 0.0,
+                "avg_payload_bytes": round(self.payload_bytes / self.built) if self.built else 0,
+                "reason": self.reason,
+            }
+
+
+# Off by default: each API process starts its own workers on startup, so
+# `uvicorn --workers N` would run N pools; enable it with few API workers.
+DOCX_ASSEMBLY_POOL = DocxAssemblyPool(
+    size=int(os.getenv("SRS_DOCX_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    enabled=os.getenv("SRS_DOCX_POOL_ENABLED", "0") == "1",
+    timeout=float(os.getenv("SRS_DOCX_TIMEOUT_SEC", "300")),
+)
@@ -2,9 +2,24 @@ from google.genai import types
 from google.adk.runners import Runner
 from google.adk.agents import SequentialAgent , ParallelAgent
 import base64
-import json , shutil , re , subprocess
+import hashlib
+import json , os , shutil , re , subprocess , tempfile , threading , time
+from collections import OrderedDict
 from pathlib import Path
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from backend.beta.utils.mermaid_native import (
+    NATIVE_PNG_AVAILABLE,
+    NATIVE_RENDERER_VERSION,
+    can_render as native_can_render,
+    render_native,
+)
+from backend.beta.utils.mermaid_pool import MERMAID_RENDERER_POOL
+from backend.beta.utils.mermaid_syntax import MermaidSyntaxError, repair_mermaid
+from backend.beta.utils.render_backends import RENDER_BACKENDS, BackendUnavailable, is_content_error
+from backend.beta.utils.png_optimizer import PngOptimizer
+from backend.beta.utils.rate_limiter import LLM_RATE_LIMITER
+from backend.beta.utils.model import GROQ_MODEL
 
 
 
@@ -71,38 +86,29 @@ async def create_prompt():
 
 
 async def generated_response(runner, user_id, session_id, prompt):
-    import asyncio
-    max_retries = 5
-    retry_delay = 15  # Start with 15 seconds
-
-    for attempt in range(max_retries):
-        try:
-            response = None
-            async for event in runner.run_async(
-                        user_id=user_id,
-                        session_id=session_id,
-                        new_message=prompt,
-                    ):
-                        if event.is_final_response() and event.content and event.content.parts:
-                            response = event.content.parts[0].text
-                            break
-            if response is None:
-                raise ValueError(
-                    "AI did not return a response. Check that GROQ_API_KEY or GEMINI_API_KEY is set in .env "
-                    "and that the model (e.g. gemini/gemini-1.5-pro-latest) is valid."
-                )
-            return response
-        except Exception as e:
-            if "rate_limit" in str(e).lower() or "429" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (attempt + 1)
-                    print(f"⚠️ Rate limit hit. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"❌ Max retries reached. Error: {e}")
-                    raise
-            else:
-                raise
+    """
+    Run the agent pipeline once through the shared LLM rate limiter; rate-limit
+    errors are retried there (Retry-After with jitter, else exponential back-off).
+    """
+    async def run_once():
+        response = None
+        async for event in runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=prompt,
+                ):
+                    if event.is_final_response() and event.content and event.content.parts:
+                        response = event.content.parts[0].text
+                        break
+        if response is None:
+            raise ValueError(
+                "AI did not return a response. Check that GROQ_API_KEY or GEMINI_API_KEY is set in .env "
+                "and that the model (e.g. gemini/gemini-1.5-pro-latest) is valid."
+            )
+        return response
+
+    prompt_text = " ".join(part.text or "" for part in (getattr(prompt, "parts", None) or []))
+    return await LLM_RATE_LIMITER.call(GROQ_MODEL, run_once, prompt_text, retries=4)
 
 
 def clean_and_parse_json(raw_response):
@@ -264,58 +270,628 @@ def clean_interface_diagrams(external_interfaces: dict) -> dict:
     return external_interfaces
 
 
-def render_mermaid_png(mermaid_code: str, output_png: Path):
+# Mermaid render settings shared by every backend and by the render cache key.
+MERMAID_THEME = "neutral"
+MERMAID_BACKGROUND = "white"
+# Renders are sized for the page instead of a fixed oversized viewport: the
+# viewport is the widest figure slot in the document (6in) laid out at
+# MERMAID_LAYOUT_PX_PER_IN CSS pixels per inch, so wider diagrams shrink to fit
+# exactly as Word would shrink them, and the device scale factor brings the
+# output up to MERMAID_DPI when embedded at that width.
+MERMAID_DPI = int(os.getenv("MERMAID_DPI", "200"))
+MERMAID_EMBED_WIDTH_IN = float(os.getenv("MERMAID_EMBED_WIDTH_IN", "6.0"))
+MERMAID_LAYOUT_PX_PER_IN = float(os.getenv("MERMAID_LAYOUT_PX_PER_IN", "100"))
+MERMAID_WIDTH = round(MERMAID_EMBED_WIDTH_IN * MERMAID_LAYOUT_PX_PER_IN)
+MERMAID_HEIGHT = round(9.0 * MERMAID_LAYOUT_PX_PER_IN)
+MERMAID_SCALE = round(MERMAID_DPI / MERMAID_LAYOUT_PX_PER_IN, 3)
+# "svg": the renderer pool writes a vector <name>.svg next to a small PNG
+# fallback (<name>.png at MERMAID_SVG_FALLBACK_SCALE) and the DOCX embeds
+# both. The one-shot mmdc / mermaid.ink fallbacks always produce PNG only.
+MERMAID_OUTPUT_FORMAT = "svg" if os.getenv("MERMAID_OUTPUT_FORMAT", "svg").lower() == "svg" else "png"
+MERMAID_SVG_FALLBACK_SCALE = float(os.getenv("MERMAID_SVG_FALLBACK_SCALE", "1"))
+MERMAID_CSS_PATH = Path("backend/beta/static/custom-diagram.css")
+MERMAID_CONFIG_PATH = Path("backend/beta/static/mermaid-config.json")
+# Opt-in: diagrams within the subset mermaid_native understands (flowchart,
+# sequence, ER, state without styling classes) are drawn in-process; the rest,
+# and any native failure, go to the renderer pool / mmdc path. Needs Pillow for
+# PNGs. tests/test_native_renderer_golden.py pins its output.
+MERMAID_NATIVE_RENDERER = os.getenv("MERMAID_NATIVE_RENDERER", "0") == "1"
+# Flowchart/sequence/ER/state sources are repaired and parsed before rendering;
+# code that still does not parse is rejected without launching a renderer.
+MERMAID_VALIDATE = os.getenv("MERMAID_VALIDATE", "1") != "0"
+MERMAID_MMDC_TIMEOUT_SEC = float(os.getenv("MERMAID_MMDC_TIMEOUT_SEC", "60"))
+# Render backends in routing order; RENDER_BACKENDS skips open circuits and ranks the rest by health.
+_BROWSER_BACKENDS = ["pool", "mmdc", "mermaid_ink"]
+
+
+class MermaidRenderCache:
     """
-    Renders Mermaid code into a PNG file using mmdc (npm).
-    Uses PATH first so it works on any machine; no hardcoded paths.
+    Content-addressed store of rendered Mermaid PNGs and SVGs.
+
+    Entries are keyed by a hash of the Mermaid source and every render option
+    that affects the output plus the file suffix, stored once under
+    ``cache_dir`` and hard-linked (or copied) into per-project paths. Total
+    size is bounded with LRU eviction.
     """
-    def _render_with_mermaid_ink():
-        encoded = base64.urlsafe_b64encode(mermaid_code.encode("utf-8")).decode("utf-8")
-        url = f"https://mermaid.ink/img/{encoded}?type=png"
-        resp = requests.get(url, timeout=45)
-        resp.raise_for_status()
-        if not resp.content:
-            raise RuntimeError("Empty image response from mermaid.ink")
-        output_png.write_bytes(resp.content)
-        print(f"✅ Mermaid diagram saved via mermaid.ink: {output_png}")
-
-    mmdc_path = shutil.which("mmdc") or shutil.which("mmdc.cmd")
-    if not mmdc_path:
-        print("⚠️ mmdc not found; using mermaid.ink fallback")
+
+    def __init__(self, cache_dir: Path, max_bytes: int, enabled: bool = True, use_links: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max(0, int(max_bytes))
+        self.enabled = enabled and self.max_bytes > 0
+        self.use_links = use_links
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def _entry_path(self, name: str) -> Path:
+        return self.cache_dir / name
+
+    def _load(self):
+        """Index existing entries, oldest access first, so LRU order survives restarts."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.cache_dir.is_dir():
+            return
+        found = []
+        for entry in [*self.cache_dir.glob("*.png"), *self.cache_dir.glob("*.svg")]:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, entry.name, st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _file_digest(self, path: Path) -> str:
+        """Digest of a config/CSS file, memoized on (mtime, size)."""
+        try:
+            st = path.stat()
+        except OSError:
+            return ""
+        memo_key = (str(path), st.st_mtime_ns, st.st_size)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key_for(self, mermaid_code: str, **options) -> str:
+        """Stable key for a Mermaid source plus its render options and style files."""
+        material = {
+            "code": mermaid_code,
+            "options": options,
+            "config": self._file_digest(MERMAID_CONFIG_PATH),
+            "css": self._file_digest(MERMAID_CSS_PATH),
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _materialize(self, source: Path, target: Path):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Never write through an existing path: it may be a hard link to another entry.
+        target.unlink(missing_ok=True)
+        if self.use_links:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source, target)
+
+    def fetch(self, key: str, target: Path) -> bool:
+        """Place the cached file for ``key`` with ``target``'s suffix at ``target``. Returns False on a miss."""
+        if not self.enabled:
+            return False
+        name = f"{key}{target.suffix}"
+        with self._lock:
+            self._load()
+            entry = self._entry_path(name)
+            if name not in self._entries or not entry.is_file():
+                if name in self._entries:
+                    self._total_bytes -= self._entries.pop(name)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(entry)
+            self._materialize(entry, target)
+            return True
+        except OSError as e:
+            print(f"⚠️ Render cache fetch failed for {target}: {e}")
+            return False
+
+    def store(self, key: str, rendered: Path):
+        """Add a freshly rendered file to the cache and evict old entries if needed."""
+        if not self.enabled or not rendered.is_file():
+            return
+        size = rendered.stat().st_size
+        if size > self.max_bytes:
+            return
+        name = f"{key}{rendered.suffix}"
+        entry = self._entry_path(name)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            shutil.copyfile(rendered, tmp)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"⚠️ Render cache store failed for {rendered}: {e}")
+            return
+        with self._lock:
+            self._load()
+            if name in self._entries:
+                self._total_bytes -= self._entries.pop(name)
+            self._entries[name] = size
+            self._total_bytes += size
+            self.stores += 1
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self.evictions += 1
+                self._entry_path(old_key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+MERMAID_RENDER_CACHE = MermaidRenderCache(
+    cache_dir=Path(os.getenv("MERMAID_CACHE_DIR", "backend/beta/.cache/mermaid")),
+    max_bytes=int(float(os.getenv("MERMAID_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    enabled=os.getenv("MERMAID_CACHE_ENABLED", "1") != "0",
+    use_links=os.getenv("MERMAID_CACHE_HARDLINK", "1") != "0",
+)
+
+
+PNG_OPTIMIZER = PngOptimizer(
+    dpi=MERMAID_DPI,
+    enabled=os.getenv("MERMAID_PNG_OPTIMIZE", "1") != "0",
+)
+
+
+def _render_options() -> dict:
+    return {
+        "theme": MERMAID_THEME,
+        "background": MERMAID_BACKGROUND,
+        "width": MERMAID_WIDTH,
+        "height": MERMAID_HEIGHT,
+        "scale": MERMAID_SCALE,
+        "format": MERMAID_OUTPUT_FORMAT,
+    }
+
+
+def _renderer_for(mermaid_code: str) -> str:
+    if MERMAID_NATIVE_RENDERER and native_can_render(mermaid_code):
+        return f"native-{NATIVE_RENDERER_VERSION}"
+    return "browser"
+
+
+def _cache_key(mermaid_code: str, options: dict) -> str:
+    # The renderer is part of the key so native and browser output never mix.
+    return MERMAID_RENDER_CACHE.key_for(mermaid_code, **options, renderer=_renderer_for(mermaid_code))
+
+
+def mermaid_source_key(mermaid_code: str) -> str:
+    """Hash identifying the PNG that ``mermaid_code`` renders to with the current options and styles."""
+    return _cache_key(mermaid_code, _render_options())
+
+
+NATIVE_RENDER_STATS = {"rendered": 0, "outside_subset": 0, "failed": 0, "total_ms": 0.0}
+_NATIVE_RENDER_STATS_LOCK = threading.Lock()
+
+
+def native_renderer_stats() -> dict:
+    with _NATIVE_RENDER_STATS_LOCK:
+        stats = dict(NATIVE_RENDER_STATS)
+    rendered = stats.pop("rendered")
+    total_ms = stats.pop("total_ms")
+    return {
+        "enabled": MERMAID_NATIVE_RENDERER,
+        "available": NATIVE_PNG_AVAILABLE,
+        "version": NATIVE_RENDERER_VERSION,
+        "rendered": rendered,
+        **stats,
+        "avg_ms": round(total_ms / rendered, 1) if rendered else 0.0,
+    }
+
+
+MERMAID_VALIDATION_STATS = {"checked": 0, "repaired": 0, "rejected": 0, "render_attempts_avoided": 0}
+_MERMAID_VALIDATION_LOCK = threading.Lock()
+
+
+def failed_render_attempts() -> int:
+    """Renderer attempts a diagram that cannot render uses up: every backend with a closed circuit."""
+    return len(RENDER_BACKENDS.route(_BROWSER_BACKENDS))
+
+
+def validate_mermaid(mermaid_code: str) -> dict:
+    """
+    Repair and parse ``mermaid_code`` before it is rendered.
+
+    Returns ``{"code", "repairs", "error", "attempts_avoided"}``: ``code`` is the
+    (possibly repaired) source to render and ``error`` the ``MermaidSyntaxError``
+    of code that cannot be repaired. ``attempts_avoided`` counts the failing
+    renderer attempts rejected code would have cost; repaired code is still
+    rendered, so it avoids none.
+    """
+    check = {"code": mermaid_code, "repairs": [], "error": None, "attempts_avoided": 0}
+    if not MERMAID_VALIDATE:
+        return check
+    try:
+        check["code"], check["repairs"] = repair_mermaid(mermaid_code)
+    except MermaidSyntaxError as e:
+        check["error"] = e
+    if check["error"] is not None:
+        check["attempts_avoided"] = failed_render_attempts()
+    with _MERMAID_VALIDATION_LOCK:
+        MERMAID_VALIDATION_STATS["checked"] += 1
+        MERMAID_VALIDATION_STATS["repaired"] += bool(check["repairs"])
+        MERMAID_VALIDATION_STATS["rejected"] += check["error"] is not None
+        MERMAID_VALIDATION_STATS["render_attempts_avoided"] += check["attempts_avoided"]
+    return check
+
+
+def mermaid_validation_stats() -> dict:
+    with _MERMAID_VALIDATION_LOCK:
+        return {"enabled": MERMAID_VALIDATE, **MERMAID_VALIDATION_STATS}
+
+
+# Renders in progress in this process, so concurrent requests (e.g. batch rows)
+# wait for an identical diagram instead of rendering it again.
+_RENDERS_IN_FLIGHT = {}
+_RENDERS_IN_FLIGHT_LOCK = threading.Lock()
+_RENDER_WAIT_SEC = float(os.getenv("MERMAID_DEDUP_WAIT_SEC", "120"))
+RENDER_DEDUP_STATS = {"deduplicated": 0}
+
+
+def _claim_render(cache_key: str, output_png: Path):
+    """Claim ``cache_key`` for rendering; returns the current owner's ``(event, path)`` if already claimed."""
+    with _RENDERS_IN_FLIGHT_LOCK:
+        owner = _RENDERS_IN_FLIGHT.get(cache_key)
+        if owner is None:
+            _RENDERS_IN_FLIGHT[cache_key] = (threading.Event(), output_png)
+        return owner
+
+
+def _release_render(cache_key: str):
+    with _RENDERS_IN_FLIGHT_LOCK:
+        owner = _RENDERS_IN_FLIGHT.pop(cache_key, None)
+    if owner:
+        owner[0].set()
+
+
+def _fetch_cached(cache_key: str, output_png: Path) -> bool:
+    """Materialize a cached render, including its SVG in SVG mode."""
+    if not MERMAID_RENDER_CACHE.fetch(cache_key, output_png):
+        return False
+    return MERMAID_OUTPUT_FORMAT != "svg" or MERMAID_RENDER_CACHE.fetch(cache_key, output_png.with_suffix(".svg"))
+
+
+def _png_only_key(mermaid_code: str, options: dict) -> str:
+    """Key for renders that have no SVG (mmdc / mermaid.ink), whatever the output format."""
+    return _cache_key(mermaid_code, {**options, "format": "png"})
+
+
+def _fetch_png_only(mermaid_code: str, options: dict, output_png: Path) -> bool:
+    """
+    In SVG mode, reuse a PNG-only fallback render while no SVG-capable
+    backend would handle the diagram, so the fallback is not re-run for
+    every identical diagram. Once the pool is preferred again the diagram
+    is rendered (and cached) with its SVG.
+    """
+    if options.get("format") != "svg" or _renderer_for(mermaid_code) != "browser":
+        return False
+    if RENDER_BACKENDS.route(_BROWSER_BACKENDS)[:1] == ["pool"]:
+        return False
+    return MERMAID_RENDER_CACHE.fetch(_png_only_key(mermaid_code, options), output_png)
+
+
+def _reuse_render(cache_key: str, source: Path, output_png: Path) -> bool:
+    """Place the render another job just finished at ``output_png``."""
+    if _fetch_cached(cache_key, output_png):
+        return True
+    try:
+        if source.is_file():
+            shutil.copyfile(source, output_png)
+            if source.with_suffix(".svg").is_file():
+                shutil.copyfile(source.with_suffix(".svg"), output_png.with_suffix(".svg"))
+            return True
+    except OSError:
+        pass
+    return False
+
+
+def render_mermaid_batch(jobs: list, max_fallback_workers: int = 6, validate: bool = True) -> list:
+    """
+    Render many (mermaid_code, output_png) jobs at once.
+
+    With ``validate`` each source first goes through ``validate_mermaid``:
+    repaired code is rendered instead and code that cannot be repaired fails
+    with its ``MermaidSyntaxError`` without a render attempt. Cache hits are materialized first, diagrams in the native subset are drawn
+    in-process, the remaining jobs go to the warm renderer pool as one batch,
+    and anything the pool cannot render falls back
+    to the one-shot mmdc / mermaid.ink path. A diagram already being rendered
+    (by another job in this batch or a concurrent request) is waited for and
+    copied. Returns one entry per job: ``None`` on success or the exception
+    that failed it.
+    """
+    options = _render_options()
+    results = [None] * len(jobs)
+    misses = []
+    waiting = []
+    for idx, (mermaid_code, output_png) in enumerate(jobs):
+        output_png = Path(output_png)
+        if validate:
+            check = validate_mermaid(mermaid_code)
+            if check["error"] is not None:
+                output_png.unlink(missing_ok=True)
+                output_png.with_suffix(".svg").unlink(missing_ok=True)
+                results[idx] = check["error"]
+                print(f"⚠️ Mermaid diagram rejected before rendering ({output_png.name}): {check['error']}")
+                continue
+            mermaid_code = check["code"]
+        cache_key = _cache_key(mermaid_code, options)
+        # An SVG left by an earlier render must never be embedded with a newer PNG.
+        output_png.with_suffix(".svg").unlink(missing_ok=True)
+        if _fetch_cached(cache_key, output_png) or _fetch_png_only(mermaid_code, options, output_png):
+            output_png.with_suffix(".mmd").write_text(mermaid_code, encoding="utf-8")
+            print(f"♻️ Mermaid diagram served from cache: {output_png}")
+            continue
+        # A previous cache hit may have left a hard link here; never render into it in place.
         output_png.parent.mkdir(parents=True, exist_ok=True)
-        _render_with_mermaid_ink()
-        return
-    
-    output_png.parent.mkdir(parents=True, exist_ok=True)
-    mmd_path = output_png.with_suffix(".mmd")
+        output_png.unlink(missing_ok=True)
+        output_png.with_suffix(".svg").unlink(missing_ok=True)
+        output_png.with_suffix(".mmd").write_text(mermaid_code, encoding="utf-8")
+        owner = _claim_render(cache_key, output_png)
+        if owner is None:
+            misses.append((idx, mermaid_code, output_png, cache_key))
+        else:
+            waiting.append(((idx, mermaid_code, output_png, cache_key), owner))
+
+    try:
+        _render_misses(misses, options, results, max_fallback_workers)
+    finally:
+        # Release before waiting on others so two batches never wait on each other.
+        for miss in misses:
+            _release_render(miss[3])
+
+    retry = []
+    for miss, (event, source) in waiting:
+        event.wait(timeout=_RENDER_WAIT_SEC)
+        if _reuse_render(miss[3], source, miss[2]):
+            with _RENDERS_IN_FLIGHT_LOCK:
+                RENDER_DEDUP_STATS["deduplicated"] += 1
+            print(f"♻️ Mermaid diagram shared with a concurrent render: {miss[2]}")
+        else:
+            retry.append(miss)
+    if retry:
+        _render_misses(retry, options, results, max_fallback_workers)
+    return results
+
+
+def _render_misses(misses: list, options: dict, results: list, max_fallback_workers: int):
+    """Render ``(idx, code, output_png, cache_key)`` misses, recording failures in ``results``."""
+    svg_mode = options.get("format") == "svg"
+    if MERMAID_NATIVE_RENDERER:
+        misses = [miss for miss in misses if not _render_native(miss, svg_mode)]
+    fallback = misses
+    if misses and RENDER_BACKENDS.route(_BROWSER_BACKENDS)[:1] == ["pool"]:
+        pool_jobs = [
+            {
+                "code": code,
+                "output": str(output_png.resolve()),
+                "config_path": str(MERMAID_CONFIG_PATH.resolve()) if MERMAID_CONFIG_PATH.exists() else None,
+                "css_path": str(MERMAID_CSS_PATH.resolve()) if MERMAID_CSS_PATH.exists() else None,
+                **options,
+                "format": "png",
+                **({
+                    "svg_output": str(output_png.with_suffix(".svg").resolve()),
+                    "fallback_scale": MERMAID_SVG_FALLBACK_SCALE,
+                } if svg_mode else {}),
+            }
+            for _, code, output_png, _ in misses
+        ]
+        fallback = []
+        started = time.perf_counter()
+        errors = MERMAID_RENDERER_POOL.render_batch(pool_jobs)
+        per_job = (time.perf_counter() - started) / len(pool_jobs)
+        for miss, error in zip(misses, errors):
+            svg_path = miss[2].with_suffix(".svg")
+            ok = error is None and miss[2].is_file() and (not svg_mode or svg_path.is_file())
+            RENDER_BACKENDS.record("pool", ok, per_job, None if ok else error or RuntimeError("no output written"))
+            if ok:
+                print(f"✅ Mermaid diagram saved via renderer pool: {miss[2]}")
+                if svg_mode:
+                    # The PNG is only a fallback, drawn at the layout resolution times the fallback scale.
+                    PNG_OPTIMIZER.optimize(miss[2], dpi=round(MERMAID_LAYOUT_PX_PER_IN * MERMAID_SVG_FALLBACK_SCALE))
+                    MERMAID_RENDER_CACHE.store(miss[3], svg_path)
+                else:
+                    PNG_OPTIMIZER.optimize(miss[2])
+                MERMAID_RENDER_CACHE.store(miss[3], miss[2])
+            else:
+                print(f"⚠️ Renderer pool failed for {miss[2].name}: {error}; using subprocess path")
+                svg_path.unlink(missing_ok=True)
+                fallback.append(miss)
+
+    def _run_fallback(miss):
+        _, code, output_png, _ = miss
+        _render_mermaid_uncached(code, output_png)
+        PNG_OPTIMIZER.optimize(output_png)
+        # mmdc and mermaid.ink only produce a PNG; in SVG mode the regular key expects an SVG too.
+        MERMAID_RENDER_CACHE.store(_png_only_key(code, options), output_png)
+
+    if len(fallback) == 1:
+        try:
+            _run_fallback(fallback[0])
+        except Exception as e:
+            results[fallback[0][0]] = e
+    elif fallback:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_fallback_workers, len(fallback)))) as executor:
+            futures = [(miss[0], executor.submit(_run_fallback, miss)) for miss in fallback]
+            for idx, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    results[idx] = e
+
+
+def _render_native(miss, svg_mode: bool) -> bool:
+    """Draw a miss in-process; False hands it to the browser path."""
+    _, code, output_png, cache_key = miss
+    if not native_can_render(code):
+        with _NATIVE_RENDER_STATS_LOCK:
+            NATIVE_RENDER_STATS["outside_subset"] += 1
+        return False
+    png_scale = MERMAID_SVG_FALLBACK_SCALE if svg_mode else MERMAID_SCALE
+    svg_path = output_png.with_suffix(".svg") if svg_mode else None
+    started = time.perf_counter()
+    try:
+        render_native(code, output_png, svg_path=svg_path, scale=png_scale, max_width=MERMAID_WIDTH,
+                      config_path=MERMAID_CONFIG_PATH)
+    except Exception as e:
+        print(f"⚠️ Native renderer failed for {output_png.name}: {e}; using browser path")
+        output_png.unlink(missing_ok=True)
+        output_png.with_suffix(".svg").unlink(missing_ok=True)
+        with _NATIVE_RENDER_STATS_LOCK:
+            NATIVE_RENDER_STATS["failed"] += 1
+        return False
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _NATIVE_RENDER_STATS_LOCK:
+        NATIVE_RENDER_STATS["rendered"] += 1
+        NATIVE_RENDER_STATS["total_ms"] += elapsed_ms
+    print(f"✅ Mermaid diagram drawn natively in {elapsed_ms:.0f} ms: {output_png}")
+    PNG_OPTIMIZER.optimize(output_png, dpi=round(MERMAID_LAYOUT_PX_PER_IN * png_scale))
+    if svg_path is not None:
+        MERMAID_RENDER_CACHE.store(cache_key, svg_path)
+    MERMAID_RENDER_CACHE.store(cache_key, output_png)
+    return True
 
-    with open(mmd_path, "w", encoding="utf-8") as f:
-        f.write(mermaid_code)
 
-    css_path = Path("backend/beta/static/custom-diagram.css")
-    config_path = Path("backend/beta/static/mermaid-config.json")
+def render_mermaid_png(mermaid_code: str, output_png: Path):
+    """
+    Renders Mermaid code into a PNG file.
+    Identical sources are served from MERMAID_RENDER_CACHE without re-rendering,
+    diagrams in the native subset are drawn in-process by mermaid_native, and
+    the warm MERMAID_RENDERER_POOL is preferred over spawning mmdc (found on
+    PATH, no hardcoded paths) for everything else.
+    """
+    error = render_mermaid_batch([(mermaid_code, output_png)])[0]
+    if error is not None:
+        raise error
 
+
+def _mmdc_path() -> str | None:
+    return shutil.which("mmdc") or shutil.which("mmdc.cmd")
+
+
+def _render_with_mermaid_ink(mermaid_code: str, output_png: Path):
+    encoded = base64.urlsafe_b64encode(mermaid_code.encode("utf-8")).decode("utf-8")
+    url = f"https://mermaid.ink/img/{encoded}?type=png"
+    resp = requests.get(url, timeout=45)
+    if resp.status_code == 400:
+        raise MermaidSyntaxError(f"mermaid.ink could not parse the diagram: {resp.text[:200]}")
+    resp.raise_for_status()
+    if not resp.content:
+        raise RuntimeError("Empty image response from mermaid.ink")
+    output_png.write_bytes(resp.content)
+    print(f"✅ Mermaid diagram saved via mermaid.ink: {output_png}")
+
+
+def _render_with_mmdc(mermaid_code: str, output_png: Path):
+    mmdc_path = _mmdc_path()
+    if not mmdc_path:
+        raise BackendUnavailable("mmdc not found")
+
+    mmd_path = output_png.with_suffix(".mmd")
+    mmd_path.write_text(mermaid_code, encoding="utf-8")
+
+    # mmdc only takes an integer scale; widen the viewport to keep the same output pixels.
+    mmdc_scale = max(1, round(MERMAID_SCALE))
     cmd = [
         mmdc_path,
         "-i", str(mmd_path),
         "-o", str(output_png),
-        "-w", "3600",
-        "-H", "2200",
-        "-t", "neutral",
-        "-b", "white",
-        "-s", "3"
+        "-w", str(round(MERMAID_WIDTH * MERMAID_SCALE / mmdc_scale)),
+        "-H", str(round(MERMAID_HEIGHT * MERMAID_SCALE / mmdc_scale)),
+        "-t", MERMAID_THEME,
+        "-b", MERMAID_BACKGROUND,
+        "-s", str(mmdc_scale)
     ]
-    if config_path.exists():
-        cmd.extend(["-c", str(config_path)])
-    if css_path.exists():
-        cmd.extend(["-C", str(css_path)])
-
+    if MERMAID_CONFIG_PATH.exists():
+        cmd.extend(["-c", str(MERMAID_CONFIG_PATH)])
+    if MERMAID_CSS_PATH.exists():
+        cmd.extend(["-C", str(MERMAID_CSS_PATH)])
 
     try:
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print(f"✅ Mermaid diagram saved: {output_png}")
+        subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=MERMAID_MMDC_TIMEOUT_SEC)
     except subprocess.CalledProcessError as e:
         print(f"❌ mmdc error: {e.stderr}")
         print(f"Command that failed: {' '.join(cmd)}")
-        print("⚠️ Falling back to mermaid.ink rendering...")
-        _render_with_mermaid_ink()
+        raise RuntimeError(f"mmdc failed: {(e.stderr or '').strip()[-300:]}") from e
+    print(f"✅ Mermaid diagram saved: {output_png}")
+
+
+_ONE_SHOT_BACKENDS = {"mmdc": _render_with_mmdc, "mermaid_ink": _render_with_mermaid_ink}
+
+
+def _render_mermaid_uncached(mermaid_code: str, output_png: Path):
+    """Render with the healthiest one-shot backend, moving to the next one when it fails."""
+    routed = RENDER_BACKENDS.route(list(_ONE_SHOT_BACKENDS))
+    if not routed:
+        raise BackendUnavailable("no render backend available (mmdc missing or circuits open)")
+    last_error = None
+    for name in routed:
+        started = time.perf_counter()
+        try:
+            _ONE_SHOT_BACKENDS[name](mermaid_code, output_png)
+        except Exception as e:
+            RENDER_BACKENDS.record(name, False, time.perf_counter() - started, e)
+            if is_content_error(e):
+                raise  # Every backend would reject the same source.
+            print(f"⚠️ {name} could not render {output_png.name}: {e}")
+            last_error = e
+            continue
+        RENDER_BACKENDS.record(name, True, time.perf_counter() - started)
+        return
+    raise last_error
+
+
+_PROBE_DIAGRAM = "flowchart LR\n  A --> B\n"
+
+
+def _probe_with(render):
+    """Background health probe: render a two-node diagram into a scratch file."""
+    def probe():
+        with tempfile.TemporaryDirectory() as tmp:
+            render(_PROBE_DIAGRAM, Path(tmp) / "probe.png")
+    return probe
+
+
+def _render_with_pool(mermaid_code: str, output_png: Path):
+    MERMAID_RENDERER_POOL.render({"code": mermaid_code, "output": str(output_png), **_render_options(), "format": "png"})
+
+
+RENDER_BACKENDS.register("pool", probe=_probe_with(_render_with_pool), available=MERMAID_RENDERER_POOL.available)
+RENDER_BACKENDS.register("mmdc", probe=_probe_with(_render_with_mmdc), available=lambda: bool(_mmdc_path()))
+RENDER_BACKENDS.register("mermaid_ink", probe=_probe_with(_render_with_mermaid_ink))
+# Bundled template diagrams (main._ensure_minimum_diagrams): tracked, never opened.
+RENDER_BACKENDS.register("template")
@@ -0,0 +1,352 @@
+"""
+Schema-guided repair of LLM JSON output.
+
+Two levels, both cheaper than asking a model again:
+
+- ``repair_json_text`` parses text that ``clean_and_parse_json`` rejects:
+  prose around the JSON, comments, trailing or missing commas, Python
+  literals, raw newlines in strings, and output cut off mid-value (open
+  strings and containers are closed, an unfinished member is dropped).
+- ``repair_fragment`` validates one AI output family against its schema
+  (``schemas/ai_sections_schema.py``), walks to each invalid subtree the
+  pydantic errors point at and fixes it in place: scalars and lists are
+  coerced to the expected type, and list items that cannot be fixed are
+  dropped as long as valid ones remain. What is still invalid afterwards
+  is left for a small family-only re-prompt.
+
+``JSON_REPAIR_STATS`` counts repairs, the model calls they avoided and the
+tokens those calls would have cost.
+"""
+
+import json
+import threading
+from typing import Any, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from backend.beta.schemas.ai_sections_schema import AI_FAMILY_SCHEMAS
+from backend.beta.utils.rate_limiter import estimate_tokens
+
+_LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null", "Infinity": "null", "-Infinity": "null"}
+_SCALAR_END = set(",:}]") | set(" \t\r\n")
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _strip_trailing_comma(out: List[str]) -> bool:
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+        return True
+    return False
+
+
+def _value_done(stack: list):
+    if stack:
+        stack[-1]["state"] = "comma"
+
+
+def repair_json_text(text: str) -> Tuple[Optional[Any], List[str]]:
+    """Best-effort parse of malformed JSON text; returns ``(value or None, fixes)``."""
+    if not isinstance(text, str):
+        return None, []
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None, []
+    fixes = set()
+    if text[:min(starts)].strip() and not text[:min(starts)].strip().startswith("```"):
+        fixes.add("leading text")
+    s, i, n = text, min(starts), len(text)
+    out: List[str] = []
+    stack: list = []  # {"type": "{" | "[", "state": key|colon|value|comma, "start": index of current member in out}
+    truncated = False
+
+    def begin_value() -> bool:
+        """Prepare for a value/key at the current position; False if it does not belong here."""
+        if not stack:
+            return not out
+        top = stack[-1]
+        if top["state"] == "comma":
+            out.append(",")
+            fixes.add("missing comma")
+            top["state"] = "key" if top["type"] == "{" else "value"
+        # An object member starts at its key, an array member at its value.
+        if top["state"] == ("key" if top["type"] == "{" else "value"):
+            top["start"] = len(out)
+        return top["state"] != "colon"
+
+    while i < n:
+        ch = s[i]
+        if ch.isspace():
+            out.append(ch)
+            i += 1
+            continue
+        if ch == "/" and s.startswith("//", i):
+            i = s.find("\n", i)
+            i = n if i < 0 else i
+            fixes.add("comments")
+            continue
+        if ch == "/" and s.startswith("/*", i):
+            end = s.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            fixes.add("comments")
+            continue
+        if ch == '"':
+            is_key = bool(stack) and stack[-1]["type"] == "{" and stack[-1]["state"] in ("key", "comma")
+            if not begin_value():
+                i += 1
+                continue
+            j, chars, escape = i + 1, ['"'], False
+            while j < n:
+                c = s[j]
+                if escape:
+                    escape = False
+                    chars.append(c)
+                elif c == "\\":
+                    escape = True
+                    chars.append(c)
+                elif c == '"':
+                    break
+                elif c in _CONTROL_ESCAPES or ord(c) < 0x20:
+                    chars.append(_CONTROL_ESCAPES.get(c, " "))
+                    fixes.add("control characters in strings")
+                else:
+                    chars.append(c)
+                j += 1
+            if j >= n:
+                truncated = True
+                if is_key or escape:
+                    break  # unfinished key (or dangling escape): the member is dropped below
+                chars.append('"')
+                out.extend(chars)
+                _value_done(stack)
+                break
+            chars.append('"')
+            out.extend(chars)
+            i = j + 1
+            if is_key:
+                stack[-1]["state"] = "colon"
+            else:
+                _value_done(stack)
+            continue
+        if ch in "{[":
+            if not begin_value():
+                i += 1
+                continue
+            out.append(ch)
+            stack.append({"type": ch, "state": "key" if ch == "{" else "value", "start": len(out)})
+            i += 1
+            continue
+        if ch in "}]":
+            if not stack:
+                break
+            top = stack.pop()
+            if top["type"] == "{" and top["state"] in ("colon", "value"):
+                del out[top["start"]:]
+                fixes.add("dangling key")
+            if _strip_trailing_comma(out):
+                fixes.add("trailing comma")
+            closer = "}" if top["type"] == "{" else "]"
+            if ch != closer:
+                fixes.add("mismatched bracket")
+            out.append(closer)
+            i += 1
+            if not stack:
+                break
+            _value_done(stack)
+            continue
+        if ch == ",":
+            if stack and stack[-1]["state"] == "comma":
+                out.append(",")
+                stack[-1]["state"] = "key" if stack[-1]["type"] == "{" else "value"
+            else:
+                fixes.add("extra comma")
+            i += 1
+            continue
+        if ch == ":":
+            if stack and stack[-1]["type"] == "{" and stack[-1]["state"] == "colon":
+                out.append(":")
+                stack[-1]["state"] = "value"
+            i += 1
+            continue
+        # Bare token: number, literal, or an unquoted key/string.
+        j = i
+        while j < n and s[j] not in _SCALAR_END and s[j] not in '"{[':
+            j += 1
+        token = s[i:j]
+        if j >= n and stack:
+            truncated = True
+            break
+        is_key = bool(stack) and stack[-1]["type"] == "{" and stack[-1]["state"] in ("key", "comma")
+        if not begin_value():
+            i = j
+            continue
+        if is_key:
+            out.append(json.dumps(token))
+            stack[-1]["state"] = "colon"
+            fixes.add("unquoted keys")
+        else:
+            if token in _LITERALS:
+                token = _LITERALS[token]
+                fixes.add("python literals")
+            try:
+                json.loads(token)
+            except ValueError:
+                token = json.dumps(token)
+                fixes.add("unquoted strings")
+            out.append(token)
+            _value_done(stack)
+        i = j
+
+    if stack:
+        truncated = True
+    if truncated:
+        fixes.add("truncated output")
+        while stack:
+            top = stack.pop()
+            if top["type"] == "{" and top["state"] in ("colon", "value"):
+                del out[top["start"]:]  # key without a finished value
+            _strip_trailing_comma(out)
+            out.append("}" if top["type"] == "{" else "]")
+            _value_done(stack)
+    elif s[i:].strip().strip("`").strip():
+        fixes.add("trailing text")
+    try:
+        return json.loads("".join(out)), sorted(fixes)
+    except ValueError:
+        return None, sorted(fixes)
+
+
+def _walk(root: Any, loc: tuple) -> List[Tuple[Any, Any]]:
+    """``(container, key)`` pairs from ``root`` along a pydantic error ``loc``, skipping union tags."""
+    path, node = [], root
+    for part in loc:
+        if isinstance(node, dict) and isinstance(part, str) and part in node:
+            path.append((node, part))
+            node = node[part]
+        elif isinstance(node, list) and isinstance(part, int) and 0 <= part < len(node):
+            path.append((node, part))
+            node = node[part]
+    return path
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    if isinstance(value, list):
+        parts = [_as_text(v) for v in value]
+        return "; ".join(p for p in parts if p) if all(p is not None for p in parts) else None
+    if isinstance(value, dict):
+        for key in ("description", "text", "requirement", "name", "value"):
+            if isinstance(value.get(key), str):
+                return value[key]
+        parts = [v for v in value.values() if isinstance(v, str)]
+        return "; ".join(parts) if parts else None
+    return None
+
+
+def _coerce(value: Any, error_type: str) -> Tuple[bool, Any]:
+    if error_type == "string_type":
+        text = _as_text(value)
+        return text is not None, text
+    if error_type == "list_type":
+        if isinstance(value, str):
+            return True, [value]
+        if isinstance(value, dict):
+            return True, list(value.values())
+    if error_type in ("dict_type", "model_type", "model_attributes_type") and isinstance(value, str):
+        return True, {"description": value}
+    return False, value
+
+
+def repair_fragment(family: str, value: Any) -> Tuple[Optional[Any], List[str]]:
+    """
+    Validate ``value`` against the ``family`` schema and fix invalid subtrees
+    locally. Returns ``(value, fixes)``; ``value`` is None when it still does
+    not validate. Valid input comes back unchanged with no fixes.
+    """
+    adapter = AI_FAMILY_SCHEMAS.get(family)
+    if adapter is None:
+        return value, []
+    value = json.loads(json.dumps(value))
+    fixes: List[str] = []
+    for _ in range(4):
+        try:
+            adapter.validate_python(value)
+            return value, fixes
+        except ValidationError as e:
+            errors = e.errors()
+        changed = False
+        drops = {}  # id(list) -> (list, {indexes})
+        touched = []  # data paths changed this pass; a union reports one error per alternative
+        for error in errors:
+            path = _walk(value, error["loc"])
+            if not path:
+                continue
+            keys = tuple(k for _, k in path)
+            if any(keys[:len(t)] == t or t[:len(keys)] == keys for t in touched):
+                continue
+            container, key = path[-1]
+            ok, fixed = _coerce(container[key], error["type"])
+            if ok:
+                container[key] = fixed
+                touched.append(keys)
+                fixes.append(f"{'.'.join(str(k) for k in keys)}: coerced ({error['type']})")
+                changed = True
+                continue
+            # Not fixable in place: drop the enclosing list item, deepest list first.
+            for parent, index in reversed(path):
+                if isinstance(parent, list):
+                    drops.setdefault(id(parent), (parent, set()))[1].add(index)
+                    break
+        for parent, indexes in drops.values():
+            if len(indexes) >= len(parent):
+                continue  # nothing valid would remain
+            for index in sorted(indexes, reverse=True):
+                del parent[index]
+            fixes.append(f"dropped {len(indexes)} invalid item(s)")
+            changed = True
+        if not changed:
+            break
+    try:
+        adapter.validate_python(value)
+        return value, fixes
+    except ValidationError:
+        return None, fixes
+
+
+class JsonRepairStats:
+    """Thread-safe counters for repairs and the model calls they replaced."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {
+            "text_repaired": 0,
+            "text_unrepairable": 0,
+            "fragments_fixed_locally": 0,
+            "fragments_reprompted": 0,
+            "fragments_failed": 0,
+            "retries_avoided": 0,
+            "tokens_saved": 0,
+        }
+
+    def add(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+def call_tokens(prompt: str, response: Any) -> int:
+    """Estimated tokens of one model call: the prompt plus the response it produced."""
+    text = response if isinstance(response, str) else json.dumps(response)
+    return estimate_tokens(prompt) + estimate_tokens(text)
+
+
+JSON_REPAIR_STATS = JsonRepairStats()
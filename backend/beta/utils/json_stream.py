@@ -0,0 +1,138 @@
+"""
+Incremental parsing of streamed LLM JSON.
+
+``IncrementalJSONParser`` is fed completion text chunk by chunk and returns
+each top-level member of the JSON object (``"functional_requirements": [...]``)
+as soon as its value closes, long before the whole response has arrived.
+Leading prose or a markdown fence before the first ``{`` is skipped. Members
+are only a preview: the complete text is still parsed with
+``clean_and_parse_json`` once the stream ends.
+"""
+
+import json
+import re
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x1F\x7F]")
+
+
+def _loads(text: str) -> Tuple[bool, Any]:
+    try:
+        return True, json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            return True, json.loads(_CONTROL_CHARS.sub(" ", text))
+        except json.JSONDecodeError:
+            return False, None
+
+
+class IncrementalJSONParser:
+    """Scan streamed text once, emitting ``(key, value)`` for each completed top-level member."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "start"  # start -> key -> colon -> value -> after -> key ... -> done
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start: Optional[int] = None
+        self.members: dict = {}
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def _emit(self, end: int, out: list):
+        ok, value = _loads(self._buf[self._value_start:end])
+        if ok and self._key is not None:
+            self.members[self._key] = value
+            out.append((self._key, value))
+        self._value_start = None
+        self._state = "after"
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Append ``chunk``; return the members whose values closed within it."""
+        out: List[Tuple[str, Any]] = []
+        if not chunk or self.done:
+            self._buf += chunk or ""
+            return out
+        self._buf += chunk
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._state == "start":
+                if ch == "{":
+                    self._depth, self._state = 1, "key"
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key":
+                        ok, key = _loads(buf[self._key_start:i + 1])
+                        self._key = key if ok else None
+                        self._state = "colon"
+                    elif self._depth == 1 and self._state == "value":
+                        self._emit(i + 1, out)
+                continue
+            if ch.isspace():
+                continue
+            at_top = self._depth == 1
+            if ch == '"':
+                self._in_string = True
+                if at_top and self._state == "key":
+                    self._key_start = i
+                elif at_top and self._state == "value" and self._value_start is None:
+                    self._value_start = i
+            elif ch == ":" and at_top and self._state == "colon":
+                self._state = "value"
+            elif ch in "{[":
+                if at_top and self._state == "value" and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if at_top:
+                    if self._state == "value" and self._value_start is not None:
+                        self._emit(i, out)
+                    self._depth, self._state = 0, "done"
+                    self._pos = i + 1
+                    return out
+                self._depth -= 1
+                if self._depth == 1 and self._state == "value" and self._value_start is not None:
+                    self._emit(i + 1, out)
+            elif ch == "," and at_top:
+                if self._state == "value" and self._value_start is not None:
+                    self._emit(i, out)
+                self._state = "key"
+            elif at_top and self._state == "value" and self._value_start is None:
+                self._value_start = i  # number, true, false or null
+        self._pos = len(buf)
+        return out
+
+
+async def parse_json_stream(chunks: AsyncIterator[str], on_member: Optional[Callable[[str, Any], None]] = None) -> str:
+    """
+    Feed streamed text ``chunks`` through an ``IncrementalJSONParser``, calling
+    ``on_member(key, value)`` for each top-level member as it closes. Returns
+    the full text. Callback errors are logged and never abort the stream.
+    """
+    parser = IncrementalJSONParser()
+    async for chunk in chunks:
+        for key, value in parser.feed(chunk):
+            if on_member is None:
+                continue
+            try:
+                on_member(key, value)
+            except Exception as e:
+                print(f"⚠️ Streamed section handler failed for '{key}': {e}")
+    return parser.text
@@ -0,0 +1,207 @@
+"""
+On-disk cache of LLM section-generation responses.
+
+Exact hits are keyed by a hash of the normalized prompt plus the model that
+answered it. An optional similarity tier matches near-duplicate prompts
+(e.g. a regeneration with one feature reworded) using a local hashed
+character-trigram embedding, so no extra provider call is needed. Entries
+expire after a TTL and the store is bounded by size with LRU eviction.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_EMBED_DIM = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    prompt_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    embedding BLOB,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (prompt_hash, model)
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation or trailing-space changes still hit."""
+    return re.sub(r"\s+", " ", prompt or "").strip()
+
+
+def _embed(text: str) -> bytes:
+    """L2-normalized hashed trigram counts, packed as float32."""
+    vector = [0.0] * _EMBED_DIM
+    text = text.lower()
+    for i in range(len(text) - 2):
+        bucket = int.from_bytes(hashlib.md5(text[i:i + 3].encode("utf-8")).digest()[:4], "little") % _EMBED_DIM
+        vector[bucket] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return struct.pack(f"{_EMBED_DIM}f", *(v / norm for v in vector))
+
+
+def _cosine(a: bytes, b: bytes) -> float:
+    return sum(x * y for x, y in zip(struct.unpack(f"{_EMBED_DIM}f", a), struct.unpack(f"{_EMBED_DIM}f", b)))
+
+
+class LLMResponseCache:
+    """SQLite-backed LLM response cache with TTL, size bound and an optional similarity tier."""
+
+    def __init__(self, db_path: Path, max_bytes: int, ttl_sec: float, enabled: bool = True,
+                 semantic: bool = False, threshold: float = 0.97, semantic_scan: int = 500):
+        self.db_path = Path(db_path)
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_sec = ttl_sec
+        self.enabled = enabled and self.max_bytes > 0
+        self.semantic = semantic
+        self.threshold = threshold
+        self.semantic_scan = semantic_scan
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def prompt_hash(prompt: str) -> str:
+        return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, models: List[str]) -> Tuple[str, dict, str]:
+        """
+        Return ``(model, response, tier)`` for the most preferred cached model,
+        where tier is ``"exact"`` or ``"semantic"``; ``("", {}, "miss")`` otherwise.
+        """
+        if not self.enabled or not models:
+            return "", {}, "miss"
+        digest = self.prompt_hash(prompt)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_sec,))
+                marks = ",".join("?" * len(models))
+                rows = db.execute(
+                    f"SELECT model, response FROM responses WHERE prompt_hash = ? AND model IN ({marks})",
+                    (digest, *models),
+                ).fetchall()
+                if rows:
+                    model, response = min(rows, key=lambda r: models.index(r[0]))
+                    db.execute("UPDATE responses SET last_used = ? WHERE prompt_hash = ? AND model = ?", (now, digest, model))
+                    self.hits += 1
+                    return model, json.loads(response), "exact"
+                if self.semantic:
+                    match = self._nearest(db, prompt, models)
+                    if match:
+                        self.semantic_hits += 1
+                        return match[0], match[1], "semantic"
+            except (sqlite3.Error, ValueError) as e:
+                print(f"⚠️ LLM cache lookup failed: {e}")
+            self.misses += 1
+        return "", {}, "miss"
+
+    def _nearest(self, db: sqlite3.Connection, prompt: str, models: List[str]) -> Optional[Tuple[str, dict]]:
+        target = _embed(normalize_prompt(prompt))
+        marks = ",".join("?" * len(models))
+        rows = db.execute(
+            f"SELECT prompt_hash, model, response, embedding FROM responses"
+            f" WHERE model IN ({marks}) AND embedding IS NOT NULL ORDER BY last_used DESC LIMIT ?",
+            (*models, self.semantic_scan),
+        ).fetchall()
+        best = None
+        for digest, model, response, embedding in rows:
+            score = _cosine(target, embedding)
+            if score >= self.threshold and (best is None or score > best[0]):
+                best = (score, digest, model, response)
+        if best is None:
+            return None
+        db.execute("UPDATE responses SET last_used = ? WHERE prompt_hash = ? AND model = ?", (time.time(), best[1], best[2]))
+        return best[2], json.loads(best[3])
+
+    def store(self, prompt: str, model: str, response: dict):
+        if not self.enabled or not response:
+            return
+        payload = json.dumps(response)
+        embedding = _embed(normalize_prompt(prompt)) if self.semantic else None
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (prompt_hash, model, response, embedding, size, created_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.prompt_hash(prompt), model, payload, embedding, len(payload) + (len(embedding) if embedding else 0), now, now),
+                )
+                self.stores += 1
+                self._evict(db)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache store failed: {e}")
+
+    def invalidate(self, prompt: str):
+        """Drop every cached response to ``prompt`` (e.g. one that failed validation)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            try:
+                deleted = self._db().execute("DELETE FROM responses WHERE prompt_hash = ?", (self.prompt_hash(prompt),)).rowcount
+                self.invalidations += max(0, deleted)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache invalidate failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            row = db.execute("SELECT prompt_hash, model, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            db.execute("DELETE FROM responses WHERE prompt_hash = ? AND model = ?", (row[0], row[1]))
+            total -= row[2]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "semantic": self.semantic,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+LLM_RESPONSE_CACHE = LLMResponseCache(
+    db_path=Path(os.getenv("LLM_CACHE_PATH", "backend/beta/.cache/llm_responses.db")),
+    max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    ttl_sec=float(os.getenv("LLM_CACHE_TTL_SEC", str(7 * 24 * 3600))),
+    enabled=os.getenv("LLM_CACHE_ENABLED", "1") != "0",
+    semantic=os.getenv("LLM_CACHE_SEMANTIC", "0") == "1",
+    threshold=float(os.getenv("LLM_CACHE_SIMILARITY", "0.97")),
+)
@@ -0,0 +1,105 @@
+"""
+Per-model LLM latency tracking.
+
+Keeps a sliding window of recent call latencies for every model so the AI
+stage can derive hedge delays from observed p95 latency instead of fixed
+timeouts, plus the time from AI stage start to the first usable streamed
+requirements section (time-to-first-useful-section).
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+HEDGE_DEFAULT_DELAY_SEC = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SEC", "4"))
+HEDGE_MIN_DELAY_SEC = float(os.getenv("LLM_HEDGE_MIN_DELAY_SEC", "0.5"))
+HEDGE_MAX_DELAY_SEC = float(os.getenv("LLM_HEDGE_MAX_DELAY_SEC", "15"))
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+_MIN_SAMPLES = 5
+
+
+class LatencyHistogram:
+    """Sliding window of latencies (seconds) for one model."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, seconds: float, ok: bool):
+        self.samples.append(seconds)
+        if ok:
+            self.successes += 1
+        else:
+            self.failures += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class LLMLatencyTracker:
+    """Thread-safe registry of latency histograms plus hedging counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, LatencyHistogram] = {}
+        self.hedges_launched = 0
+        self.hedge_wins = 0
+        self.races = 0
+        self.first_section = LatencyHistogram()
+
+    def record(self, model: str, seconds: float, ok: bool):
+        with self._lock:
+            self._models.setdefault(model, LatencyHistogram()).record(seconds, ok)
+
+    def hedge_delay(self, model: str) -> float:
+        """Delay before launching a backup for ``model``: its p95, clamped, or the default until warmed up."""
+        with self._lock:
+            histogram = self._models.get(model)
+            p = histogram.percentile(HEDGE_PERCENTILE) if histogram and len(histogram.samples) >= _MIN_SAMPLES else None
+        if p is None:
+            return HEDGE_DEFAULT_DELAY_SEC
+        return max(HEDGE_MIN_DELAY_SEC, min(HEDGE_MAX_DELAY_SEC, p))
+
+    def record_race(self, hedges: int, winner_was_hedge: bool):
+        with self._lock:
+            self.races += 1
+            self.hedges_launched += hedges
+            if winner_was_hedge:
+                self.hedge_wins += 1
+
+    def record_first_section(self, seconds: float):
+        with self._lock:
+            self.first_section.record(seconds, ok=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = {
+                name: {
+                    "samples": len(h.samples),
+                    "successes": h.successes,
+                    "failures": h.failures,
+                    "p50_ms": round(h.percentile(50) * 1000) if h.samples else None,
+                    "p95_ms": round(h.percentile(95) * 1000) if h.samples else None,
+                }
+                for name, h in self._models.items()
+            }
+            return {
+                "races": self.races,
+                "hedges_launched": self.hedges_launched,
+                "hedge_wins": self.hedge_wins,
+                "models": models,
+                "time_to_first_useful_section": {
+                    "samples": len(self.first_section.samples),
+                    "p50_ms": round(self.first_section.percentile(50) * 1000) if self.first_section.samples else None,
+                    "p95_ms": round(self.first_section.percentile(95) * 1000) if self.first_section.samples else None,
+                },
+            }
+
+
+LLM_LATENCY = LLMLatencyTracker()
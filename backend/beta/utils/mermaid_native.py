@@ -0,0 +1,1280 @@
+"""
+In-process renderer for the Mermaid subset in ``mermaid_syntax``.
+
+Diagrams are parsed, laid out in Python and drawn from one list of
+primitives to SVG (always) and PNG (when Pillow is installed), so the
+deterministic SRS diagrams never need Node, Chromium or mermaid.ink.
+
+Flowcharts, state diagrams and ER diagrams use a layered (Sugiyama-style)
+layout: cycles are broken by reversing DFS back edges, nodes are ranked by
+longest path, long edges get dummy nodes, layer order is improved with
+barycenter sweeps, and positions are balanced against their neighbours
+with an exact least-squares placement that keeps the minimum spacing.
+Subgraphs are laid out recursively and placed as single blocks in their
+parent. Sequence diagrams use a column/row layout.
+"""
+
+import json
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from backend.beta.utils.mermaid_syntax import MermaidSyntaxError, parse_mermaid
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Optional: without Pillow only SVG can be produced natively.
+    Image = ImageDraw = ImageFont = None
+
+# Bump when output changes so cached renders are not reused.
+NATIVE_RENDERER_VERSION = "1"
+NATIVE_PNG_AVAILABLE = Image is not None
+
+FONT_FAMILY = "Arial, Helvetica, sans-serif"
+FONT_SIZE = 16
+SMALL_FONT_SIZE = 14
+LINE_HEIGHT = 1.25
+
+# Helvetica/Arial advance widths (1/1000 em) for ASCII 32..126.
+_CHAR_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+
+_DEFAULT_THEME = {
+    "primaryColor": "#ECECFF",
+    "primaryTextColor": "#333333",
+    "primaryBorderColor": "#9370DB",
+    "lineColor": "#333333",
+    "secondaryColor": "#FFFFDE",
+    "secondaryTextColor": "#333333",
+    "tertiaryColor": "#FEF3C7",
+    "tertiaryTextColor": "#333333",
+    "background": "#FFFFFF",
+    "clusterBkg": "#FFFFDE",
+    "clusterBorder": "#AAAA33",
+}
+_THEMES: Dict[Tuple[str, float], dict] = {}
+_THEMES_LOCK = threading.Lock()
+
+
+class NativeRenderUnsupported(ValueError):
+    """The diagram is valid Mermaid but uses features outside the native subset."""
+
+
+def text_width(text: str, size: float = FONT_SIZE) -> float:
+    total = 0
+    for ch in text:
+        code = ord(ch)
+        if 32 <= code <= 126:
+            total += _CHAR_WIDTHS[code - 32]
+        else:
+            total += 1000 if code >= 0x2E80 else 556
+    return total * size / 1000.0
+
+
+def _text_block(text: str, size: float = FONT_SIZE) -> Tuple[List[str], float, float]:
+    lines = (text or "").split("\n")
+    return lines, max(text_width(line, size) for line in lines), len(lines) * size * LINE_HEIGHT
+
+
+def load_theme(config_path: Optional[Path]) -> dict:
+    """Mermaid ``themeVariables`` from the shared config file, over neutral defaults."""
+    if not config_path:
+        return dict(_DEFAULT_THEME)
+    path = Path(config_path)
+    try:
+        stamp = path.stat().st_mtime
+    except OSError:
+        return dict(_DEFAULT_THEME)
+    with _THEMES_LOCK:
+        theme = _THEMES.get((str(path), stamp))
+        if theme is None:
+            theme = dict(_DEFAULT_THEME)
+            try:
+                theme.update(json.loads(path.read_text(encoding="utf-8")).get("themeVariables") or {})
+            except (OSError, ValueError):
+                pass
+            _THEMES[(str(path), stamp)] = theme
+    return theme
+
+
+def _color(value: Optional[str], default: str) -> str:
+    value = (value or "").strip()
+    if re.fullmatch(r"#[0-9a-fA-F]{3}|#[0-9a-fA-F]{6}|[a-zA-Z]+", value):
+        return value
+    return "none" if value.lower() in ("#none", "none", "transparent") else default
+
+
+def _px(value: Optional[str], default: float) -> float:
+    match = re.match(r"^\s*([\d.]+)", value or "")
+    return float(match.group(1)) if match else default
+
+
+# --- Layered layout ---
+
+def _pava(desired: List[float], gaps: List[float]) -> List[float]:
+    """
+    Positions closest (least squares) to ``desired`` that keep consecutive
+    items at least ``gaps[i]`` apart (pool-adjacent-violators on shifted values).
+    """
+    offsets = [0.0]
+    for gap in gaps:
+        offsets.append(offsets[-1] + gap)
+    shifted = [d - o for d, o in zip(desired, offsets)]
+    blocks: List[List[float]] = []  # [mean, weight, count]
+    for value in shifted:
+        blocks.append([value, 1.0, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean2, w2, n2 = blocks.pop()
+            mean1, w1, n1 = blocks.pop()
+            blocks.append([(mean1 * w1 + mean2 * w2) / (w1 + w2), w1 + w2, n1 + n2])
+    result = []
+    for mean, _, count in blocks:
+        result.extend([mean] * count)
+    return [r + o for r, o in zip(result, offsets)]
+
+
+def _crossings(layers: List[List[str]], down: Dict[str, List[str]]) -> int:
+    total = 0
+    for upper, lower in zip(layers, layers[1:]):
+        position = {n: i for i, n in enumerate(lower)}
+        pairs = sorted((i, position[t]) for i, n in enumerate(upper) for t in down.get(n, ()) if t in position)
+        for a in range(len(pairs)):
+            for b in range(a + 1, len(pairs)):
+                if pairs[a][0] < pairs[b][0] and pairs[a][1] > pairs[b][1]:
+                    total += 1
+    return total
+
+
+def layered_layout(sizes: Dict[str, Tuple[float, float]], edges: List[Tuple[str, str]],
+                   direction: str = "TB", node_sep: float = 40, rank_sep: float = 50,
+                   label_sizes: Optional[Dict[int, Tuple[float, float]]] = None) -> dict:
+    """
+    Lay out ``sizes`` (id -> (width, height)) and ``edges`` in layers along
+    ``direction``. Returns ``centers`` (id -> (x, y)), ``routes`` (edge index
+    -> points from the source to the target centre, or None for self loops),
+    ``labels`` (edge index -> label centre), ``width`` and ``height``.
+    """
+    label_sizes = label_sizes or {}
+    horizontal = direction in ("LR", "RL")
+    # Work top-to-bottom: breadth runs along a layer, depth across layers.
+    dims = {n: ((h, w) if horizontal else (w, h)) for n, (w, h) in sizes.items()}
+    order = list(sizes)
+
+    # 1. Break cycles by reversing DFS back edges.
+    out_edges: Dict[str, List[Tuple[str, int]]] = {n: [] for n in order}
+    for i, (a, b) in enumerate(edges):
+        if a != b:
+            out_edges[a].append((b, i))
+    reversed_edges = set()
+    state: Dict[str, int] = {}
+    # Sources first, then nodes in the order they start edges, so the first
+    # edge written keeps its direction when a cycle has to be broken.
+    has_in = {b for a, b in edges if a != b}
+    roots = [n for n in order if n not in has_in] + [a for a, _ in edges] + order
+    for root in dict.fromkeys(roots):
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(out_edges[root]))]
+        while stack:
+            node, successors = stack[-1]
+            advanced = False
+            for target, i in successors:
+                if state.get(target) == 1:
+                    reversed_edges.add(i)
+                elif target not in state:
+                    state[target] = 1
+                    stack.append((target, iter(out_edges[target])))
+                    advanced = True
+                    break
+            if not advanced:
+                state[node] = 2
+                stack.pop()
+    dag = {}
+    for i, (a, b) in enumerate(edges):
+        if a != b:
+            dag[i] = (b, a) if i in reversed_edges else (a, b)
+
+    # 2. Rank by longest path from the sources. Ranks are doubled so every
+    #    edge has a middle layer where its label can take up space.
+    preds: Dict[str, List[str]] = {n: [] for n in order}
+    for a, b in dag.values():
+        preds[b].append(a)
+    rank: Dict[str, int] = {}
+
+    def rank_of(node: str) -> int:
+        pending = [node]
+        while pending:
+            current = pending[-1]
+            missing = [p for p in preds[current] if p not in rank]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            rank[current] = max((rank[p] + 2 for p in preds[current]), default=0)
+        return rank[node]
+
+    for node in order:
+        rank_of(node)
+
+    # 3. Split edges with dummy nodes; a labelled edge's middle dummy is its label.
+    chains: Dict[int, List[str]] = {}
+    label_node: Dict[int, str] = {}
+    breadth = {n: dims[n][0] for n in order}
+    depth = {n: dims[n][1] for n in order}
+    virtual = set()
+    for i, (a, b) in dag.items():
+        chain = [a]
+        label_rank = rank[a] + 1 + 2 * ((rank[b] - rank[a] - 2) // 4)
+        for r in range(rank[a] + 1, rank[b]):
+            dummy = f"\0{i}:{r}"
+            rank[dummy] = r
+            if r == label_rank and i in label_sizes:
+                w, h = label_sizes[i]
+                breadth[dummy], depth[dummy] = (h, w) if horizontal else (w, h)
+                label_node[i] = dummy
+            else:
+                breadth[dummy] = depth[dummy] = 0.0
+                virtual.add(dummy)
+            chain.append(dummy)
+        chain.append(b)
+        chains[i] = chain
+    down: Dict[str, List[str]] = {}
+    up: Dict[str, List[str]] = {}
+    for chain in chains.values():
+        for a, b in zip(chain, chain[1:]):
+            down.setdefault(a, []).append(b)
+            up.setdefault(b, []).append(a)
+
+    # 4. Order layers: declaration order, then barycenter sweeps keeping the best.
+    layer_count = max(rank.values(), default=-1) + 1
+    layers: List[List[str]] = [[] for _ in range(layer_count)]
+    seen = set()
+    for node in order + [n for chain in chains.values() for n in chain[1:-1]]:
+        if node not in seen:
+            seen.add(node)
+            layers[rank[node]].append(node)
+    best = [list(layer) for layer in layers]
+    best_crossings = _crossings(layers, down)
+    for sweep in range(8):
+        downward = sweep % 2 == 0
+        indices = range(1, layer_count) if downward else range(layer_count - 2, -1, -1)
+        for li in indices:
+            ref = layers[li - 1] if downward else layers[li + 1]
+            position = {n: p for p, n in enumerate(ref)}
+            neighbours = up if downward else down
+            current = {n: p for p, n in enumerate(layers[li])}
+
+            def barycenter(n, position=position, neighbours=neighbours, current=current):
+                linked = [position[m] for m in neighbours.get(n, ()) if m in position]
+                return sum(linked) / len(linked) if linked else current[n]
+
+            layers[li].sort(key=lambda n: (barycenter(n), current[n]))
+        crossings = _crossings(layers, down)
+        if crossings < best_crossings:
+            best, best_crossings = [list(layer) for layer in layers], crossings
+    layers = best
+
+    # 5. Depth coordinates.
+    layer_depth = [max((depth[n] for n in layer), default=0.0) for layer in layers]
+    layer_top = []
+    cursor = 0.0
+    for li in range(layer_count):
+        layer_top.append(cursor)
+        cursor += layer_depth[li] + (rank_sep / 2 if li < layer_count - 1 else 0.0)
+    total_depth = cursor
+
+    # 6. Breadth coordinates: pull towards neighbours, keep spacing.
+    x: Dict[str, float] = {}
+    for layer in layers:
+        cursor = 0.0
+        for n in layer:
+            x[n] = cursor + breadth[n] / 2
+            cursor += breadth[n] + node_sep
+
+    def gaps_for(layer):
+        return [(breadth[a] + breadth[b]) / 2 + (node_sep / 2 if a in virtual or b in virtual else node_sep)
+                for a, b in zip(layer, layer[1:])]
+
+    for sweep in range(6):
+        for li in (range(layer_count) if sweep % 2 == 0 else range(layer_count - 1, -1, -1)):
+            layer = layers[li]
+            desired = []
+            for n in layer:
+                linked = [x[m] for m in up.get(n, []) + down.get(n, [])]
+                desired.append(sum(linked) / len(linked) if linked else x[n])
+            for n, value in zip(layer, _pava(desired, gaps_for(layer))):
+                x[n] = value
+    lefts = [x[n] - breadth[n] / 2 for n in x]
+    rights = [x[n] + breadth[n] / 2 for n in x]
+    shift = -min(lefts, default=0.0)
+    total_breadth = max(rights, default=0.0) + shift
+    for n in x:
+        x[n] += shift
+    y = {n: layer_top[rank[n]] + layer_depth[rank[n]] / 2 for n in x}
+
+    def to_xy(b: float, d: float) -> Tuple[float, float]:
+        if direction in ("BT", "RL"):
+            d = total_depth - d
+        return (d, b) if horizontal else (b, d)
+
+    centers = {n: to_xy(x[n], y[n]) for n in order}
+    routes: Dict[int, Optional[List[Tuple[float, float]]]] = {}
+    labels: Dict[int, Tuple[float, float]] = {}
+    for i, (a, b) in enumerate(edges):
+        if a == b:
+            routes[i] = None
+            continue
+        chain = chains[i]
+        points = [to_xy(x[n], y[n]) for n in chain]
+        if i in label_node:
+            labels[i] = to_xy(x[label_node[i]], y[label_node[i]])
+        if i in reversed_edges:
+            points.reverse()
+        routes[i] = points
+    width, height = (total_depth, total_breadth) if horizontal else (total_breadth, total_depth)
+    return {"centers": centers, "routes": routes, "labels": labels, "width": width, "height": height,
+            "reversed": reversed_edges}
+
+
+# --- Scene helpers ---
+
+def _port(center: Tuple[float, float], size: Tuple[float, float], direction: str, outgoing: bool,
+          offset: float = 0.0) -> Tuple[float, float]:
+    """Point on the box edge facing the flow (source) or against it (target)."""
+    cx, cy = center
+    w, h = size
+    forward = {"TB": (0, 1), "BT": (0, -1), "LR": (1, 0), "RL": (-1, 0)}[direction]
+    dx, dy = forward if outgoing else (-forward[0], -forward[1])
+    if dx:
+        return cx + dx * w / 2, cy + offset
+    return cx + offset, cy + dy * h / 2
+
+
+def _attach(routes: List[dict], center: Dict[str, Tuple[float, float]], size: Dict[str, Tuple[float, float]],
+            pointed: Tuple[str, ...] = ()) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    """
+    End points for ``routes`` (dicts with src, dst, interior points, direction
+    and reversed), spread across each node face in the order the edges head
+    off so they do not converge on one point. Nodes in ``pointed`` (diamonds,
+    circles) keep every edge on the tip.
+    """
+    faces: Dict[Tuple[str, bool, str], List[Tuple[float, int, bool]]] = {}
+    for k, route in enumerate(routes):
+        axis = 1 if route["direction"] in ("LR", "RL") else 0
+        for is_src in (True, False):
+            node, other = (route["src"], route["dst"]) if is_src else (route["dst"], route["src"])
+            if route["points"]:
+                toward = route["points"][0] if is_src else route["points"][-1]
+            else:
+                toward = center[other]
+            forward_face = is_src != route["reversed"]
+            faces.setdefault((node, forward_face, route["direction"]), []).append((toward[axis], k, is_src))
+    offsets: Dict[Tuple[int, bool], float] = {}
+    for (node, _, direction), ends in faces.items():
+        face = size[node][1] if direction in ("LR", "RL") else size[node][0]
+        ends.sort()
+        count = len(ends)
+        step = min(16.0, face * 0.6 / (count - 1)) if count > 1 and node not in pointed else 0.0
+        for j, (_, k, is_src) in enumerate(ends):
+            offsets[(k, is_src)] = (j - (count - 1) / 2) * step
+    ends = []
+    for k, route in enumerate(routes):
+        ends.append((
+            _port(center[route["src"]], size[route["src"]], route["direction"], not route["reversed"], offsets[(k, True)]),
+            _port(center[route["dst"]], size[route["dst"]], route["direction"], route["reversed"], offsets[(k, False)]),
+        ))
+    return ends
+
+
+def _pair_offsets(pairs: List[Tuple[str, str]], step: float = 16.0) -> List[float]:
+    """Sideways offsets that separate edges joining the same two nodes."""
+    count: Dict[frozenset, int] = {}
+    for pair in pairs:
+        count[frozenset(pair)] = count.get(frozenset(pair), 0) + 1
+    seen: Dict[frozenset, int] = {}
+    offsets = []
+    for pair in pairs:
+        key = frozenset(pair)
+        index = seen.get(key, 0)
+        seen[key] = index + 1
+        offsets.append((index - (count[key] - 1) / 2) * step)
+    return offsets
+
+
+def _shifted(point: Tuple[float, float], dx: float, dy: float, offset: float, direction: str) -> Tuple[float, float]:
+    """``point`` moved by (dx, dy) and by ``offset`` across the flow."""
+    if direction in ("LR", "RL"):
+        return point[0] + dx, point[1] + dy + offset
+    return point[0] + dx + offset, point[1] + dy
+
+
+def _flow_curve(points: List[Tuple[float, float]], direction: str, samples: int = 12) -> List[Tuple[float, float]]:
+    """
+    Smooth curve through ``points`` (Catmull-Rom) that leaves the first and
+    enters the last point along the flow axis.
+    """
+    forward = {"TB": (0, 1), "BT": (0, -1), "LR": (1, 0), "RL": (-1, 0)}[direction]
+    count = len(points)
+    tangents = []
+    for k, (px, py) in enumerate(points):
+        if k in (0, count - 1):
+            other = points[1] if k == 0 else points[-2]
+            reach = abs((other[0] - px) * forward[0] + (other[1] - py) * forward[1])
+            tangents.append((forward[0] * reach, forward[1] * reach))
+        else:
+            tangents.append(((points[k + 1][0] - points[k - 1][0]) / 2, (points[k + 1][1] - points[k - 1][1]) / 2))
+    curve = [points[0]]
+    for k in range(count - 1):
+        (ax, ay), (bx, by) = points[k], points[k + 1]
+        c1 = (ax + tangents[k][0] / 3 * (2 if k == 0 else 1), ay + tangents[k][1] / 3 * (2 if k == 0 else 1))
+        last = k + 1 == count - 1
+        c2 = (bx - tangents[k + 1][0] / 3 * (2 if last else 1), by - tangents[k + 1][1] / 3 * (2 if last else 1))
+        for step in range(1, samples + 1):
+            t = step / samples
+            u = 1 - t
+            curve.append((
+                u ** 3 * ax + 3 * u * u * t * c1[0] + 3 * u * t * t * c2[0] + t ** 3 * bx,
+                u ** 3 * ay + 3 * u * u * t * c1[1] + 3 * u * t * t * c2[1] + t ** 3 * by,
+            ))
+    return curve
+
+
+def _unit(a: Tuple[float, float], b: Tuple[float, float]) -> Tuple[float, float]:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = math.hypot(dx, dy) or 1.0
+    return dx / length, dy / length
+
+
+def _arrow_head(tip: Tuple[float, float], towards: Tuple[float, float], color: str, size: float = 9.0) -> dict:
+    ux, uy = towards
+    bx, by = tip[0] - ux * size, tip[1] - uy * size
+    return {"op": "poly", "points": [tip, (bx - uy * size / 2, by + ux * size / 2), (bx + uy * size / 2, by - ux * size / 2)],
+            "fill": color, "stroke": color, "sw": 1}
+
+
+def _end_marker(kind: str, tip: Tuple[float, float], towards: Tuple[float, float], color: str) -> List[dict]:
+    if kind == ">":
+        return [_arrow_head(tip, towards, color)]
+    if kind == "o":
+        return [{"op": "ellipse", "cx": tip[0] - towards[0] * 5, "cy": tip[1] - towards[1] * 5, "rx": 5, "ry": 5,
+                 "fill": "#FFFFFF", "stroke": color, "sw": 1.5}]
+    if kind == "x":
+        cx, cy = tip[0] - towards[0] * 6, tip[1] - towards[1] * 6
+        return [{"op": "line", "points": [(cx - 5, cy - 5), (cx + 5, cy + 5)], "stroke": color, "sw": 2},
+                {"op": "line", "points": [(cx - 5, cy + 5), (cx + 5, cy - 5)], "stroke": color, "sw": 2}]
+    return []
+
+
+def _trim(curve: List[Tuple[float, float]], start: float, end: float) -> List[Tuple[float, float]]:
+    """Shorten a polyline so markers sit on its ends instead of overlapping the stroke."""
+    if len(curve) < 2:
+        return curve
+    curve = list(curve)
+    if start:
+        ux, uy = _unit(curve[0], curve[1])
+        curve[0] = (curve[0][0] + ux * start, curve[0][1] + uy * start)
+    if end:
+        ux, uy = _unit(curve[-2], curve[-1])
+        curve[-1] = (curve[-1][0] - ux * end, curve[-1][1] - uy * end)
+    return curve
+
+
+def _label_box(center: Tuple[float, float], text: str, size: float, color: str, background: str) -> List[dict]:
+    lines, w, h = _text_block(text, size)
+    return [
+        {"op": "rect", "x": center[0] - w / 2 - 4, "y": center[1] - h / 2 - 2, "w": w + 8, "h": h + 4, "rx": 2,
+         "fill": background, "stroke": "none", "sw": 0},
+        {"op": "text", "x": center[0], "y": center[1], "lines": lines, "size": size, "color": color,
+         "anchor": "middle", "max_w": w + 8},
+    ]
+
+
+def _dash(style: Optional[str]) -> Optional[List[float]]:
+    if not style:
+        return None
+    values = [float(v) for v in re.findall(r"[\d.]+", style)]
+    return values or None
+
+
+# --- Flowchart ---
+
+_PAD_X, _PAD_Y = 16, 12
+_CLUSTER_PAD = 16
+
+
+def _shape_size(shape: str, w: float, h: float) -> Tuple[float, float]:
+    if shape == "diamond":
+        side = max(w + h, 60)
+        return side, side * 0.75
+    if shape == "circle":
+        d = max(w, h) + 8
+        return d, d
+    if shape == "hexagon":
+        return w + h / 2 + 8, h
+    if shape == "cylinder":
+        return w, h + 16
+    if shape == "stadium":
+        return w + h / 2, h
+    return w, h
+
+
+def _node_shapes(shape: str, cx: float, cy: float, w: float, h: float, fill: str, stroke: str, sw: float,
+                 dash: Optional[List[float]]) -> List[dict]:
+    x0, y0 = cx - w / 2, cy - h / 2
+    common = {"fill": fill, "stroke": stroke, "sw": sw, "dash": dash}
+    if shape == "diamond":
+        return [{"op": "poly", "points": [(cx, y0), (x0 + w, cy), (cx, y0 + h), (x0, cy)], **common}]
+    if shape == "circle":
+        return [{"op": "ellipse", "cx": cx, "cy": cy, "rx": w / 2, "ry": h / 2, **common}]
+    if shape == "hexagon":
+        inset = h / 4
+        return [{"op": "poly", "points": [(x0 + inset, y0), (x0 + w - inset, y0), (x0 + w, cy),
+                                          (x0 + w - inset, y0 + h), (x0 + inset, y0 + h), (x0, cy)], **common}]
+    if shape == "cylinder":
+        ry = 8
+        return [
+            {"op": "ellipse", "cx": cx, "cy": y0 + h - ry, "rx": w / 2, "ry": ry, **common},
+            {"op": "rect", "x": x0, "y": y0 + ry, "w": w, "h": h - 2 * ry, "rx": 0, "fill": fill, "stroke": "none", "sw": 0},
+            {"op": "line", "points": [(x0, y0 + ry), (x0, y0 + h - ry)], "stroke": stroke, "sw": sw},
+            {"op": "line", "points": [(x0 + w, y0 + ry), (x0 + w, y0 + h - ry)], "stroke": stroke, "sw": sw},
+            {"op": "ellipse", "cx": cx, "cy": y0 + ry, "rx": w / 2, "ry": ry, **common},
+        ]
+    rx = {"round": 5, "stadium": h / 2}.get(shape, 0)
+    prims = [{"op": "rect", "x": x0, "y": y0, "w": w, "h": h, "rx": rx, **common}]
+    if shape == "subroutine":
+        prims += [{"op": "line", "points": [(x0 + 8, y0), (x0 + 8, y0 + h)], "stroke": stroke, "sw": sw},
+                  {"op": "line", "points": [(x0 + w - 8, y0), (x0 + w - 8, y0 + h)], "stroke": stroke, "sw": sw}]
+    return prims
+
+
+class _FlowchartBuilder:
+    """Recursive compound layout of a flowchart model."""
+
+    def __init__(self, model: dict, theme: dict):
+        self.model = model
+        self.theme = theme
+        self.parent: Dict[str, Optional[str]] = {}
+        for container, members in model["children"].items():
+            for member in members:
+                self.parent[member] = container
+        for node in model["nodes"]:
+            self.parent.setdefault(node, None)
+        for sub_id, sub in model["subgraphs"].items():
+            self.parent[sub_id] = sub["parent"]
+        self.size: Dict[str, Tuple[float, float]] = {}
+        self.layouts: Dict[Optional[str], dict] = {}
+        self.title: Dict[str, Tuple[List[str], float]] = {}
+        self.center: Dict[str, Tuple[float, float]] = {}
+        self.edge_owner: Dict[int, Tuple[Optional[str], int]] = {}
+
+    def _direction(self, container: Optional[str]) -> str:
+        while container is not None:
+            own = self.model["subgraphs"][container]["direction"]
+            if own:
+                return own
+            container = self.model["subgraphs"][container]["parent"]
+        return self.model["direction"]
+
+    def _ancestors(self, item: str) -> List[Optional[str]]:
+        chain, current = [], self.parent.get(item)
+        while True:
+            chain.append(current)
+            if current is None:
+                return chain
+            current = self.parent.get(current)
+
+    def _lift(self, item: str, container: Optional[str]) -> Optional[str]:
+        """The member of ``container`` that is ``item`` or contains it."""
+        current = item
+        while current is not None and self.parent.get(current) != container:
+            current = self.parent.get(current)
+        return current
+
+    def _measure_node(self, node_id: str):
+        node = self.model["nodes"][node_id]
+        _, w, h = _text_block(node["label"])
+        self.size[node_id] = _shape_size(node["shape"], w + 2 * _PAD_X, h + 2 * _PAD_Y)
+
+    def _layout(self, container: Optional[str]):
+        members = self.model["children"].get(container, [])
+        for member in members:
+            if member in self.model["subgraphs"]:
+                self._layout(member)
+            else:
+                self._measure_node(member)
+        local_edges, label_sizes = [], {}
+        for i, edge in enumerate(self.model["edges"]):
+            if edge["src"] not in self.parent or edge["dst"] not in self.parent:
+                continue
+            src_anc, dst_anc = self._ancestors(edge["src"]), self._ancestors(edge["dst"])
+            shared = next((c for c in src_anc if c in dst_anc), None)
+            if shared != container:
+                continue
+            a, b = self._lift(edge["src"], container), self._lift(edge["dst"], container)
+            if a is None or b is None:
+                continue
+            self.edge_owner[i] = (container, len(local_edges))
+            if edge["label"]:
+                _, lw, lh = _text_block(edge["label"], SMALL_FONT_SIZE)
+                label_sizes[len(local_edges)] = (lw + 8, lh + 4)
+            local_edges.append((a, b))
+        direction = self._direction(container)
+        layout = layered_layout({m: self.size[m] for m in members}, local_edges, direction,
+                                node_sep=40, rank_sep=50, label_sizes=label_sizes)
+        layout["direction"] = direction
+        self.layouts[container] = layout
+        if container is not None:
+            lines, tw, th = _text_block(self.model["subgraphs"][container]["label"])
+            self.title[container] = (lines, th)
+            width = max(layout["width"], tw) + 2 * _CLUSTER_PAD
+            height = layout["height"] + th + 2 * _CLUSTER_PAD + 4
+            self.size[container] = (width, height)
+
+    def _place(self, container: Optional[str], origin: Tuple[float, float]):
+        layout = self.layouts[container]
+        inner_w = layout["width"]
+        if container is None:
+            ox, oy = origin
+        else:
+            w, _ = self.size[container]
+            ox = origin[0] + (w - inner_w) / 2
+            oy = origin[1] + _CLUSTER_PAD + self.title[container][1] + 4
+        layout["origin"] = (ox, oy)
+        for member, (cx, cy) in layout["centers"].items():
+            self.center[member] = (ox + cx, oy + cy)
+            if member in self.model["subgraphs"]:
+                w, h = self.size[member]
+                self._place(member, (ox + cx - w / 2, oy + cy - h / 2))
+
+    def build(self) -> Tuple[List[dict], float, float]:
+        self._layout(None)
+        margin = 8
+        self._place(None, (margin, margin))
+        root = self.layouts[None]
+        theme, styles = self.theme, self.model["styles"]
+        scene: List[dict] = []
+        # Clusters, outermost first.
+        for sub_id in self.model["subgraphs"]:
+            if sub_id not in self.center:
+                continue
+            style = styles.get(sub_id, {})
+            (cx, cy), (w, h) = self.center[sub_id], self.size[sub_id]
+            scene.append({"op": "rect", "x": cx - w / 2, "y": cy - h / 2, "w": w, "h": h, "rx": 0,
+                          "fill": _color(style.get("fill"), theme["clusterBkg"]),
+                          "stroke": _color(style.get("stroke"), theme["clusterBorder"]),
+                          "sw": _px(style.get("stroke-width"), 1), "dash": _dash(style.get("stroke-dasharray"))})
+            lines, th = self.title[sub_id]
+            scene.append({"op": "text", "x": cx, "y": cy - h / 2 + _CLUSTER_PAD / 2 + th / 2 + 2, "lines": lines,
+                          "size": FONT_SIZE, "color": _color(style.get("color"), theme["primaryTextColor"]),
+                          "anchor": "middle", "max_w": w})
+        # Edges: spread across node faces, parallel edges kept apart.
+        line_color = theme["lineColor"]
+        owned = [(i, container, local) for i, (container, local) in self.edge_owner.items()
+                 if self.layouts[container]["routes"][local] is not None]
+        offsets = _pair_offsets([(self.model["edges"][i]["src"], self.model["edges"][i]["dst"]) for i, _, _ in owned])
+        routes = []
+        for (i, container, local), offset in zip(owned, offsets):
+            edge, layout = self.model["edges"][i], self.layouts[container]
+            ox, oy = layout["origin"]
+            routes.append({
+                "src": edge["src"], "dst": edge["dst"], "direction": layout["direction"],
+                "reversed": local in layout["reversed"],
+                "points": [_shifted(p, ox, oy, offset, layout["direction"]) for p in layout["routes"][local][1:-1]],
+            })
+        pointed = tuple(n for n, node in self.model["nodes"].items() if node["shape"] in ("diamond", "circle"))
+        labels = []
+        for (i, container, local), offset, route, (start, end) in zip(
+                owned, offsets, routes, _attach(routes, self.center, self.size, pointed)):
+            edge, layout = self.model["edges"][i], self.layouts[container]
+            curve = _flow_curve([start] + route["points"] + [end], route["direction"])
+            width = {"thick": 3.5, "dotted": 2}.get(edge["style"], 2)
+            dash = [3, 3] if edge["style"] == "dotted" else None
+            curve = _trim(curve, 4 if edge["start"] else 0, 4 if edge["end"] else 0)
+            scene.append({"op": "line", "points": curve, "stroke": line_color, "sw": width, "dash": dash})
+            scene.extend(_end_marker(edge["end"], end, _unit(curve[-2], end), line_color))
+            if edge["start"]:
+                marker = ">" if edge["start"] == "<" else edge["start"]
+                scene.extend(_end_marker(marker, start, _unit(curve[1], start), line_color))
+            if edge["label"] and local in layout["labels"]:
+                ox, oy = layout["origin"]
+                labels.append((_shifted(layout["labels"][local], ox, oy, offset, route["direction"]), edge["label"]))
+        # Nodes over edges, labels on top.
+        for node_id, node in self.model["nodes"].items():
+            if node_id not in self.center:
+                continue
+            style = styles.get(node_id, {})
+            (cx, cy), (w, h) = self.center[node_id], self.size[node_id]
+            scene.extend(_node_shapes(node["shape"], cx, cy, w, h,
+                                      _color(style.get("fill"), theme["primaryColor"]),
+                                      _color(style.get("stroke"), theme["primaryBorderColor"]),
+                                      _px(style.get("stroke-width"), 1.5), _dash(style.get("stroke-dasharray"))))
+            lines, tw, _ = _text_block(node["label"])
+            scene.append({"op": "text", "x": cx, "y": cy, "lines": lines, "size": FONT_SIZE,
+                          "color": _color(style.get("color"), theme["primaryTextColor"]), "anchor": "middle",
+                          "max_w": w - 8})
+        for center, text in labels:
+            scene.extend(_label_box(center, text, SMALL_FONT_SIZE, theme["primaryTextColor"], theme["background"]))
+        return scene, root["width"] + 2 * margin, root["height"] + 2 * margin
+
+
+# --- State diagram ---
+
+def _build_state(model: dict, theme: dict) -> Tuple[List[dict], float, float]:
+    sizes = {}
+    for state_id, state in model["states"].items():
+        if state["kind"] in ("start", "end"):
+            sizes[state_id] = (16, 16)
+        else:
+            _, w, h = _text_block(state["label"])
+            sizes[state_id] = (max(w + 2 * _PAD_X, 60), h + 2 * _PAD_Y)
+    edges, label_sizes = [], {}
+    for i, transition in enumerate(model["transitions"]):
+        edges.append((transition["src"], transition["dst"]))
+        if transition["label"]:
+            _, lw, lh = _text_block(transition["label"], SMALL_FONT_SIZE)
+            label_sizes[i] = (lw + 8, lh + 4)
+    direction = model["direction"]
+    layout = layered_layout(sizes, edges, direction, node_sep=50, rank_sep=40, label_sizes=label_sizes)
+    margin = 8
+    center = {k: (x + margin, y + margin) for k, (x, y) in layout["centers"].items()}
+    scene, labels = [], []
+    color = theme["lineColor"]
+    drawn = [i for i in range(len(edges)) if layout["routes"][i] is not None]
+    offsets = _pair_offsets([edges[i] for i in drawn], 14)
+    routes = [{"src": edges[i][0], "dst": edges[i][1], "direction": direction, "reversed": i in layout["reversed"],
+               "points": [_shifted(p, margin, margin, offset, direction) for p in layout["routes"][i][1:-1]]}
+              for i, offset in zip(drawn, offsets)]
+    pointed = tuple(k for k, state in model["states"].items() if state["kind"] in ("start", "end"))
+    for i, offset, route, (start, end) in zip(drawn, offsets, routes, _attach(routes, center, sizes, pointed)):
+        curve = _trim(_flow_curve([start] + route["points"] + [end], direction), 0, 4)
+        scene.append({"op": "line", "points": curve, "stroke": color, "sw": 1.5})
+        scene.append(_arrow_head(end, _unit(curve[-2], end), color))
+        if i in layout["labels"]:
+            labels.append((_shifted(layout["labels"][i], margin, margin, offset, direction),
+                           model["transitions"][i]["label"]))
+    for state_id, state in model["states"].items():
+        cx, cy = center[state_id]
+        w, h = sizes[state_id]
+        if state["kind"] == "start":
+            scene.append({"op": "ellipse", "cx": cx, "cy": cy, "rx": 7, "ry": 7, "fill": color, "stroke": color, "sw": 1})
+        elif state["kind"] == "end":
+            scene.append({"op": "ellipse", "cx": cx, "cy": cy, "rx": 7, "ry": 7, "fill": theme["background"],
+                          "stroke": color, "sw": 1.5})
+            scene.append({"op": "ellipse", "cx": cx, "cy": cy, "rx": 4, "ry": 4, "fill": color, "stroke": color, "sw": 1})
+        else:
+            scene.append({"op": "rect", "x": cx - w / 2, "y": cy - h / 2, "w": w, "h": h, "rx": 6,
+                          "fill": theme["primaryColor"], "stroke": theme["primaryBorderColor"], "sw": 1.5})
+            lines, _, _ = _text_block(state["label"])
+            scene.append({"op": "text", "x": cx, "y": cy, "lines": lines, "size": FONT_SIZE,
+                          "color": theme["primaryTextColor"], "anchor": "middle", "max_w": w - 8})
+    for point, text in labels:
+        scene.extend(_label_box(point, text, SMALL_FONT_SIZE, theme["primaryTextColor"], theme["background"]))
+    return scene, layout["width"] + 2 * margin, layout["height"] + 2 * margin
+
+
+# --- ER diagram ---
+
+_ER_ROW = 24
+_ER_HEADER = 30
+
+
+def _er_marker(card: str, tip: Tuple[float, float], outward: Tuple[float, float], color: str) -> List[dict]:
+    """Crow's-foot notation for one relationship end; ``outward`` points from the entity along the edge."""
+    ux, uy = outward
+    px, py = -uy, ux
+
+    def at(dist: float, side: float = 0.0) -> Tuple[float, float]:
+        return tip[0] + ux * dist + px * side, tip[1] + uy * dist + py * side
+
+    def bar(dist: float) -> dict:
+        return {"op": "line", "points": [at(dist, -7), at(dist, 7)], "stroke": color, "sw": 1.5}
+
+    prims = []
+    many = card in ("}o", "}|", "o{", "|{")
+    optional = "o" in card
+    if many:
+        prims += [{"op": "line", "points": [at(0, -8), at(12)], "stroke": color, "sw": 1.5},
+                  {"op": "line", "points": [at(0, 8), at(12)], "stroke": color, "sw": 1.5}]
+    else:
+        prims.append(bar(8))
+    if optional:
+        cx, cy = at(20)
+        prims.append({"op": "ellipse", "cx": cx, "cy": cy, "rx": 5, "ry": 5, "fill": "#FFFFFF", "stroke": color, "sw": 1.5})
+    else:
+        prims.append(bar(16))
+    return prims
+
+
+def _build_er(model: dict, theme: dict) -> Tuple[List[dict], float, float]:
+    tables = {}
+    for name, attributes in model["entities"].items():
+        columns = [[a["type"], a["name"], ",".join(a["keys"])] for a in attributes]
+        widths = [max([text_width(row[c], SMALL_FONT_SIZE) for row in columns] or [0]) for c in range(3)]
+        body = sum(widths) + 16 * sum(1 for w in widths if w)
+        width = max(text_width(name) + 2 * _PAD_X, body + 8, 100)
+        tables[name] = {"columns": columns, "widths": widths, "size": (width, _ER_HEADER + _ER_ROW * len(columns))}
+    edges, label_sizes = [], {}
+    for i, relation in enumerate(model["relations"]):
+        edges.append((relation["src"], relation["dst"]))
+        if relation["label"]:
+            _, lw, lh = _text_block(relation["label"], SMALL_FONT_SIZE)
+            label_sizes[i] = (lw + 8, lh + 4)
+    sizes = {name: table["size"] for name, table in tables.items()}
+    layout = layered_layout(sizes, edges, "TB", node_sep=50, rank_sep=60, label_sizes=label_sizes)
+    margin = 8
+    center = {k: (x + margin, y + margin) for k, (x, y) in layout["centers"].items()}
+    color = theme["lineColor"]
+    scene, labels = [], []
+    drawn = [i for i in range(len(edges)) if layout["routes"][i] is not None]
+    offsets = _pair_offsets([edges[i] for i in drawn], 18)
+    routes = [{"src": edges[i][0], "dst": edges[i][1], "direction": "TB", "reversed": i in layout["reversed"],
+               "points": [_shifted(p, margin, margin, offset, "TB") for p in layout["routes"][i][1:-1]]}
+              for i, offset in zip(drawn, offsets)]
+    for i, offset, route, (start, end) in zip(drawn, offsets, routes, _attach(routes, center, sizes)):
+        relation = model["relations"][i]
+        curve = _flow_curve([start] + route["points"] + [end], "TB")
+        scene.append({"op": "line", "points": curve, "stroke": color, "sw": 1.5,
+                      "dash": None if relation["identifying"] else [6, 4]})
+        scene.extend(_er_marker(relation["src_card"], start, _unit(start, curve[1]), color))
+        scene.extend(_er_marker(relation["dst_card"], end, _unit(end, curve[-2]), color))
+        if i in layout["labels"]:
+            labels.append((_shifted(layout["labels"][i], margin, margin, offset, "TB"), relation["label"]))
+    for name, table in tables.items():
+        cx, cy = center[name]
+        w, h = table["size"]
+        x0, y0 = cx - w / 2, cy - h / 2
+        scene.append({"op": "rect", "x": x0, "y": y0, "w": w, "h": h, "rx": 0, "fill": theme["background"],
+                      "stroke": theme["primaryBorderColor"], "sw": 1.5})
+        scene.append({"op": "rect", "x": x0, "y": y0, "w": w, "h": _ER_HEADER, "rx": 0, "fill": theme["primaryColor"],
+                      "stroke": theme["primaryBorderColor"], "sw": 1.5})
+        scene.append({"op": "text", "x": cx, "y": y0 + _ER_HEADER / 2, "lines": [name], "size": FONT_SIZE,
+                      "color": theme["primaryTextColor"], "anchor": "middle", "max_w": w - 8, "weight": "bold"})
+        for r, row in enumerate(table["columns"]):
+            ry = y0 + _ER_HEADER + r * _ER_ROW
+            if r % 2:
+                scene.append({"op": "rect", "x": x0 + 1, "y": ry, "w": w - 2, "h": _ER_ROW, "rx": 0,
+                              "fill": theme["clusterBkg"], "stroke": "none", "sw": 0})
+            tx = x0 + 8
+            for c, value in enumerate(row):
+                if table["widths"][c]:
+                    scene.append({"op": "text", "x": tx, "y": ry + _ER_ROW / 2, "lines": [value], "size": SMALL_FONT_SIZE,
+                                  "color": theme["primaryTextColor"], "anchor": "start", "max_w": table["widths"][c] + 8})
+                    tx += table["widths"][c] + 16
+        scene.append({"op": "rect", "x": x0, "y": y0, "w": w, "h": h, "rx": 0, "fill": "none",
+                      "stroke": theme["primaryBorderColor"], "sw": 1.5})
+    for point, text in labels:
+        scene.extend(_label_box(point, text, SMALL_FONT_SIZE, theme["primaryTextColor"], theme["background"]))
+    return scene, layout["width"] + 2 * margin, layout["height"] + 2 * margin
+
+
+# --- Sequence diagram ---
+
+_ACTOR_H = 50
+_ACTOR_MIN_W = 120
+_ACTOR_GAP = 40
+
+
+def _build_sequence(model: dict, theme: dict) -> Tuple[List[dict], float, float]:
+    participants = model["participants"]
+    if not participants:
+        raise NativeRenderUnsupported("sequenceDiagram without participants")
+    index = {p["id"]: i for i, p in enumerate(participants)}
+    widths = [max(_ACTOR_MIN_W, _text_block(p["label"])[1] + 2 * _PAD_X) for p in participants]
+    centers = []
+    cursor = 8.0
+    for w in widths:
+        centers.append(cursor + w / 2)
+        cursor += w + _ACTOR_GAP
+    # Widen columns so each message label fits between its endpoints.
+    spans = []
+    for event in model["events"]:
+        if event["kind"] == "message":
+            a, b = sorted((index[event["src"]], index[event["dst"]]))
+            need = _text_block(event["text"], SMALL_FONT_SIZE)[1] + 24
+            spans.append((b - a, a, b, need))
+    for _, a, b, need in sorted(spans):
+        if a == b:
+            b = a + 1
+            if b >= len(centers):
+                continue
+            need = need + 20
+        deficit = need - (centers[b] - centers[a])
+        if deficit > 0:
+            for k in range(b, len(centers)):
+                centers[k] += deficit
+    color, text_color = theme["lineColor"], theme["primaryTextColor"]
+    scene: List[dict] = []
+    rows: List[dict] = []
+    y = 8 + _ACTOR_H + 20
+    blocks: List[dict] = []
+    number = 0
+    for event in model["events"]:
+        kind = event["kind"]
+        if kind == "message":
+            lines, tw, th = _text_block(event["text"], SMALL_FONT_SIZE)
+            a, b = index[event["src"]], index[event["dst"]]
+            for block in blocks:
+                block["cols"].update((a, b))
+            y += th + 6
+            number += 1
+            rows.append({"kind": "message", "y": y, "a": a, "b": b, "event": event, "lines": lines,
+                         "number": number if model["autonumber"] else None})
+            y += 30 if a == b else 14
+        elif kind == "note":
+            cols = [index[t] for t in event["targets"]]
+            for block in blocks:
+                block["cols"].update(cols)
+            lines, tw, th = _text_block(event["text"], SMALL_FONT_SIZE)
+            rows.append({"kind": "note", "y": y, "cols": cols, "event": event, "lines": lines, "tw": tw, "th": th})
+            y += th + 24
+        elif kind == "block":
+            blocks.append({"block": event["block"], "label": event["label"], "top": y, "cols": set(),
+                           "branches": [], "depth": len(blocks)})
+            y += SMALL_FONT_SIZE * LINE_HEIGHT + 16
+        elif kind == "branch":
+            blocks[-1]["branches"].append((y, event["label"]))
+            y += SMALL_FONT_SIZE * LINE_HEIGHT + 16
+        elif kind == "end":
+            block = blocks.pop()
+            block["bottom"] = y + 4
+            if blocks:
+                blocks[-1]["cols"].update(block["cols"])
+            rows.append({"kind": "block", "block": block})
+            y += 16
+    lifeline_end = y + 8
+    total_w = centers[-1] + widths[-1] / 2 + 8
+    # Actor boxes top and bottom, lifelines between.
+    for i, participant in enumerate(participants):
+        cx, w = centers[i], widths[i]
+        scene.append({"op": "line", "points": [(cx, 8 + _ACTOR_H), (cx, lifeline_end)], "stroke": color, "sw": 1,
+                      "dash": [4, 4]})
+        for top in (8, lifeline_end):
+            scene.append({"op": "rect", "x": cx - w / 2, "y": top, "w": w, "h": _ACTOR_H, "rx": 3,
+                          "fill": theme["primaryColor"], "stroke": theme["primaryBorderColor"], "sw": 1.5})
+            lines, _, _ = _text_block(participant["label"])
+            scene.append({"op": "text", "x": cx, "y": top + _ACTOR_H / 2, "lines": lines, "size": FONT_SIZE,
+                          "color": text_color, "anchor": "middle", "max_w": w - 8})
+    # Blocks behind messages, drawn outermost first.
+    for row in sorted((r for r in rows if r["kind"] == "block"), key=lambda r: r["block"]["depth"]):
+        block = row["block"]
+        cols = block["cols"] or set(range(len(participants)))
+        inset = 8 * block["depth"]
+        x0 = min(centers[c] for c in cols) - 70 + inset
+        x1 = max(centers[c] for c in cols) + 70 - inset
+        x0, x1 = max(2, x0), min(total_w - 2, x1)
+        top, bottom = block["top"], block["bottom"]
+        scene.append({"op": "rect", "x": x0, "y": top, "w": x1 - x0, "h": bottom - top, "rx": 0, "fill": "none",
+                      "stroke": color, "sw": 1, "dash": [2, 2]})
+        tag = block["block"]
+        tag_w = text_width(tag, SMALL_FONT_SIZE) + 16
+        tag_h = SMALL_FONT_SIZE * LINE_HEIGHT + 6
+        scene.append({"op": "poly", "points": [(x0, top), (x0 + tag_w, top), (x0 + tag_w, top + tag_h - 6),
+                                               (x0 + tag_w - 6, top + tag_h), (x0, top + tag_h)],
+                      "fill": theme["primaryColor"], "stroke": color, "sw": 1})
+        scene.append({"op": "text", "x": x0 + tag_w / 2, "y": top + tag_h / 2, "lines": [tag], "size": SMALL_FONT_SIZE,
+                      "color": text_color, "anchor": "middle", "max_w": tag_w, "weight": "bold"})
+        if block["label"]:
+            scene.append({"op": "text", "x": (x0 + x1) / 2 + tag_w / 2, "y": top + tag_h / 2,
+                          "lines": [f"[{block['label']}]"], "size": SMALL_FONT_SIZE, "color": text_color,
+                          "anchor": "middle", "max_w": x1 - x0 - tag_w})
+        for branch_y, label in block["branches"]:
+            scene.append({"op": "line", "points": [(x0, branch_y), (x1, branch_y)], "stroke": color, "sw": 1,
+                          "dash": [3, 3]})
+            if label:
+                scene.append({"op": "text", "x": (x0 + x1) / 2, "y": branch_y + tag_h / 2, "lines": [f"[{label}]"],
+                              "size": SMALL_FONT_SIZE, "color": text_color, "anchor": "middle", "max_w": x1 - x0})
+    for row in rows:
+        if row["kind"] == "message":
+            event = row["event"]
+            ay, xa, xb = row["y"], centers[row["a"]], centers[row["b"]]
+            dash = [4, 3] if event["dashed"] else None
+            if row["a"] == row["b"]:
+                points = [(xa, ay), (xa + 40, ay), (xa + 40, ay + 20), (xa, ay + 20)]
+                text_x, anchor = xa + 8, "start"
+            else:
+                points = [(xa, ay), (xb, ay)]
+                text_x, anchor = (xa + xb) / 2, "middle"
+            tip_dir = _unit(points[-2], points[-1])
+            trimmed = _trim(points, 0, 2 if event["head"] != "none" else 0)
+            scene.append({"op": "line", "points": trimmed, "stroke": color, "sw": 1.5, "dash": dash})
+            if event["head"] == "filled":
+                scene.append(_arrow_head(points[-1], tip_dir, color))
+            elif event["head"] == "cross":
+                scene.extend(_end_marker("x", points[-1], tip_dir, color))
+            elif event["head"] == "open":
+                tip = points[-1]
+                scene.append({"op": "line", "points": [
+                    (tip[0] - tip_dir[0] * 9 - tip_dir[1] * 5, tip[1] - tip_dir[1] * 9 + tip_dir[0] * 5), tip,
+                    (tip[0] - tip_dir[0] * 9 + tip_dir[1] * 5, tip[1] - tip_dir[1] * 9 - tip_dir[0] * 5)],
+                    "stroke": color, "sw": 1.5})
+            th = len(row["lines"]) * SMALL_FONT_SIZE * LINE_HEIGHT
+            scene.append({"op": "text", "x": text_x, "y": ay - th / 2 - 4, "lines": row["lines"], "size": SMALL_FONT_SIZE,
+                          "color": text_color, "anchor": anchor, "max_w": max(abs(xb - xa), 200)})
+            if row["number"] is not None:
+                scene.append({"op": "ellipse", "cx": xa, "cy": ay, "rx": 9, "ry": 9, "fill": color, "stroke": color, "sw": 1})
+                scene.append({"op": "text", "x": xa, "y": ay, "lines": [str(row["number"])], "size": 11,
+                              "color": theme["background"], "anchor": "middle", "max_w": 18})
+        elif row["kind"] == "note":
+            event, cols = row["event"], row["cols"]
+            w = row["tw"] + 20
+            if event["position"] == "over":
+                left, right = min(centers[c] for c in cols), max(centers[c] for c in cols)
+                w = max(w, right - left + 40)
+                x0 = (left + right) / 2 - w / 2
+            elif event["position"] == "left of":
+                x0 = centers[cols[0]] - 12 - w
+            else:
+                x0 = centers[cols[0]] + 12
+            h = row["th"] + 12
+            scene.append({"op": "rect", "x": x0, "y": row["y"], "w": w, "h": h, "rx": 0,
+                          "fill": theme["tertiaryColor"], "stroke": theme["primaryBorderColor"], "sw": 1})
+            scene.append({"op": "text", "x": x0 + w / 2, "y": row["y"] + h / 2, "lines": row["lines"],
+                          "size": SMALL_FONT_SIZE, "color": theme["tertiaryTextColor"], "anchor": "middle", "max_w": w})
+    min_x = min(min(p["x"] for p in scene if "x" in p and p["op"] == "rect"), 0)
+    if min_x < 0:
+        for prim in scene:
+            _shift(prim, -min_x + 4, 0)
+        total_w += -min_x + 4
+    max_x = max((p["x"] + p["w"] for p in scene if p["op"] == "rect"), default=total_w)
+    return scene, max(total_w, max_x + 8), lifeline_end + _ACTOR_H + 8
+
+
+def _shift(prim: dict, dx: float, dy: float):
+    if "x" in prim:
+        prim["x"] += dx
+        prim["y"] += dy
+    if "cx" in prim:
+        prim["cx"] += dx
+        prim["cy"] += dy
+    if "points" in prim:
+        prim["points"] = [(x + dx, y + dy) for x, y in prim["points"]]
+
+
+# --- Output ---
+
+def _svg_paint(prim: dict) -> str:
+    parts = [f'fill="{escape(prim.get("fill") or "none")}"']
+    stroke = prim.get("stroke") or "none"
+    parts.append(f'stroke="{escape(stroke)}"')
+    if stroke != "none":
+        parts.append(f'stroke-width="{prim.get("sw", 1):g}"')
+        if prim.get("dash"):
+            parts.append(f'stroke-dasharray="{" ".join(f"{d:g}" for d in prim["dash"])}"')
+    return " ".join(parts)
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def scene_to_svg(scene: List[dict], width: float, height: float, background: str, display_width: float) -> str:
+    """Standalone SVG; ``display_width`` sets the intrinsic size (the viewBox keeps the full layout)."""
+    display_height = height * display_width / width
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_fmt(display_width)}" height="{_fmt(display_height)}" '
+        f'viewBox="0 0 {_fmt(width)} {_fmt(height)}" font-family="{FONT_FAMILY}">',
+        f'<rect x="0" y="0" width="{_fmt(width)}" height="{_fmt(height)}" fill="{escape(background)}"/>',
+    ]
+    for prim in scene:
+        op = prim["op"]
+        if op == "rect":
+            out.append(f'<rect x="{_fmt(prim["x"])}" y="{_fmt(prim["y"])}" width="{_fmt(prim["w"])}" '
+                       f'height="{_fmt(prim["h"])}" rx="{_fmt(prim.get("rx", 0))}" {_svg_paint(prim)}/>')
+        elif op == "ellipse":
+            out.append(f'<ellipse cx="{_fmt(prim["cx"])}" cy="{_fmt(prim["cy"])}" rx="{_fmt(prim["rx"])}" '
+                       f'ry="{_fmt(prim["ry"])}" {_svg_paint(prim)}/>')
+        elif op == "poly":
+            points = " ".join(f"{_fmt(x)},{_fmt(y)}" for x, y in prim["points"])
+            out.append(f'<polygon points="{points}" {_svg_paint(prim)}/>')
+        elif op == "line":
+            points = " ".join(f"{_fmt(x)},{_fmt(y)}" for x, y in prim["points"])
+            out.append(f'<polyline points="{points}" {_svg_paint({**prim, "fill": "none"})} '
+                       'stroke-linejoin="round" stroke-linecap="round"/>')
+        elif op == "text":
+            size = prim["size"]
+            line_h = size * LINE_HEIGHT
+            first = prim["y"] - line_h * (len(prim["lines"]) - 1) / 2 + size * 0.35
+            anchor = "middle" if prim["anchor"] == "middle" else "start"
+            weight = ' font-weight="bold"' if prim.get("weight") == "bold" else ""
+            for n, line in enumerate(prim["lines"]):
+                out.append(f'<text x="{_fmt(prim["x"])}" y="{_fmt(first + n * line_h)}" font-size="{_fmt(size)}" '
+                           f'fill="{escape(prim["color"])}" text-anchor="{anchor}"{weight}>{escape(line)}</text>')
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+_FONT_CANDIDATES = ("arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf",
+                    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+_BOLD_CANDIDATES = ("arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf",
+                    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+_FONTS: Dict[Tuple[int, bool], object] = {}
+_FONTS_LOCK = threading.Lock()
+
+
+def _font(size: int, bold: bool = False):
+    key = (size, bold)
+    with _FONTS_LOCK:
+        font = _FONTS.get(key)
+        if font is None:
+            for candidate in (_BOLD_CANDIDATES if bold else _FONT_CANDIDATES):
+                try:
+                    font = ImageFont.truetype(candidate, size)
+                    break
+                except OSError:
+                    continue
+            if font is None:
+                font = ImageFont.load_default(size)
+            _FONTS[key] = font
+    return font
+
+
+def _rgb(value: str):
+    try:
+        return Image.new("RGB", (1, 1), value).getpixel((0, 0))
+    except (ValueError, TypeError):
+        return None
+
+
+def _dashed(points: List[Tuple[float, float]], pattern: List[float]) -> List[List[Tuple[float, float]]]:
+    """Split a polyline into the visible dashes of ``pattern``."""
+    dashes, current = [], [points[0]]
+    index, remaining, on = 0, pattern[0], True
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        length = math.hypot(bx - ax, by - ay)
+        pos = 0.0
+        while length - pos > remaining:
+            pos += remaining
+            point = (ax + (bx - ax) * pos / length, ay + (by - ay) * pos / length)
+            if on:
+                current.append(point)
+                dashes.append(current)
+            else:
+                current = [point]
+            on = not on
+            index = (index + 1) % len(pattern)
+            remaining = pattern[index]
+        remaining -= length - pos
+        if on:
+            current.append((bx, by))
+    if on and len(current) > 1:
+        dashes.append(current)
+    return dashes
+
+
+def scene_to_png(scene: List[dict], width: float, height: float, background: str, scale: float, output: Path,
+                 supersample: int = 2):
+    """Rasterize ``scene`` with Pillow at ``scale`` device pixels per layout pixel."""
+    if Image is None:
+        raise NativeRenderUnsupported("Pillow is not installed")
+    k = scale * supersample
+    image = Image.new("RGB", (max(1, round(width * k)), max(1, round(height * k))), _rgb(background) or (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+
+    def pt(p):
+        return (p[0] * k, p[1] * k)
+
+    for prim in scene:
+        op = prim["op"]
+        fill = _rgb(prim.get("fill") or "none") if prim.get("fill") not in (None, "none") else None
+        stroke = _rgb(prim.get("stroke") or "none") if prim.get("stroke") not in (None, "none") else None
+        sw = max(1, round(prim.get("sw", 1) * k)) if stroke else 0
+        if op == "rect":
+            box = [prim["x"] * k, prim["y"] * k, (prim["x"] + prim["w"]) * k, (prim["y"] + prim["h"]) * k]
+            if prim.get("dash") and stroke:
+                draw.rounded_rectangle(box, radius=prim.get("rx", 0) * k, fill=fill)
+                x0, y0 = prim["x"], prim["y"]
+                x1, y1 = x0 + prim["w"], y0 + prim["h"]
+                for dash in _dashed([(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)], prim["dash"]):
+                    draw.line([pt(p) for p in dash], fill=stroke, width=sw)
+            else:
+                draw.rounded_rectangle(box, radius=prim.get("rx", 0) * k, fill=fill, outline=stroke, width=sw)
+        elif op == "ellipse":
+            box = [(prim["cx"] - prim["rx"]) * k, (prim["cy"] - prim["ry"]) * k,
+                   (prim["cx"] + prim["rx"]) * k, (prim["cy"] + prim["ry"]) * k]
+            draw.ellipse(box, fill=fill, outline=stroke, width=sw)
+        elif op == "poly":
+            points = [pt(p) for p in prim["points"]]
+            draw.polygon(points, fill=fill)
+            if stroke:
+                outline = prim["points"] + [prim["points"][0]]
+                for dash in (_dashed(outline, prim["dash"]) if prim.get("dash") else [outline]):
+                    draw.line([pt(p) for p in dash], fill=stroke, width=sw, joint="curve")
+        elif op == "line" and stroke:
+            for dash in (_dashed(prim["points"], prim["dash"]) if prim.get("dash") else [prim["points"]]):
+                draw.line([pt(p) for p in dash], fill=stroke, width=sw, joint="curve")
+        elif op == "text":
+            size = prim["size"] * k
+            font = _font(max(1, round(size)), prim.get("weight") == "bold")
+            widest = max((font.getlength(line) for line in prim["lines"]), default=0)
+            limit = prim.get("max_w", 0) * k
+            if limit and widest > limit:
+                # Pillow's fallback fonts run wider than Arial; shrink to the measured box.
+                font = _font(max(1, round(size * limit / widest)), prim.get("weight") == "bold")
+            line_h = prim["size"] * LINE_HEIGHT * k
+            first = prim["y"] * k - line_h * (len(prim["lines"]) - 1) / 2
+            color = _rgb(prim["color"]) or (0, 0, 0)
+            for n, line in enumerate(prim["lines"]):
+                anchor = "mm" if prim["anchor"] == "middle" else "lm"
+                draw.text((prim["x"] * k, first + n * line_h), line, fill=color, font=font, anchor=anchor)
+    if supersample > 1:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    image.save(output, format="PNG")
+
+
+_BUILDERS = {
+    "flowchart": lambda model, theme: _FlowchartBuilder(model, theme).build(),
+    "state": _build_state,
+    "er": _build_er,
+    "sequence": _build_sequence,
+}
+
+
+def build_scene(code: str, theme: dict) -> Tuple[List[dict], float, float]:
+    """Parse and lay out ``code``; raises ``NativeRenderUnsupported`` or ``MermaidSyntaxError``."""
+    model = parse_mermaid(code)
+    if model["unsupported"]:
+        line_no, text = model["unsupported"][0]
+        raise NativeRenderUnsupported(f"line {line_no}: {text[:40]!r} is outside the native subset")
+    scene, width, height = _BUILDERS[model["type"]](model, theme)
+    return scene, max(width, 1.0), max(height, 1.0)
+
+
+def can_render(code: str) -> bool:
+    """True when ``code`` parses within the native subset and PNG output is available."""
+    if not NATIVE_PNG_AVAILABLE:
+        return False
+    try:
+        model = parse_mermaid(code)
+    except MermaidSyntaxError:
+        return False
+    return not model["unsupported"]
+
+
+def render_native(code: str, output_png: Path, svg_path: Optional[Path] = None, scale: float = 2.0,
+                  max_width: Optional[float] = None, config_path: Optional[Path] = None) -> Tuple[float, float]:
+    """
+    Render ``code`` to ``output_png`` (and ``svg_path`` when given). Diagrams
+    wider than ``max_width`` layout pixels are scaled down to it, like
+    Mermaid's ``useMaxWidth``. Returns the display size in layout pixels.
+    """
+    theme = load_theme(config_path)
+    scene, width, height = build_scene(code, theme)
+    fit = min(1.0, max_width / width) if max_width else 1.0
+    background = theme.get("background") or "#FFFFFF"
+    if svg_path is not None:
+        svg_path = Path(svg_path)
+        svg_path.parent.mkdir(parents=True, exist_ok=True)
+        svg_path.write_text(scene_to_svg(scene, width, height, background, width * fit), encoding="utf-8")
+    scene_to_png(scene, width, height, background, scale * fit, Path(output_png))
+    return width * fit, height * fit
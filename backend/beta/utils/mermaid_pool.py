@@ -0,0 +1,313 @@
+"""
+Persistent Mermaid renderer pool.
+
+Keeps a few long-lived Node workers (``mermaid_worker.mjs``) running, each
+holding a warm headless browser, so diagrams no longer pay a Node + Chromium
+cold start per render. Workers speak a JSON-lines protocol over stdin/stdout.
+Each job is timed from when its worker starts it, not from submission. A
+job that overruns fails on its own; its worker is restarted only when it has
+finished nothing since that job started (a wedged browser). Crashed workers
+are restarted too; callers fall back to the one-shot ``mmdc`` subprocess
+path whenever the pool is unavailable.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from itertools import count
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_WORKER_SCRIPT = Path(__file__).with_name("mermaid_worker.mjs")
+
+
+class RenderJobError(RuntimeError):
+    """Raised when the pool could not render a job."""
+
+
+class _Worker:
+    """One Node process plus the reader thread that resolves its jobs."""
+
+    def __init__(self, index: int, cmd: List[str], env: dict):
+        self.index = index
+        self.pending: Dict[str, Future] = {}
+        self.started: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.spawned = self.last_progress = time.monotonic()
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            env=env,
+        )
+        self._reader = threading.Thread(target=self._read_loop, name=f"mermaid-pool-{index}", daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    @property
+    def load(self) -> int:
+        return len(self.pending)
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("ready"):
+                self.last_progress = time.monotonic()
+                self.ready.set()
+                continue
+            job_id = str(message.get("id"))
+            if message.get("started"):
+                with self.lock:
+                    if job_id in self.pending:
+                        self.started[job_id] = time.monotonic()
+                continue
+            with self.lock:
+                future = self.pending.pop(job_id, None)
+                self.started.pop(job_id, None)
+                self.last_progress = time.monotonic()
+            if future is None or future.done():
+                continue
+            if message.get("ok"):
+                future.set_result(message.get("ms"))
+            else:
+                future.set_exception(RenderJobError(message.get("error") or "render failed"))
+        self._fail_pending(f"renderer worker {self.index} exited (code {self.proc.poll()})")
+
+    def _fail_pending(self, reason: str):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.started = {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(RenderJobError(reason))
+
+    def submit(self, job_id: str, job: dict) -> Future:
+        future: Future = Future()
+        with self.lock:
+            if not self.alive:
+                raise RenderJobError(f"renderer worker {self.index} is not running")
+            self.pending[job_id] = future
+            try:
+                self.proc.stdin.write(json.dumps({"id": job_id, **job}) + "\n")
+                self.proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                self.pending.pop(job_id, None)
+                raise RenderJobError(f"renderer worker {self.index} rejected job: {e}")
+        return future
+
+    def forget(self, job_id: str):
+        """Stop tracking a job the caller gave up on; a late result is ignored."""
+        with self.lock:
+            self.pending.pop(job_id, None)
+            self.started.pop(job_id, None)
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.proc.kill()
+        else:
+            try:
+                self.proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._fail_pending(f"renderer worker {self.index} stopped")
+
+
+class MermaidRendererPool:
+    """Pool of warm Node/Chromium Mermaid renderers with per-job timeouts."""
+
+    def __init__(self, size: int, pages_per_worker: int, job_timeout: float, enabled: bool = True):
+        self.size = max(1, size)
+        self.pages_per_worker = max(1, pages_per_worker)
+        self.job_timeout = job_timeout
+        self.enabled = enabled
+        self.restarts = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.reason = ""
+        self._workers: List[Optional[_Worker]] = []
+        self._lock = threading.Lock()
+        self._ids = count(1)
+        self._cmd: Optional[List[str]] = None
+        self._env: Optional[dict] = None
+        self._last_restart: Dict[int, float] = {}
+
+    def _resolve_command(self) -> bool:
+        node = shutil.which("node")
+        if not node:
+            self.reason = "node not found"
+            return False
+        modules_root = os.getenv("MERMAID_CLI_NODE_MODULES", "").strip()
+        if not modules_root:
+            npm = shutil.which("npm") or shutil.which("npm.cmd")
+            if npm:
+                try:
+                    modules_root = subprocess.run(
+                        [npm, "root", "-g"], capture_output=True, text=True, timeout=15, check=True
+                    ).stdout.strip()
+                except (OSError, subprocess.SubprocessError):
+                    modules_root = ""
+        if not modules_root or not (Path(modules_root) / "@mermaid-js" / "mermaid-cli").is_dir():
+            self.reason = "@mermaid-js/mermaid-cli not installed globally"
+            return False
+        env = dict(os.environ)
+        env["MERMAID_CLI_NODE_MODULES"] = modules_root
+        env["MERMAID_POOL_PAGES"] = str(self.pages_per_worker)
+        self._cmd = [node, str(_WORKER_SCRIPT)]
+        self._env = env
+        return True
+
+    def start(self):
+        """Spawn the workers. Safe to call more than once."""
+        if not self.enabled:
+            self.reason = "disabled by MERMAID_POOL_ENABLED=0"
+            return
+        with self._lock:
+            if self._workers:
+                return
+            if self._cmd is None and not self._resolve_command():
+                print(f"ℹ️ Mermaid renderer pool not started: {self.reason}")
+                return
+            self._workers = [self._spawn(i) for i in range(self.size)]
+        print(f"🚀 Mermaid renderer pool started with {self.size} worker(s)")
+
+    def _spawn(self, index: int) -> Optional[_Worker]:
+        try:
+            return _Worker(index, self._cmd, self._env)
+        except OSError as e:
+            self.reason = f"failed to start worker: {e}"
+            print(f"⚠️ Mermaid renderer worker {index} failed to start: {e}")
+            return None
+
+    def stop(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            if worker:
+                worker.stop()
+
+    def available(self) -> bool:
+        return any(w is not None and w.alive for w in self._workers)
+
+    def _restart(self, index: int):
+        """Replace a dead or hung worker, at most once every few seconds per slot."""
+        now = time.monotonic()
+        if now - self._last_restart.get(index, 0.0) < 5.0:
+            return
+        self._last_restart[index] = now
+        old = self._workers[index]
+        if old is not None:
+            old.stop(kill=True)
+        self._workers[index] = self._spawn(index)
+        self.restarts += 1
+        print(f"🔁 Restarted Mermaid renderer worker {index}")
+
+    def _pick_worker(self) -> _Worker:
+        with self._lock:
+            for i, worker in enumerate(self._workers):
+                if worker is None or not worker.alive:
+                    self._restart(i)
+            live = [w for w in self._workers if w is not None and w.alive]
+            if not live:
+                raise RenderJobError("no live renderer workers")
+            return min(live, key=lambda w: w.load)
+
+    def render_batch(self, jobs: List[dict], timeout: Optional[float] = None) -> List[Optional[Exception]]:
+        """
+        Render a batch of jobs concurrently across the pool.
+
+        Each job carries ``code``, ``output`` and render options. Returns one
+        entry per job: ``None`` on success or the exception that failed it.
+        ``timeout`` applies to each job from the moment its worker starts it.
+        """
+        timeout = timeout or self.job_timeout
+        results: List[Optional[Exception]] = [None] * len(jobs)
+        waiting = {}
+        for i, job in enumerate(jobs):
+            try:
+                worker = self._pick_worker()
+                job_id = str(next(self._ids))
+                waiting[i] = (worker, job_id, worker.submit(job_id, job))
+            except RenderJobError as e:
+                results[i] = e
+
+        while waiting:
+            futures = {entry[2]: i for i, entry in waiting.items()}
+            done, _ = wait(list(futures), timeout=min(1.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                del waiting[i]
+                try:
+                    future.result()
+                except Exception as e:
+                    results[i] = e
+            now = time.monotonic()
+            for i, (worker, job_id, future) in list(waiting.items()):
+                started = worker.started.get(job_id)
+                if started is not None and now - started > timeout:
+                    # Only a worker that finished nothing since this job started is wedged;
+                    # otherwise just this page is stuck and the worker's other jobs carry on.
+                    wedged = worker.last_progress < started
+                elif started is None and not worker.ready.is_set() and now - worker.spawned > timeout:
+                    wedged = True  # the browser never came up
+                else:
+                    continue
+                del waiting[i]
+                worker.forget(job_id)
+                self.timeouts += 1
+                results[i] = RenderJobError(f"render timed out after {timeout:.0f}s")
+                if wedged:
+                    with self._lock:
+                        if worker in self._workers:
+                            self._restart(self._workers.index(worker))
+        self.rendered += sum(1 for r in results if r is None)
+        self.failed += sum(1 for r in results if r is not None)
+        return results
+
+    def render(self, job: dict, timeout: Optional[float] = None):
+        error = self.render_batch([job], timeout=timeout)[0]
+        if error is not None:
+            raise error
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.available(),
+            "workers": sum(1 for w in self._workers if w is not None and w.alive),
+            "ready": sum(1 for w in self._workers if w is not None and w.alive and w.ready.is_set()),
+            "size": self.size,
+            "pages_per_worker": self.pages_per_worker,
+            "in_flight": sum(w.load for w in self._workers if w is not None),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "reason": "" if self.available() else self.reason,
+        }
+
+
+MERMAID_RENDERER_POOL = MermaidRendererPool(
+    size=int(os.getenv("MERMAID_POOL_WORKERS", "2")),
+    pages_per_worker=int(os.getenv("MERMAID_POOL_PAGES", "3")),
+    job_timeout=float(os.getenv("MERMAID_POOL_JOB_TIMEOUT_SEC", "30")),
+    enabled=os.getenv("MERMAID_POOL_ENABLED", "1") != "0",
+)
@@ -0,0 +1,883 @@
+"""
+Parser for the Mermaid subset the SRS pipeline produces.
+
+Supported diagram types are ``flowchart``/``graph`` (with subgraphs, shapes,
+edge labels and ``style``), ``erDiagram``, ``sequenceDiagram`` and
+``stateDiagram``/``stateDiagram-v2`` (flat states). ``parse_mermaid`` turns
+source into a plain-dict model used by the native renderer. Statements that
+are valid Mermaid but outside the subset (``classDef``, ``click``, composite
+states, ...) are listed under ``unsupported`` rather than rejected; code that
+Mermaid itself would reject raises ``MermaidSyntaxError`` with its line number.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+DIRECTIONS = {"TB", "TD", "BT", "LR", "RL"}
+
+
+class MermaidSyntaxError(ValueError):
+    """Mermaid source that does not parse; ``line`` is 1-based (0 for the whole diagram)."""
+
+    def __init__(self, message: str, line: int = 0):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+        self.reason = message
+
+
+def _source_lines(code: str) -> List[Tuple[int, str]]:
+    """Non-empty, comment-free ``(line_no, text)`` pairs, split on ``;`` outside quotes."""
+    lines = []
+    for line_no, raw in enumerate((code or "").splitlines(), start=1):
+        text = raw.strip()
+        if not text or text.startswith("%%"):
+            continue
+        part, quoted = [], False
+        for ch in text:
+            if ch == '"':
+                quoted = not quoted
+            if ch == ";" and not quoted:
+                if "".join(part).strip():
+                    lines.append((line_no, "".join(part).strip()))
+                part = []
+                continue
+            part.append(ch)
+        if "".join(part).strip():
+            lines.append((line_no, "".join(part).strip()))
+    return lines
+
+
+def clean_label(text: str) -> str:
+    """Label text as displayed: quotes dropped, ``<br/>`` as newlines, common entities decoded."""
+    text = (text or "").strip()
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        text = text[1:-1]
+    text = re.sub(r"<br\s*/?>", "\n", text, flags=re.IGNORECASE)
+    for entity, char in (("#quot;", '"'), ("#amp;", "&"), ("#lt;", "<"), ("#gt;", ">"), ("#35;", "#")):
+        text = text.replace(entity, char)
+    return text
+
+
+def diagram_type(code: str) -> Optional[str]:
+    """``flowchart``, ``er``, ``sequence`` or ``state`` from the header line, else None."""
+    lines = _source_lines(code)
+    if not lines:
+        return None
+    header = lines[0][1]
+    if re.match(r"^(flowchart|graph)\b", header):
+        return "flowchart"
+    if header == "erDiagram":
+        return "er"
+    if header == "sequenceDiagram":
+        return "sequence"
+    if re.match(r"^stateDiagram(-v2)?$", header):
+        return "state"
+    return None
+
+
+# --- Flowchart ---
+
+_NODE_ID = re.compile(r"\w+(?:-\w+)*")
+# (open, close, shape); longer delimiters first.
+_SHAPES = [
+    ("([", "])", "stadium"),
+    ("[(", ")]", "cylinder"),
+    ("((", "))", "circle"),
+    ("[[", "]]", "subroutine"),
+    ("{{", "}}", "hexagon"),
+    ("[/", "/]", "rect"),
+    ("[\\", "\\]", "rect"),
+    ("[", "]", "rect"),
+    ("(", ")", "round"),
+    ("{", "}", "diamond"),
+    (">", "]", "rect"),
+]
+_EDGE = re.compile(
+    r"(?P<start><|[xo](?=-|=))?"
+    r"(?:(?P<tbody>--|==|-\.)\s*(?P<text>[^\s|>\-=.][^|>]*?)\s*(?P<tclose>-{2,}|={2,}|\.+-)(?P<tend>>|[xo](?=\s|$))?"
+    r"|(?P<body>-{2,}|={2,}|-\.+-)(?P<end>>|[xo](?=[\s|]|$))?)"
+)
+_UNQUOTED_FORBIDDEN = set("()[]{}")
+_STYLE_KEYS = {"fill", "stroke", "stroke-width", "stroke-dasharray", "color"}
+
+
+def _read_label(text: str, pos: int, close: str, line_no: int) -> Tuple[str, int]:
+    """Read a node label starting at ``pos`` up to ``close``; returns ``(raw_label, next_pos)``."""
+    if text.startswith('"', pos):
+        end_quote = text.find('"', pos + 1)
+        if end_quote < 0:
+            raise MermaidSyntaxError("Unterminated quoted label", line_no)
+        if not text.startswith(close, end_quote + 1):
+            raise MermaidSyntaxError(f"Expected '{close}' after quoted label", line_no)
+        return text[pos:end_quote + 1], end_quote + 1 + len(close)
+    end = text.find(close, pos)
+    if end < 0:
+        raise MermaidSyntaxError(f"Missing '{close}' to close node label", line_no)
+    raw = text[pos:end]
+    if any(ch in _UNQUOTED_FORBIDDEN for ch in raw):
+        raise MermaidSyntaxError(f"Unquoted label {raw!r} contains brackets; wrap it in double quotes", line_no)
+    return raw, end + len(close)
+
+
+def _read_node(text: str, pos: int, line_no: int) -> Tuple[dict, int]:
+    """Read ``ID`` plus an optional shape/label at ``pos``."""
+    match = _NODE_ID.match(text, pos)
+    if not match:
+        raise MermaidSyntaxError(f"Expected a node id at {text[pos:pos + 20]!r}", line_no)
+    node = {"id": match.group(0), "label": None, "shape": None}
+    pos = match.end()
+    for open_, close, shape in _SHAPES:
+        if text.startswith(open_, pos):
+            raw, pos = _read_label(text, pos + len(open_), close, line_no)
+            node["label"] = clean_label(raw)
+            node["shape"] = shape
+            break
+    css_class = re.match(r":::([\w-]+)", text[pos:])
+    if css_class:
+        node["class"] = css_class.group(1)
+        pos += css_class.end()
+    return node, pos
+
+
+def _skip_spaces(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _read_node_group(text: str, pos: int, line_no: int) -> Tuple[List[dict], int]:
+    nodes = []
+    while True:
+        node, pos = _read_node(text, pos, line_no)
+        nodes.append(node)
+        pos = _skip_spaces(text, pos)
+        if text.startswith("&", pos):
+            pos = _skip_spaces(text, pos + 1)
+            continue
+        return nodes, pos
+
+
+def _edge_style(body: str) -> str:
+    if body.startswith("="):
+        return "thick"
+    if "." in body:
+        return "dotted"
+    return "solid"
+
+
+def _parse_chain(text: str, line_no: int) -> Tuple[List[dict], List[dict]]:
+    """Parse ``A --> B -->|x| C & D`` into ``(nodes, edges)``."""
+    nodes, edges = [], []
+    group, pos = _read_node_group(text, 0, line_no)
+    nodes.extend(group)
+    while pos < len(text):
+        match = _EDGE.match(text, pos)
+        if not match:
+            raise MermaidSyntaxError(f"Expected an arrow at {text[pos:pos + 20]!r}", line_no)
+        body = match.group("body") or match.group("tbody") + match.group("tclose")
+        end = match.group("end") if match.group("body") else match.group("tend")
+        label = match.group("text")
+        pos = _skip_spaces(text, match.end())
+        if text.startswith("|", pos):
+            close = text.find("|", pos + 1)
+            if close < 0:
+                raise MermaidSyntaxError("Missing closing '|' for edge label", line_no)
+            label = text[pos + 1:close]
+            pos = _skip_spaces(text, close + 1)
+        if pos >= len(text):
+            raise MermaidSyntaxError("Arrow has no target node", line_no)
+        targets, pos = _read_node_group(text, pos, line_no)
+        nodes.extend(targets)
+        for src in group:
+            for dst in targets:
+                edges.append({
+                    "src": src["id"],
+                    "dst": dst["id"],
+                    "label": clean_label(label) if label and label.strip() else "",
+                    "start": match.group("start") or "",
+                    "end": end or "",
+                    "style": _edge_style(body),
+                    "line": line_no,
+                })
+        group = targets
+    return nodes, edges
+
+
+def _parse_subgraph_header(rest: str, line_no: int) -> Tuple[str, str]:
+    rest = rest.strip()
+    if not rest:
+        raise MermaidSyntaxError("subgraph needs an id or title", line_no)
+    if rest.startswith('"'):
+        label = clean_label(rest)
+        return re.sub(r"\W+", "_", label).strip("_") or f"subgraph_{line_no}", label
+    match = _NODE_ID.match(rest)
+    if match and match.end() < len(rest) and rest[match.end()] == "[":
+        raw, end = _read_label(rest, match.end() + 1, "]", line_no)
+        if rest[end:].strip():
+            raise MermaidSyntaxError(f"Unexpected text after subgraph title: {rest[end:].strip()!r}", line_no)
+        return match.group(0), clean_label(raw)
+    if match and match.end() == len(rest):
+        return rest, rest
+    # Mermaid takes a bare multi-word title as both id and label.
+    return rest, rest
+
+
+def _parse_style(rest: str) -> Dict[str, str]:
+    style = {}
+    for item in rest.split(","):
+        key, _, value = item.partition(":")
+        key = key.strip()
+        if key in _STYLE_KEYS and value.strip():
+            style[key] = value.strip()
+    return style
+
+
+def _parse_flowchart(lines: List[Tuple[int, str]]) -> dict:
+    header_no, header = lines[0]
+    parts = header.split()
+    direction = parts[1].upper() if len(parts) > 1 else "TB"
+    if direction not in DIRECTIONS or len(parts) > 2:
+        raise MermaidSyntaxError(f"Invalid flowchart header {header!r}", header_no)
+    model = {
+        "type": "flowchart",
+        "direction": "TB" if direction == "TD" else direction,
+        "nodes": {},
+        "edges": [],
+        "subgraphs": {},
+        "children": {None: []},  # container id (None = root) -> ordered member ids
+        "styles": {},
+        "unsupported": [],
+    }
+    stack: List[Optional[str]] = [None]
+    placed = set()
+
+    def declare(node: dict):
+        if node["id"] in model["subgraphs"]:
+            return  # An edge to a subgraph id connects to the subgraph itself.
+        existing = model["nodes"].get(node["id"])
+        if existing is None:
+            model["nodes"][node["id"]] = {
+                "label": node["label"] if node["label"] is not None else node["id"],
+                "shape": node["shape"] or "rect",
+            }
+        elif node["label"] is not None:
+            existing.update(label=node["label"], shape=node["shape"])
+        if node["id"] not in placed:
+            placed.add(node["id"])
+            model["children"][stack[-1]].append(node["id"])
+
+    for line_no, text in lines[1:]:
+        keyword = text.split(None, 1)[0]
+        rest = text[len(keyword):].strip()
+        if keyword == "subgraph":
+            sub_id, label = _parse_subgraph_header(rest, line_no)
+            if sub_id in model["subgraphs"]:
+                raise MermaidSyntaxError(f"Duplicate subgraph id {sub_id!r}", line_no)
+            if sub_id in model["nodes"]:
+                # Referenced by an edge before its declaration: it was never a node.
+                del model["nodes"][sub_id]
+                for members in model["children"].values():
+                    if sub_id in members:
+                        members.remove(sub_id)
+            model["subgraphs"][sub_id] = {"label": label, "direction": None, "parent": stack[-1], "line": line_no}
+            model["children"][stack[-1]].append(sub_id)
+            model["children"][sub_id] = []
+            placed.add(sub_id)
+            stack.append(sub_id)
+        elif text == "end":
+            if len(stack) == 1:
+                raise MermaidSyntaxError("'end' without a matching subgraph", line_no)
+            stack.pop()
+        elif keyword == "direction":
+            if rest.upper() not in DIRECTIONS:
+                raise MermaidSyntaxError(f"Invalid direction {rest!r}", line_no)
+            if stack[-1] is None:
+                model["direction"] = "TB" if rest.upper() == "TD" else rest.upper()
+            else:
+                model["subgraphs"][stack[-1]]["direction"] = "TB" if rest.upper() == "TD" else rest.upper()
+        elif keyword == "style":
+            target, _, props = rest.partition(" ")
+            model["styles"].setdefault(target, {}).update(_parse_style(props))
+        elif keyword in ("classDef", "class", "linkStyle", "click") or text.startswith(":::"):
+            model["unsupported"].append((line_no, text))
+        else:
+            nodes, edges = _parse_chain(text, line_no)
+            for node in nodes:
+                declare(node)
+                if node.get("class"):
+                    model["unsupported"].append((line_no, f"{node['id']}:::{node['class']}"))
+            model["edges"].extend(edges)
+    if len(stack) > 1:
+        raise MermaidSyntaxError(f"subgraph {stack[-1]!r} is never closed with 'end'", model["subgraphs"][stack[-1]]["line"])
+    return model
+
+
+# --- ER diagram ---
+
+_ER_RELATION = re.compile(
+    r"^(?P<a>[\w-]+)\s*(?P<left>\|o|\|\||\}o|\}\|)(?P<line>--|\.\.)(?P<right>o\||\|\||o\{|\|\{)\s*(?P<b>[\w-]+)"
+    r"\s*:\s*(?P<label>.+)$"
+)
+_ER_ATTRIBUTE = re.compile(r'^(?P<type>[\w\-\[\]()]+)\s+(?P<name>[\w\-\[\]()*]+)(?P<keys>(?:\s+(?:PK|FK|UK)(?:\s*,\s*(?:PK|FK|UK))*)?)\s*(?P<comment>"[^"]*")?$')
+
+
+def _parse_er(lines: List[Tuple[int, str]]) -> dict:
+    model = {"type": "er", "entities": {}, "relations": [], "unsupported": []}
+    current = None
+    for line_no, text in lines[1:]:
+        if current is not None:
+            if text == "}":
+                current = None
+                continue
+            match = _ER_ATTRIBUTE.match(text)
+            if not match:
+                raise MermaidSyntaxError(f"Invalid attribute {text!r} in entity", line_no)
+            keys = [k.strip() for k in re.split(r"[\s,]+", match.group("keys")) if k.strip()]
+            model["entities"][current].append({"type": match.group("type"), "name": match.group("name"), "keys": keys})
+            continue
+        block = re.match(r"^([\w-]+)\s*\{\s*(\})?$", text)
+        if block:
+            model["entities"].setdefault(block.group(1), [])
+            if not block.group(2):
+                current = block.group(1)
+            continue
+        relation = _ER_RELATION.match(text)
+        if relation:
+            for name in (relation.group("a"), relation.group("b")):
+                model["entities"].setdefault(name, [])
+            model["relations"].append({
+                "src": relation.group("a"),
+                "dst": relation.group("b"),
+                "src_card": relation.group("left"),
+                "dst_card": relation.group("right"),
+                "identifying": relation.group("line") == "--",
+                "label": clean_label(relation.group("label")),
+            })
+            continue
+        if re.match(r"^[\w-]+$", text):
+            model["entities"].setdefault(text, [])
+            continue
+        raise MermaidSyntaxError(f"Invalid erDiagram statement {text!r}", line_no)
+    if current is not None:
+        raise MermaidSyntaxError(f"Entity {current!r} is missing its closing '}}'", lines[-1][0])
+    return model
+
+
+# --- Sequence diagram ---
+
+_SEQ_ARROWS = ["-->>", "->>", "--x", "-x", "--)", "-)", "-->", "->"]
+_SEQ_MESSAGE = re.compile(
+    r"^(?P<a>[^\s:>+-][^:>+]*?)\s*(?P<arrow>" + "|".join(re.escape(a) for a in _SEQ_ARROWS) + r")"
+    r"\s*[+-]?\s*(?P<b>[^:+-][^:]*?)\s*:\s*(?P<text>.*)$"
+)
+_SEQ_BLOCKS = {"alt", "opt", "loop", "par", "critical", "break", "rect"}
+_SEQ_BRANCHES = {"else", "and", "option"}
+
+
+def _parse_sequence(lines: List[Tuple[int, str]]) -> dict:
+    model = {"type": "sequence", "participants": [], "events": [], "autonumber": False, "unsupported": []}
+    known = {}
+
+    def participant(pid: str, label: Optional[str] = None, kind: str = "participant"):
+        pid = pid.strip()
+        if pid not in known:
+            known[pid] = {"id": pid, "label": clean_label(label) if label else pid, "kind": kind}
+            model["participants"].append(known[pid])
+        elif label:
+            known[pid].update(label=clean_label(label), kind=kind)
+        return pid
+
+    depth = 0
+    for line_no, text in lines[1:]:
+        keyword = text.split(None, 1)[0]
+        rest = text[len(keyword):].strip()
+        if keyword in ("participant", "actor"):
+            match = re.match(r"^(\S+)(?:\s+as\s+(.+))?$", rest)
+            if not match:
+                raise MermaidSyntaxError(f"Invalid {keyword} declaration", line_no)
+            participant(match.group(1), match.group(2), keyword)
+        elif keyword == "autonumber":
+            model["autonumber"] = True
+        elif keyword in ("activate", "deactivate"):
+            participant(rest)
+        elif keyword == "box":
+            # Participant grouping; the native renderer does not draw boxes.
+            depth += 1
+            model["unsupported"].append((line_no, text))
+            model["events"].append({"kind": "box", "line": line_no})
+        elif keyword in _SEQ_BLOCKS:
+            depth += 1
+            model["events"].append({"kind": "block", "block": keyword, "label": clean_label(rest), "line": line_no})
+        elif keyword in _SEQ_BRANCHES:
+            if not depth:
+                raise MermaidSyntaxError(f"'{keyword}' outside a block", line_no)
+            model["events"].append({"kind": "branch", "label": clean_label(rest), "line": line_no})
+        elif text == "end":
+            if not depth:
+                raise MermaidSyntaxError("'end' without a matching block", line_no)
+            depth -= 1
+            model["events"].append({"kind": "end", "line": line_no})
+        elif keyword.lower() == "note":
+            match = re.match(r"^(left of|right of|over)\s+([^:]+?)\s*:\s*(.*)$", rest, re.IGNORECASE)
+            if not match:
+                raise MermaidSyntaxError("Invalid note; use 'Note over A: text'", line_no)
+            targets = [participant(t) for t in match.group(2).split(",")]
+            model["events"].append({
+                "kind": "note", "position": match.group(1).lower(), "targets": targets,
+                "text": clean_label(match.group(3)), "line": line_no,
+            })
+        else:
+            match = _SEQ_MESSAGE.match(text)
+            if not match:
+                if keyword in ("title", "link", "links", "properties", "details", "create", "destroy"):
+                    model["unsupported"].append((line_no, text))
+                    continue
+                raise MermaidSyntaxError(f"Invalid sequence statement {text!r}", line_no)
+            arrow = match.group("arrow")
+            model["events"].append({
+                "kind": "message",
+                "src": participant(match.group("a")),
+                "dst": participant(match.group("b")),
+                "text": clean_label(match.group("text")),
+                "dashed": arrow.startswith("--"),
+                "head": "cross" if arrow.endswith("x") else "open" if arrow.endswith(")") else
+                        "filled" if arrow.endswith(">>") else "none",
+                "line": line_no,
+            })
+    if depth:
+        raise MermaidSyntaxError("Block is never closed with 'end'", lines[-1][0])
+    return model
+
+
+# --- State diagram ---
+
+_STATE_REF = r"\[\*\]|[\w-]+"
+_STATE_TRANSITION = re.compile(rf"^(?P<a>{_STATE_REF})\s*-->\s*(?P<b>{_STATE_REF})\s*(?::\s*(?P<label>.*))?$")
+
+
+def _parse_state(lines: List[Tuple[int, str]]) -> dict:
+    model = {"type": "state", "direction": "TB", "states": {}, "transitions": [], "unsupported": []}
+
+    def state(ref: str, role: str) -> str:
+        if ref == "[*]":
+            ref = "[*]start" if role == "src" else "[*]end"
+            model["states"].setdefault(ref, {"label": "", "kind": ref[3:]})
+        else:
+            model["states"].setdefault(ref, {"label": ref, "kind": "state"})
+        return ref
+
+    for line_no, text in lines[1:]:
+        keyword = text.split(None, 1)[0]
+        rest = text[len(keyword):].strip()
+        transition = _STATE_TRANSITION.match(text)
+        if transition:
+            model["transitions"].append({
+                "src": state(transition.group("a"), "src"),
+                "dst": state(transition.group("b"), "dst"),
+                "label": clean_label(transition.group("label") or ""),
+            })
+        elif keyword == "direction":
+            if rest.upper() not in DIRECTIONS:
+                raise MermaidSyntaxError(f"Invalid direction {rest!r}", line_no)
+            model["direction"] = "TB" if rest.upper() == "TD" else rest.upper()
+        elif keyword == "state":
+            alias = re.match(r'^"([^"]*)"\s+as\s+([\w-]+)$', rest)
+            if alias:
+                state(alias.group(2), "src")
+                model["states"][alias.group(2)]["label"] = clean_label(alias.group(1))
+            elif re.match(r"^[\w-]+$", rest):
+                state(rest, "src")
+            else:
+                # Composite states, <<choice>>/<<fork>> and the like.
+                model["unsupported"].append((line_no, text))
+        elif keyword.lower() == "note" or keyword in ("classDef", "class", "}", "--"):
+            model["unsupported"].append((line_no, text))
+        else:
+            description = re.match(r"^([\w-]+)\s*:\s*(.+)$", text)
+            if not description:
+                raise MermaidSyntaxError(f"Invalid stateDiagram statement {text!r}", line_no)
+            state(description.group(1), "src")
+            model["states"][description.group(1)]["label"] = clean_label(description.group(2))
+    return model
+
+
+_PARSERS = {"flowchart": _parse_flowchart, "er": _parse_er, "sequence": _parse_sequence, "state": _parse_state}
+
+
+def parse_mermaid(code: str) -> dict:
+    """Parse ``code`` into a diagram model; raises ``MermaidSyntaxError`` when it is not valid."""
+    kind = diagram_type(code)
+    if kind is None:
+        lines = _source_lines(code)
+        first = lines[0] if lines else (0, "")
+        raise MermaidSyntaxError(f"Unknown or unsupported diagram header {first[1][:40]!r}", first[0])
+    return _PARSERS[kind](_source_lines(code))
+
+
+# --- Repair ---
+#
+# LLM-written diagrams fail in a handful of predictable ways. ``repair_mermaid``
+# fixes those in the source text (so the fixed code still renders with mmdc /
+# the renderer pool) and then validates the result with ``parse_mermaid``.
+
+# Characters allowed in a sloppy node id such as ``N/A`` or ``api.v2``.
+_LOOSE_ID = re.compile(r"(?:[^\s\[\](){}<>&|\"=:;.\-→⟶➔]|-(?![-.>])|\.(?![-.>]))+")
+# What may follow a node label: end of statement, ``&``, a class or an arrow.
+_AFTER_LABEL = re.compile(r"\s*(?:$|&|:::|[-=.<→⟶➔]|[xo][-=])")
+_RESERVED_IDS = {"end"}
+# (pattern at the start of an edge, replacement); first match wins.
+_FLOW_ARROW_REPAIRS = [
+    (re.compile(r"--\|([^|]*)\|-->"), r"-->|\1|"),
+    (re.compile(r"[→⟶➔]"), "-->"),
+    (re.compile(r"(-{2,}|={2,})>{2,}"), r"\1>"),
+    (re.compile(r"<->(?!>)"), "<-->"),
+    (re.compile(r"->(?!>)"), "-->"),
+    (re.compile(r"=>"), "==>"),
+    (re.compile(r"\.->"), "-.->"),
+    (re.compile(r"--\s+>"), "-->"),
+]
+
+
+def _split_statements(text: str) -> List[str]:
+    """Split one source line on ``;`` outside quotes."""
+    parts, part, quoted = [], [], False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        if ch == ";" and not quoted:
+            parts.append("".join(part))
+            part = []
+            continue
+        part.append(ch)
+    parts.append("".join(part))
+    return parts
+
+
+def _quote_label(raw: str) -> str:
+    """``raw`` as a quoted label, inner quotes escaped."""
+    inner = raw.strip()
+    if len(inner) >= 2 and inner[0] == '"' and inner[-1] == '"':
+        inner = inner[1:-1]
+    return '"' + inner.replace('"', "#quot;") + '"'
+
+
+def _needs_quotes(raw: str) -> bool:
+    inner = raw.strip()
+    if len(inner) >= 2 and inner[0] == '"' and inner[-1] == '"':
+        return '"' in inner[1:-1]
+    return '"' in inner or any(ch in _UNQUOTED_FORBIDDEN for ch in inner)
+
+
+class _FlowRepair:
+    """Token-level fixes for flowchart statements, following ``_parse_chain``."""
+
+    def __init__(self):
+        self.repairs: List[str] = []
+        self.renamed: Dict[str, str] = {}
+        self.labelled: set = set()  # ids declared with a shape
+        self.ids: set = set()
+
+    def _node_id(self, text: str, pos: int, line_no: int) -> Tuple[str, int]:
+        loose = _LOOSE_ID.match(text, pos)
+        if not loose:
+            return "", pos
+        raw = loose.group(0)
+        strict = _NODE_ID.fullmatch(raw)
+        if strict and raw not in _RESERVED_IDS:
+            self.ids.add(raw)
+            return raw, loose.end()
+        if raw not in self.renamed:
+            base = (re.sub(r"\W+", "_", raw).strip("_") or "node") + ("_node" if raw in _RESERVED_IDS else "")
+            new, n = base, 2
+            while new in self.ids or new in self.renamed.values():
+                new, n = f"{base}_{n}", n + 1
+            self.renamed[raw] = new
+            self.repairs.append(f"line {line_no}: renamed node id {raw!r} to {new!r}")
+        self.ids.add(self.renamed[raw])
+        return self.renamed[raw], loose.end()
+
+    def label(self, text: str, pos: int, close: str, line_no: int) -> Tuple[str, int]:
+        """Raw label at ``pos`` (quoted when it needs to be) and the position after ``close``."""
+        end = text.find(close, pos)
+        first = end
+        while end >= 0 and not _AFTER_LABEL.match(text, end + len(close)):
+            end = text.find(close, end + 1)
+        if end < 0:
+            end = first
+        if end < 0:
+            self.repairs.append(f"line {line_no}: closed label with {close!r}")
+            return _quote_label(text[pos:]) if _needs_quotes(text[pos:]) else text[pos:], len(text)
+        raw = text[pos:end]
+        if _needs_quotes(raw):
+            self.repairs.append(f"line {line_no}: quoted label {raw.strip()!r}")
+            raw = _quote_label(raw)
+        return raw, end + len(close)
+
+    def _node(self, text: str, pos: int, line_no: int, out: List[str]) -> Optional[int]:
+        node_id, pos = self._node_id(text, pos, line_no)
+        if not node_id:
+            return None
+        out.append(node_id)
+        for open_, close, _ in _SHAPES:
+            if text.startswith(open_, pos):
+                raw, pos = self.label(text, pos + len(open_), close, line_no)
+                out.append(open_ + raw + close)
+                self.labelled.add(node_id)
+                break
+        css_class = re.match(r":::[\w-]+", text[pos:])
+        if css_class:
+            out.append(css_class.group(0))
+            pos += css_class.end()
+        return pos
+
+    def chain(self, text: str, line_no: int) -> str:
+        out: List[str] = []
+        pos = 0
+        while True:
+            # One node group.
+            while True:
+                start = pos
+                pos = self._node(text, pos, line_no, out)
+                if pos is None:
+                    out.append(text[start:])
+                    return "".join(out)
+                spaced = _skip_spaces(text, pos)
+                if text.startswith("&", spaced):
+                    out.append(text[pos:spaced + 1])
+                    pos = spaced + 1
+                    after = _skip_spaces(text, pos)
+                    out.append(text[pos:after])
+                    pos = after
+                    continue
+                break
+            after = _skip_spaces(text, pos)
+            out.append(text[pos:after])
+            pos = after
+            if pos >= len(text):
+                return "".join(out)
+            for pattern, replacement in _FLOW_ARROW_REPAIRS:
+                bad = pattern.match(text, pos)
+                if bad:
+                    good = bad.expand(replacement)
+                    self.repairs.append(f"line {line_no}: arrow {bad.group(0)!r} -> {good!r}")
+                    text = text[:pos] + good + text[bad.end():]
+                    break
+            edge = _EDGE.match(text, pos)
+            if not edge:
+                out.append(text[pos:])
+                return "".join(out)
+            pos = _skip_spaces(text, edge.end())
+            out.append(text[edge.start():pos])
+            if text.startswith("|", pos):
+                close = text.find("|", pos + 1)
+                if close < 0:
+                    out.append(text[pos:])
+                    return "".join(out)
+                label_end = _skip_spaces(text, close + 1)
+                out.append(text[pos:label_end])
+                pos = label_end
+
+    def subgraph(self, rest: str, line_no: int) -> str:
+        match = _NODE_ID.match(rest)
+        if match and rest.startswith("[", match.end()):
+            raw, end = self.label(rest, match.end() + 1, "]", line_no)
+            return f"{match.group(0)}[{raw}]{rest[end:]}"
+        return rest
+
+
+def _repair_flowchart(lines: List[str], repairs: List[str]) -> List[str]:
+    fixer = _FlowRepair()
+    out: List[Optional[str]] = list(lines)
+    headers = []  # (index, raw header text)
+    depth = 0
+    for index, raw in enumerate(lines[1:], start=1):
+        line_no = index + 1
+        text = raw.strip()
+        if not text or text.startswith("%%"):
+            continue
+        indent = raw[:len(raw) - len(raw.lstrip())]
+        statements = []
+        for statement in _split_statements(text):
+            stripped = statement.strip()
+            keyword = stripped.split(None, 1)[0] if stripped else ""
+            if not stripped or keyword in ("direction", "style", "classDef", "class", "linkStyle", "click"):
+                statements.append(statement)
+            elif keyword == "subgraph":
+                depth += 1
+                header = "subgraph " + fixer.subgraph(stripped[len(keyword):].strip(), line_no)
+                headers.append((index, len(statements)))
+                statements.append(header)
+            elif stripped == "end":
+                if depth:
+                    depth -= 1
+                    statements.append(statement)
+                else:
+                    repairs.append(f"line {line_no}: dropped 'end' without a matching subgraph")
+            else:
+                statements.append(fixer.chain(stripped, line_no))
+        if not statements:
+            out[index] = None
+        elif [s.strip() for s in statements] != [s.strip() for s in _split_statements(text)]:
+            out[index] = indent + "; ".join(s.strip() for s in statements)
+    repairs.extend(fixer.repairs)
+
+    # A subgraph must not share its id with a node or an earlier subgraph.
+    seen = set()
+    for index, position in headers:
+        statements = _split_statements(out[index].strip())
+        header = statements[position].strip()
+        try:
+            sub_id, title = _parse_subgraph_header(header[len("subgraph"):], index + 1)
+        except MermaidSyntaxError:
+            continue
+        explicit = _NODE_ID.fullmatch(sub_id) is not None
+        if explicit and (sub_id in fixer.labelled or sub_id in seen):
+            new, n = f"{sub_id}_group", 2
+            while new in fixer.ids or new in seen:
+                new, n = f"{sub_id}_group{n}", n + 1
+            repairs.append(f"line {index + 1}: renamed subgraph id {sub_id!r} to {new!r} (already used)")
+            statements[position] = f"subgraph {new}[{_quote_label(title)}]"
+            indent = out[index][:len(out[index]) - len(out[index].lstrip())]
+            out[index] = indent + "; ".join(s.strip() for s in statements)
+            sub_id = new
+        seen.add(sub_id)
+
+    if depth:
+        repairs.append(f"closed {depth} unterminated subgraph(s)")
+        out.extend(["end"] * depth)
+    return [line for line in out if line is not None]
+
+
+_SEQ_LOOSE_MESSAGE = re.compile(
+    r"^(?P<a>[^\s:>+=→-][^\s:>+=→]*?)\s*(?P<arrow>[-=]{1,2}>{1,3}|--?[x)]|[→⟶➔])\s*(?P<act>[+-]?)\s*"
+    r"(?P<b>[^\s:+-][^\s:]*)\s*(?::\s*(?P<text>.*)|(?P<bare>\S.*))?$"
+)
+_SEQ_ARROW_REPAIRS = {"=>>": "->>", "=>": "->>", "==>": "->>", "==>>": "->>", "->>>": "->>", "-->>>": "-->>",
+                      "→": "->>", "⟶": "->>", "➔": "->>"}
+
+
+def _repair_sequence(lines: List[str], repairs: List[str]) -> List[str]:
+    out: List[str] = [lines[0]]
+    depth = 0
+    for index, raw in enumerate(lines[1:], start=1):
+        line_no = index + 1
+        text = raw.strip()
+        keyword = text.split(None, 1)[0] if text else ""
+        if not text or text.startswith("%%"):
+            out.append(raw)
+            continue
+        if keyword in _SEQ_BLOCKS or keyword == "box":
+            depth += 1
+        elif text == "end":
+            if not depth:
+                repairs.append(f"line {line_no}: dropped 'end' without a matching block")
+                continue
+            depth -= 1
+        elif keyword not in ("participant", "actor", "autonumber", "activate", "deactivate", "title") \
+                and keyword.lower() != "note" and keyword not in _SEQ_BRANCHES and not _SEQ_MESSAGE.match(text):
+            match = _SEQ_LOOSE_MESSAGE.match(text)
+            if match:
+                arrow = _SEQ_ARROW_REPAIRS.get(match.group("arrow"), match.group("arrow"))
+                message = match.group("text") if match.group("text") is not None else match.group("bare") or ""
+                fixed = f"{match.group('a')}{arrow}{match.group('act')}{match.group('b')}: {message}".rstrip()
+                if match.group("text") is None and not message:
+                    fixed += ": " + match.group("b")
+                if _SEQ_MESSAGE.match(fixed):
+                    repairs.append(f"line {line_no}: message {text!r} -> {fixed!r}")
+                    raw = raw[:len(raw) - len(raw.lstrip())] + fixed
+        out.append(raw)
+    if depth:
+        repairs.append(f"closed {depth} unterminated block(s)")
+        out.extend(["end"] * depth)
+    return out
+
+
+_ER_LOOSE_RELATION = re.compile(
+    r"^(?P<a>[\w-]+)\s*(?P<left>[|}{o]{1,2})\s*(?P<line>-{1,3}|\.{1,3})\s*(?P<right>[|{}o]{1,2})\s*(?P<b>[\w-]+)"
+    r"\s*(?::\s*(?P<label>.*))?$"
+)
+_ER_LEFT = {"|": "||", "||": "||", "o": "|o", "|o": "|o", "o|": "|o", "}": "}|", "{": "}|", "}|": "}|",
+            "|}": "}|", "{|": "}|", "}o": "}o", "o}": "}o", "{o": "}o", "o{": "}o"}
+_ER_RIGHT = {"|": "||", "||": "||", "o": "o|", "o|": "o|", "|o": "o|", "{": "|{", "}": "|{", "|{": "|{",
+             "{|": "|{", "|}": "|{", "o{": "o{", "{o": "o{", "}o": "o{", "o}": "o{"}
+
+
+def _repair_er(lines: List[str], repairs: List[str]) -> List[str]:
+    out: List[str] = [lines[0]]
+    in_entity = False
+    for index, raw in enumerate(lines[1:], start=1):
+        line_no = index + 1
+        text = raw.strip()
+        if not text or text.startswith("%%"):
+            out.append(raw)
+            continue
+        if in_entity:
+            if text == "}":
+                in_entity = False
+                out.append(raw)
+                continue
+            if _ER_ATTRIBUTE.match(text):
+                out.append(raw)
+                continue
+            repairs.append(f"line {line_no}: closed entity block before {text!r}")
+            out.append("    }")
+            in_entity = False
+        if re.match(r"^[\w-]+\s*\{\s*$", text):
+            in_entity = True
+        elif not _ER_RELATION.match(text):
+            match = _ER_LOOSE_RELATION.match(text)
+            if match and match.group("left") in _ER_LEFT and match.group("right") in _ER_RIGHT:
+                label = (match.group("label") or "").strip() or '""'
+                line = "--" if match.group("line")[0] == "-" else ".."
+                fixed = (f"{match.group('a')} {_ER_LEFT[match.group('left')]}{line}{_ER_RIGHT[match.group('right')]} "
+                         f"{match.group('b')} : {label}")
+                repairs.append(f"line {line_no}: relationship {text!r} -> {fixed!r}")
+                raw = raw[:len(raw) - len(raw.lstrip())] + fixed
+        out.append(raw)
+    if in_entity:
+        repairs.append("closed an unterminated entity block")
+        out.append("    }")
+    return out
+
+
+_STATE_LOOSE_TRANSITION = re.compile(
+    rf"^(?P<a>{_STATE_REF})\s*(?P<arrow>->|=>|==>|-{{3,}}>|[→⟶➔])\s*(?P<b>{_STATE_REF})\s*(?P<rest>:.*)?$"
+)
+
+
+def _repair_state(lines: List[str], repairs: List[str]) -> List[str]:
+    out: List[str] = [lines[0]]
+    for index, raw in enumerate(lines[1:], start=1):
+        match = _STATE_LOOSE_TRANSITION.match(raw.strip())
+        if match:
+            fixed = f"{match.group('a')} --> {match.group('b')}{' ' + match.group('rest') if match.group('rest') else ''}"
+            repairs.append(f"line {index + 1}: arrow {match.group('arrow')!r} -> '-->'")
+            raw = raw[:len(raw) - len(raw.lstrip())] + fixed
+        out.append(raw)
+    return out
+
+
+_REPAIRERS = {"flowchart": _repair_flowchart, "er": _repair_er, "sequence": _repair_sequence, "state": _repair_state}
+
+
+def repair_mermaid(code: str) -> Tuple[str, List[str]]:
+    """
+    Fix common faults in ``code`` and validate the result.
+
+    Returns ``(code, repairs)`` where ``repairs`` describes each change (empty
+    when the code was already valid). Unquoted labels with brackets or quotes,
+    malformed arrows, reserved or invalid node ids, subgraph ids that clash
+    with a node, unbalanced ``end`` and ER relationships without a label are
+    repaired. Raises ``MermaidSyntaxError`` when the code still does not
+    parse. Diagram types outside the supported subset are returned unchanged.
+    """
+    kind = diagram_type(code)
+    if kind is None:
+        return code, []
+    lines = code.splitlines()
+    header = next(i for i, line in enumerate(lines) if line.strip() and not line.strip().startswith("%%"))
+    repairs: List[str] = []
+    body = _REPAIRERS[kind](lines[header:], repairs)
+    fixed = "\n".join(lines[:header] + body) + ("\n" if code.endswith("\n") else "")
+    parse_mermaid(fixed)
+    return (fixed, repairs) if repairs else (code, [])
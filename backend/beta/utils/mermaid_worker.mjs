@@ -0,0 +1,176 @@
+// Long-lived Mermaid renderer used by backend/beta/utils/mermaid_pool.py.
+//
+// Launches one headless browser and keeps it warm. Jobs arrive on stdin as
+// one JSON object per line and results are written to stdout the same way:
+//
+//   -> {"id": "1", "code": "flowchart LR\n A-->B", "output": "/abs/out.png",
+//       "format": "png", "width": 600, "height": 900, "scale": 2,
+//       "theme": "neutral", "background": "white",
+//       "config_path": "...json", "css_path": "...css"}
+//   <- {"id": "1", "started": true}
+//   <- {"id": "1", "ok": true, "ms": 412}
+//   <- {"id": "2", "ok": false, "error": "Parse error on line 2"}
+//
+// With "svg_output" set the diagram is rendered as SVG to that path and
+// "output" receives a PNG fallback drawn from it at "fallback_scale".
+//
+// Up to MERMAID_POOL_PAGES jobs render concurrently, each in its own page.
+// "started" is sent when a job leaves the queue for a page; the pool times
+// jobs from there, so time spent queued behind other jobs does not count.
+
+import fs from "node:fs";
+import path from "node:path";
+import readline from "node:readline";
+import { pathToFileURL } from "node:url";
+
+const MAX_PAGES = Math.max(1, parseInt(process.env.MERMAID_POOL_PAGES || "3", 10));
+
+function send(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+function packageEntry(root, name) {
+  const dir = path.join(root, name);
+  const pkg = JSON.parse(fs.readFileSync(path.join(dir, "package.json"), "utf8"));
+  let entry = pkg.exports;
+  if (entry && typeof entry === "object" && entry["."] !== undefined) {
+    entry = entry["."];
+  }
+  while (entry && typeof entry === "object") {
+    entry = entry.import || entry.default || entry.node || null;
+  }
+  return path.join(dir, entry || pkg.module || pkg.main || "index.js");
+}
+
+async function importFrom(roots, name) {
+  for (const root of roots) {
+    if (fs.existsSync(path.join(root, name, "package.json"))) {
+      return import(pathToFileURL(packageEntry(root, name)).href);
+    }
+  }
+  return import(name);
+}
+
+const globalRoot = process.env.MERMAID_CLI_NODE_MODULES || "";
+const cliRoots = globalRoot ? [globalRoot] : [];
+const cli = await importFrom(cliRoots, "@mermaid-js/mermaid-cli");
+const puppeteerRoots = globalRoot
+  ? [path.join(globalRoot, "@mermaid-js", "mermaid-cli", "node_modules"), globalRoot]
+  : [];
+const puppeteerModule = await importFrom(puppeteerRoots, "puppeteer");
+const puppeteer = puppeteerModule.default || puppeteerModule;
+
+const browser = await puppeteer.launch({
+  headless: "new",
+  executablePath: process.env.PUPPETEER_EXECUTABLE_PATH || undefined,
+  args: ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"],
+});
+browser.on("disconnected", () => {
+  // Without a browser every job would fail; exit so the pool restarts us.
+  process.exit(3);
+});
+
+const fileCache = new Map();
+function readCached(file, parse) {
+  if (!file) return undefined;
+  let stat;
+  try {
+    stat = fs.statSync(file);
+  } catch {
+    return undefined;
+  }
+  const hit = fileCache.get(file);
+  if (hit && hit.mtimeMs === stat.mtimeMs) return hit.value;
+  const raw = fs.readFileSync(file, "utf8");
+  const value = parse ? JSON.parse(raw) : raw;
+  fileCache.set(file, { mtimeMs: stat.mtimeMs, value });
+  return value;
+}
+
+// Draws an SVG the worker just rendered to a PNG, without running Mermaid again.
+async function rasterizeSvg(svg, job) {
+  const page = await browser.newPage();
+  try {
+    await page.setViewport({
+      width: job.width || 800,
+      height: job.height || 600,
+      deviceScaleFactor: job.fallback_scale || 1,
+    });
+    const background = job.background || "white";
+    await page.setContent(`<!DOCTYPE html><html><body style="margin:0;background:${background}">${svg}</body></html>`);
+    const element = await page.$("svg");
+    return await element.screenshot({ omitBackground: background === "transparent" });
+  } finally {
+    await page.close();
+  }
+}
+
+async function render(job) {
+  const started = Date.now();
+  let mermaidConfig = { theme: job.theme || "default", ...(readCached(job.config_path, true) || {}) };
+  if (job.svg_output) {
+    // Word does not draw <foreignObject>, so labels must be plain SVG text.
+    mermaidConfig = {
+      ...mermaidConfig,
+      htmlLabels: false,
+      flowchart: { ...(mermaidConfig.flowchart || {}), htmlLabels: false },
+    };
+  }
+  const { data } = await cli.renderMermaid(browser, job.code, job.svg_output ? "svg" : job.format || "png", {
+    viewport: {
+      width: job.width || 800,
+      height: job.height || 600,
+      deviceScaleFactor: job.scale || 1,
+    },
+    backgroundColor: job.background || "white",
+    mermaidConfig,
+    myCSS: readCached(job.css_path, false),
+  });
+  fs.mkdirSync(path.dirname(job.output), { recursive: true });
+  if (job.svg_output) {
+    const svg = Buffer.from(data).toString("utf8");
+    fs.writeFileSync(job.svg_output, svg);
+    fs.writeFileSync(job.output, await rasterizeSvg(svg, job));
+  } else {
+    fs.writeFileSync(job.output, data);
+  }
+  return Date.now() - started;
+}
+
+let active = 0;
+const waiting = [];
+
+function pump() {
+  while (active < MAX_PAGES && waiting.length) {
+    const job = waiting.shift();
+    active += 1;
+    send({ id: job.id, started: true });
+    render(job)
+      .then((ms) => send({ id: job.id, ok: true, ms }))
+      .catch((err) => send({ id: job.id, ok: false, error: String((err && err.message) || err) }))
+      .finally(() => {
+        active -= 1;
+        pump();
+      });
+  }
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on("line", (line) => {
+  if (!line.trim()) return;
+  let job;
+  try {
+    job = JSON.parse(line);
+  } catch (err) {
+    send({ id: null, ok: false, error: `Invalid job: ${err.message}` });
+    return;
+  }
+  waiting.push(job);
+  pump();
+});
+rl.on("close", async () => {
+  await browser.close().catch(() => {});
+  process.exit(0);
+});
+
+send({ ready: true, pid: process.pid });
@@ -0,0 +1,198 @@
+"""
+Latency- and cost-aware model routing.
+
+Every LLM call site reports its outcome per task (``srs_sections``,
+``notebook_analyze``, ``notebook_chat``, ``notebook_diagram``) and model:
+latency, whether the call failed, and whether the reply was usable JSON.
+``MODEL_ROUTER.order(task, models, prompt)`` ranks a call site's candidates
+from that rolling window:
+
+1. models that meet the task's latency target (p90) and success floor,
+   cheapest expected cost per successful call first;
+2. models without enough samples yet, in the configured order;
+3. the rest, fastest failure-adjusted latency first.
+
+With probability ``LLM_ROUTER_EXPLORE`` an alternative (preferring the least
+sampled) is moved to the front instead, so a model that recovered or a new
+one gets measured. Recent decisions are kept for the admin endpoint.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from backend.beta.utils.rate_limiter import estimate_tokens
+
+# USD per million (input, output) tokens; override or extend with LLM_MODEL_COSTS (JSON).
+_DEFAULT_COSTS = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro-latest": (1.25, 5.00),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+_DEFAULT_TARGETS_SEC = {
+    "srs_sections": 20.0,
+    "notebook_analyze": 8.0,
+    "notebook_chat": 6.0,
+    "notebook_diagram": 10.0,
+}
+
+
+def _load_costs() -> Dict[str, Tuple[float, float]]:
+    costs = dict(_DEFAULT_COSTS)
+    raw = os.getenv("LLM_MODEL_COSTS", "").strip()
+    if raw:
+        try:
+            for name, pair in json.loads(raw).items():
+                costs[name] = (float(pair[0]), float(pair[1]))
+        except (ValueError, TypeError, IndexError, AttributeError) as e:
+            print(f"⚠️ Ignoring invalid LLM_MODEL_COSTS: {e}")
+    return costs
+
+
+class ModelWindow:
+    """Rolling outcomes of one model on one task: ``(seconds, ok, json_valid)``."""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)
+        self.calls = 0
+
+    def record(self, seconds: float, ok: bool, json_valid: bool):
+        self.outcomes.append((seconds, ok, ok and json_valid))
+        self.calls += 1
+
+    def stats(self) -> dict:
+        n = len(self.outcomes)
+        if not n:
+            return {"samples": 0, "p50_sec": None, "p90_sec": None, "failure_rate": None, "json_valid_rate": None, "success_rate": None}
+        latencies = sorted(seconds for seconds, _, _ in self.outcomes)
+        ok = sum(1 for _, o, _ in self.outcomes if o)
+        valid = sum(1 for _, _, v in self.outcomes if v)
+        return {
+            "samples": n,
+            "p50_sec": latencies[int(0.5 * (n - 1))],
+            "p90_sec": latencies[int(round(0.9 * (n - 1)))],
+            "failure_rate": 1 - ok / n,
+            "json_valid_rate": valid / ok if ok else 0.0,
+            "success_rate": valid / n,
+        }
+
+
+class ModelRouter:
+    """Thread-safe per-task model statistics and the ranking built on them."""
+
+    def __init__(self, window: int = 50, min_samples: int = 5, min_success: float = 0.8,
+                 explore: float = 0.1, output_tokens: int = 1024, enabled: bool = True, seed: Optional[int] = None):
+        self.window = max(1, window)
+        self.min_samples = max(1, min_samples)
+        self.min_success = min_success
+        self.explore = explore
+        self.output_tokens = output_tokens
+        self.enabled = enabled
+        self.costs = _load_costs()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, str], ModelWindow] = {}
+        self._decisions: Dict[str, dict] = {}
+        self._recent = deque(maxlen=100)
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def target_sec(self, task: str) -> float:
+        name = f"LLM_ROUTER_TARGET_{re.sub(r'[^A-Z0-9]', '_', task.upper())}_SEC"
+        return float(os.getenv(name, _DEFAULT_TARGETS_SEC.get(task, 15.0)))
+
+    def cost_per_million(self, model: str) -> Optional[Tuple[float, float]]:
+        name = (model or "").strip()
+        return self.costs.get(name) or self.costs.get(name.split("/", 1)[-1])
+
+    def record(self, task: str, model: str, seconds: float, ok: bool, json_valid: bool = True):
+        with self._lock:
+            key = (task, model)
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = ModelWindow(self.window)
+            window.record(seconds, ok, json_valid)
+
+    def _rank(self, task: str, models: List[str], prompt_tokens: int) -> List[dict]:
+        target = self.target_sec(task)
+        ranked = []
+        for position, model in enumerate(models):
+            window = self._windows.get((task, model))
+            stats = window.stats() if window else ModelWindow(1).stats()
+            price = self.cost_per_million(model)
+            cost = (prompt_tokens * price[0] + self.output_tokens * price[1]) / 1e6 if price else None
+            entry = {"model": model, **stats, "cost_per_call_usd": cost}
+            if stats["samples"] < self.min_samples:
+                entry["tier"], key = "unmeasured", (1, position)
+            elif stats["p90_sec"] <= target and stats["success_rate"] >= self.min_success:
+                # Unknown prices sort after every priced model that qualifies.
+                per_success = cost / stats["success_rate"] if cost is not None else float("inf")
+                entry["tier"], key = "meets_target", (0, per_success, stats["p90_sec"])
+            else:
+                entry["tier"] = "misses_target"
+                key = (2, stats["p90_sec"] / max(stats["success_rate"], 0.05))
+            ranked.append((key, entry))
+        ranked.sort(key=lambda item: item[0])
+        return [entry for _, entry in ranked]
+
+    def order(self, task: str, models: List[str], prompt: str = "") -> List[str]:
+        """Return ``models`` best-first for ``task``; the configured order while routing is off."""
+        models = list(dict.fromkeys(models))
+        if not models:
+            return models
+        with self._lock:
+            ranked = self._rank(task, models, estimate_tokens(prompt))
+            reason = "exploit"
+            if not self.enabled:
+                ranked.sort(key=lambda entry: models.index(entry["model"]))
+                reason = "disabled"
+            elif len(ranked) > 1 and self._random.random() < self.explore:
+                alternatives = ranked[1:]
+                fewest = min(entry["samples"] for entry in alternatives)
+                pick = self._random.choice([entry for entry in alternatives if entry["samples"] == fewest])
+                ranked.remove(pick)
+                ranked.insert(0, pick)
+                reason = "explore"
+            elif all(entry["tier"] == "unmeasured" for entry in ranked):
+                reason = "default"
+            chosen = [entry["model"] for entry in ranked]
+            decision = {"at": time.time(), "reason": reason, "target_sec": self.target_sec(task), "order": chosen}
+            self._decisions[task] = {**decision, "candidates": ranked}
+            self._recent.append({"task": task, **decision})
+            counts = self._counts.setdefault(task, {})
+            counts[reason] = counts.get(reason, 0) + 1
+        return chosen
+
+    def status(self) -> dict:
+        with self._lock:
+            tasks: Dict[str, dict] = {}
+            for (task, model), window in self._windows.items():
+                tasks.setdefault(task, {"target_sec": self.target_sec(task), "models": {}})
+                tasks[task]["models"][model] = {**window.stats(), "calls": window.calls}
+            return {
+                "enabled": self.enabled,
+                "explore_rate": self.explore,
+                "min_samples": self.min_samples,
+                "min_success": self.min_success,
+                "tasks": tasks,
+                "decision_counts": {task: dict(counts) for task, counts in self._counts.items()},
+                "last_decision": dict(self._decisions),
+                "recent_decisions": list(self._recent),
+            }
+
+
+MODEL_ROUTER = ModelRouter(
+    window=int(os.getenv("LLM_ROUTER_WINDOW", "50")),
+    min_samples=int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5")),
+    min_success=float(os.getenv("LLM_ROUTER_MIN_SUCCESS", "0.8")),
+    explore=float(os.getenv("LLM_ROUTER_EXPLORE", "0.1")),
+    output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1024")),
+    enabled=os.getenv("LLM_ROUTER_ENABLED", "1") != "0",
+)
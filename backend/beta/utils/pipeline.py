@@ -0,0 +1,72 @@
+"""
+Minimal DAG executor for the generation pipeline.
+
+Stages are async callables that receive the results of the stages they
+depend on. Each stage starts as soon as its dependencies finish, so
+independent work (rendering input-only diagrams, the AI call) overlaps.
+Per-stage timings are recorded so the overlap can be reported.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+StageFn = Callable[[Dict[str, object]], Awaitable[object]]
+
+
+class Pipeline:
+    """Run named async stages in dependency order with maximal overlap."""
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[StageFn, Tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: StageFn, deps: Iterable[str] = ()) -> "Pipeline":
+        deps = tuple(deps)
+        missing = [d for d in deps if d not in self._stages]
+        if name in self._stages or missing:
+            # Requiring dependencies to be added first rules out cycles.
+            raise ValueError(f"Stage {name!r} is a duplicate or depends on unknown stages {missing}")
+        self._stages[name] = (fn, deps)
+        return self
+
+    async def run(self) -> Tuple[Dict[str, object], Dict[str, dict]]:
+        """
+        Execute every stage and return ``(results, timings)``. Timings hold
+        ``start``, ``end`` and ``duration`` in seconds from the pipeline start.
+        The first stage to raise cancels the rest and its exception propagates.
+        """
+        started = time.perf_counter()
+        results: Dict[str, object] = {}
+        timings: Dict[str, dict] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, fn: StageFn, deps: Tuple[str, ...]):
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            begin = time.perf_counter()
+            try:
+                results[name] = await fn({d: results[d] for d in deps})
+            finally:
+                end = time.perf_counter()
+                timings[name] = {
+                    "start": round(begin - started, 3),
+                    "end": round(end - started, 3),
+                    "duration": round(end - begin, 3),
+                }
+
+        for name, (fn, deps) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, fn, deps))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return results, timings
+
+
+def overlap_saved(timings: Dict[str, dict]) -> float:
+    """Seconds saved versus running every stage back to back."""
+    if not timings:
+        return 0.0
+    serial = sum(t["duration"] for t in timings.values())
+    return round(max(0.0, serial - max(t["end"] for t in timings.values())), 3)
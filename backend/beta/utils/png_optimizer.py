@@ -0,0 +1,149 @@
+"""
+Lossless post-processing for rendered diagram PNGs.
+
+Every fresh render is rewritten before it enters the render cache:
+textual/time/EXIF metadata is dropped, a ``pHYs`` chunk records the render
+DPI (python-docx uses it for the image's native size), and the image data
+is re-deflated at the highest zlib level. When Pillow is installed, images
+with at most 256 distinct opaque colors are also converted to an exact
+palette. The result is only kept when it is smaller, and savings are
+recorded per diagram.
+"""
+
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Optional: palette reduction is skipped without Pillow.
+    Image = None
+
+_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Ancillary chunks that carry no pixel or color information.
+_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf", b"pHYs"}
+
+
+def _chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    if not data.startswith(_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    chunks, pos = [], len(_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunks.append((kind, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+        if kind == b"IEND":
+            break
+    return chunks
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+
+def _phys(dpi: int) -> bytes:
+    ppm = round(dpi / 0.0254)
+    return _chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+
+
+def _restream(data: bytes, dpi: int) -> bytes:
+    """Same pixels and filters: metadata stripped, DPI recorded, IDAT re-deflated at level 9."""
+    chunks = _chunks(data)
+    compressed = b"".join(body for kind, body in chunks if kind == b"IDAT")
+    recompressed = zlib.compress(zlib.decompress(compressed), 9)
+    idat = recompressed if len(recompressed) < len(compressed) else compressed
+    out = [_SIGNATURE]
+    for kind, body in chunks:
+        if kind in _METADATA_CHUNKS or kind == b"IEND":
+            continue
+        if kind == b"IDAT":
+            if idat is not None:
+                out.append(_phys(dpi))
+                out.append(_chunk(b"IDAT", idat))
+                idat = None
+            continue
+        out.append(_chunk(kind, body))
+    out.append(_chunk(b"IEND", b""))
+    return b"".join(out)
+
+
+def _palettize(data: bytes, dpi: int) -> Optional[bytes]:
+    """Exact palette version of an image with <= 256 opaque colors, else None."""
+    if Image is None:
+        return None
+    with Image.open(BytesIO(data)) as img:
+        img.load()
+        if img.mode == "RGBA":
+            if img.getextrema()[3][0] < 255:
+                return None
+            img = img.convert("RGB")
+        if img.mode != "RGB":
+            return None
+        colors = img.getcolors(256)
+        if colors is None:
+            return None
+        paletted = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=len(colors))
+        # ADAPTIVE can merge colors; only accept a pixel-exact result.
+        if paletted.convert("RGB").tobytes() != img.tobytes():
+            return None
+        buffer = BytesIO()
+        paletted.save(buffer, format="PNG", optimize=True, dpi=(dpi, dpi))
+        return buffer.getvalue()
+
+
+class PngOptimizer:
+    """Rewrites PNGs in place and keeps per-diagram savings."""
+
+    def __init__(self, dpi: int, enabled: bool = True, history: int = 100):
+        self.dpi = dpi
+        self.enabled = enabled
+        self.optimized = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def optimize(self, path: Path, dpi: Optional[int] = None) -> Tuple[int, int]:
+        """Optimize ``path`` (rendered at ``dpi``, default ``self.dpi``) and return ``(bytes_before, bytes_after)``."""
+        path = Path(path)
+        data = path.read_bytes()
+        if not self.enabled:
+            return len(data), len(data)
+        dpi = dpi or self.dpi
+        best = data
+        try:
+            for candidate in (_restream(data, dpi), _palettize(data, dpi)):
+                if candidate and len(candidate) < len(best):
+                    best = candidate
+        except (ValueError, zlib.error, OSError) as e:
+            print(f"⚠️ PNG optimization skipped for {path.name}: {e}")
+            return len(data), len(data)
+        if best is not data:
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(best)
+            os.replace(tmp, path)
+        with self._lock:
+            self.optimized += 1
+            self.bytes_before += len(data)
+            self.bytes_after += len(best)
+            self.recent.append({"diagram": path.stem, "before": len(data), "after": len(best)})
+        return len(data), len(best)
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = self.bytes_before - self.bytes_after
+            return {
+                "enabled": self.enabled,
+                "palette_reduction": Image is not None,
+                "dpi": self.dpi,
+                "optimized": self.optimized,
+                "bytes_before": self.bytes_before,
+                "bytes_after": self.bytes_after,
+                "saved_ratio": round(saved / self.bytes_before, 4) if self.bytes_before else 0.0,
+                "recent": list(self.recent)[-20:],
+            }
@@ -0,0 +1,414 @@
+"""
+Provider-aware rate limiting shared by every LLM call site.
+
+Each provider (``groq``, ``gemini``, ...) has token buckets for requests and
+tokens per minute and an AIMD concurrency limit: a success raises the limit
+by ``1/limit``, a rate-limit error halves it. A 429 also blocks the provider
+until its Retry-After has passed (plus jitter); without one the caller backs
+off exponentially with full jitter. Buckets and blocks live in SQLite under
+``SRS_DATA_DIR`` so API workers and job worker processes draw from one
+budget; the concurrency limit is per process. Time spent queued for a slot
+or for bucket capacity is tracked per provider.
+"""
+
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.beta.utils.llm_stats import LatencyHistogram
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    provider TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+# (rpm, tpm, concurrency); 0 disables that limit. Override with LLM_LIMIT_<PROVIDER>_RPM/_TPM/_CONCURRENCY.
+_DEFAULT_LIMITS = {
+    "groq": (30, 12000, 4),
+    "gemini": (15, 1000000, 4),
+}
+_FALLBACK_LIMITS = (60, 0, 4)
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "rate_limit", "ratelimit", "resource_exhausted", "resource exhausted", "quota")
+_RETRY_IN = re.compile(r"(?:try again|retry) in\s+(?:(\d+)m)?\s*(\d+(?:\.\d+)?)\s*(ms|s)\b", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+
+
+def provider_of(model: str) -> str:
+    """``groq/llama-3.1-8b-instant`` -> ``groq``; bare ``gemini-*`` names -> ``gemini``."""
+    name = (model or "").strip().lower()
+    if "/" in name:
+        return name.split("/", 1)[0]
+    if name.startswith("gemini"):
+        return "gemini"
+    return name or "default"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After from the provider's response headers or error message, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is not None:
+            return max(0.0, float(value))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    text = str(error)
+    match = _RETRY_IN.search(text)
+    if match:
+        minutes, amount, unit = match.groups()
+        seconds = float(amount) / (1000.0 if unit.lower() == "ms" else 1.0)
+        return seconds + 60.0 * int(minutes or 0)
+    match = _RETRY_DELAY.search(text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def _take(row: Optional[Tuple[float, float, float, float]], now: float, tokens: float,
+          rpm: float, tpm: float) -> Tuple[Tuple[float, float, float, float], float]:
+    """
+    Refill ``(requests, tokens, updated, blocked_until)`` and take one request
+    plus ``tokens``. Returns the new row and the seconds to wait (0 when taken).
+    """
+    if row is None:
+        row = (float(rpm), float(tpm), now, 0.0)
+    have_requests, have_tokens, updated, blocked_until = row
+    elapsed = max(0.0, now - updated)
+    if rpm:
+        have_requests = min(rpm, have_requests + elapsed * rpm / 60.0)
+    if tpm:
+        have_tokens = min(tpm, have_tokens + elapsed * tpm / 60.0)
+        # A request larger than the whole bucket would never fit; it waits for a full one instead.
+        tokens = min(tokens, tpm)
+    if now < blocked_until:
+        return (have_requests, have_tokens, now, blocked_until), blocked_until - now
+    waits = []
+    if rpm and have_requests < 1:
+        waits.append((1 - have_requests) * 60.0 / rpm)
+    if tpm and have_tokens < tokens:
+        waits.append((tokens - have_tokens) * 60.0 / tpm)
+    if waits:
+        return (have_requests, have_tokens, now, blocked_until), max(waits)
+    if rpm:
+        have_requests -= 1
+    if tpm:
+        have_tokens -= tokens
+    return (have_requests, have_tokens, now, blocked_until), 0.0
+
+
+class MemoryBucketStore:
+    """Per-process bucket state."""
+
+    def __init__(self):
+        self._rows: Dict[str, Tuple[float, float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, provider: str, tokens: float, rpm: float, tpm: float) -> float:
+        with self._lock:
+            row, wait = _take(self._rows.get(provider), time.time(), tokens, rpm, tpm)
+            self._rows[provider] = row
+            return wait
+
+    def adjust(self, provider: str, tokens: float):
+        """Give back (positive) or charge (negative) tokens once actual usage is known."""
+        with self._lock:
+            row = self._rows.get(provider)
+            if row is not None:
+                self._rows[provider] = (row[0], row[1] + tokens, row[2], row[3])
+
+    def block(self, provider: str, until: float, rpm: float, tpm: float):
+        with self._lock:
+            row = self._rows.get(provider) or (float(rpm), float(tpm), time.time(), 0.0)
+            self._rows[provider] = (row[0], row[1], row[2], max(row[3], until))
+
+    def blocked_for(self, provider: str) -> float:
+        with self._lock:
+            row = self._rows.get(provider)
+            return max(0.0, row[3] - time.time()) if row else 0.0
+
+
+class SqliteBucketStore:
+    """Bucket state shared by every process on the host through one SQLite file."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, provider: str, change: Callable[[Optional[tuple]], Tuple[tuple, float]]) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE provider = ?", (provider,)
+            ).fetchone()
+            new_row, result = change(row)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (provider, requests, tokens, updated, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                (provider, *new_row),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def take(self, provider: str, tokens: float, rpm: float, tpm: float) -> float:
+        return self._update(provider, lambda row: _take(row, time.time(), tokens, rpm, tpm))
+
+    def adjust(self, provider: str, tokens: float):
+        self._update(provider, lambda row: ((row[0], row[1] + tokens, row[2], row[3]) if row else (0.0, 0.0, time.time(), 0.0), 0.0))
+
+    def block(self, provider: str, until: float, rpm: float, tpm: float):
+        def change(row):
+            row = row or (float(rpm), float(tpm), time.time(), 0.0)
+            return (row[0], row[1], row[2], max(row[3], until)), 0.0
+        self._update(provider, change)
+
+    def blocked_for(self, provider: str) -> float:
+        row = self._conn().execute("SELECT blocked_until FROM buckets WHERE provider = ?", (provider,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+
+class ProviderState:
+    """AIMD concurrency limit, waiters and counters for one provider in this process."""
+
+    def __init__(self, rpm: float, tpm: float, concurrency: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_limit = max(1, concurrency)
+        self.limit = float(self.max_limit)
+        self.inflight = 0
+        self.waiters = deque()  # (loop, future)
+        self.waiting = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.decrease_hold = 0.0
+        self.queue_wait = LatencyHistogram()
+
+
+class LLMRateLimiter:
+    """Gate LLM calls per provider: buckets, AIMD concurrency and 429 back-off with retries."""
+
+    def __init__(self, store, max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 jitter: float = 0.2, output_tokens: int = 1024, enabled: bool = True):
+        self.store = store
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+        self.enabled = enabled
+        self._providers: Dict[str, ProviderState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, provider: str) -> ProviderState:
+        with self._lock:
+            state = self._providers.get(provider)
+            if state is None:
+                rpm, tpm, concurrency = _DEFAULT_LIMITS.get(provider, _FALLBACK_LIMITS)
+                prefix = f"LLM_LIMIT_{re.sub(r'[^A-Z0-9]', '_', provider.upper())}_"
+                state = self._providers[provider] = ProviderState(
+                    rpm=float(os.getenv(prefix + "RPM", rpm)),
+                    tpm=float(os.getenv(prefix + "TPM", tpm)),
+                    concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+                )
+            return state
+
+    def _store_call(self, method: str, *args):
+        try:
+            return getattr(self.store, method)(*args)
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared rate limiter unavailable ({e}); using per-process buckets")
+            self.store = MemoryBucketStore()
+            return getattr(self.store, method)(*args)
+
+    async def _enter(self, state: ProviderState):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if state.inflight < max(1, int(state.limit)):
+                    state.inflight += 1
+                    return
+                future = loop.create_future()
+                state.waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, future) in state.waiters:
+                        state.waiters.remove((loop, future))
+                    elif future.done() and not future.cancelled():
+                        self._wake(state)  # pass the wake-up on
+                raise
+
+    def _wake(self, state: ProviderState):
+        """Wake one waiter; caller holds ``self._lock``."""
+        while state.waiters:
+            loop, future = state.waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+                return
+
+    def _exit(self, state: ProviderState, ok: Optional[bool]):
+        with self._lock:
+            state.inflight -= 1
+            if ok:
+                state.limit = min(float(state.max_limit), state.limit + 1.0 / state.limit)
+            for _ in range(max(1, int(state.limit)) - state.inflight):
+                self._wake(state)
+
+    async def _acquire(self, provider: str, state: ProviderState, tokens: float):
+        started = time.perf_counter()
+        with self._lock:
+            state.waiting += 1
+        try:
+            await self._enter(state)
+            try:
+                while True:
+                    wait = await asyncio.to_thread(self._store_call, "take", provider, tokens, state.rpm, state.tpm)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(min(wait, 5.0) + random.uniform(0, 0.05))
+            except BaseException:
+                self._exit(state, None)
+                raise
+        finally:
+            with self._lock:
+                state.waiting -= 1
+                state.queue_wait.record(time.perf_counter() - started, ok=True)
+
+    def _throttled(self, provider: str, state: ProviderState, error: Exception, attempt: int) -> float:
+        """Shrink concurrency, honour Retry-After (blocking the provider everywhere); return the back-off."""
+        now = time.time()
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after * (1.0 + random.uniform(0, self.jitter))
+            self._store_call("block", provider, now + delay, state.rpm, state.tpm)
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        with self._lock:
+            state.throttled += 1
+            # One halving per back-off window, not one per request of the same burst.
+            if now >= state.decrease_hold:
+                state.limit = max(1.0, state.limit / 2.0)
+                state.decrease_hold = now + max(delay, 1.0)
+        print(f"⚠️ {provider} rate limited; retrying in {delay:.1f}s (concurrency limit {int(state.limit)})")
+        return delay
+
+    async def call(self, model: str, factory: Callable[[], Awaitable], prompt: str = "",
+                   output_tokens: Optional[int] = None, retries: Optional[int] = None):
+        """
+        Run ``factory()`` once the provider of ``model`` has capacity; retry it
+        on rate-limit errors. Other errors, and the last rate-limit error, are
+        raised unchanged.
+        """
+        if not self.enabled:
+            return await factory()
+        provider = provider_of(model)
+        state = self._state(provider)
+        tokens = estimate_tokens(prompt) + (self.output_tokens if output_tokens is None else output_tokens)
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            await self._acquire(provider, state, tokens)
+            with self._lock:
+                state.requests += 1
+            ok = None
+            try:
+                result = await factory()
+                ok = True
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    ok = False
+                    raise
+                delay = self._throttled(provider, state, e, attempt)
+                if attempt >= retries:
+                    raise
+            finally:
+                self._exit(state, ok)
+            if ok:
+                used = getattr(getattr(result, "usage", None), "total_tokens", None)
+                if isinstance(used, int) and state.tpm:
+                    await asyncio.to_thread(self._store_call, "adjust", provider, float(tokens - used))
+                return result
+            with self._lock:
+                state.retries += 1
+            await asyncio.sleep(delay)
+
+    def status(self) -> dict:
+        providers = {}
+        with self._lock:
+            states = dict(self._providers)
+        for name, state in states.items():
+            with self._lock:
+                wait = state.queue_wait
+                providers[name] = {
+                    "rpm": state.rpm,
+                    "tpm": state.tpm,
+                    "concurrency_limit": round(state.limit, 2),
+                    "max_concurrency": state.max_limit,
+                    "inflight": state.inflight,
+                    "waiting": state.waiting,
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                    "retries": state.retries,
+                    "queue_wait_p50_ms": round(wait.percentile(50) * 1000) if wait.samples else None,
+                    "queue_wait_p95_ms": round(wait.percentile(95) * 1000) if wait.samples else None,
+                    "queue_wait_max_ms": round(max(wait.samples) * 1000) if wait.samples else None,
+                }
+            providers[name]["blocked_for_sec"] = round(self._store_call("blocked_for", name), 1)
+        return {
+            "enabled": self.enabled,
+            "shared": isinstance(self.store, SqliteBucketStore),
+            "providers": providers,
+        }
+
+
+LLM_RATE_LIMITER = LLMRateLimiter(
+    store=(
+        SqliteBucketStore(Path(os.getenv("SRS_DATA_DIR", "backend/beta/data")) / "rate_limits.db")
+        if os.getenv("LLM_LIMITER_SHARED", "1") != "0" else MemoryBucketStore()
+    ),
+    max_retries=int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3")),
+    backoff_base=float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SEC", "1")),
+    backoff_max=float(os.getenv("LLM_RATE_LIMIT_BACKOFF_MAX_SEC", "30")),
+    jitter=float(os.getenv("LLM_RATE_LIMIT_JITTER", "0.2")),
+    output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1024")),
+    enabled=os.getenv("LLM_RATE_LIMIT_ENABLED", "1") != "0",
+)
@@ -0,0 +1,229 @@
+"""
+Health tracking and circuit breakers for diagram render backends.
+
+Every backend (renderer pool, one-shot ``mmdc``, mermaid.ink, the bundled
+template diagrams) keeps a rolling window of outcomes and latencies. A
+backend that fails ``failure_threshold`` times in a row is opened: no job is
+routed to it until a background probe, run once its cooldown has passed
+(half-open), succeeds again. Each failed probe doubles the cooldown up to a
+cap. ``route`` orders the usable backends by health score so new jobs go to
+the healthiest one first. Failures caused by the diagram itself (Mermaid
+parse errors) say nothing about the backend and never trip the breaker.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from backend.beta.utils.mermaid_syntax import MermaidSyntaxError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Error text that means the diagram source was rejected, not the backend.
+_CONTENT_ERROR_MARKERS = ("parse error", "syntax error", "lexical error", "no diagram type detected")
+
+
+def is_content_error(error: Exception) -> bool:
+    """True when ``error`` reports invalid diagram source rather than a backend fault."""
+    if isinstance(error, MermaidSyntaxError):
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in _CONTENT_ERROR_MARKERS)
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised when every render backend a job could use has its circuit open."""
+
+
+class BackendHealth:
+    """Rolling outcomes plus circuit breaker state for one backend."""
+
+    def __init__(self, name: str, probe: Optional[Callable[[], None]], available: Callable[[], bool],
+                 window: int, breaker: bool):
+        self.name = name
+        self.probe = probe
+        self.available = available
+        self.breaker = breaker
+        self.outcomes = deque(maxlen=window)  # (ok, seconds)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = 0.0
+        self.open_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.content_errors = 0
+        self.trips = 0
+        self.probes = 0
+        self.last_error = ""
+
+    def success_rate(self) -> float:
+        if not self.outcomes:
+            return 1.0
+        return sum(1 for ok, _ in self.outcomes if ok) / len(self.outcomes)
+
+    def mean_latency(self) -> Optional[float]:
+        latencies = [seconds for ok, seconds in self.outcomes if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def score(self, latency_ref: float) -> float:
+        """Success rate discounted by latency: 1.0 for an always-successful, instant backend."""
+        latency = self.mean_latency() or 0.0
+        return self.success_rate() / (1.0 + latency / latency_ref)
+
+
+class RenderBackendManager:
+    """Thread-safe registry of backend health; routes jobs and probes open circuits."""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 window: int = 50, latency_ref: float = 5.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.window = window
+        self.latency_ref = latency_ref
+        self._backends: Dict[str, BackendHealth] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def register(self, name: str, probe: Optional[Callable[[], None]] = None,
+                 available: Callable[[], bool] = lambda: True, breaker: bool = True):
+        """Add a backend; ``probe`` renders a tiny diagram and raises on failure."""
+        with self._lock:
+            self._backends[name] = BackendHealth(name, probe, available, self.window, breaker and probe is not None)
+
+    @staticmethod
+    def _configured(backend: BackendHealth) -> bool:
+        try:
+            return bool(backend.available())
+        except Exception:
+            return False
+
+    def _usable(self, backend: BackendHealth) -> bool:
+        return backend.state == CLOSED and self._configured(backend)
+
+    def allow(self, name: str) -> bool:
+        """True when ``name`` is configured and its circuit is closed."""
+        with self._lock:
+            backend = self._backends.get(name)
+            return backend is not None and self._usable(backend)
+
+    def route(self, names: List[str]) -> List[str]:
+        """The usable backends among ``names``, healthiest first (ties keep the given order)."""
+        with self._lock:
+            usable = [self._backends[n] for n in names if n in self._backends and self._usable(self._backends[n])]
+            ranked = sorted(enumerate(usable), key=lambda item: (-item[1].score(self.latency_ref), item[0]))
+            return [backend.name for _, backend in ranked]
+
+    def record(self, name: str, ok: bool, seconds: float, error: Optional[Exception] = None):
+        """Record one job outcome; repeated failures open the circuit."""
+        if error is not None and is_content_error(error):
+            with self._lock:
+                backend = self._backends.get(name)
+                if backend is not None:
+                    backend.content_errors += 1
+                    backend.consecutive_failures = 0
+            return
+        with self._lock:
+            backend = self._backends.get(name)
+            if backend is None:
+                return
+            backend.outcomes.append((ok, seconds))
+            if ok:
+                backend.successes += 1
+                backend.consecutive_failures = 0
+                return
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            backend.last_error = str(error or "")[:200]
+            if backend.breaker and backend.state == CLOSED and backend.consecutive_failures >= self.failure_threshold:
+                self._trip(backend, self.base_cooldown)
+
+    def _trip(self, backend: BackendHealth, cooldown: float):
+        backend.state = OPEN
+        backend.cooldown = min(cooldown, self.max_cooldown)
+        backend.open_until = time.monotonic() + backend.cooldown
+        backend.trips += 1
+        print(f"⚠️ Render backend '{backend.name}' circuit opened for {backend.cooldown:.0f}s: {backend.last_error}")
+        self._ensure_prober()
+        self._wake.set()
+
+    def _ensure_prober(self):
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(target=self._probe_loop, name="render-backend-prober", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            self._wake.clear()
+            with self._lock:
+                now = time.monotonic()
+                due = [b for b in self._backends.values() if b.state == OPEN and b.open_until <= now]
+                for backend in due:
+                    backend.state = HALF_OPEN
+                waits = [b.open_until - now for b in self._backends.values() if b.state == OPEN]
+            for backend in due:
+                self._probe(backend)
+            if due:
+                continue
+            self._wake.wait(timeout=max(0.05, min(waits)) if waits else 60.0)
+
+    def _probe(self, backend: BackendHealth):
+        started = time.perf_counter()
+        try:
+            backend.probe()
+            error = None
+        except Exception as e:
+            error = e
+        seconds = time.perf_counter() - started
+        with self._lock:
+            backend.probes += 1
+            if error is None:
+                backend.state = CLOSED
+                backend.consecutive_failures = 0
+                backend.outcomes.append((True, seconds))
+                print(f"✅ Render backend '{backend.name}' probe succeeded; circuit closed")
+            else:
+                backend.last_error = str(error)[:200]
+                self._trip(backend, backend.cooldown * 2)
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            backends = {}
+            for name, b in self._backends.items():
+                latency = b.mean_latency()
+                backends[name] = {
+                    "state": b.state,
+                    "configured": self._configured(b),
+                    "score": round(b.score(self.latency_ref), 3),
+                    "success_rate": round(b.success_rate(), 3),
+                    "mean_latency_ms": round(latency * 1000) if latency is not None else None,
+                    "samples": len(b.outcomes),
+                    "successes": b.successes,
+                    "failures": b.failures,
+                    "content_errors": b.content_errors,
+                    "consecutive_failures": b.consecutive_failures,
+                    "trips": b.trips,
+                    "probes": b.probes,
+                    "retry_in_sec": round(max(0.0, b.open_until - now), 1) if b.state == OPEN else 0.0,
+                    "last_error": b.last_error,
+                }
+            return {
+                "failure_threshold": self.failure_threshold,
+                "cooldown_sec": self.base_cooldown,
+                "max_cooldown_sec": self.max_cooldown,
+                "backends": backends,
+            }
+
+
+RENDER_BACKENDS = RenderBackendManager(
+    failure_threshold=int(os.getenv("MERMAID_BREAKER_FAILURES", "3")),
+    cooldown=float(os.getenv("MERMAID_BREAKER_COOLDOWN_SEC", "30")),
+    max_cooldown=float(os.getenv("MERMAID_BREAKER_MAX_COOLDOWN_SEC", "600")),
+    window=int(os.getenv("MERMAID_BREAKER_WINDOW", "50")),
+)
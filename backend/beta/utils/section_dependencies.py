@@ -0,0 +1,155 @@
+"""
+Dependency map between SRSRequest fields and what they feed.
+
+Each input field lists the AI output families (top-level keys of the AI
+JSON, see ``_build_ai_prompt``), the template-built sections
+(``build_minimal_sections``) and the diagrams (``srs_diagrams``) whose
+content depends on it. Section-level regeneration uses it to redo only what
+a change can affect.
+"""
+
+from typing import Dict, List
+
+# AI JSON family -> sections it populates in _map_ai_to_sections.
+FAMILY_SECTIONS: Dict[str, List[str]] = {
+    "introduction": ["introduction_section", "glossary_section"],
+    "overall_description": ["overall_description_section", "assumptions_section"],
+    "functional_requirements": ["system_features_section"],
+    "non_functional_requirements": ["nfr_section"],
+    "risk_analysis": ["risk_analysis"],
+}
+
+ALL_FAMILIES = list(FAMILY_SECTIONS)
+
+# "section.field" -> families, template sections and diagrams that read it.
+FIELD_DEPENDENCIES: Dict[str, dict] = {
+    "project_identity.project_name": {
+        "families": ["introduction"],
+        "sections": ["glossary_section"],
+        "diagrams": ["system_context", "ui_local_diagram"],
+    },
+    "project_identity.problem_statement": {
+        "families": ["introduction", "overall_description"],
+        "sections": ["introduction_section"],
+        "diagrams": [],
+    },
+    "project_identity.target_users": {
+        "families": ["introduction", "overall_description"],
+        "sections": ["introduction_section", "overall_description_section", "assumptions_section"],
+        "diagrams": ["system_context", "use_case", "sequence_diagram"],
+    },
+    # Title page only.
+    "project_identity.author": {"families": [], "sections": [], "diagrams": []},
+    "project_identity.organization": {"families": [], "sections": [], "diagrams": []},
+    "project_identity.live_link": {"families": [], "sections": [], "diagrams": []},
+    "project_identity.project_id": {"families": [], "sections": [], "diagrams": []},
+    "system_context.application_type": {
+        "families": ["introduction", "overall_description"],
+        "sections": ["introduction_section", "overall_description_section"],
+        "diagrams": ["system_architecture"],
+    },
+    "system_context.domain": {
+        "families": ["introduction", "overall_description"],
+        "sections": ["introduction_section", "overall_description_section"],
+        "diagrams": ["system_context"],
+    },
+    "functional_scope.core_features": {
+        "families": ["introduction", "functional_requirements"],
+        "sections": ["introduction_section", "overall_description_section", "system_features_section"],
+        "diagrams": ["use_case"],
+    },
+    "functional_scope.primary_user_flow": {
+        "families": ["functional_requirements"],
+        "sections": ["system_features_section"],
+        "diagrams": [],
+    },
+    "non_functional_requirements.expected_user_scale": {
+        "families": ["non_functional_requirements"],
+        "sections": ["nfr_section"],
+        "diagrams": [],
+    },
+    "non_functional_requirements.performance_expectation": {
+        "families": ["non_functional_requirements"],
+        "sections": ["nfr_section"],
+        "diagrams": [],
+    },
+    "security_and_compliance.authentication_required": {
+        "families": ["non_functional_requirements"],
+        "sections": ["nfr_section"],
+        "diagrams": [],
+    },
+    "security_and_compliance.sensitive_data_handling": {
+        "families": ["non_functional_requirements", "risk_analysis"],
+        "sections": ["nfr_section"],
+        "diagrams": ["security_flow"],
+    },
+    "security_and_compliance.compliance_requirements": {
+        "families": ["non_functional_requirements", "risk_analysis"],
+        "sections": ["nfr_section"],
+        "diagrams": [],
+    },
+    "technical_preferences.preferred_backend": {
+        "families": [],
+        "sections": ["external_interfaces_section"],
+        "diagrams": ["system_architecture"],
+    },
+    "technical_preferences.database_preference": {
+        "families": [],
+        "sections": ["external_interfaces_section"],
+        "diagrams": ["system_architecture"],
+    },
+    "technical_preferences.deployment_preference": {
+        "families": [],
+        "sections": [],
+        "diagrams": ["system_architecture"],
+    },
+    # Detail level and extra instructions shape every AI family.
+    "output_control.srs_detail_level": {"families": ALL_FAMILIES, "sections": [], "diagrams": []},
+    "output_control.additional_instructions": {"families": ALL_FAMILIES, "sections": [], "diagrams": []},
+}
+
+
+def deep_merge(base: dict, changes: dict) -> dict:
+    """Apply a partial SRSRequest: nested dicts merge, everything else (including lists) replaces."""
+    merged = dict(base)
+    for key, value in (changes or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def changed_fields(old: dict, new: dict) -> List[str]:
+    """Dotted ``section.field`` paths whose values differ between two requests."""
+    changed = []
+    for section in sorted(set(old) | set(new)):
+        old_section, new_section = old.get(section) or {}, new.get(section) or {}
+        if not isinstance(old_section, dict) or not isinstance(new_section, dict):
+            if old_section != new_section:
+                changed.append(section)
+            continue
+        for field in sorted(set(old_section) | set(new_section)):
+            if old_section.get(field) != new_section.get(field):
+                changed.append(f"{section}.{field}")
+    return changed
+
+
+def plan_regeneration(fields: List[str]) -> dict:
+    """Union of families, sections and diagrams affected by ``fields``; unknown fields redo everything."""
+    families, sections, diagrams = set(), set(), set()
+    for field in fields:
+        deps = FIELD_DEPENDENCIES.get(field)
+        if deps is None:
+            families.update(ALL_FAMILIES)
+            continue
+        families.update(deps["families"])
+        sections.update(deps["sections"])
+        diagrams.update(deps["diagrams"])
+    for family in families:
+        sections.update(FAMILY_SECTIONS[family])
+    return {
+        "families": [f for f in ALL_FAMILIES if f in families],
+        "sections": sorted(sections),
+        "diagrams": sorted(diagrams),
+    }
@@ -6,20 +6,77 @@ Software Requirements Specification (SRS) documents from JSON data with
 automatic Table of Contents and page numbering.
 """
 
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime
+from io import BytesIO
+
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 
+_TEMPLATE_FIELD = re.compile(r"\{\{([A-Z_]+)\}\}")
+_BASE_TEMPLATE: Optional[bytes] = None
+_BASE_TEMPLATE_LOCK = threading.Lock()
+# Office 2016+ reads an SVG from this blip extension and falls back to the PNG blip.
+_SVG_BLIP_EXT_URI = "{96DAC541-7B7A-43D3-8B79-37D633B846F1}"
+_SVG_NS = "http://schemas.microsoft.com/office/drawing/2016/SVG/main"
+_SVG_ROOT = re.compile(rb"<svg\b[^>]*>")
+_SVG_VIEWBOX = re.compile(rb'viewBox="\s*[-\d.]+[\s,]+[-\d.]+[\s,]+([\d.]+)[\s,]+([\d.]+)\s*"')
+_SVG_SIZE_ATTR = re.compile(rb'\s(?:width|height)="[^"]*"')
+
+
+def _svg_for_word(data: bytes) -> bytes:
+    """Give the root <svg> absolute width/height from its viewBox; Word ignores percentage sizes."""
+    root = _SVG_ROOT.search(data)
+    if not root:
+        return data
+    viewbox = _SVG_VIEWBOX.search(root.group(0))
+    if not viewbox:
+        return data
+    tag = _SVG_SIZE_ATTR.sub(b"", root.group(0))
+    sized = tag[:4] + b' width="%s" height="%s"' % viewbox.groups() + tag[4:]
+    return data[:root.start()] + sized + data[root.end():]
+
+
+def _base_template_bytes() -> bytes:
+    """
+    Styles, page layout, title page, TOC and header/footer fields, built once
+    per process with ``{{FIELD}}`` placeholders for the per-document values.
+    """
+    global _BASE_TEMPLATE
+    if _BASE_TEMPLATE is None:
+        with _BASE_TEMPLATE_LOCK:
+            if _BASE_TEMPLATE is None:
+                generator = SRSDocumentGenerator("{{PROJECT_NAME}}", ["{{AUTHORS}}"], "{{ORGANIZATION}}", use_template=False)
+                generator.document_id = "{{DOCUMENT_ID}}"
+                generator.date_created = "{{DATE_CREATED}}"
+                generator._add_title_page()
+                generator._add_table_of_contents()
+                generator._add_header_footer()
+                generator._set_update_fields_on_open()
+                buffer = BytesIO()
+                generator.doc.save(buffer)
+                _BASE_TEMPLATE = buffer.getvalue()
+    return _BASE_TEMPLATE
+
 
 class SRSDocumentGenerator:
     """Generate SRS documents from JSON data with proper formatting and TOC."""
     
-    def __init__(self, project_name: str, authors: List[str] = None, organization: str = "Organization Name"):
+    def __init__(self, project_name: str, authors: List[str] = None, organization: str = "Organization Name",
+                 use_template: bool = False):
         """
         Initialize the SRS document generator.
         
@@ -27,14 +84,47 @@ class SRSDocumentGenerator:
             project_name: Name of the project for headers
             authors: List of document author names (default: ["Author Name"])
             organization: Organization name (default: "Organization Name")
+            use_template: Clone the cached base template, which already has the
+                styles, title page, TOC and header/footer (default: False)
         """
         self.project_name = str(project_name or "Project")
         self.authors = [str(a) for a in (authors or ["Author Name"])]
         self.organization = str(organization or "Organization Name")
-        self.doc = Document()
+        self.document_id = f"SRS-{self.project_name[:20].upper().replace(' ', '-')}-001"
+        self.date_created = datetime.now().strftime("%m/%d/%Y")
         self.image_paths = {}  # set before adding sections; may include system_context, system_architecture, use_case, user_workflow, security_flow, data_erd
-        self._setup_document()
-        self._setup_styles()
+        self.from_template = use_template
+        self._svg_rids: Dict[str, str] = {}  # SVG SHA1 -> relationship id, so each SVG is stored once
+        if use_template:
+            self.doc = Document(BytesIO(_base_template_bytes()))
+            self._fill_template_fields()
+        else:
+            self.doc = Document()
+            self._setup_document()
+            self._setup_styles()
+
+    def _fill_template_fields(self):
+        """Replace the base template placeholders with this document's values."""
+        values = {
+            "PROJECT_NAME": self.project_name,
+            "AUTHORS": ", ".join(self.authors),
+            "ORGANIZATION": self.organization,
+            "DOCUMENT_ID": self.document_id,
+            "DATE_CREATED": self.date_created,
+        }
+        paragraphs = list(self.doc.paragraphs)
+        for table in self.doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    paragraphs.extend(cell.paragraphs)
+        for section in self.doc.sections:
+            if not section.header.is_linked_to_previous:
+                paragraphs.extend(section.header.paragraphs)
+        for paragraph in paragraphs:
+            for run in paragraph.runs:
+                if "{{" in run.text:
+                    # One pass, so placeholder-like text inside the values is left alone.
+                    run.text = _TEMPLATE_FIELD.sub(lambda m: values.get(m.group(1), m.group(0)), run.text)
 
     def _apply_section_layout(self, section):
         """Apply consistent page geometry to a single section."""
@@ -150,6 +240,51 @@ class SRSDocumentGenerator:
         except KeyError:
             pass
 
+    @staticmethod
+    def _fit_width(path: Path, width: float) -> float:
+        """
+        Embed width in inches for ``path`` in a slot ``width`` inches wide.
+        Diagrams rendered at a known DPI keep their native size when it is
+        smaller than the slot (stretched at most 2x), so small diagrams are
+        not blown up past their resolution; PNGs without DPI fill the slot.
+        """
+        try:
+            image = DocxImage.from_file(str(path))
+            native = image.px_width / (image.horz_dpi or 72)
+        except Exception:
+            return width
+        return min(width, max(native, width / 2))
+
+    def _add_picture(self, run, path: Path, width: float):
+        """
+        Add ``path`` to ``run`` at a DPI-aware width. When a vector
+        ``<name>.svg`` sits next to the PNG, it is embedded as an SVG blip
+        with the PNG as the fallback for readers without SVG support.
+        """
+        path = Path(path)
+        run.add_picture(str(path), width=Inches(self._fit_width(path, width)))
+        svg_path = path.with_suffix(".svg")
+        if not svg_path.is_file():
+            return
+        blob = _svg_for_word(svg_path.read_bytes())
+        key = hashlib.sha1(blob).hexdigest()
+        rid = self._svg_rids.get(key)
+        if rid is None:
+            package = self.doc.part.package
+            partname = PackURI(package.next_partname("/word/media/image%d.svg"))
+            part = Part(partname, "image/svg+xml", blob, package)
+            rid = self.doc.part.relate_to(part, RT.IMAGE)
+            self._svg_rids[key] = rid
+        blip = run._r.xpath(".//a:blip")[-1]
+        ext_lst = OxmlElement("a:extLst")
+        ext = OxmlElement("a:ext")
+        ext.set("uri", _SVG_BLIP_EXT_URI)
+        svg_blip = ext.makeelement(f"{{{_SVG_NS}}}svgBlip", nsmap={"asvg": _SVG_NS})
+        svg_blip.set(qn("r:embed"), rid)
+        ext.append(svg_blip)
+        ext_lst.append(ext)
+        blip.append(ext_lst)
+
     def _add_figure(self, path: Path, caption: str, width: float = 5.8):
         """Insert a centered figure with a consistent caption style and border."""
         try:
@@ -162,7 +297,7 @@ class SRSDocumentGenerator:
             paragraph = cell.paragraphs[0]
             paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
             run = paragraph.add_run()
-            run.add_picture(str(path), width=Inches(width))
+            self._add_picture(run, path, width)
 
             # Add caption below
             caption_para = self.doc.add_paragraph()
@@ -196,7 +331,7 @@ class SRSDocumentGenerator:
                 if path and Path(path).exists():
                     try:
                         run = para.add_run()
-                        run.add_picture(str(path), width=Inches(image_width))
+                        self._add_picture(run, path, image_width)
                         cap = cell.add_paragraph(caption)
                         cap.style = "Caption"
                     except Exception as e:
@@ -313,8 +448,6 @@ class SRSDocumentGenerator:
         
     def _add_title_page(self):
         """Add title page for the SRS document."""
-        from datetime import datetime
-
         self.doc.add_paragraph()
         self._add_horizontal_rule()
 
@@ -388,8 +521,7 @@ class SRSDocumentGenerator:
         # Date created
         date_created = self.doc.add_paragraph()
         date_created.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        today_date = datetime.now().strftime("%m/%d/%Y")
-        run = date_created.add_run(f"Date Created: {today_date}")
+        run = date_created.add_run(f"Date Created: {self.date_created}")
         run.font.name = 'Arial'
         run.font.size = Pt(12)
         date_created.paragraph_format.space_after = Pt(26)
@@ -399,7 +531,7 @@ class SRSDocumentGenerator:
         control_table.style = 'Table Grid'
         control_table.autofit = True
         control_rows = [
-            ("Document ID", f"SRS-{self.project_name[:20].upper().replace(' ', '-')}-001"),
+            ("Document ID", self.document_id),
             ("Document Status", "Draft"),
             ("Prepared For", self.organization),
         ]
@@ -1077,15 +1209,17 @@ def generate_srs_document(
     """
     Generate a complete SRS document.
     """
-    # Create generator instance
-    generator = SRSDocumentGenerator(project_name, authors, organization)
+    # Create generator instance; the cached base template already holds the title page and TOC
+    use_template = os.getenv("SRS_DOCX_TEMPLATE_CACHE", "1") != "0"
+    generator = SRSDocumentGenerator(project_name, authors, organization, use_template=use_template)
     generator.image_paths = image_paths
     
-    # Add title page
-    generator._add_title_page()
-    
-    # Add Table of Contents
-    generator._add_table_of_contents()
+    if not use_template:
+        # Add title page
+        generator._add_title_page()
+
+        # Add Table of Contents
+        generator._add_table_of_contents()
 
     # Add a diagram-heavy visual overview to match enterprise SRS samples
     generator.add_visual_overview_section()
@@ -1110,8 +1244,10 @@ def generate_srs_document(
     
     # Add header and footer (must be after all content is added)
     generator._apply_layout_to_all_sections()
-    generator._add_header_footer()
-    generator._set_update_fields_on_open()
+    if not use_template:
+        # Template header/footer sit on the first content section; later sections link to it.
+        generator._add_header_footer()
+        generator._set_update_fields_on_open()
     
     # Save the document
     generator.save(output_path)
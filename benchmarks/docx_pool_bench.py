@@ -0,0 +1,100 @@
+"""
+DOCX assembly throughput and event-loop lag: API threads vs the process pool.
+
+Runs 1, 4 and 16 concurrent full-mode ``generate_srs_document`` builds
+through ``run_in_threadpool``, as the endpoints do, once with in-process
+builds (``DocxAssemblyPool`` disabled, the default) and once per
+``--workers`` pool size. A 10 ms ticker on the event loop records how late
+it wakes up; lag is what every other request on the API process waits.
+
+    python benchmarks/docx_pool_bench.py [--concurrency 1 4 16] [--workers 1 4]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+os.environ.setdefault("SRS_DATA_DIR", tempfile.mkdtemp(prefix="srs-bench-"))
+
+TICK_SEC = 0.01
+
+
+def _document_kwargs():
+    spec = importlib.util.spec_from_file_location("docx_template_bench", ROOT / "benchmarks" / "docx_template_bench.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.document_kwargs
+
+
+async def measure(pool, kwargs_for, concurrency: int) -> dict:
+    """Wall time of ``concurrency`` simultaneous builds and the event-loop lag while they run."""
+    from starlette.concurrency import run_in_threadpool
+
+    lags, done = [], False
+
+    async def ticker():
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK_SEC)
+            lags.append((time.perf_counter() - started - TICK_SEC) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*[run_in_threadpool(lambda i=i: pool.build(**kwargs_for(i))) for i in range(concurrency)])
+    wall = time.perf_counter() - started
+    done = True
+    await tick
+    lags.sort()
+    return {
+        "docs_per_min": round(concurrency / wall * 60, 1),
+        "lag_p95_ms": round(lags[int(0.95 * (len(lags) - 1))], 1),
+        "lag_max_ms": round(lags[-1], 1),
+    }
+
+
+async def run(args):
+    from backend.beta.utils.docx_pool import DocxAssemblyPool
+
+    document_kwargs = _document_kwargs()
+    out_dir = Path(tempfile.mkdtemp(prefix="docx-pool-bench-"))
+    base = document_kwargs(args.project_key, "full", "")
+
+    def kwargs_for(i: int) -> dict:
+        return {**base, "output_path": str(out_dir / f"build_{i}.docx")}
+
+    pools = [("threads", DocxAssemblyPool(0))] + [(f"pool x{n}", DocxAssemblyPool(n)) for n in args.workers]
+    print(f"{'builds':<9} {'concurrent':>10} {'docs/min':>9} {'lag p95 ms':>11} {'lag max ms':>11}")
+    for label, pool in pools:
+        pool.start()
+        try:
+            await measure(pool, kwargs_for, 1)  # warm-up
+            for concurrency in args.concurrency:
+                result = await measure(pool, kwargs_for, concurrency)
+                print(f"{label:<9} {concurrency:>10} {result['docs_per_min']:>9} "
+                      f"{result['lag_p95_ms']:>11} {result['lag_max_ms']:>11}")
+        finally:
+            pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="pool sizes to compare")
+    parser.add_argument("--project-key", default="698af25e156a77480b01ce5c", help="project whose stored diagrams are embedded")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
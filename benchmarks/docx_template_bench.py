@@ -0,0 +1,114 @@
+"""
+DOCX assembly time and allocations with and without the cached base template.
+
+Builds the ``test_payload.json`` document in instant, quick and full mode
+with ``SRS_DOCX_TEMPLATE_CACHE`` off and on, using the diagrams stored for
+``--project-key`` under ``backend/beta/static``. Reports the median front
+matter time (generator set-up plus title page, TOC and header/footer
+fields, which is what the template replaces), the median end-to-end
+``generate_srs_document`` time, and the tracemalloc peak of one build.
+
+    python benchmarks/docx_template_bench.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("SRS_DOCX_POOL_ENABLED", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+os.environ.setdefault("SRS_DATA_DIR", tempfile.mkdtemp(prefix="srs-bench-"))
+
+# Instant builds embed only these two, as _generate_instant_fallback does.
+INSTANT_DIAGRAMS = ("system_context", "system_architecture")
+
+
+def document_kwargs(project_key: str, mode: str, output_path: str) -> dict:
+    """``generate_srs_document`` arguments for the sample payload, as ``_generate_document`` passes them."""
+    from backend.beta import main
+
+    inputs = main.SRSRequest(**json.loads(Path("test_payload.json").read_text(encoding="utf-8"))).dict()
+    sections = main.build_minimal_sections(inputs)
+    sections["external_interfaces_section"] = main.clean_interface_diagrams(sections.get("external_interfaces_section", {}))
+    image_paths = {key: str(path) for key, path in main._build_image_paths(project_key).items() if path.is_file()}
+    if mode == "instant":
+        image_paths = {key: path for key, path in image_paths.items() if key in INSTANT_DIAGRAMS}
+    identity = inputs["project_identity"]
+    return dict(
+        project_name=identity["project_name"],
+        introduction_section=sections["introduction_section"],
+        overall_description_section=sections["overall_description_section"],
+        system_features_section=sections["system_features_section"],
+        external_interfaces_section=sections["external_interfaces_section"],
+        nfr_section=sections["nfr_section"],
+        glossary_section=sections["glossary_section"],
+        assumptions_section=sections["assumptions_section"],
+        image_paths=image_paths,
+        output_path=output_path,
+        authors=identity["author"],
+        organization=identity["organization"],
+        sections=sections,
+        mode=mode,
+    )
+
+
+def front_matter(generator_module, kwargs: dict, use_template: bool):
+    """The part of a build the base template replaces."""
+    generator = generator_module.SRSDocumentGenerator(
+        kwargs["project_name"], kwargs["authors"], kwargs["organization"], use_template=use_template
+    )
+    if not use_template:
+        generator._add_title_page()
+        generator._add_table_of_contents()
+        generator._add_header_footer()
+        generator._set_update_fields_on_open()
+
+
+def _median_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="timed builds per mode and setting")
+    parser.add_argument("--project-key", default="698af25e156a77480b01ce5c", help="project whose stored diagrams are embedded")
+    args = parser.parse_args()
+
+    from backend.beta.utils import srs_document_generator as generator_module
+
+    out_dir = Path(tempfile.mkdtemp(prefix="docx-template-bench-"))
+    print(f"{'mode':<8} {'template':<9} {'front ms':>9} {'build ms':>9} {'peak MB':>8}")
+    for mode in ("instant", "quick", "full"):
+        kwargs = document_kwargs(args.project_key, mode, str(out_dir / f"{mode}.docx"))
+        for flag in ("0", "1"):
+            os.environ["SRS_DOCX_TEMPLATE_CACHE"] = flag
+            use_template = flag == "1"
+            generator_module.generate_srs_document(**kwargs)  # warm-up, and builds the template once
+            front = _median_ms(lambda: front_matter(generator_module, kwargs, use_template), args.runs)
+            build = _median_ms(lambda: generator_module.generate_srs_document(**kwargs), args.runs)
+            tracemalloc.start()
+            generator_module.generate_srs_document(**kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{mode:<8} {'on' if use_template else 'off':<9} {front:>9} {build:>9} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
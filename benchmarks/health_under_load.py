@@ -0,0 +1,152 @@
+"""
+Load test: ``/health`` latency while SRS generations run.
+
+Starts ``--generations`` concurrent ``POST /generate_srs`` requests against
+the app in-process and probes ``/health`` every ``--interval`` seconds until
+they finish, after measuring an idle baseline the same way. Each AI call
+(``_generate_ai_content``) is replaced by ``asyncio.sleep(--provider-sec)``
+with an empty reply, so every section takes its retries and then the
+fallback content, and diagram renders by a copy of a stored PNG after
+``--render-sec`` in a worker thread. The run needs no API keys, Node or
+network; everything else (fan-out, retries, progress, artifact store, DOCX
+assembly) is the real pipeline. If the AI stage blocked the event loop,
+probe latency would grow with the number of generations. The documents,
+diagrams and sample report a run writes are removed or restored afterwards.
+
+    python benchmarks/health_under_load.py --generations 1 4 16 --mode full
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("SRS_DOCX_POOL_ENABLED", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+os.environ.setdefault("SRS_DATA_DIR", tempfile.mkdtemp(prefix="srs-bench-"))
+
+SAMPLE_PNG = Path("backend/beta/static/Test_Project_use_case.png")
+SAMPLE_REPORT = Path("backend/beta/static/sample_report.docx")
+OUTPUT_DIRS = (Path("backend/beta/generated_srs"), Path("backend/beta/static"))
+
+
+def install_stubs(main, provider_sec: float, render_sec: float):
+    """Swap providers and diagram renders for fixed delays; returns a function that restores them."""
+    originals = {name: getattr(main, name) for name in ("_generate_ai_content", "render_mermaid_batch")}
+
+    async def fake_ai(prompt: str, project_key: str = "", on_member=None) -> dict:
+        await asyncio.sleep(provider_sec)
+        return {}
+
+    def fake_render(jobs, *args, **kwargs):
+        time.sleep(render_sec)
+        for _, output_png in jobs:
+            shutil.copyfile(SAMPLE_PNG, output_png)
+        return [None] * len(jobs)
+
+    main._generate_ai_content = fake_ai
+    main.render_mermaid_batch = fake_render
+
+    def restore():
+        for name, value in originals.items():
+            setattr(main, name, value)
+    return restore
+
+
+def _stats(samples_ms: list) -> dict:
+    ordered = sorted(samples_ms)
+    return {
+        "probes": len(ordered),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+async def _probe(client, interval: float, until) -> list:
+    samples = []
+    while not until():
+        started = time.perf_counter()
+        response = await client.get("/health")
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def measure(app, generations: int, mode: str = "full", interval: float = 0.05, baseline_sec: float = 1.0) -> dict:
+    """Idle and under-load ``/health`` latency around ``generations`` concurrent builds."""
+    import httpx
+
+    payload = json.loads(Path("test_payload.json").read_text(encoding="utf-8"))
+    prefix = f"health_load_{mode}_{generations}_"
+    sample_report = SAMPLE_REPORT.read_bytes() if SAMPLE_REPORT.exists() else None
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600)
+    try:
+        result = await _run(client, payload, mode, prefix, generations, interval, baseline_sec)
+    finally:
+        for folder in OUTPUT_DIRS:
+            for path in folder.glob(f"{prefix}*"):
+                path.unlink()
+        if sample_report is not None:
+            SAMPLE_REPORT.write_bytes(sample_report)
+    return {"generations": generations, "mode": mode, **result}
+
+
+async def _run(client, payload: dict, mode: str, prefix: str, generations: int, interval: float, baseline_sec: float) -> dict:
+    async with client:
+        deadline = time.perf_counter() + baseline_sec
+        baseline = await _probe(client, interval, lambda: time.perf_counter() >= deadline)
+
+        async def generate(index: int):
+            body = json.loads(json.dumps(payload))
+            body["project_identity"]["project_id"] = f"{prefix}{index}"
+            return await client.post("/generate_srs", params={"mode": mode}, json=body)
+
+        started = time.perf_counter()
+        builds = [asyncio.create_task(generate(i)) for i in range(generations)]
+        loaded = await _probe(client, interval, lambda: all(task.done() for task in builds))
+        responses = await asyncio.gather(*builds)
+    return {
+        "wall_sec": round(time.perf_counter() - started, 2),
+        "statuses": [response.status_code for response in responses],
+        "idle": _stats(baseline),
+        "under_load": _stats(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--generations", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mode", choices=["full", "quick", "instant"], default="full")
+    parser.add_argument("--provider-sec", type=float, default=2.0, help="simulated LLM call latency")
+    parser.add_argument("--render-sec", type=float, default=0.3, help="simulated diagram batch latency")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between /health probes")
+    args = parser.parse_args()
+
+    from backend.beta import main as app_main
+
+    install_stubs(app_main, args.provider_sec, args.render_sec)
+    print(f"{'builds':>6} {'wall s':>7} {'idle p50':>9} {'idle p95':>9} {'load p50':>9} {'load p95':>9} {'load max':>9}  statuses")
+    for count in args.generations:
+        result = asyncio.run(measure(app_main.app, count, args.mode, args.interval))
+        idle, loaded = result["idle"], result["under_load"]
+        print(f"{count:>6} {result['wall_sec']:>7} {idle['p50_ms']:>9} {idle['p95_ms']:>9} "
+              f"{loaded['p50_ms']:>9} {loaded['p95_ms']:>9} {loaded['max_ms']:>9}  {sorted(set(result['statuses']))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Latency benchmark for the native Mermaid renderer.
+
+Renders every diagram ``get_all_srs_diagrams`` produces for
+``test_payload.json`` and reports the median time per stage: parse and
+layout, SVG serialization, and PNG rasterization at 1x (the SVG-mode
+fallback) and 2x (PNG mode). With ``--browser`` the same sources also go
+through the one-shot mmdc / mermaid.ink path for comparison, when one of
+them is available.
+
+    python benchmarks/native_render_bench.py [--runs 5] [--browser]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("SRS_DOCX_POOL_ENABLED", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+os.environ.setdefault("SRS_DATA_DIR", tempfile.mkdtemp(prefix="srs-bench-"))
+
+CONFIG_PATH = Path("backend/beta/static/mermaid-config.json")
+
+
+def _median_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per diagram and stage")
+    parser.add_argument("--browser", action="store_true", help="also time the mmdc / mermaid.ink path once per diagram")
+    args = parser.parse_args()
+
+    from backend.beta.schemas.srs_input_schema import SRSRequest
+    from backend.beta.utils import globals as render_globals
+    from backend.beta.utils import mermaid_native as native
+    from backend.beta.utils.srs_diagrams import get_all_srs_diagrams
+
+    payload = json.loads(Path("test_payload.json").read_text(encoding="utf-8"))
+    diagrams = get_all_srs_diagrams(SRSRequest(**payload).dict())
+    theme = native.load_theme(CONFIG_PATH)
+    background = theme.get("background") or "#FFFFFF"
+    out_dir = Path(tempfile.mkdtemp(prefix="native-bench-"))
+
+    columns = ["layout", "svg", "png 1x", "png 2x"] + (["browser"] if args.browser else [])
+    print(f"{'diagram':<20}" + "".join(f"{c:>10}" for c in columns) + "   (median ms)")
+    totals = {c: [] for c in columns}
+    for name, code in diagrams.items():
+        native.build_scene(code, theme)  # warm fonts and theme
+        scene, width, height = native.build_scene(code, theme)
+        row = {
+            "layout": _median_ms(lambda: native.build_scene(code, theme), args.runs),
+            "svg": _median_ms(lambda: native.scene_to_svg(scene, width, height, background, width), args.runs),
+        }
+        for label, scale in (("png 1x", 1.0), ("png 2x", 2.0)):
+            if native.NATIVE_PNG_AVAILABLE:
+                row[label] = _median_ms(
+                    lambda: native.scene_to_png(scene, width, height, background, scale, out_dir / f"{name}.png"),
+                    args.runs,
+                )
+        if args.browser:
+            try:
+                row["browser"] = _median_ms(
+                    lambda: render_globals._render_mermaid_uncached(code, out_dir / f"{name}_browser.png"), 1
+                )
+            except Exception as e:
+                print(f"  browser path unavailable for {name}: {e}")
+        for column, value in row.items():
+            totals[column].append(value)
+        print(f"{name:<20}" + "".join(f"{row[c]:>10.1f}" if c in row else f"{'-':>10}" for c in columns))
+    print(f"{'mean':<20}" + "".join(
+        f"{statistics.mean(totals[c]):>10.1f}" if totals[c] else f"{'-':>10}" for c in columns
+    ))
+    if not native.NATIVE_PNG_AVAILABLE:
+        print("Pillow is not installed; PNG columns skipped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Lookup latency of the SQLite project store at scale.
+
+Fills a fresh ``SQLiteProjectBackend`` with ``--projects`` projects, each
+carrying ``--markdown-kb`` KB of markdown and its own review token, then
+times ``get`` by id (random ids, so mostly LRU misses, and then ids already
+in the LRU) and ``find(review_token=...)``. Each lookup returns a parsed
+``Project``, as the workflow endpoints use it.
+
+    python benchmarks/project_store_bench.py [--projects 100000] [--markdown-kb 20]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("SRS_DOCX_POOL_ENABLED", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+os.environ.setdefault("SRS_DATA_DIR", tempfile.mkdtemp(prefix="srs-bench-"))
+
+
+def fill(backend, count: int, markdown_kb: int):
+    """Insert ``count`` projects in one transaction; project ``i`` has id ``p<i>`` and token ``t<i>``."""
+    from backend.beta.models.project import Project
+
+    body = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (markdown_kb * 1024 // 57 + 1))[:markdown_kb * 1024]
+    conn = backend._conn()
+    conn.execute("BEGIN IMMEDIATE")
+    for i in range(count):
+        project = Project(
+            id=f"p{i}", name=f"Project {i}", contentMarkdown=f"# Project {i}\n\n{body}",
+            status="IN_REVIEW", clientEmail=f"client{i % 500}@example.com", reviewToken=f"t{i}",
+        )
+        backend._write(conn, project, project.model_dump_json())
+    conn.execute("COMMIT")
+
+
+def _timed_us(fn, keys: list) -> dict:
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        assert fn(key)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "median_us": round(statistics.median(samples), 1),
+        "p95_us": round(samples[int(0.95 * (len(samples) - 1))], 1),
+    }
+
+
+def measure(backend, args):
+    """Fill ``backend`` and print lookup latencies."""
+    db_path = backend.db_path
+    started = time.perf_counter()
+    fill(backend, args.projects, args.markdown_kb)
+    size_mb = db_path.stat().st_size / 2**20
+    print(f"filled {args.projects} projects ({size_mb:.0f} MB) in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(0)
+    ids = [rng.randrange(args.projects) for _ in range(args.lookups)]
+    hot = ids[:max(1, min(args.cache_size, 100))]
+    for i in hot:
+        backend.get(f"p{i}")
+    cases = {
+        "get by id (random)": _timed_us(backend.get, [f"p{i}" for i in ids]),
+        "get by id (in LRU)": _timed_us(backend.get, [f"p{hot[n % len(hot)]}" for n in range(args.lookups)]),
+        "find by review token": _timed_us(lambda token: backend.find(review_token=token, limit=1), [f"t{i}" for i in ids]),
+    }
+    print(f"{'lookup':<22} {'median us':>10} {'p95 us':>9}")
+    for name, result in cases.items():
+        print(f"{name:<22} {result['median_us']:>10} {result['p95_us']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--projects", type=int, default=100_000)
+    parser.add_argument("--markdown-kb", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=5000, help="timed lookups per case")
+    parser.add_argument("--cache-size", type=int, default=1024, help="PROJECT_STORE_CACHE_SIZE")
+    args = parser.parse_args()
+
+    from backend.beta.services.project_store import SQLiteProjectBackend
+
+    db_dir = Path(tempfile.mkdtemp(prefix="project-store-bench-"))
+    try:
+        measure(SQLiteProjectBackend(db_dir / "projects.db", cache_size=args.cache_size), args)
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Shared setup for the backend tests; run ``python -m pytest`` from the repository root.
+
+Settings are pinned before ``backend.beta`` is imported: state goes to a
+throwaway SRS_DATA_DIR, no job workers or DOCX processes are started, and the
+provider key is a placeholder, so any test that reaches a real LLM call fails
+instead of spending quota.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = Path(tempfile.mkdtemp(prefix="srs-tests-"))
+
+# main.py resolves its output folders relative to the repository root.
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+os.environ["SRS_DATA_DIR"] = str(DATA_DIR)
+os.environ["MERMAID_CACHE_DIR"] = str(DATA_DIR / "mermaid-cache")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("SRS_JOB_WORKERS", "0")
+os.environ.setdefault("SRS_DOCX_POOL_ENABLED", "0")
+os.environ.setdefault("MERMAID_POOL_ENABLED", "0")
+
+
+@pytest.fixture
+def srs_inputs() -> dict:
+    """``test_payload.json`` as the generation pipeline sees it."""
+    from backend.beta.schemas.srs_input_schema import SRSRequest
+
+    return SRSRequest(**json.loads((ROOT / "test_payload.json").read_text(encoding="utf-8"))).dict()
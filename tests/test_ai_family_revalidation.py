@@ -0,0 +1,88 @@
+"""A family that still fails its schema check after a re-prompt gets template content, not the invalid reply."""
+
+import asyncio
+
+import pytest
+
+VALID_FEATURES = [{"feature_name": "Login", "description": "Users sign in.", "requirements": ["Email and password"]}]
+INVALID_NFR = {"performance": [], "security": [], "reliability": []}
+VALID_QUICK = {
+    "introduction": {"purpose": "A test system."},
+    "functional_requirements": VALID_FEATURES,
+    "overall_description": {"product_perspective": "A standalone web application."},
+}
+
+
+@pytest.fixture
+def main():
+    from backend.beta import main
+
+    return main
+
+
+def _nfr_text(main, srs_inputs, ai_content):
+    return main._map_ai_to_sections(srs_inputs, ai_content)["nfr_section"]
+
+
+def test_reprompted_family_that_still_fails_is_dropped(main, srs_inputs, monkeypatch):
+    prompts = []
+
+    async def still_invalid(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return {"non_functional_requirements": INVALID_NFR}
+
+    monkeypatch.setattr(main, "_generate_ai_content", still_invalid)
+    ai_content = {**VALID_QUICK, "non_functional_requirements": INVALID_NFR}
+    repaired, broken = asyncio.run(main._repair_ai_output(srs_inputs, "quick", "prompt", ai_content, budget_sec=5))
+
+    assert len(prompts) == 1
+    assert broken == ["non_functional_requirements"]
+    assert "non_functional_requirements" not in repaired
+    assert repaired["functional_requirements"] == VALID_FEATURES
+    assert _nfr_text(main, srs_inputs, repaired) == _nfr_text(main, srs_inputs, {})
+
+
+def test_reprompted_family_that_validates_is_merged(main, srs_inputs, monkeypatch):
+    nfr = {"performance": ["Pages load within 2 seconds."]}
+
+    async def valid(prompt, *args, **kwargs):
+        return {"non_functional_requirements": nfr}
+
+    monkeypatch.setattr(main, "_generate_ai_content", valid)
+    ai_content = {**VALID_QUICK, "non_functional_requirements": INVALID_NFR}
+    repaired, broken = asyncio.run(main._repair_ai_output(srs_inputs, "quick", "prompt", ai_content, budget_sec=5))
+
+    assert broken == []
+    assert repaired["non_functional_requirements"] == nfr
+
+
+def test_no_budget_left_drops_invalid_family(main, srs_inputs):
+    ai_content = {**VALID_QUICK, "non_functional_requirements": INVALID_NFR}
+    repaired, broken = asyncio.run(main._repair_ai_output(srs_inputs, "quick", "prompt", ai_content, budget_sec=0))
+
+    assert broken == ["non_functional_requirements"]
+    assert "non_functional_requirements" not in repaired
+
+
+def test_section_regeneration_falls_back_when_reply_does_not_validate(main, srs_inputs, monkeypatch):
+    project_key = "regen_invalid"
+    previous = {"functional_requirements": VALID_FEATURES, "non_functional_requirements": {"performance": ["Old NFR."]}}
+    main.ARTIFACT_STORE.save_stage(project_key, srs_inputs, "ai", "quick", previous)
+
+    async def invalid(prompt, *args, **kwargs):
+        return {family: INVALID_NFR if family == "non_functional_requirements" else [] for family in previous}
+
+    monkeypatch.setattr(main, "API_KEY_CONFIGURED", True)
+    monkeypatch.setattr(main, "_generate_ai_content", invalid)
+    monkeypatch.setattr(main, "plan_regeneration", lambda fields: {
+        "families": ["non_functional_requirements"], "sections": ["nfr_section"], "diagrams": [],
+    })
+    monkeypatch.setattr(main, "_generate_document", lambda *args: f"./backend/beta/generated_srs/{project_key}_SRS_quick.docx")
+    monkeypatch.setattr(main, "_ensure_minimum_diagrams", lambda *args: None)
+    request = main.SectionRegenerationRequest(changes={"project_identity": {"version": "2.0"}})
+    response = asyncio.run(main.regenerate_srs_sections(project_key, request))
+
+    assert any("non_functional_requirements did not validate" in w for w in response["warnings"])
+    _, saved = main.ARTIFACT_STORE.load_latest(project_key, "ai", ["quick"])[1:]
+    assert "non_functional_requirements" not in saved
+    assert saved["functional_requirements"] == VALID_FEATURES
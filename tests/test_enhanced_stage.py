@@ -0,0 +1,67 @@
+"""An enhanced build only records its ``ai`` stage when the enhancement produced something."""
+
+import asyncio
+
+import pytest
+
+QUICK_AI = {
+    "functional_requirements": [
+        {"feature_name": "Login", "description": "Users sign in with email and password."},
+        {"feature_name": "Logout", "description": "Users end their session."},
+    ],
+}
+
+
+@pytest.fixture
+def main(monkeypatch):
+    from backend.beta import main
+
+    monkeypatch.setattr(main, "API_KEY_CONFIGURED", True)
+    monkeypatch.setenv("FULL_AI_BUDGET_SEC", "0.2")
+    return main
+
+
+def _build_enhanced(main, srs_inputs, project_key):
+    main.ARTIFACT_STORE.save_stage(project_key, srs_inputs, "ai", "quick", QUICK_AI)
+    return asyncio.run(main._build_sections_with_ai(srs_inputs, "Test Project", project_key, mode="enhanced"))
+
+
+def test_enhancement_timeout_does_not_save_quick_output_as_enhanced(main, srs_inputs, monkeypatch):
+    async def hangs(*args, **kwargs):
+        await asyncio.sleep(5)
+        return {"functional_requirements": []}
+
+    monkeypatch.setattr(main, "_generate_ai_content", hangs)
+    sections = _build_enhanced(main, srs_inputs, "enhanced_timeout")
+
+    assert sections["system_features_section"]
+    assert main.ARTIFACT_STORE.load_stage("enhanced_timeout", srs_inputs, "ai", ["enhanced"]) == (None, {})
+    assert main.ARTIFACT_STORE.load_stage("enhanced_timeout", srs_inputs, "sections", ["enhanced"]) == (None, {})
+
+
+@pytest.mark.parametrize("failure", ["raises", "empty"])
+def test_failed_enhancement_does_not_save_enhanced_stage(main, srs_inputs, monkeypatch, failure):
+    async def fails(*args, **kwargs):
+        if failure == "raises":
+            raise RuntimeError("provider down")
+        return {}
+
+    monkeypatch.setattr(main, "_generate_ai_content", fails)
+    project_key = f"enhanced_{failure}"
+    _build_enhanced(main, srs_inputs, project_key)
+
+    assert main.ARTIFACT_STORE.load_stage(project_key, srs_inputs, "ai", ["enhanced"]) == (None, {})
+
+
+def test_successful_enhancement_is_saved(main, srs_inputs, monkeypatch):
+    extra = {"functional_requirements": [{"feature_name": "Login", "structured_requirements": {"inputs": ["email"]}}]}
+
+    async def extends(*args, **kwargs):
+        return extra
+
+    monkeypatch.setattr(main, "_generate_ai_content", extends)
+    _build_enhanced(main, srs_inputs, "enhanced_ok")
+
+    mode, saved = main.ARTIFACT_STORE.load_stage("enhanced_ok", srs_inputs, "ai", ["enhanced"])
+    assert mode == "enhanced"
+    assert saved["functional_requirements"][0]["structured_requirements"] == {"inputs": ["email"]}
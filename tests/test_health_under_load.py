@@ -0,0 +1,34 @@
+"""``/health`` stays responsive while several generations run (benchmarks/health_under_load.py)."""
+
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("httpx")
+
+BENCH = Path(__file__).resolve().parents[1] / "benchmarks" / "health_under_load.py"
+
+
+@pytest.fixture
+def bench():
+    spec = importlib.util.spec_from_file_location("health_under_load", BENCH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_health_latency_stays_flat_during_generations(bench):
+    from backend.beta import main
+
+    restore = bench.install_stubs(main, provider_sec=0.2, render_sec=0.05)
+    try:
+        result = asyncio.run(bench.measure(main.app, 4, mode="full", interval=0.02, baseline_sec=0.3))
+    finally:
+        restore()
+
+    assert result["statuses"] == [200] * 4
+    assert result["under_load"]["probes"] >= 5
+    # A blocked event loop would hold probes for whole AI calls or DOCX builds (hundreds of ms).
+    assert result["under_load"]["p95_ms"] < 100
@@ -0,0 +1,64 @@
+"""``/srs_progress`` for builds run by a job worker keeps the worker's full payload."""
+
+import pytest
+
+
+@pytest.fixture
+def main():
+    from backend.beta import main
+
+    return main
+
+
+def _run_in_job(main, project_key, *updates):
+    """Claim a job for ``project_key`` and report ``updates`` from inside it, like a worker."""
+    job = main.JOB_QUEUE.submit("full", project_key, {"request": {}})
+    assert main.JOB_QUEUE.claim("test-worker")["id"] == job["id"]
+    token = main._CURRENT_JOB_ID.set(job["id"])
+    try:
+        for args, extra in updates:
+            main._set_progress(project_key, *args, **extra)
+    finally:
+        main._CURRENT_JOB_ID.reset(token)
+    # Durable writes (progress row, then the job row) happen on the store's writer thread.
+    main.PROGRESS_STORE.flush()
+    return job
+
+
+def test_job_run_build_keeps_rich_progress_fields(main):
+    timings = {"ai": 1.5, "diagrams": 0.7}
+    job = _run_in_job(
+        main, "job_rich",
+        (("ai", 40, "AI content generated (groq)."), {"llm_cache": "miss"}),
+        (("doc", 85, "Building full DOCX..."), {"stage_timings": timings, "llm_cache": "miss"}),
+    )
+    # The job row is written after the progress row, so it is always the newer of the two.
+    assert main.JOB_QUEUE.get(job["id"])["stage"] == "doc"
+
+    progress = main._get_progress("job_rich")
+    assert progress["stage_timings"] == timings
+    assert progress["llm_cache"] == "miss"
+    assert progress["job_id"] == job["id"]
+    assert progress["status"] == "processing"
+
+
+def test_job_outcome_overrides_worker_payload(main):
+    job = _run_in_job(main, "job_lost", (("ai", 25, "Generating..."), {"stage_timings": {"ai": 2.0}}))
+    main.JOB_QUEUE.fail(job["id"], "worker lost")
+
+    progress = main._get_progress("job_lost")
+    assert progress["status"] == "failed"
+    assert progress["error"] == "worker lost"
+    assert progress["stage_timings"] == {"ai": 2.0}
+
+
+def test_newer_direct_build_wins_over_old_job(main):
+    job = _run_in_job(main, "job_then_direct", (("doc", 85, "Building..."), {}))
+    main.JOB_QUEUE.complete(job["id"], {"download_url": "/download_srs/old.docx"})
+    main._set_progress("job_then_direct", "ai", 40, "Direct build.", section_preview={"id": "FR-1"})
+    main.PROGRESS_STORE.flush()
+
+    progress = main._get_progress("job_then_direct")
+    assert progress["message"] == "Direct build."
+    assert progress["section_preview"] == {"id": "FR-1"}
+    assert "job_id" not in progress
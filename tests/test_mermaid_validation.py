@@ -0,0 +1,30 @@
+"""``validate_mermaid`` only credits avoided render attempts to code it rejects."""
+
+import pytest
+
+
+@pytest.fixture
+def render_globals(monkeypatch):
+    from backend.beta.utils import globals as render_globals
+
+    # Three closed circuits, whatever backends this host actually has.
+    monkeypatch.setattr(render_globals, "failed_render_attempts", lambda: 3)
+    return render_globals
+
+
+def test_repaired_code_avoids_no_attempts(render_globals):
+    check = render_globals.validate_mermaid('flowchart LR\n  A[Start (x)] --> B["End"]\n')
+    assert check["error"] is None
+    assert check["repairs"]
+    assert check["attempts_avoided"] == 0
+
+
+def test_rejected_code_counts_every_open_backend(render_globals):
+    check = render_globals.validate_mermaid("flowchart LR\n  A --> \n  subgraph\n")
+    assert check["error"] is not None
+    assert check["attempts_avoided"] == 3
+
+
+def test_valid_code_is_untouched(render_globals):
+    code = "flowchart LR\n  A[Start] --> B[End]\n"
+    assert render_globals.validate_mermaid(code) == {"code": code, "repairs": [], "error": None, "attempts_avoided": 0}
@@ -0,0 +1,107 @@
+"""
+Golden-image tests for the native Mermaid renderer (``utils/mermaid_native.py``).
+
+Every diagram ``get_all_srs_diagrams`` produces for ``test_payload.json`` is
+rendered with the shared Mermaid config and compared with the files in
+``tests/golden/native``:
+
+- SVG output is pure Python and must match byte for byte.
+- PNG output must have the same size and look the same once downscaled;
+  glyphs come from whichever TrueType font the host has, so text pixels are
+  allowed to differ slightly.
+
+After an intended layout or styling change (bump NATIVE_RENDERER_VERSION),
+refresh the goldens and review the diff:
+
+    UPDATE_GOLDEN=1 python -m pytest tests/test_native_renderer_golden.py
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+GOLDEN_DIR = Path(__file__).parent / "golden" / "native"
+UPDATE = os.getenv("UPDATE_GOLDEN") == "1"
+CONFIG_PATH = Path("backend/beta/static/mermaid-config.json")
+PNG_SCALE = 1.0
+# Mean absolute difference (0-255) allowed between 8x-downscaled grayscale images.
+PNG_TOLERANCE = 4.0
+
+
+def _fixtures():
+    import json
+
+    from backend.beta.schemas.srs_input_schema import SRSRequest
+    from backend.beta.utils.srs_diagrams import get_all_srs_diagrams
+
+    payload = json.loads(Path("test_payload.json").read_text(encoding="utf-8"))
+    return get_all_srs_diagrams(SRSRequest(**payload).dict())
+
+
+FIXTURES = _fixtures()
+
+
+@pytest.fixture(scope="module")
+def native():
+    from backend.beta.utils import mermaid_native
+
+    return mermaid_native
+
+
+def _check_golden(golden: Path, produced: bytes, compare):
+    if UPDATE or not golden.exists():
+        if not UPDATE:
+            pytest.fail(f"missing golden {golden.name}; run with UPDATE_GOLDEN=1 to create it")
+        golden.parent.mkdir(parents=True, exist_ok=True)
+        golden.write_bytes(produced)
+        return
+    compare(golden.read_bytes(), produced)
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_fixture_is_in_native_subset(native, name):
+    from backend.beta.utils.mermaid_syntax import parse_mermaid
+
+    assert parse_mermaid(FIXTURES[name])["unsupported"] == []
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_svg_matches_golden(native, name):
+    theme = native.load_theme(CONFIG_PATH)
+    scene, width, height = native.build_scene(FIXTURES[name], theme)
+    svg = native.scene_to_svg(scene, width, height, theme.get("background") or "#FFFFFF", width)
+
+    def compare(expected: bytes, produced: bytes):
+        assert produced.decode("utf-8") == expected.decode("utf-8"), f"{name}.svg differs from the golden"
+
+    _check_golden(GOLDEN_DIR / f"{name}.svg", svg.encode("utf-8"), compare)
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_png_matches_golden(native, name, tmp_path):
+    if not native.NATIVE_PNG_AVAILABLE:
+        pytest.skip("Pillow is not installed")
+    from io import BytesIO
+
+    from PIL import Image, ImageChops, ImageStat
+
+    output = tmp_path / f"{name}.png"
+    native.render_native(FIXTURES[name], output, scale=PNG_SCALE, config_path=CONFIG_PATH)
+
+    def compare(expected: bytes, produced: bytes):
+        want = Image.open(BytesIO(expected)).convert("L")
+        got = Image.open(BytesIO(produced)).convert("L")
+        assert got.size == want.size, f"{name}.png is {got.size}, golden is {want.size}"
+        small = (max(1, want.width // 8), max(1, want.height // 8))
+        diff = ImageChops.difference(want.resize(small, Image.BOX), got.resize(small, Image.BOX))
+        assert ImageStat.Stat(diff).mean[0] <= PNG_TOLERANCE, f"{name}.png drifted from the golden"
+
+    _check_golden(GOLDEN_DIR / f"{name}.png", output.read_bytes(), compare)
+
+
+def test_native_renderer_is_opt_in():
+    from backend.beta.utils import globals as render_globals
+
+    if "MERMAID_NATIVE_RENDERER" not in os.environ:
+        assert render_globals.MERMAID_NATIVE_RENDERER is False
@@ -0,0 +1,40 @@
+"""ProgressStore writes behind the caller but never hides an update while it is being written."""
+
+import sqlite3
+import time
+
+from backend.beta.services.progress_store import ProgressStore
+
+
+def test_update_stays_readable_while_write_is_blocked(tmp_path):
+    store = ProgressStore(tmp_path / "progress.db")
+    store.set("warm", {"stage": "init"})
+    store.flush()
+
+    blocker = sqlite3.connect(str(tmp_path / "progress.db"), isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        store.set("blocked", {"stage": "ai", "progress": 40})
+        assert time.perf_counter() - started < 0.1
+        time.sleep(0.3)  # the writer thread is now waiting on the lock
+        assert store.get("blocked") == {"stage": "ai", "progress": 40}
+    finally:
+        blocker.execute("COMMIT")
+    store.flush()
+    assert ProgressStore(tmp_path / "progress.db").get("blocked") == {"stage": "ai", "progress": 40}
+    assert store.stats()["pending"] == 0
+
+
+def test_write_hook_runs_for_latest_update_only(tmp_path):
+    store = ProgressStore(tmp_path / "progress.db")
+    ran = []
+    blocker = sqlite3.connect(str(tmp_path / "progress.db"), isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    for step in range(5):
+        store.set("coalesced", {"step": step}, on_write=lambda step=step: ran.append(step))
+    blocker.execute("COMMIT")
+    store.flush()
+    time.sleep(0.2)
+    assert ran[-1] == 4
+    assert store.get("coalesced") == {"step": 4}
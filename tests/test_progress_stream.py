@@ -0,0 +1,55 @@
+"""Progress streams: a reconnect with an unknown id gets a private snapshot."""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def main(monkeypatch):
+    from backend.beta import main
+
+    monkeypatch.setenv("SRS_EVENTS_HEARTBEAT_SEC", "0.3")
+    return main
+
+
+def test_unknown_resume_id_snapshot_is_not_broadcast(main):
+    async def scenario():
+        main._set_progress("stream_resume", "ai", 40, "AI sections generated.")
+        watching = main._progress_stream("stream_resume", None)
+        reconnecting = main._progress_stream("stream_resume", 42)
+        try:
+            first = await watching.__anext__()
+            assert first[1]["message"] == "AI sections generated."
+            published = main.PROGRESS_EVENTS.stats()["published"]
+
+            snapshot = await reconnecting.__anext__()
+            assert snapshot[1]["message"] == "AI sections generated."
+            assert main.PROGRESS_EVENTS.stats()["published"] == published
+            # The client that was already watching only gets a heartbeat, not the snapshot again.
+            assert await watching.__anext__() is None
+
+            main._set_progress("stream_resume", "doc", 85, "Building full DOCX...")
+            for stream in (watching, reconnecting):
+                event = await stream.__anext__()
+                assert event[1]["stage"] == "doc"
+                assert event[0] > snapshot[0]
+        finally:
+            await watching.aclose()
+            await reconnecting.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_known_resume_id_replays_missed_events(main):
+    async def scenario():
+        first = main.PROGRESS_EVENTS.publish("stream_replay", {"stage": "ai", "progress": 25})
+        main.PROGRESS_EVENTS.publish("stream_replay", {"stage": "ai", "progress": 40})
+        stream = main._progress_stream("stream_replay", first)
+        try:
+            event = await stream.__anext__()
+            assert event[1]["progress"] == 40
+        finally:
+            await stream.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+"""Review links are single-use even when several processes submit them at once."""
+
+import multiprocessing
+
+import pytest
+
+from backend.beta.models.project import Project, ReviewFeedback
+from backend.beta.services.project_store import (
+    ProjectStore,
+    ReviewTokenInvalid,
+    ReviewTokenUsed,
+    SQLiteProjectBackend,
+)
+
+
+def _submit_feedback(args):
+    db_path, project_id, token = args
+    # A fresh backend per process: SQLite connections must not cross a fork.
+    ProjectStore.use_backend(SQLiteProjectBackend(db_path))
+    try:
+        ProjectStore.transition(
+            project_id, "CHANGES_REQUESTED", expect_token=token, mark_token_used=True,
+            feedback=ReviewFeedback(date="2026-01-01", comment="Please fix", source="Client"),
+        )
+        return "ok"
+    except ReviewTokenUsed:
+        return "used"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    backend = SQLiteProjectBackend(tmp_path / "projects.db")
+    monkeypatch.setattr(ProjectStore, "_backend", backend)
+    ProjectStore.save_project(Project(id="p1", name="P", contentMarkdown="# P", reviewToken="tok", status="IN_REVIEW"))
+    return backend
+
+
+def test_concurrent_submissions_consume_the_token_once(store):
+    with multiprocessing.get_context("fork").Pool(8) as pool:
+        results = pool.map(_submit_feedback, [(store.db_path, "p1", "tok")] * 16)
+
+    assert results.count("ok") == 1
+    assert results.count("used") == 15
+    project = ProjectStore.get_project("p1")
+    assert project.reviewTokenUsed
+    assert project.status == "CHANGES_REQUESTED"
+    assert len(project.reviewFeedback) == 1
+
+
+def test_wrong_token_changes_nothing(store):
+    with pytest.raises(ReviewTokenInvalid):
+        ProjectStore.transition("p1", "APPROVED", expect_token="nope", mark_token_used=True)
+
+    project = ProjectStore.get_project("p1")
+    assert project.status == "IN_REVIEW"
+    assert not project.reviewTokenUsed